@@ -6,14 +6,24 @@ Gemini 2.5 FlashAgent
 
 import os
 import json
-import base64
+import asyncio
 from typing import Dict, List, Optional, Union
-from openai import OpenAI
 import datetime
 
+from utils.response_cache import get_response_cache
+from utils.image_prep import get_image_preparer
+from utils.json_stream import try_parse_json
+from utils.llm_clients import PooledLLMClient, run_sync
 
-class BaseGeminiAgent:
-    """Gemini 2.5 Flash Agent"""
+
+class BaseGeminiAgent(PooledLLMClient):
+    """Gemini 2.5 Flash Agent（异步接口 acall_gemini / aprocess，同步接口为其封装）"""
+
+    # 共享客户端池中的服务商（见 utils/llm_clients.py）
+    provider = "openrouter"
+
+    # 需要的图纸页面类别（见 core/page_classifier.py），None表示全部页面
+    PAGE_CLASSES = None
     
     def __init__(
         self,
@@ -36,16 +46,17 @@ class BaseGeminiAgent:
         if not self.api_key:
             raise ValueError("OPENROUTER_API_KEYapi_key")
         
-        self.client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=self.api_key
-        )
-        
         self.model_name = "google/gemini-2.5-flash-preview-09-2025"
+
+        # 共享响应缓存（相同输入直接复用上次结果）
+        self.response_cache = get_response_cache()
+
+        # 共享图片编码器（同一页图纸在各Agent之间只编码一次）
+        self.image_preparer = get_image_preparer()
     
     def encode_image_to_base64(self, image_path: str) -> str:
         """
-        base64
+        base64（经共享图片编码器压缩，MIME类型与实际编码一致）
 
         Args:
             image_path: 
@@ -54,15 +65,7 @@ class BaseGeminiAgent:
             base64URL
         """
         try:
-            with open(image_path, "rb") as image_file:
-                encoded_string = base64.b64encode(image_file.read()).decode('ascii')
-                # 
-                if image_path.lower().endswith('.png'):
-                    return f"data:image/png;base64,{encoded_string}"
-                elif image_path.lower().endswith(('.jpg', '.jpeg')):
-                    return f"data:image/jpeg;base64,{encoded_string}"
-                else:
-                    return f"data:image/png;base64,{encoded_string}"
+            return self.image_preparer.encode_file(image_path)
         except Exception as e:
             print(f"  : {image_path}")
             print(f"   : {str(e)}")
@@ -73,9 +76,18 @@ class BaseGeminiAgent:
         system_prompt: str,
         user_query: str,
         images: Optional[Union[str, List[str]]] = None
+    ) -> Dict:
+        """acall_gemini 的同步封装"""
+        return run_sync(self.acall_gemini(system_prompt, user_query, images))
+
+    async def acall_gemini(
+        self,
+        system_prompt: str,
+        user_query: str,
+        images: Optional[Union[str, List[str]]] = None
     ) -> Dict:
         """
-        Gemini 2.5 Flash
+        Gemini 2.5 Flash（异步；图片哈希、编码和缓存读写在线程中执行，不阻塞事件循环）
         
         Args:
             system_prompt: 
@@ -97,6 +109,28 @@ class BaseGeminiAgent:
             else:
                 image_paths = images
         
+        # 命中缓存则跳过API调用
+        cache_key = await asyncio.to_thread(
+            self.response_cache.make_key,
+            model=self.model_name,
+            temperature=self.temperature,
+            system_prompt=system_prompt,
+            user_query=user_query,
+            images=image_paths,
+            extra={"image_prep": self.image_preparer.signature}
+        )
+        cached = await asyncio.to_thread(self.response_cache.get_json, cache_key, "{")
+        if cached is not None:
+            print(f"\n[{self.agent_name}] Cache hit ({cache_key[:12]})")
+            response_content = cached["raw_response"]
+            parsed_result = self._parse_json_response(response_content)
+            return {
+                "success": "parse_error" not in parsed_result,
+                "result": parsed_result,
+                "raw_response": response_content,
+                "cached": True
+            }
+
         # 
         user_content = []
         
@@ -106,13 +140,8 @@ class BaseGeminiAgent:
             "text": user_query
         })
         
-        # 
-        for img_path in image_paths:
-            if img_path.startswith('http'):
-                image_url = img_path
-            else:
-                image_url = self.encode_image_to_base64(img_path)
-            
+        # 所有图片共享单次请求的像素/字节预算
+        for image_url in await asyncio.to_thread(self.image_preparer.prepare, image_paths):
             user_content.append({
                 "type": "image_url",
                 "image_url": {"url": image_url}
@@ -135,8 +164,9 @@ class BaseGeminiAgent:
             print(f"   Images: {len(image_paths)}")
             print(f"   Temperature: {self.temperature}")
 
-            # API
-            completion = self.client.chat.completions.create(
+            # API（截断时续写，不整个重试）
+            response = await self.acall_json(
+                roots="{",
                 extra_headers={
                     "HTTP-Referer": "https://mecagent.com",
                     "X-Title": "MecAgent"  # 
@@ -147,12 +177,20 @@ class BaseGeminiAgent:
             )
             
             # 
-            response_content = completion.choices[0].message.content
+            response_content = response["raw_response"]
             
             print(f"[{self.agent_name}] Success")
+
+            # 只缓存完整解析的输出（截断补齐或解析失败的输出下次重新请求）
+            if response["success"] and response["complete"]:
+                await asyncio.to_thread(self.response_cache.set, cache_key, {"raw_response": response_content})
             
-            # JSON
-            parsed_result = self._parse_json_response(response_content)
+            # JSON（续写用完仍被截断时保留补齐的部分结果，但按失败返回）
+            truncated = not response["complete"] and response["result"] is not None
+            if response["success"] or truncated:
+                parsed_result = response["result"]
+            else:
+                parsed_result = self._parse_json_response(response_content)
             
             # 
             self._save_debug_output(
@@ -163,6 +201,16 @@ class BaseGeminiAgent:
                 parsed=parsed_result
             )
             
+            if truncated:
+                print(f"[{self.agent_name}] {response['error']}")
+                return {
+                    "success": False,
+                    "error": response["error"],
+                    "truncated": True,
+                    "result": parsed_result,
+                    "raw_response": response_content
+                }
+
             return {
                 "success": True,
                 "result": parsed_result,
@@ -187,30 +235,10 @@ class BaseGeminiAgent:
         Returns:
             JSON
         """
-        try:
-            # 
-            json_start = response_content.find('{')
-            json_end = response_content.rfind('}') + 1
-            if json_start >= 0 and json_end > json_start:
-                json_str = response_content[json_start:json_end]
-                return json.loads(json_str)
-            else:
-                return {"raw_content": response_content}
-        except json.JSONDecodeError as e:
-            # JSON```json
-            if "```json" in response_content:
-                json_start = response_content.find("```json") + 7
-                json_end = response_content.find("```", json_start)
-                if json_end > json_start:
-                    json_str = response_content[json_start:json_end].strip()
-                    try:
-                        return json.loads(json_str)
-                    except:
-                        return {"raw_content": response_content, "parse_error": str(e)}
-                else:
-                    return {"raw_content": response_content, "parse_error": str(e)}
-            else:
-                return {"raw_content": response_content, "parse_error": str(e)}
+        result, error = try_parse_json(response_content, roots="{")
+        if result is None:
+            return {"raw_content": response_content, "parse_error": error}
+        return result
     
     def _save_debug_output(
         self,
@@ -230,7 +258,8 @@ class BaseGeminiAgent:
             response: 
             parsed: 
         """
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        # 精确到微秒：并发链路中同一Agent可能在同一秒内多次输出
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
         output_dir = "debug_output"
         os.makedirs(output_dir, exist_ok=True)
         
@@ -255,15 +284,19 @@ class BaseGeminiAgent:
         
         print(f" [{self.agent_name}] : {output_file}")
     
-    def process(self, **kwargs) -> Dict:
+    def process(self, *args, **kwargs) -> Dict:
+        """aprocess 的同步封装"""
+        return run_sync(self.aprocess(*args, **kwargs))
+
+    async def aprocess(self, *args, **kwargs) -> Dict:
         """
-        
-        
+        Agent处理逻辑（子类实现）
+
         Args:
             **kwargs: 
-            
+
         Returns:
             
         """
-        raise NotImplementedError("process")
+        raise NotImplementedError("aprocess")
 
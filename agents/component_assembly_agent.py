@@ -11,6 +11,9 @@ from prompts.agent_3_component_assembly import build_component_assembly_prompt
 
 class ComponentAssemblyAgent(BaseGeminiAgent):
     """"""
+
+    # 组件装配需要明细表、装配视图和焊接说明（见 core/page_classifier.py）
+    PAGE_CLASSES = ("bom", "assembly_view", "weld_detail")
     
     def __init__(self, api_key: str = None):
         super().__init__(
@@ -19,7 +22,7 @@ class ComponentAssemblyAgent(BaseGeminiAgent):
             temperature=0.1
         )
     
-    def process(
+    async def aprocess(
         self,
         component_plan: Dict,
         component_images: List[str],
@@ -58,7 +61,7 @@ class ComponentAssemblyAgent(BaseGeminiAgent):
         )
         
         # Gemini
-        result = self.call_gemini(
+        result = await self.acall_gemini(
             system_prompt=system_prompt,
             user_query=user_query,
             images=component_images
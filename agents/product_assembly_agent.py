@@ -11,6 +11,9 @@ from prompts.agent_4_product_assembly import build_product_assembly_prompt
 
 class ProductAssemblyAgent(BaseGeminiAgent):
     """"""
+
+    # 产品总装需要明细表和装配视图（见 core/page_classifier.py）
+    PAGE_CLASSES = ("bom", "assembly_view")
     
     def __init__(self, api_key: str = None):
         super().__init__(
@@ -19,7 +22,7 @@ class ProductAssemblyAgent(BaseGeminiAgent):
             temperature=0.1
         )
     
-    def process(
+    async def aprocess(
         self,
         product_plan: Dict,
         product_images: List[str],
@@ -62,7 +65,7 @@ class ProductAssemblyAgent(BaseGeminiAgent):
         )
         
         # Gemini
-        result = self.call_gemini(
+        result = await self.acall_gemini(
             system_prompt=system_prompt,
             user_query=user_query,
             images=product_images
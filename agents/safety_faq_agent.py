@@ -7,6 +7,7 @@ FAQ
 from typing import Dict, List
 from agents.base_gemini_agent import BaseGeminiAgent
 from prompts.agent_6_safety_faq import build_safety_faq_prompt
+from utils.step_patches import apply_step_patches, extract_patches, validate_safety_warnings
 
 
 class SafetyFAQAgent(BaseGeminiAgent):
@@ -19,13 +20,15 @@ class SafetyFAQAgent(BaseGeminiAgent):
             temperature=0.2  # 
         )
     
-    def process(
+    async def aprocess(
         self,
         assembly_steps: List[Dict]
     ) -> Dict:
         """
         新逻辑：为每个装配步骤添加安全警告和FAQ（如果该步骤有安全风险）
 
+        模型只输出补丁（见 utils/step_patches.py），合并和校验在本地进行
+
         Args:
             assembly_steps: Agent 5增强后的装配步骤（已包含焊接信息）
 
@@ -33,7 +36,8 @@ class SafetyFAQAgent(BaseGeminiAgent):
             {
                 "success": bool,
                 "enhanced_steps": [...],  # 增强后的装配步骤（包含安全警告）
-                "faq_items": [...]        # 全局FAQ列表
+                "faq_items": [...],       # 全局FAQ列表
+                "patch_report": {"applied": int, "skipped": [...]}  # 补丁合并情况
             }
         """
         print(f"\n{'='*80}")
@@ -47,17 +51,25 @@ class SafetyFAQAgent(BaseGeminiAgent):
         )
 
         # 调用Gemini
-        result = self.call_gemini(
+        result = await self.acall_gemini(
             system_prompt=system_prompt,
             user_query=user_query,
             images=None
         )
 
+        # 模型只返回补丁（步骤号 → safety_warnings字段），在本地合并到原步骤
+        patches = extract_patches(result["result"], "safety_warnings") if result["success"] else None
+        if patches is None and result["success"]:
+            result = {"success": False, "error": "输出中没有step_patches"}
+
         if result["success"]:
             parsed = result["result"]
 
-            # 获取增强后的步骤和FAQ
-            enhanced_steps = parsed.get("enhanced_steps", [])
+            enhanced_steps, report = apply_step_patches(
+                assembly_steps, patches, "safety_warnings", validate_safety_warnings
+            )
+            for reason in report["skipped"]:
+                print(f"   ⚠️ 丢弃安全补丁: {reason}")
             faq_items = parsed.get("faq_items", [])
 
             # 统计有安全警告的步骤数量
@@ -77,6 +89,7 @@ class SafetyFAQAgent(BaseGeminiAgent):
                 "faq_items": faq_items,
                 "total_steps": len(enhanced_steps),
                 "safety_steps_count": safety_steps_count,
+                "patch_report": report,
                 "raw_result": parsed
             }
         else:
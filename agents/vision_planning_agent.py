@@ -11,6 +11,9 @@ from prompts.agent_1_vision_planning import build_simple_assembly_planning_promp
 
 class VisionPlanningAgent(BaseGeminiAgent):
     """"""
+
+    # 规划需要明细表和装配视图（见 core/page_classifier.py）
+    PAGE_CLASSES = ("bom", "assembly_view")
     
     def __init__(self, api_key: str = None):
         super().__init__(
@@ -19,7 +22,7 @@ class VisionPlanningAgent(BaseGeminiAgent):
             temperature=0.1
         )
     
-    def process(
+    async def aprocess(
         self,
         all_images: List[str],
         bom_data: List[Dict]
@@ -48,7 +51,7 @@ class VisionPlanningAgent(BaseGeminiAgent):
         system_prompt, user_query = build_simple_assembly_planning_prompt(bom_data)
         
         # Gemini
-        result = self.call_gemini(
+        result = await self.acall_gemini(
             system_prompt=system_prompt,
             user_query=user_query,
             images=all_images
@@ -7,10 +7,14 @@ Agent 5:
 from typing import Dict, List
 from agents.base_gemini_agent import BaseGeminiAgent
 from prompts.agent_5_welding import build_welding_prompt
+from utils.step_patches import apply_step_patches, extract_patches, validate_welding
 
 
 class WeldingAgent(BaseGeminiAgent):
     """"""
+
+    # 只看有焊接标注的页面（见 core/page_classifier.py）
+    PAGE_CLASSES = ("weld_detail",)
     
     def __init__(self, api_key: str = None):
         super().__init__(
@@ -19,7 +23,7 @@ class WeldingAgent(BaseGeminiAgent):
             temperature=0.1
         )
     
-    def process(
+    async def aprocess(
         self,
         all_images: List[str],
         assembly_steps: List[Dict]
@@ -27,6 +31,8 @@ class WeldingAgent(BaseGeminiAgent):
         """
         新逻辑：为每个装配步骤添加焊接要点（如果该步骤涉及焊接）
 
+        模型只输出补丁（见 utils/step_patches.py），合并和校验在本地进行
+
         Args:
             all_images: PDF图纸列表
             assembly_steps: Agent 3或Agent 4生成的装配步骤
@@ -34,7 +40,8 @@ class WeldingAgent(BaseGeminiAgent):
         Returns:
             {
                 "success": bool,
-                "enhanced_steps": [...]  # 增强后的装配步骤（包含焊接信息）
+                "enhanced_steps": [...],  # 增强后的装配步骤（包含焊接信息）
+                "patch_report": {"applied": int, "skipped": [...]}  # 补丁合并情况
             }
         """
         print(f"\n{'='*80}")
@@ -47,17 +54,25 @@ class WeldingAgent(BaseGeminiAgent):
         system_prompt, user_query = build_welding_prompt(assembly_steps)
 
         # 调用Gemini
-        result = self.call_gemini(
+        result = await self.acall_gemini(
             system_prompt=system_prompt,
             user_query=user_query,
             images=all_images
         )
 
+        # 模型只返回补丁（步骤号 → welding字段），在本地合并到原步骤
+        patches = extract_patches(result["result"], "welding") if result["success"] else None
+        if patches is None and result["success"]:
+            result = {"success": False, "error": "输出中没有step_patches"}
+
         if result["success"]:
             parsed = result["result"]
 
-            # 获取增强后的步骤
-            enhanced_steps = parsed.get("enhanced_steps", [])
+            enhanced_steps, report = apply_step_patches(
+                assembly_steps, patches, "welding", validate_welding
+            )
+            for reason in report["skipped"]:
+                print(f"   ⚠️ 丢弃焊接补丁: {reason}")
 
             # 统计焊接步骤数量
             welding_steps_count = sum(
@@ -74,6 +89,7 @@ class WeldingAgent(BaseGeminiAgent):
                 "enhanced_steps": enhanced_steps,
                 "total_steps": len(enhanced_steps),
                 "welding_steps_count": welding_steps_count,
+                "patch_report": report,
                 "raw_result": parsed
             }
         else:
@@ -25,12 +25,12 @@ import uvicorn
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from core.pipeline import generate_assembly_manual
 from core.parallel_pipeline import ParallelAssemblyPipeline
 from models.vision_model import Qwen3VLModel
 from models.assembly_expert import AssemblyExpertModel
 from processors.file_processor import PDFProcessor, ModelProcessor
 from backend.websocket_manager import ws_manager, ProgressReporter
+from utils.rate_governor import current_job, get_rate_governor
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -65,6 +65,8 @@ class GenerationRequest(BaseModel):
     config: GenerationConfig
     pdf_files: List[str]
     model_files: List[str]
+    resume_task_id: Optional[str] = None  # 续跑：复用该任务输出目录中输入未变化的阶段结果
+    from_step: Optional[int] = None  # 续跑：强制从第N阶段开始重新计算（需同时指定resume_task_id）
 
 class GenerationStatus(BaseModel):
     task_id: str
@@ -132,6 +134,11 @@ async def health_check():
             }
         )
 
+@app.get("/api/metrics/llm")
+async def llm_metrics():
+    """LLM限流指标：各服务商的并发上限、在途/排队请求数（按任务）、限流与重试计数、最近的限流事件"""
+    return get_rate_governor().metrics()
+
 class SettingsRequest(BaseModel):
     dashscope_api_key: str
     deepseek_api_key: str
@@ -238,8 +245,19 @@ async def start_generation(
 ):
     """开始生成装配说明书"""
     try:
-        # 创建任务ID
-        task_id = str(uuid.uuid4())
+        # 创建任务ID（续跑时沿用原任务ID和输出目录）
+        if request.from_step and not request.resume_task_id:
+            raise HTTPException(400, "from_step需要同时指定resume_task_id（要续跑的任务）")
+        resume = bool(request.resume_task_id)
+        if request.resume_task_id:
+            try:
+                task_id = str(uuid.UUID(request.resume_task_id))
+            except ValueError:
+                raise HTTPException(400, "resume_task_id格式无效")
+            if not (output_dir / task_id).exists():
+                raise HTTPException(404, "要续跑的任务输出不存在")
+        else:
+            task_id = str(uuid.uuid4())
 
         # 将文件名转换为完整路径
         pdf_paths = []
@@ -282,7 +300,9 @@ async def start_generation(
             task_id,
             request.config,
             pdf_paths,
-            model_paths
+            model_paths,
+            resume,
+            request.from_step
         )
         
         return {
@@ -291,6 +311,8 @@ async def start_generation(
             "message": "生成任务已启动"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"启动生成任务失败: {str(e)}")
 
@@ -396,9 +418,13 @@ async def process_generation(
     task_id: str,
     config: GenerationConfig,
     pdf_files: List[str],
-    model_files: List[str]
+    model_files: List[str],
+    resume: bool = False,
+    from_step: Optional[int] = None
 ):
-    """后台处理生成任务 - 使用并行流水线"""
+    """后台处理生成任务 - 使用并行流水线（resume时复用输出目录中的阶段检查点）"""
+    # 本任务发出的LLM请求按task_id归组（限流器按任务公平放行；asyncio.to_thread会传递该上下文）
+    current_job.set(task_id)
     try:
         # 创建进度报告器，传入当前事件循环
         loop = asyncio.get_running_loop()
@@ -433,7 +459,9 @@ async def process_generation(
             model_files=model_files,
             output_dir=str(task_output_dir),
             focus_type=config.focus,
-            special_requirements=config.requirements
+            special_requirements=config.requirements,
+            resume=resume,
+            from_step=from_step
         )
 
         if result.get("success"):
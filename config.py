@@ -12,6 +12,12 @@ PROJECT_ROOT = Path(__file__).parent
 
 # API配置
 API_CONFIG = {
+    # OpenRouter配置 (Gemini 2.5 Flash，Agent 1-6 和 AI匹配)
+    "openrouter": {
+        "api_key": os.getenv("OPENROUTER_API_KEY"),
+        "base_url": "https://openrouter.ai/api/v1",
+    },
+
     # 阿里云DashScope配置 (Qwen3-VL)
     "dashscope": {
         "api_key": os.getenv("DASHSCOPE_API_KEY"),
@@ -46,9 +52,32 @@ FILE_CONFIG = {
         "max_file_size": 100 * 1024 * 1024,  # 100MB
         "scale_factor": 1.0,  # 默认缩放因子
         "blender_timeout": 300,  # Blender处理超时(秒)
+        "tessellation": os.getenv("TESSELLATION_QUALITY", "fine"),  # STEP曲面细分精度（tessellation_presets中的名称）
+        "tessellation_presets": {
+            # tol_linear: 弦高误差（模型单位，通常为mm）；tol_angular: 相邻法线最大夹角（弧度）
+            "preview": {"tol_linear": 0.5, "tol_angular": 1.0},  # 粗略、最快，用于预览
+            "standard": {"tol_linear": 0.1, "tol_angular": 0.5},
+            "fine": {"tol_linear": 0.01, "tol_angular": 0.5},  # 最终手册（与cascadio默认值一致）
+        },
+        "glb_passthrough": True,  # STEP直接使用cascadio生成的GLB（只改节点名称和根变换，不重新解析网格）
+        "generate_lods": os.getenv("GENERATE_LODS", "false").lower() == "true",  # 转换后生成多级细节GLB（见 processors/glb_lod.py）
+        "lod_ratios": [1.0, 0.25, 0.05],  # 各级三角形比例（第0级为原始GLB）
+        "compact_glb": os.getenv("COMPACT_GLB", "true").lower() == "true",  # 转换后焊接顶点并按KHR_mesh_quantization量化（见 processors/glb_compact.py）
+        "share_meshes": os.getenv("SHARE_MESHES", "true").lower() == "true",  # 重复的标准件（只差刚体变换）共用一个网格（见 processors/glb_instancing.py）
+        "contact_graph": os.getenv("CONTACT_GRAPH", "true").lower() == "true",  # 转换时计算零件接触/包含关系图（见 processors/spatial_index.py）
     }
 }
 
+# 视觉模型图片配置（见 utils/image_prep.py）
+IMAGE_CONFIG = {
+    "render_colorspace": "gray",  # PDF渲染色彩空间：gray（黑白线稿图纸）或 rgb
+    "max_pixels_per_request": 16_000_000,  # 单次请求所有图片的总像素上限
+    "max_bytes_per_request": 6 * 1024 * 1024,  # 单次请求所有图片编码后的总字节上限
+    "min_long_edge": 1280,  # 缩放下限（长边像素），保证标注文字可辨认
+    "jpeg_quality": 80,  # 带阴影/渲染视图使用JPEG的质量
+    "memo_entries": 256,  # 已编码图片的进程内缓存条目数
+}
+
 # Blender配置
 BLENDER_CONFIG = {
     "executable": os.getenv("BLENDER_EXE", "blender"),
@@ -118,12 +147,14 @@ LOGGING_CONFIG = {
     "backup_count": 5,
 }
 
-# 缓存配置
+# 缓存配置（LLM响应缓存见 utils/response_cache.py，页面渲染缓存见 utils/render_cache.py，GLB转换缓存见 utils/glb_cache.py）
 CACHE_CONFIG = {
     "enable": True,
     "directory": PROJECT_ROOT / ".cache",
     "max_size": 1024 * 1024 * 1024,  # 1GB
     "ttl": 24 * 3600,  # 24小时
+    "page_render_max_size": 2 * 1024 * 1024 * 1024,  # PDF页面渲染缓存上限 2GB（见 utils/render_cache.py）
+    "glb_max_size": 4 * 1024 * 1024 * 1024,  # STEP→GLB转换缓存上限 4GB（见 utils/glb_cache.py）
 }
 
 # 安全配置
@@ -136,10 +167,54 @@ SECURITY_CONFIG = {
 # 性能配置
 PERFORMANCE_CONFIG = {
     "max_concurrent_jobs": 2,  # 最大并发任务数
+    "max_concurrent_agent_calls": int(os.getenv("MAX_CONCURRENT_AGENT_CALLS", "4")),  # 单个任务内同时在途的Agent请求数（按服务商限速调整）
+    "render_workers": int(os.getenv("RENDER_WORKERS", str(os.cpu_count() or 1))),  # PDF栅格化进程数
+    "convert_workers": int(os.getenv("CONVERT_WORKERS", str(os.cpu_count() or 1))),  # STEP→GLB转换子进程数（见 processors/glb_converter.py）
+    "convert_timeout": int(os.getenv("CONVERT_TIMEOUT", "600")),  # 单个STEP文件转换超时(秒)
+    "convert_memory_limit": int(os.getenv("CONVERT_MEMORY_LIMIT_MB", "4096")) * 1024 * 1024,  # 单个转换子进程内存上限
+    "llm_max_connections": int(os.getenv("LLM_MAX_CONNECTIONS", "32")),  # 每个服务商客户端的最大连接数（见 utils/llm_clients.py）
+    "llm_max_keepalive_connections": int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "16")),  # 每个服务商客户端保持的空闲连接数
+    "llm_keepalive_expiry": float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60")),  # 空闲连接保持时间(秒)
+    "llm_http2": os.getenv("LLM_HTTP2", "true").lower() == "true",  # LLM请求使用HTTP/2（需要h2包）
+    "llm_max_continuations": int(os.getenv("LLM_MAX_CONTINUATIONS", "2")),  # JSON输出被截断时"从截断处继续"的最多请求次数（见 utils/json_stream.py）
+    "llm_report_prompt_tokens": os.getenv("LLM_REPORT_PROMPT_TOKENS", "true").lower() == "true",  # 发送前输出每次请求的提示词token预估（见 utils/prompt_encoder.py）
+    "llm_continuation_images": os.getenv("LLM_CONTINUATION_IMAGES", "false").lower() == "true",  # 续写请求是否重新附带图片（默认只带文字和已有输出）
     "memory_limit": "8G",  # 内存限制
     "temp_cleanup": True,  # 自动清理临时文件
 }
 
+# LLM限流配置（见 utils/rate_governor.py）；限额按账户等级调整，0或不设表示不限
+RATE_LIMIT_CONFIG = {
+    "providers": {
+        "openrouter": {
+            "requests_per_minute": int(os.getenv("OPENROUTER_RPM", "120")),
+            "tokens_per_minute": int(os.getenv("OPENROUTER_TPM", "2000000")),
+            "max_concurrency": int(os.getenv("OPENROUTER_MAX_CONCURRENCY", "16")),
+            "models": {},  # 按模型的限额：{模型名: {"requests_per_minute": ..., "tokens_per_minute": ...}}
+        },
+        "dashscope": {
+            "requests_per_minute": int(os.getenv("DASHSCOPE_RPM", "60")),
+            "tokens_per_minute": int(os.getenv("DASHSCOPE_TPM", "1000000")),
+            "max_concurrency": int(os.getenv("DASHSCOPE_MAX_CONCURRENCY", "8")),
+            "models": {},
+        },
+        "deepseek": {
+            "requests_per_minute": int(os.getenv("DEEPSEEK_RPM", "60")),
+            "tokens_per_minute": int(os.getenv("DEEPSEEK_TPM", "1000000")),
+            "max_concurrency": int(os.getenv("DEEPSEEK_MAX_CONCURRENCY", "8")),
+            "models": {},
+        },
+        "default": {"max_concurrency": 4},  # 未配置的服务商
+    },
+    "min_concurrency": 1,  # 自适应并发的下限
+    "error_decrease": 0.5,  # 429/5xx 时并发上限乘以该系数
+    "latency_slowdown": 2.0,  # 延迟（按每输出token计）超过近期最好值的该倍数时视为拥塞
+    "latency_decrease": 0.9,  # 延迟拥塞时并发上限乘以该系数
+    "max_retries": int(os.getenv("LLM_MAX_RETRIES", "5")),  # 429/5xx/连接错误的最大重试次数
+    "backoff_base": 1.0,  # 指数退避的基数(秒)
+    "backoff_max": 60.0,  # 单次退避上限(秒)
+}
+
 # 开发配置
 DEV_CONFIG = {
     "debug": os.getenv("DEBUG", "false").lower() == "true",
@@ -170,6 +245,8 @@ def get_config(section: str = None):
         "cache": CACHE_CONFIG,
         "security": SECURITY_CONFIG,
         "performance": PERFORMANCE_CONFIG,
+        "rate_limit": RATE_LIMIT_CONFIG,
+        "image": IMAGE_CONFIG,
         "dev": DEV_CONFIG,
     }
     
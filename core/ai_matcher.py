@@ -4,9 +4,7 @@ AI智能匹配器
 """
 
 import json
-import re
 from typing import List, Dict
-from openai import OpenAI
 import sys
 import os
 
@@ -18,22 +16,27 @@ from prompts.agent_2_bom_3d_matching import (
     build_ai_matching_prompt,
     AI_MATCHING_SYSTEM_PROMPT
 )
+from utils.response_cache import get_response_cache
+from utils.llm_clients import PooledLLMClient
+from utils.json_stream import try_parse_json
 
 
-class AIBOMMatcher:
+class AIBOMMatcher(PooledLLMClient):
     """AI智能BOM匹配器（使用Gemini 2.5 Flash）"""
 
+    # 共享客户端池中的服务商（见 utils/llm_clients.py）
+    provider = "openrouter"
+
     def __init__(self, api_key: str = None):
         # 使用Gemini 2.5 Flash（通过OpenRouter）
         self.api_key = api_key or os.getenv("OPENROUTER_API_KEY")
         if not self.api_key:
             raise ValueError("需要设置OPENROUTER_API_KEY环境变量或传入api_key参数")
 
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url="https://openrouter.ai/api/v1"
-        )
         self.model = "google/gemini-2.5-flash-preview-09-2025"  # 和其他agent使用相同的模型
+
+        # 共享响应缓存
+        self.response_cache = get_response_cache()
     
     def match_unmatched_parts(
         self,
@@ -103,20 +106,36 @@ class AIBOMMatcher:
             import time
             start_time = time.time()
 
-            response = self.client.chat.completions.create(
-                model=self.model,  # 使用Gemini 2.5 Flash
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_query}
-                ],
-                temperature=0.4,  # ✅ 提高到0.4，使用COT推理，追求100%匹配率
-                # ✅ 不限制max_tokens，Gemini 2.5 Flash支持65.5K输出（COT需要更多token）
-                stream=False,
-                timeout=60
+            cache_key = self.response_cache.make_key(
+                model=self.model,
+                temperature=0.4,
+                system_prompt=system_prompt,
+                user_query=user_query
             )
+            cached = self.response_cache.get_json(cache_key)
+
+            if cached is not None:
+                print(f"      ♻️  命中缓存，跳过AI调用 ({cache_key[:12]})")
+                result_text = cached["raw_response"]
+            else:
+                response = self.call_json(  # 截断时续写，不整个重试
+                    roots="{[",
+                    model=self.model,  # 使用Gemini 2.5 Flash
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_query}
+                    ],
+                    temperature=0.4,  # ✅ 提高到0.4，使用COT推理，追求100%匹配率
+                    # ✅ 不限制max_tokens，Gemini 2.5 Flash支持65.5K输出（COT需要更多token）
+                    stream=False,
+                    timeout=60
+                )
+                result_text = response["raw_response"]
+                # 只缓存完整解析的输出
+                if response["success"] and response["complete"]:
+                    self.response_cache.set(cache_key, {"raw_response": result_text})
 
             elapsed = time.time() - start_time
-            result_text = response.choices[0].message.content
 
             print(f"      📊 AI大脑返回了分析结果 ({len(result_text)} 字符, 耗时: {elapsed:.1f}秒)")
             import sys
@@ -239,65 +258,23 @@ class AIBOMMatcher:
         return prompt
     
     def _parse_response(self, response_text: str) -> List[Dict]:
-        """解析AI响应（参考dual_channel_parser的成熟方案）"""
-
-        # 移除markdown代码块标记（参考dual_channel_parser）
-        content = response_text.strip()
-
-        if content.startswith('```json'):
-            content = content[7:]  # 移除 ```json
-
-        if content.startswith('```'):
-            content = content[3:]  # 移除 ```
-
-        if content.endswith('```'):
-            content = content[:-3]  # 移除结尾的 ```
-
-        content = content.strip()
-
-        # 查找JSON的开始和结束
-        json_start = content.find('{')
-        json_end = content.rfind('}') + 1
-
-        if json_start >= 0 and json_end > json_start:
-            json_str = content[json_start:json_end]
-
-            # ✅ 自动修复常见的JSON格式错误
-            # 1. 移除数组/对象最后一个元素后的逗号（如 },\n] 或 },\n}）
-            json_str = re.sub(r',(\s*[\]}])', r'\1', json_str)
-
-            # 2. 移除控制字符
-            json_str = ''.join(char for char in json_str if ord(char) >= 32 or char in '\n\r\t')
-
-            # 尝试解析JSON
-            try:
-                parsed_result = json.loads(json_str)
-                print(f"      ✅ JSON解析成功")
+        """解析AI响应（容错解析：代码块、末尾逗号、控制字符、截断，见 utils/json_stream.py）"""
+        parsed_result, error = try_parse_json(response_text, roots="{[")
+        if parsed_result is None:
+            print(f"      ⚠️  {error}")
+            return []
 
-                # 如果返回的是对象，提取ai_matched_pairs字段
-                if isinstance(parsed_result, dict):
-                    if 'ai_matched_pairs' in parsed_result:
-                        return parsed_result['ai_matched_pairs']
-                    else:
-                        print(f"      ⚠️  JSON格式错误：缺少'ai_matched_pairs'字段")
-                        return []
-                # 如果直接返回数组
-                elif isinstance(parsed_result, list):
-                    return parsed_result
-                else:
-                    print(f"      ⚠️  JSON格式错误：期望对象或数组，得到 {type(parsed_result)}")
-                    return []
+        print(f"      ✅ JSON解析成功")
 
-            except json.JSONDecodeError as e:
-                error_msg = f"JSON解析失败: line {e.lineno} column {e.colno} (char {e.pos})"
-                print(f"      ⚠️  {error_msg}")
+        # 如果返回的是对象，提取ai_matched_pairs字段
+        if isinstance(parsed_result, dict):
+            if 'ai_matched_pairs' in parsed_result:
+                return parsed_result['ai_matched_pairs']
+            else:
+                print(f"      ⚠️  JSON格式错误：缺少'ai_matched_pairs'字段")
                 return []
-            except Exception as e:
-                print(f"      ⚠️  解析错误: {e}")
-                return []
-        else:
-            print(f"      ⚠️  未找到有效的JSON数据")
-            return []
+        # 如果直接返回数组
+        return parsed_result
     
     def apply_ai_matches(
         self,
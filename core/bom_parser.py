@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+"""
+BOM明细表解析
+全系统唯一的BOM行解析实现（Gemini流水线、双通道解析器、并行流水线、参考项目脚本共用）
+
+- 逐页流式读取PDF，不拼接整份文档
+- 优先按坐标提取明细表（core.bom_table，列对齐，按页缓存）；页面上没有可识别的表头时退回文本行解析
+- 文本行取自PyMuPDF单词（按内容流顺序，基线变化处断行），比pypdf的extract_text快一个数量级
+- 文本行只做一次预编译正则匹配
+- 每行记录来源（文件、页码、行号），输出紧凑的 BomRow
+
+明细表行格式：
+    序号 物料代码 [代号] 名称 数量 [单重] 总重 [备注]
+    例如: 10 01.01.02.0337 T-U2500-01-09-Q235 后座轴套 1 0.30 0.30
+
+吞吐量测试：python core/bom_parser.py [PDF文件或目录] [--show]
+"""
+
+import re
+import sys
+import math
+import time
+import hashlib
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+import fitz  # PyMuPDF
+
+# 添加项目根目录到路径（直接运行本文件做吞吐量测试时）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.bom_table import get_table_cache
+from utils.file_hash import hash_file
+
+
+# 序号上限（更大的数字通常是图纸尺寸标注）
+MAX_SEQ = 200
+
+# 整行匹配：序号 物料代码 主体 数字尾部 [备注]
+# 数字尾部为行末（备注前）的2~3个数：数量 [单重] 总重，首个为整数；
+# 主体为非贪婪匹配，尽量多的数归入尾部，再由 _split_numbers 按 数量×单重≈总重 决定读法
+ROW_PATTERN = re.compile(
+    r"(?P<seq>\d{1,3})\s+"
+    r"(?P<code>\d{2}\.\d{2}\.\S+)\s+"
+    r"(?P<body>.*?\S)\s+"
+    r"(?P<numbers>\d+(?:\s+\d+(?:\.\d+)?){1,2})"
+    r"(?:\s+(?P<remark>[^\d\s]\S*))?"
+)
+
+# 数量×单重与总重的允许误差（总重通常四舍五入到两位小数）
+WEIGHT_REL_TOLERANCE = 0.05
+WEIGHT_ABS_TOLERANCE = 0.01
+
+# 相邻单词中心高度差小于字高的该比例时视为同一行
+SAME_LINE_RATIO = 0.5
+
+# 代号（产品图号/规格）特征字符
+PRODUCT_CODE_PATTERN = re.compile(r"[-*φΦM]")
+
+PdfSource = Union[str, Path, bytes, BinaryIO]
+
+
+class BomRow(NamedTuple):
+    """一行BOM（带来源信息；line为文本行号，坐标提取时为明细表行号）"""
+    seq: int
+    code: str
+    product_code: str
+    name: str
+    quantity: int
+    weight: float
+    unit_weight: Optional[float]
+    file: str
+    page: int
+    line: int
+
+    def to_dict(self) -> Dict:
+        """转换为流水线使用的BOM字典"""
+        return {
+            "seq": str(self.seq),
+            "code": self.code,
+            "product_code": self.product_code,
+            "name": self.name,
+            "quantity": self.quantity,
+            "weight": self.weight,
+            "unit_weight": self.unit_weight,
+            "source_pdf": self.file,
+            "page": self.page,
+            "line": self.line
+        }
+
+    @property
+    def raw(self) -> str:
+        """重建的原始行文本"""
+        fields = [str(self.seq), self.code, self.product_code, self.name, str(self.quantity)]
+        if self.unit_weight is not None:
+            fields.append(f"{self.unit_weight:g}")
+        fields.append(f"{self.weight:g}")
+        return " ".join(field for field in fields if field)
+
+
+def _split_numbers(numbers: List[str]) -> Tuple[List[str], int, Optional[float], float]:
+    """
+    确定行末数字的读法
+
+    三个数时优先读作 数量 单重 总重（数量×单重≈总重时）；否则第一个数属于名称（如"支架 8"），
+    读作 数量 总重，第二个数不是整数时仍按三个数读
+
+    Args:
+        numbers: 行末的2~3个数（首个为整数）
+
+    Returns:
+        (归入名称的数, 数量, 单重, 总重)
+    """
+    if len(numbers) == 2:
+        return [], int(numbers[0]), None, float(numbers[1])
+
+    quantity, unit_weight, weight = int(numbers[0]), float(numbers[1]), float(numbers[2])
+    consistent = math.isclose(
+        quantity * unit_weight, weight, rel_tol=WEIGHT_REL_TOLERANCE, abs_tol=WEIGHT_ABS_TOLERANCE
+    )
+    if not consistent and numbers[1].isdigit():
+        return numbers[:1], int(numbers[1]), None, weight
+    return [], quantity, unit_weight, weight
+
+
+def parse_bom_line(line: str, file: str = "", page: int = 1, line_no: int = 1) -> Optional[BomRow]:
+    """
+    解析单行文本
+
+    Args:
+        line: 文本行
+        file: 来源文件名
+        page: 页码（从1开始）
+        line_no: 页内行号（从1开始）
+
+    Returns:
+        BomRow，不是BOM行时返回None
+    """
+    line = line.strip()
+    if not line or not line[0].isdigit():
+        return None
+
+    match = ROW_PATTERN.fullmatch(line)
+    if match is None:
+        return None
+
+    seq = int(match["seq"])
+    if not 1 <= seq <= MAX_SEQ:
+        return None
+
+    body = match["body"].split()
+    extra, quantity, unit_weight, weight = _split_numbers(match["numbers"].split())
+    body.extend(extra)
+    product_code = body[0] if len(body) > 1 and PRODUCT_CODE_PATTERN.search(body[0]) else ""
+    name_tokens = body[1:] if product_code else body
+
+    return BomRow(
+        seq=seq,
+        code=match["code"],
+        product_code=product_code,
+        name=" ".join(name_tokens) or "未知",
+        quantity=quantity,
+        weight=weight,
+        unit_weight=unit_weight,
+        file=file,
+        page=page,
+        line=line_no
+    )
+
+
+def page_lines(page) -> List[str]:
+    """
+    按内容流顺序重建页面文本行（与pypdf的extract_text断行一致）
+
+    Args:
+        page: fitz页面对象
+
+    Returns:
+        文本行列表
+    """
+    lines = []
+    current: List[str] = []
+    center = height = 0.0
+    for x0, y0, x1, y1, word, *_ in page.get_text("words"):
+        word_center = (y0 + y1) / 2
+        if current and abs(word_center - center) <= height * SAME_LINE_RATIO:
+            current.append(word)
+            continue
+        if current:
+            lines.append(" ".join(current))
+        current = [word]
+        center, height = word_center, y1 - y0
+    if current:
+        lines.append(" ".join(current))
+    return lines
+
+
+def _is_duplicate(code: str, seen_codes: Optional[Set[str]]) -> bool:
+    """
+    物料代码是否已出现（未出现时加入集合）
+
+    没有物料代码列的明细表每行代码都为空，空代码不参与去重
+    """
+    if seen_codes is None or not code:
+        return False
+    if code in seen_codes:
+        return True
+    seen_codes.add(code)
+    return False
+
+
+def iter_bom_rows_from_lines(
+    lines: List[str],
+    file: str = "",
+    page: int = 1,
+    seen_codes: Optional[Set[str]] = None
+) -> Iterator[BomRow]:
+    """
+    从一页文本行中逐行解析BOM
+
+    Args:
+        lines: 页面文本行
+        file: 来源文件名
+        page: 页码（从1开始）
+        seen_codes: 已出现的物料代码；传入时跳过重复代码并把新代码加入集合（空代码不去重）
+
+    Yields:
+        BomRow
+    """
+    for line_no, line in enumerate(lines, 1):
+        row = parse_bom_line(line, file, page, line_no)
+        if row is None:
+            continue
+        if _is_duplicate(row.code, seen_codes):
+            continue
+        yield row
+
+
+def iter_bom_rows_from_text(
+    text: str,
+    file: str = "",
+    page: int = 1,
+    seen_codes: Optional[Set[str]] = None
+) -> Iterator[BomRow]:
+    """从一页纯文本中逐行解析BOM（参数同 iter_bom_rows_from_lines）"""
+    return iter_bom_rows_from_lines(text.splitlines(), file, page, seen_codes)
+
+
+def iter_bom_rows_from_table(
+    page,
+    digest: str,
+    file: str = "",
+    seen_codes: Optional[Set[str]] = None
+) -> Iterator[BomRow]:
+    """
+    按坐标从一页明细表解析BOM（结果按页缓存）
+
+    Args:
+        page: fitz页面对象
+        digest: PDF内容哈希（缓存键）
+        file: 来源文件名
+        seen_codes: 已出现的物料代码
+
+    Yields:
+        BomRow
+    """
+    for cells in get_table_cache().get_rows(page, digest):
+        if _is_duplicate(cells["code"], seen_codes):
+            continue
+        yield BomRow(file=file, page=page.number + 1, **cells)
+
+
+def iter_page_bom_rows(
+    page,
+    digest: str,
+    file: str = "",
+    seen_codes: Optional[Set[str]] = None,
+    lines: Optional[List[str]] = None
+) -> Iterator[BomRow]:
+    """
+    解析单页BOM：优先坐标提取明细表，页面上没有可识别的明细表时退回文本行解析
+
+    Args:
+        page: fitz页面对象
+        digest: PDF内容哈希（明细表缓存键）
+        file: 来源文件名
+        seen_codes: 已出现的物料代码
+        lines: 已提取的页面文本行（调用方还需要文本时传入，避免重复提取）
+
+    Yields:
+        BomRow
+    """
+    table_rows = list(iter_bom_rows_from_table(page, digest, file, seen_codes))
+    if table_rows:
+        yield from table_rows
+        return
+    yield from iter_bom_rows_from_lines(
+        page_lines(page) if lines is None else lines, file, page.number + 1, seen_codes
+    )
+
+
+def iter_bom_rows(
+    source: PdfSource,
+    file: Optional[str] = None,
+    seen_codes: Optional[Set[str]] = None,
+    use_tables: bool = True
+) -> Iterator[BomRow]:
+    """
+    逐页流式解析PDF中的BOM
+
+    Args:
+        source: PDF路径、字节或文件对象
+        file: 来源文件名（默认取路径文件名）
+        seen_codes: 跨文件去重用的物料代码集合
+        use_tables: 是否优先按坐标提取明细表
+
+    Yields:
+        BomRow
+    """
+    if isinstance(source, (str, Path)):
+        file = Path(source).name if file is None else file
+        digest = hash_file(source) if use_tables else ""
+        doc = fitz.open(source)
+    else:
+        data = source if isinstance(source, bytes) else source.read()
+        digest = hashlib.sha256(data).hexdigest() if use_tables else ""
+        doc = fitz.open(stream=data, filetype="pdf")
+
+    with doc:
+        for page_no, page in enumerate(doc, 1):
+            if use_tables:
+                yield from iter_page_bom_rows(page, digest, file or "", seen_codes)
+            else:
+                yield from iter_bom_rows_from_lines(page_lines(page), file or "", page_no, seen_codes)
+
+
+def extract_bom_rows(
+    source: PdfSource,
+    file: Optional[str] = None,
+    seen_codes: Optional[Set[str]] = None,
+    use_tables: bool = True
+) -> List[BomRow]:
+    """解析PDF中的全部BOM行（参数同 iter_bom_rows）"""
+    return list(iter_bom_rows(source, file, seen_codes, use_tables))
+
+
+def _count_rows_pypdf(pdf_path: Path) -> int:
+    """旧实现：pypdf文本层 + 文本行解析（仅用于对比）"""
+    from pypdf import PdfReader
+
+    seen_codes: Set[str] = set()
+    return sum(
+        len(list(iter_bom_rows_from_text(page.extract_text() or "", pdf_path.name, page_no, seen_codes)))
+        for page_no, page in enumerate(PdfReader(pdf_path).pages, 1)
+    )
+
+
+def _count_rows_text(pdf_path: Path) -> int:
+    return len(extract_bom_rows(pdf_path, seen_codes=set(), use_tables=False))
+
+
+def _count_rows_table(pdf_path: Path) -> int:
+    """坐标提取（不读缓存）"""
+    from core.bom_table import extract_table_rows
+
+    with fitz.open(pdf_path) as doc:
+        return sum(len(extract_table_rows(page)) for page in doc)
+
+
+def _count_rows_cached(pdf_path: Path) -> int:
+    return len(extract_bom_rows(pdf_path, seen_codes=set()))
+
+
+# 容易读错数量的文本行（--show 时先打印解析结果）
+SAMPLE_LINES = [
+    "10 01.01.02.0337 T-U2500-01-09-Q235 后座轴套 1 0.30 0.30",
+    "3 01.02.03.0001 支架 1 12 12",  # 数量1 单重12 总重12，不是"支架 1"×12
+    "5 02.01.01.0010 GB/T5782 螺栓 M8*45 4 2 8",  # 数量4 单重2 总重8
+    "7 01.02.03.0002 垫圈 8 4 0.4",  # 名称中的8，数量4 总重0.4
+]
+
+BENCHMARK_METHODS = {
+    "pypdf": _count_rows_pypdf,
+    "text": _count_rows_text,
+    "table": _count_rows_table,
+    "cached": _count_rows_cached
+}
+
+
+def benchmark(pdf_paths: List[Path], repeat: int = 20, method: str = "cached") -> Dict:
+    """
+    BOM解析吞吐量测试
+
+    Args:
+        pdf_paths: PDF文件列表
+        repeat: 重复次数
+        method: pypdf（旧文本层）/ text（PyMuPDF文本行）/ table（坐标提取，无缓存）/ cached（默认路径）
+
+    Returns:
+        统计结果
+    """
+    count_rows = BENCHMARK_METHODS[method]
+    pages = 0
+    for pdf_path in pdf_paths:
+        with fitz.open(pdf_path) as doc:
+            pages += len(doc)
+    rows = sum(count_rows(p) for p in pdf_paths)  # 同时预热缓存
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for pdf_path in pdf_paths:
+            count_rows(pdf_path)
+    elapsed = time.perf_counter() - start
+
+    files = len(pdf_paths) * repeat
+    return {
+        "method": method,
+        "files": len(pdf_paths),
+        "pages": pages,
+        "rows": rows,
+        "elapsed": elapsed,
+        "files_per_minute": files / elapsed * 60 if elapsed else 0.0,
+        "pages_per_second": pages * repeat / elapsed if elapsed else 0.0
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="BOM解析吞吐量测试")
+    parser.add_argument("paths", nargs="*", help="PDF文件或目录（默认: 测试-pdf）")
+    parser.add_argument("--repeat", type=int, default=20, help="重复次数")
+    parser.add_argument(
+        "--method", action="append", choices=sorted(BENCHMARK_METHODS),
+        help="测试的解析方式，可重复指定（默认全部）"
+    )
+    parser.add_argument("--show", action="store_true", help="打印解析出的BOM行")
+    args = parser.parse_args()
+
+    targets = [Path(p) for p in args.paths] or [Path(__file__).resolve().parent.parent / "测试-pdf"]
+    pdf_files = sorted(
+        pdf for target in targets
+        for pdf in ([target] if target.is_file() else target.glob("*.pdf"))
+    )
+    if not pdf_files:
+        print("❌ 未找到PDF文件")
+        sys.exit(1)
+
+    if args.show:
+        for line in SAMPLE_LINES:
+            row = parse_bom_line(line, "示例")
+            print(f"{line}\t→ 名称={row.name} 数量={row.quantity} 单重={row.unit_weight} 总重={row.weight:g}")
+        for pdf_file in pdf_files:
+            for row in iter_bom_rows(pdf_file, seen_codes=set()):
+                print(f"{row.file}:{row.page}:{row.line}\t{row.raw}")
+
+    for method in args.method or list(BENCHMARK_METHODS):
+        result = benchmark(pdf_files, args.repeat, method)
+        print(
+            f"[{method:>6}] {result['files']} 个PDF, {result['pages']} 页, {result['rows']} 个BOM行 | "
+            f"{args.repeat} 轮 {result['elapsed']:.2f}秒 | "
+            f"{result['files_per_minute']:.0f} 个PDF/分钟, {result['pages_per_second']:.1f} 页/秒"
+        )
@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""
+基于坐标的BOM明细表提取
+用PyMuPDF单词坐标和页面矢量线（get_drawings）定位明细表网格，按列归属单词
+
+- 表头：同一基线上同时出现 序号/名称/数量（及 物料代码/代号/单重/总重/备注）的一行
+- 列边界：优先取穿过表头的竖直表格线，没有表格线时取相邻表头中点
+- 数据行：从表头向上、向下逐行扩展，行内单词按横坐标落入列；序号列不是整数的行即视为表格结束
+- 结果按 (PDF内容哈希, 页码) 缓存在内存和磁盘（CACHE_CONFIG["directory"]/bom_tables）
+
+与纯文本行解析相比，数量/单重/总重直接取自对应列，不再按行尾token位置猜测。
+"""
+
+import os
+import re
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import CACHE_CONFIG
+
+
+# 提取规则版本（规则变化时使旧缓存失效）
+TABLE_EXTRACTOR_VERSION = 1
+
+# 磁盘缓存子目录
+TABLE_CACHE_SUBDIR = "bom_tables"
+
+# 内存缓存页数
+MEMORY_CACHE_PAGES = 512
+
+# 表头文字 → 列名
+HEADER_ALIASES = {
+    "序号": "seq",
+    "物料代码": "code",
+    "物料编码": "code",
+    "代号": "product_code",
+    "图号": "product_code",
+    "名称": "name",
+    "数量": "quantity",
+    "单重": "unit_weight",
+    "总重": "weight",
+    "重量": "weight",
+    "备注": "remark"
+}
+
+# 识别为明细表表头所需的列
+REQUIRED_COLUMNS = {"seq", "name", "quantity"}
+
+# 相邻单词中心高度差小于字高的该比例时视为同一行
+SAME_LINE_RATIO = 0.5
+
+# 相邻数据行间距超过行高的该倍数时视为表格结束
+MAX_ROW_GAP_RATIO = 2.5
+
+# 字高超过表头字高该倍数的单词不属于明细表（与表格重叠的标题等大字）
+MAX_WORD_HEIGHT_RATIO = 1.5
+
+# 竖直表格线判定容差（pt）
+RULING_TOLERANCE = 0.5
+
+SEQ_PATTERN = re.compile(r"\d{1,3}")
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+Word = Tuple[float, float, float, float, str]
+
+
+# ========== 行与表头 ==========
+
+def _group_lines(words: Sequence[Word]) -> List[List[Word]]:
+    """按中心高度把单词聚成行（行内按横坐标排序）"""
+    lines: List[List[Word]] = []
+    center = height = 0.0
+    for word in sorted(words, key=lambda w: (w[1] + w[3]) / 2):
+        word_center = (word[1] + word[3]) / 2
+        if lines and abs(word_center - center) <= height * SAME_LINE_RATIO:
+            lines[-1].append(word)
+            continue
+        lines.append([word])
+        center, height = word_center, word[3] - word[1]
+    for line in lines:
+        line.sort(key=lambda w: w[0])
+    return lines
+
+
+def _find_header(lines: List[List[Word]]) -> Optional[Tuple[int, Dict[str, Word]]]:
+    """查找明细表表头行，返回 (行序号, {列名: 表头单词})"""
+    for index, line in enumerate(lines):
+        columns: Dict[str, Word] = {}
+        for word in line:
+            column = HEADER_ALIASES.get(word[4])
+            if column and column not in columns:
+                columns[column] = word
+        if not REQUIRED_COLUMNS <= columns.keys():
+            continue
+
+        # 明细表表头最左列为序号（排除标题栏中零散的同名文字）
+        ordered = sorted(columns.values(), key=lambda w: w[0])
+        if HEADER_ALIASES[ordered[0][4]] == "seq":
+            return index, columns
+    return None
+
+
+def _vertical_rulings(drawings: List[Dict], y: float, x_min: float, x_max: float) -> List[float]:
+    """穿过高度y、位于[x_min, x_max]内的竖直表格线横坐标"""
+    xs = []
+    for path in drawings:
+        for item in path["items"]:
+            if item[0] == "l":
+                p1, p2 = item[1], item[2]
+                if abs(p1.x - p2.x) <= RULING_TOLERANCE and min(p1.y, p2.y) <= y <= max(p1.y, p2.y):
+                    xs.append(p1.x)
+            elif item[0] == "re":
+                rect = item[1]
+                if rect.y0 <= y <= rect.y1:
+                    xs.extend((rect.x0, rect.x1))
+    return sorted({round(x, 1) for x in xs if x_min <= x <= x_max})
+
+
+def _column_bounds(columns: Dict[str, Word], drawings: List[Dict]) -> List[Tuple[str, float, float]]:
+    """计算各列的左右边界"""
+    ordered = sorted(columns.items(), key=lambda item: item[1][0])
+    centers = [(name, (word[0] + word[2]) / 2) for name, word in ordered]
+    header_y = (ordered[0][1][1] + ordered[0][1][3]) / 2
+
+    # 表格左右外延：第一/最后一个表头到相邻表头的距离
+    first_gap = centers[1][1] - centers[0][1]
+    last_gap = centers[-1][1] - centers[-2][1]
+    x_min = centers[0][1] - first_gap
+    x_max = centers[-1][1] + last_gap
+
+    rulings = _vertical_rulings(drawings, header_y, x_min, x_max)
+
+    bounds = []
+    for index, (name, center) in enumerate(centers):
+        left_limit = centers[index - 1][1] if index else x_min
+        right_limit = centers[index + 1][1] if index + 1 < len(centers) else x_max
+
+        left_rulings = [x for x in rulings if left_limit < x < center]
+        right_rulings = [x for x in rulings if center < x < right_limit]
+        left = max(left_rulings) if left_rulings else (left_limit + center) / 2
+        right = min(right_rulings) if right_rulings else (center + right_limit) / 2
+        bounds.append((name, left, right))
+    return bounds
+
+
+# ========== 数据行 ==========
+
+def _assign_cells(line: List[Word], bounds: List[Tuple[str, float, float]]) -> Dict[str, str]:
+    """把一行单词按中心横坐标落入列"""
+    cells: Dict[str, List[str]] = {}
+    for word in line:
+        center = (word[0] + word[2]) / 2
+        for name, left, right in bounds:
+            if left <= center < right:
+                cells.setdefault(name, []).append(word[4])
+                break
+    return {name: " ".join(parts) for name, parts in cells.items()}
+
+
+def _parse_number(text: Optional[str]) -> Optional[float]:
+    if text and NUMBER_PATTERN.fullmatch(text):
+        return float(text)
+    return None
+
+
+def _row_from_cells(cells: Dict[str, str], row_no: int) -> Optional[Dict]:
+    """单元格 → BOM行字典；不是数据行时返回None"""
+    seq = cells.get("seq", "")
+    quantity = _parse_number(cells.get("quantity"))
+    if not SEQ_PATTERN.fullmatch(seq) or quantity is None:
+        return None
+
+    unit_weight = _parse_number(cells.get("unit_weight"))
+    weight = _parse_number(cells.get("weight"))
+    if weight is None:
+        weight = unit_weight * quantity if unit_weight is not None else 0.0
+
+    return {
+        "seq": int(seq),
+        "code": cells.get("code", ""),
+        "product_code": cells.get("product_code", ""),
+        "name": cells.get("name", "") or "未知",
+        "quantity": int(quantity),
+        "weight": weight,
+        "unit_weight": unit_weight,
+        "line": row_no
+    }
+
+
+def _collect_rows(
+    lines: List[List[Word]],
+    header_index: int,
+    bounds: List[Tuple[str, float, float]]
+) -> List[Dict]:
+    """从表头向上、向下扩展，收集连续的数据行"""
+    x_min, x_max = bounds[0][1], bounds[-1][2]
+    header_line = lines[header_index]
+    row_height = max(w[3] - w[1] for w in header_line)
+
+    rows = []
+    for direction in (-1, 1):
+        previous_y = (header_line[0][1] + header_line[0][3]) / 2
+        index = header_index + direction
+        while 0 <= index < len(lines):
+            in_table = [
+                w for w in lines[index]
+                if x_min <= (w[0] + w[2]) / 2 < x_max and w[3] - w[1] <= row_height * MAX_WORD_HEIGHT_RATIO
+            ]
+            index += direction
+            if not in_table:
+                continue
+
+            line_y = (in_table[0][1] + in_table[0][3]) / 2
+            if abs(line_y - previous_y) > row_height * MAX_ROW_GAP_RATIO:
+                break
+
+            cells = _assign_cells(in_table, bounds)
+            row = _row_from_cells(cells, len(rows) + 1)
+            if row is None:
+                # 名称换行等续行：只落在名称/备注列时跳过，否则表格结束
+                if not cells.keys() <= {"name", "remark"}:
+                    break
+                continue
+
+            rows.append(row)
+            previous_y = line_y
+
+        if rows:
+            break  # 明细表只在表头一侧
+    return rows
+
+
+def extract_table_rows(page) -> List[Dict]:
+    """
+    从单页提取BOM明细表（不使用缓存）
+
+    Args:
+        page: fitz页面对象
+
+    Returns:
+        BOM行字典列表（seq/code/product_code/name/quantity/weight/unit_weight/line），
+        页面上没有明细表时返回空列表
+    """
+    words = [tuple(w[:5]) for w in page.get_text("words")]
+    lines = _group_lines(words)
+    header = _find_header(lines)
+    if header is None:
+        return []
+
+    header_index, columns = header
+    bounds = _column_bounds(columns, page.get_drawings())
+    return _collect_rows(lines, header_index, bounds)
+
+
+# ========== 按页缓存 ==========
+
+class BomTableCache:
+    """按 (PDF内容哈希, 页码) 缓存明细表提取结果（内存LRU + 磁盘JSON）"""
+
+    def __init__(self, directory: Optional[Path] = None, enabled: Optional[bool] = None):
+        self.directory = Path(directory or CACHE_CONFIG["directory"]) / TABLE_CACHE_SUBDIR
+        self.enabled = CACHE_CONFIG["enable"] if enabled is None else enabled
+        self._memory: "OrderedDict[Tuple[str, int], List[Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str) -> Path:
+        return self.directory / f"{digest}_v{TABLE_EXTRACTOR_VERSION}.json"
+
+    def get_rows(self, page, digest: str) -> List[Dict]:
+        """
+        获取页面明细表（优先读缓存）
+
+        Args:
+            page: fitz页面对象
+            digest: PDF内容哈希
+
+        Returns:
+            BOM行字典列表
+        """
+        if not self.enabled:
+            return extract_table_rows(page)
+
+        key = (digest, page.number)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        pages = self._load(digest)
+        rows = pages.get(str(page.number))
+        if rows is None:
+            rows = extract_table_rows(page)
+            pages[str(page.number)] = rows
+            self._save(digest, pages)
+
+        with self._lock:
+            self._memory[key] = rows
+            while len(self._memory) > MEMORY_CACHE_PAGES:
+                self._memory.popitem(last=False)
+        return rows
+
+    def _load(self, digest: str) -> Dict[str, List[Dict]]:
+        try:
+            with open(self._path(digest), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, digest: str, pages: Dict[str, List[Dict]]):
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(pages, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_table_cache() -> BomTableCache:
+    """获取全局共享的明细表缓存实例"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = BomTableCache()
+    return _default_cache
@@ -16,8 +16,6 @@ import os
 
 import json
 
-import tempfile
-
 from pathlib import Path
 
 from typing import Dict, List, Any, Optional
@@ -26,10 +24,23 @@ from typing import Dict, List, Any, Optional
 
 import fitz  # PyMuPDF
 
-from pypdf import PdfReader
+import openai
 
 from models.vision_model import Qwen3VLModel
 
+from core.bom_parser import iter_bom_rows, iter_page_bom_rows, page_lines
+from utils.file_hash import hash_file
+from utils.render_cache import get_render_cache
+from utils.prompt_encoder import encode_table
+
+
+
+
+
+# 视觉通道渲染DPI（3倍缩放）
+
+VISION_RENDER_DPI = 216
+
 
 
 
@@ -70,6 +81,26 @@ class DualChannelParser:
 
 
 
+    def _render_progress(self, pdf_name: str):
+
+        """生成逐页渲染进度回调"""
+
+        def callback(done: int, total: int, page_index: int):
+
+            self._report_progress("pdf_render", done * 100 // total, f"🖼️  {pdf_name} 第 {page_index + 1} 页已渲染 ({done}/{total})", {
+
+                "file": pdf_name,
+
+                "pages_done": done,
+
+                "pages_total": total
+
+            })
+
+        return callback
+
+
+
     def parse_multi_pdfs(self, pdf_paths: List[str]) -> Dict[str, Any]:
         """
         解析多个PDF文件，合并BOM后进行视觉分析
@@ -81,8 +112,6 @@ class DualChannelParser:
             候选事实JSON
         """
         import os
-        import re
-        from pypdf import PdfReader
 
         print(f"🔍 开始多PDF双通道解析: {len(pdf_paths)} 个文件")
 
@@ -96,14 +125,10 @@ class DualChannelParser:
         for i, pdf_path in enumerate(pdf_paths, 1):
             print(f"\n📄 处理第 {i}/{len(pdf_paths)} 个PDF: {os.path.basename(pdf_path)}")
 
-            # 使用pypdf提取BOM
+            # 流式解析BOM（每项自带来源文件、页码、行号）
             bom_items = self._extract_bom_from_pdf(pdf_path)
 
             if bom_items:
-                # 添加来源信息
-                for item in bom_items:
-                    item["source_pdf"] = os.path.basename(pdf_path)
-
                 all_bom_items.extend(bom_items)
                 print(f"   ✅ 提取到 {len(bom_items)} 个BOM项")
             else:
@@ -116,29 +141,14 @@ class DualChannelParser:
         print("步骤2: 视觉通道解析 - 装配专家分析（传入所有BOM上下文）")
         print("="*80)
 
-        # 合并所有PDF的页面到临时目录
-        temp_dir = tempfile.mkdtemp()
-        print(f"📁 创建临时目录: {temp_dir}")
-
+        # 从共享渲染缓存取得所有PDF页面（同一页面每个DPI只渲染一次）
+        render_cache = get_render_cache()
         all_image_paths = []
-        total_pages = 0
-
         for pdf_path in pdf_paths:
-            doc = fitz.open(pdf_path)
-            total_pages += len(doc)
-
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-
-                # 高分辨率渲染
-                mat = fitz.Matrix(3, 3)  # 3倍缩放
-                pix = page.get_pixmap(matrix=mat)
-
-                img_path = f"{temp_dir}/pdf{len(all_image_paths) + 1}_page{page_num + 1}.png"
-                pix.save(img_path)
-                all_image_paths.append(img_path)
-
-            doc.close()
+            all_image_paths.extend(render_cache.render_pdf(
+                pdf_path, VISION_RENDER_DPI, progress_callback=self._render_progress(Path(pdf_path).name)
+            ))
+        total_pages = len(all_image_paths)
 
         print(f"📄 总页数: {total_pages}，已转换为 {len(all_image_paths)} 张图片")
         print(f"📊 BOM上下文: {len(all_bom_items)} 个零件")
@@ -149,11 +159,6 @@ class DualChannelParser:
             bom_items=all_bom_items
         )
 
-        # 清理临时文件
-        import shutil
-        shutil.rmtree(temp_dir)
-        print("🗑️  已清理临时文件")
-
         # 合并结果
         result = {
             "bom_candidates": all_bom_items,
@@ -169,84 +174,10 @@ class DualChannelParser:
     def _extract_bom_from_pdf(self, pdf_path: str) -> List[Dict]:
         """从单个PDF提取BOM表"""
         try:
-            from pypdf import PdfReader
-            import re
-
-            reader = PdfReader(pdf_path)
-            all_text = ""
-            for page in reader.pages:
-                all_text += page.extract_text() + "\n"
-
-            bom_items = []
-            seen_codes = set()
-            lines = all_text.split('\n')
-
-            for line in lines:
-                if not line.strip() or '序号' in line or '物料代码' in line:
-                    continue
-
-                parts = line.split()
-                if len(parts) < 4:
-                    continue
-
-                # 第一个应该是序号
-                try:
-                    seq = int(parts[0])
-                    if not (1 <= seq <= 200):
-                        continue
-                except:
-                    continue
-
-                # 查找BOM代号
-                code = None
-                code_idx = -1
-                for i, part in enumerate(parts[1:], 1):
-                    if re.match(r'^\d{2}\.\d{2}\.', part):
-                        code = part
-                        code_idx = i
-                        break
-
-                if not code or code in seen_codes:
-                    continue
-                seen_codes.add(code)
-
-                # 提取产品代号
-                product_code = ""
-                if code_idx + 1 < len(parts):
-                    next_part = parts[code_idx + 1]
-                    if any(c in next_part for c in ['-', '*', 'φ', 'Φ', 'M', 'T-']):
-                        product_code = next_part
-
-                # 提取名称
-                name_start_idx = code_idx + 2 if product_code else code_idx + 1
-                name_parts = []
-                for i in range(name_start_idx, len(parts) - 2):
-                    name_parts.append(parts[i])
-                name = ' '.join(name_parts) if name_parts else "未知"
-
-                # 提取数量
-                try:
-                    qty = int(parts[-2])
-                    weight = float(parts[-1])
-                except:
-                    try:
-                        qty = int(parts[-3])
-                        weight = float(parts[-1])
-                    except:
-                        continue
-
-                bom_items.append({
-                    "seq": str(seq),
-                    "code": code,
-                    "product_code": product_code,
-                    "name": name,
-                    "specification": "",
-                    "quantity": qty,
-                    "weight": weight,
-                    "material": ""
-                })
-
-            return bom_items
+            return [
+                dict(row.to_dict(), specification="", material="")
+                for row in iter_bom_rows(pdf_path, seen_codes=set())
+            ]
         except Exception as e:
             print(f"   ❌ BOM提取失败: {e}")
             return []
@@ -371,7 +302,7 @@ class DualChannelParser:
 
     def _text_channel_parse(self, pdf_path: str, doc) -> Dict[str, Any]:
 
-        """文本通道：使用pypdf提取文本 + BOM解析（完全参考参考项目）"""
+        """文本通道：逐页提取文本 + BOM解析（core.bom_parser）"""
 
         print("📄 文本通道解析中...")
 
@@ -387,7 +318,7 @@ class DualChannelParser:
 
             "text_extraction": {
 
-                "message": "pypdf文本提取中...",
+                "message": "PDF文本提取中...",
 
                 "bom_candidates": 0
 
@@ -411,41 +342,27 @@ class DualChannelParser:
 
 
 
-        # 使用pypdf提取文本（参考参考项目的方法）
-
-        try:
-
-            reader = PdfReader(pdf_path)
-
-        except Exception as e:
+        # 逐页提取文本行（BOM与技术要求共用同一份文本）
 
-            print(f"❌ pypdf读取失败: {e}")
+        pdf_name = Path(pdf_path).name
 
-            return results
+        digest = hash_file(pdf_path)
 
+        bom_items = []
 
+        for page_num, page in enumerate(doc, 1):
 
-        # 提取所有页面文本
+            lines = page_lines(page)
 
-        text_chunks = []
+            page_text = "\n".join(lines)
 
-        for page in reader.pages:
+            # 明细表按坐标提取，页面没有可识别的表头时退回文本行解析
 
-            page_text = page.extract_text() or ""
+            rows = iter_page_bom_rows(page, digest, pdf_name, lines=lines)
 
-            if page_text:
+            bom_items.extend(self._bom_row_to_item(row) for row in rows)
 
-                text_chunks.append(page_text)
-
-
-
-        combined_text = "\n".join(text_chunks)
-
-
-
-        # 使用参考项目的方法提取BOM项目
-
-        bom_items = self._extract_bom_from_text(combined_text)
+            results["tech_requirements"].extend(self._extract_tech_requirements(page_text, page_num))
 
         results["bom_items"] = bom_items
 
@@ -453,16 +370,6 @@ class DualChannelParser:
 
 
 
-        # 提取技术要求
-
-        for page_num, text in enumerate(text_chunks):
-
-            tech_lines = self._extract_tech_requirements(text, page_num + 1)
-
-            results["tech_requirements"].extend(tech_lines)
-
-
-
         print(f"✅ 文本通道完成 - BOM: {len(results['bom_items'])}, 技术要求: {len(results['tech_requirements'])}")
 
 
@@ -528,13 +435,8 @@ class DualChannelParser:
         # 准备消息（多图格式）
         content = []
 
-        # 添加所有图片
-        for img_path in image_paths:
-            if img_path.startswith('http'):
-                image_url = img_path
-            else:
-                image_url = self.vision_model.encode_image_to_base64(img_path)
-
+        # 添加所有图片（共享单次请求的像素/字节预算）
+        for image_url in self.vision_model.image_preparer.prepare(image_paths):
             content.append({
                 "type": "image_url",
                 "image_url": {"url": image_url}
@@ -554,7 +456,9 @@ class DualChannelParser:
         # 调用API
         print(f"   🔄 正在调用 qwen-vl-plus...")
 
-        response = self.vision_model.client.chat.completions.create(
+        response = self.vision_model.call_json(
+            roots="{",
+            on_text=lambda text: print(".", end="", flush=True),
             model="qwen-vl-plus",
             messages=messages,
             temperature=0.1,
@@ -562,34 +466,16 @@ class DualChannelParser:
             stream=True
         )
 
-        # 收集响应
-        answer_content = ""
-        for chunk in response:
-            if chunk.choices[0].delta.content:
-                answer_content += chunk.choices[0].delta.content
-                print(".", end="", flush=True)
-
         print()  # 换行
 
-        # 解析JSON
-        try:
-            if "```json" in answer_content:
-                json_start = answer_content.find("```json") + 7
-                json_end = answer_content.find("```", json_start)
-                json_str = answer_content[json_start:json_end].strip()
-            else:
-                json_start = answer_content.find('{')
-                json_end = answer_content.rfind('}') + 1
-                json_str = answer_content[json_start:json_end]
-
-            result = json.loads(json_str)
-            print(f"   ✅ JSON解析成功")
+        # 解析JSON（边接收边容错解析，截断时已续写，见 utils/json_stream.py）
+        if not response["success"]:
+            print(f"   ⚠️  JSON解析失败: {response['error']}")
+            return {}
 
-            return result
+        print(f"   ✅ JSON解析成功")
 
-        except Exception as e:
-            print(f"   ⚠️  JSON解析失败: {e}")
-            return {}
+        return response["result"]
 
     def _vision_channel_parse(self, pdf_path: str, doc, bom_items: List[Dict]) -> Dict[str, Any]:
 
@@ -623,39 +509,17 @@ class DualChannelParser:
 
 
 
-        # 转换所有PDF页面为图片
-
-        temp_dir = tempfile.mkdtemp()
-
-        print(f"📁 创建临时目录: {temp_dir}")
+        # 从共享渲染缓存取得所有页面图片（同一页面每个DPI只渲染一次）
 
         print(f"📄 PDF总页数: {len(doc)}")
 
+        image_paths = get_render_cache().render_pdf(
 
+            pdf_path, VISION_RENDER_DPI, progress_callback=self._render_progress(Path(pdf_path).name)
 
-        image_paths = []
-
-        for page_num in range(len(doc)):
-
-            page = doc[page_num]
-
-            print(f"🖼️  转换第 {page_num + 1} 页为图片...")
-
-
-
-            # 高分辨率渲染
-
-            mat = fitz.Matrix(3, 3)  # 3倍缩放，约225DPI
-
-            pix = page.get_pixmap(matrix=mat)
-
-            img_path = f"{temp_dir}/page_{page_num + 1}.png"
-
-            pix.save(img_path)
-
-            image_paths.append(img_path)
+        )
 
-            print(f"   ✅ 已保存: {img_path}, 尺寸: {pix.width}x{pix.height}")
+        print(f"   ✅ 已获取 {len(image_paths)} 页图片")
 
 
 
@@ -775,14 +639,6 @@ class DualChannelParser:
 
             raise
 
-        finally:
-
-            import shutil
-
-            shutil.rmtree(temp_dir, ignore_errors=True)
-
-            print(f"🗑️  已清理临时文件")
-
 
 
         return results
@@ -869,9 +725,7 @@ class DualChannelParser:
 
 **BOM表中的主要结构件（共{len(main_parts)}个）：**
 
-```json
-{json.dumps(main_parts[:15], ensure_ascii=False, indent=2)}
-```
+{encode_table(main_parts)}
 
 {ASSEMBLY_USER_QUERY_TEMPLATE}
 
@@ -885,13 +739,9 @@ class DualChannelParser:
 
 
 
-                # 添加所有图片
-
-                for img_path in image_paths:
+                # 添加所有图片（共享单次请求的像素/字节预算，重试时复用编码结果）
 
-                    # 编码图片为base64
-
-                    image_url = self.vision_model.encode_image_to_base64(img_path)
+                for image_url in self.vision_model.image_preparer.prepare(image_paths):
 
                     content.append({
 
@@ -939,11 +789,15 @@ class DualChannelParser:
 
 
 
-                # 调用API（使用qwen-vl-plus）
+                # 调用API（使用qwen-vl-plus；边接收边容错解析，输出被截断时续写，不整个重试）
 
                 print(f"🔄 正在调用 {self.vision_model.model_name}...")
 
-                completion = self.vision_model.client.chat.completions.create(
+                response = self.vision_model.call_json(
+
+                    roots="{",
+
+                    on_text=lambda text: print(".", end="", flush=True),  # 显示进度
 
                     model=self.vision_model.model_name,
 
@@ -952,6 +806,7 @@ class DualChannelParser:
                     stream=True,
 
                     # ⚠️ 不限制max_tokens，让模型完整输出所有零件的装配指导
+
                     # max_tokens=4000,  # 之前限制导致JSON被截断
 
                     extra_body={
@@ -962,105 +817,41 @@ class DualChannelParser:
 
                 )
 
-
-
-                # 处理流式响应
-
-                answer_content = ""
-
-
-
-                for chunk in completion:
-
-                    if not chunk.choices:
-
-                        continue
-
-
-
-                    delta = chunk.choices[0].delta
-
-                    if delta.content:
-
-                        answer_content += delta.content
-
-                        print(".", end="", flush=True)  # 显示进度
-
-
-
                 print()  # 换行
 
 
 
-                # 解析JSON结果（增强容错）
-
-                # 移除markdown代码块标记
-
-                content = answer_content.strip()
-
-                if content.startswith('```json'):
-
-                    content = content[7:]  # 移除 ```json
-
-                if content.startswith('```'):
-
-                    content = content[3:]  # 移除 ```
-
-                if content.endswith('```'):
-
-                    content = content[:-3]  # 移除结尾的 ```
-
-
-
-                content = content.strip()
-
+                answer_content = response["raw_response"]
 
 
-                # 查找JSON的开始和结束
 
-                json_start = content.find('{')
+                # 解析结果（代码块、末尾逗号、未转义字符、截断已由 utils/json_stream.py 修复）
 
-                json_end = content.rfind('}') + 1
+                if not response["success"]:
 
+                    # ✅ 没有JSON或修复后仍无法解析时才整个重试
 
+                    error_msg = f"JSON解析失败: {response['error']}"
 
-                if json_start >= 0 and json_end > json_start:
-
-                    json_str = content[json_start:json_end]
-
-
-
-                    # 尝试解析JSON
-
-                    try:
-
-                        parsed_result = json.loads(json_str)
-
-                        print(f"✅ JSON解析成功")
-
-                        self._log(f"✅ Qwen-VL视觉分析完成（第{attempt+1}次尝试成功）", "success")
-
-                    except json.JSONDecodeError as e:
+                    self._log(f"⚠️ {error_msg}（尝试 {attempt+1}/{max_retries}）", "warning")
 
-                        # ✅ 修复: JSON解析失败时，抛出异常触发重试
+                    raise ValueError(error_msg)
 
-                        error_msg = f"JSON解析失败: line {e.lineno} column {e.colno} (char {e.pos})"
 
-                        print(f"[DEBUG] {error_msg}")
 
-                        self._log(f"⚠️ {error_msg}（尝试 {attempt+1}/{max_retries}）", "warning")
+                parsed_result = response["result"]
 
-                        raise json.JSONDecodeError(error_msg, json_str, e.pos)
+                if response["continuations"]:
 
-                else:
+                    self._log(f"✂️ 输出被截断，已续写{response['continuations']}次", "info")
 
-                    # ✅ 修复: 未找到JSON时，抛出异常触发重试
+                if not response["complete"]:
 
-                    error_msg = "未找到有效的JSON数据"
+                    self._log("⚠️ 续写后JSON仍未闭合，已补齐截断部分", "warning")
 
-                    self._log(f"⚠️ {error_msg}（尝试 {attempt+1}/{max_retries}）", "warning")
+                print(f"✅ JSON解析成功")
 
-                    raise ValueError(error_msg)
+                self._log(f"✅ Qwen-VL视觉分析完成（第{attempt+1}次尝试成功）", "success")
 
 
 
@@ -1130,11 +921,7 @@ class DualChannelParser:
 
                 if attempt < max_retries - 1:
 
-                    # 还有重试机会，等待后重试
-
-                    import time
-
-                    time.sleep(2)
+                    # 还有重试机会，立即重试（模型输出问题，不是服务商过载；请求节奏由限流器控制）
 
                     continue
 
@@ -1164,7 +951,8 @@ class DualChannelParser:
 
 
 
-                if attempt < max_retries - 1:
+                # API错误（429/5xx/连接错误）已由限流器（utils/rate_governor.py）按退避重试过，不再重复重试
+                if attempt < max_retries - 1 and not isinstance(e, openai.APIError):
 
                     # 还有重试机会，等待后重试
 
@@ -1310,197 +1098,35 @@ class DualChannelParser:
 
     
 
-    def _extract_bom_from_text(self, raw_text: str) -> List[Dict[str, Any]]:
-
-        """
-
-        从文本中提取BOM项目（参考参考项目的方法）
-
-
-
-        BOM行格式通常为：
-
-        序号 代号 名称 [材料/规格] 数量 [重量]
-
-        例如: 53 01.09.2556 T-SPV1830-EURO-09-Q235 方形板-机加-镀锌 1 3.65
-
-        """
-
-        items = []
-
-
-
-        for raw_line in raw_text.splitlines():
-
-            line = raw_line.strip()
-
-            if not line:
-
-                continue
-
-
-
-            tokens = line.split()
-
-
-
-            # 至少需要4个token: 序号 代号 名称 数量
-
-            if len(tokens) < 4:
-
-                continue
-
-
-
-            # 第一个token必须是数字（序号）
-
-            if not tokens[0].isdigit():
-
-                continue
-
-
-
-            # 第二个token应该是代号（包含字母或特殊字符）
-
-            code = tokens[1]
-
-            if not self._looks_like_part_code(code):
-
-                continue
-
-
-
-            # 解析序号
-
-            try:
-
-                index = int(tokens[0])
+    def _bom_row_to_item(self, row) -> Dict[str, Any]:
 
-            except ValueError:
+        """BomRow → 文本通道BOM项"""
 
-                continue
+        return {
 
+            "seq": str(row.seq),
 
+            "code": row.code,
 
-            # 查找最后的数量（整数）
+            "product_code": row.product_code,
 
-            qty_info = self._find_last_int(tokens)
+            "name": row.name,
 
-            # 查找最后的重量（浮点数）
+            "qty": row.quantity,
 
-            weight_info = self._find_last_float(tokens)
+            "weight": row.weight,
 
+            "raw": row.raw,
 
+            "page": row.page,
 
-            # 确定名称的结束位置
+            "line": row.line,
 
-            desc_end = len(tokens)
+            "source": "text_extraction",
 
-            if qty_info:
+            "confidence": 0.85
 
-                desc_end = min(desc_end, qty_info[1])
-
-            elif weight_info:
-
-                desc_end = min(desc_end, weight_info[1])
-
-
-
-            # 提取名称（从第3个token到desc_end）
-
-            name_tokens = tokens[2:desc_end]
-
-            if not name_tokens:
-
-                name_tokens = tokens[1:desc_end]
-
-
-
-            item = {
-
-                "seq": str(index),
-
-                "code": code,
-
-                "name": " ".join(name_tokens),
-
-                "qty": qty_info[0] if qty_info else "unknown",
-
-                "weight": weight_info[0] if weight_info else None,
-
-                "raw": line,
-
-                "source": "text_extraction",
-
-                "confidence": 0.85
-
-            }
-
-            items.append(item)
-
-
-
-        return items
-
-
-
-    def _looks_like_part_code(self, token: str) -> bool:
-
-        """判断token是否像零件代号"""
-
-        # 包含字母
-
-        if any(ch.isalpha() for ch in token):
-
-            return True
-
-        # 包含特殊字符
-
-        return any(ch in "-_.*/" for ch in token)
-
-
-
-    def _find_last_int(self, tokens: List[str]) -> Optional[tuple]:
-
-        """从后往前查找最后一个整数"""
-
-        for idx in range(len(tokens) - 1, -1, -1):
-
-            token = tokens[idx]
-
-            if token.isdigit():
-
-                try:
-
-                    return int(token), idx
-
-                except ValueError:
-
-                    continue
-
-        return None
-
-
-
-    def _find_last_float(self, tokens: List[str]) -> Optional[tuple]:
-
-        """从后往前查找最后一个浮点数"""
-
-        for idx in range(len(tokens) - 1, -1, -1):
-
-            token = tokens[idx]
-
-            try:
-
-                if any(ch.isdigit() for ch in token):
-
-                    return float(token), idx
-
-            except ValueError:
-
-                continue
-
-        return None
+        }
 
 
 
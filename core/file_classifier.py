@@ -8,7 +8,7 @@ import os
 import re
 from pathlib import Path
 from typing import Dict, List, Tuple
-import fitz  # PyMuPDF
+from utils.render_cache import get_render_cache
 
 
 class FileClassifier:
@@ -232,24 +232,6 @@ class FileClassifier:
         Returns:
             
         """
-        pdf_document = fitz.open(pdf_path)
-        image_paths = []
-        
-        try:
-            for page_num in range(len(pdf_document)):
-                page = pdf_document[page_num]
-                
-                # 
-                mat = fitz.Matrix(dpi / 72, dpi / 72)
-                pix = page.get_pixmap(matrix=mat)
-                
-                # 
-                image_path = Path(output_dir) / f"page_{page_num + 1:03d}.png"
-                pix.save(str(image_path))
-                image_paths.append(str(image_path))
-        
-        finally:
-            pdf_document.close()
-        
-        return image_paths
+        # 从共享渲染缓存取得（同一页面每个DPI只渲染一次）
+        return get_render_cache().render_pdf(pdf_path, dpi, output_dir=output_dir)
 
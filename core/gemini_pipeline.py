@@ -6,7 +6,8 @@ Gemini 6-Agent工作流（生产级）
 架构说明：
 - 支路1（PDF处理）：文件分类 → BOM提取 → Agent 1视觉规划
 - 支路2（3D处理）：STEP转GLB → Agent 2 BOM-3D匹配
-- 主线路：Agent 3组件装配 → Agent 4产品总装 → Agent 5焊接 → Agent 6安全FAQ → 整合输出
+- 主线路：每个组件（Agent 3组件装配 → Agent 5焊接 → Agent 6安全FAQ）与产品总装
+  （Agent 4 → Agent 5 → Agent 6）各为一条链路，有界并发执行 → 整合输出
 
 复用的Core组件：
 - file_classifier.py - 文件分类
@@ -15,11 +16,14 @@ Gemini 6-Agent工作流（生产级）
 """
 
 import os
+import copy
+import contextvars
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 # 添加项目根目录到路径
 import sys
@@ -37,8 +41,12 @@ if sys.platform == 'win32':
         sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace', line_buffering=True)
     os.environ['PYTHONIOENCODING'] = 'utf-8'
 
+from config import PERFORMANCE_CONFIG
+
 # 复用Core组件
 from core.file_classifier import FileClassifier
+from core.bom_parser import iter_bom_rows
+from core.page_classifier import classify_pdfs, select_pages
 from core.hierarchical_bom_matcher_v2 import HierarchicalBOMMatcher
 from core.manual_integrator_v2 import ManualIntegratorV2
 
@@ -49,6 +57,12 @@ from agents.product_assembly_agent import ProductAssemblyAgent
 from agents.welding_agent import WeldingAgent
 from agents.safety_faq_agent import SafetyFAQAgent
 
+# 响应缓存 & 步骤检查点
+from utils.response_cache import get_response_cache
+from utils.image_prep import get_image_preparer
+from utils.rate_governor import current_job, get_rate_governor
+from utils.checkpoint import StepCheckpoint
+
 # 日志工具
 from utils.logger import (
     print_step, print_substep, print_info,
@@ -56,16 +70,45 @@ from utils.logger import (
 )
 
 
+# 各步骤的产物（检查点续跑时从磁盘加载）
+# 步骤5-7按链路并发执行，作为一个整体记录在步骤5下
+STEP_ARTIFACTS = {
+    1: ["step1_file_hierarchy.json", "step1_image_hierarchy.json"],
+    2: ["step2_bom_data.json"],
+    3: ["step3_planning_result.json"],
+    4: ["step4_matching_result.json"],
+    5: [
+        "step5_component_results.json",
+        "step6_product_result.json",
+        "step7_enhanced_component_results.json",
+        "step7_enhanced_product_result.json"
+    ]
+}
+
+# PDF转图片DPI（步骤1）
+IMAGE_DPI = 200
+
+
 class GeminiAssemblyPipeline:
     """基于Gemini 2.5 Flash的6-Agent装配说明书生成工作流"""
     
-    def __init__(self, api_key: str, output_dir: str = "pipeline_output"):
+    def __init__(
+        self,
+        api_key: str,
+        output_dir: str = "pipeline_output",
+        max_concurrency: Optional[int] = None,
+        resume: bool = False,
+        from_step: Optional[int] = None
+    ):
         """
         初始化工作流
         
         Args:
             api_key: OpenRouter API密钥
             output_dir: 输出目录
+            max_concurrency: 步骤5-7同时运行的Agent链路数，默认取 PERFORMANCE_CONFIG["max_concurrent_agent_calls"]
+            resume: 续跑模式，输入指纹未变化的步骤直接加载output_dir中的产物
+            from_step: 强制从第N步开始重新计算（隐含resume；6、7与5同属一组并发链路，按5处理）
         """
         self.api_key = api_key
         self.output_dir = Path(output_dir)
@@ -86,6 +129,14 @@ class GeminiAssemblyPipeline:
         self.welding_agent = WeldingAgent()
         self.safety_agent = SafetyFAQAgent()
         
+        # 步骤5-7的并发上限（受服务商速率限制约束）
+        self.max_concurrency = max(1, max_concurrency or PERFORMANCE_CONFIG["max_concurrent_agent_calls"])
+
+        # 步骤检查点
+        if from_step in (6, 7):
+            from_step = 5
+        self.checkpoint = StepCheckpoint(self.output_dir, resume=resume, from_step=from_step)
+
         # 工作流状态
         self.start_time = None
         self.current_step = 0
@@ -121,49 +172,104 @@ class GeminiAssemblyPipeline:
         """
         self.start_time = time.time()
 
+        # 本工作流发出的LLM请求归为一个任务（限流器按任务公平放行）
+        job_token = current_job.set(self.output_dir.name)
+
         print_step("🚀 Gemini 6-Agent装配说明书生成工作流启动")
         print_info(f"📁 输出目录: {self.output_dir}")
         print_info(f"📋 总步骤数: {self.total_steps}")
         print_info("")
 
         try:
+            pdf_files = sorted(str(f) for f in Path(pdf_dir).glob("*.pdf"))
+            step_files = sorted(
+                str(f) for f in Path(step_dir).rglob("*")
+                if f.suffix.lower() in (".step", ".stp")
+            )
+
             # ========== 支路1: PDF处理 ==========
             # 步骤1: 文件分类 + PDF转图片
             self.current_step = 1
-            file_hierarchy, image_hierarchy = self._step1_classify_and_convert(pdf_dir)
+            file_hierarchy, image_hierarchy = self._run_checkpointed(
+                1,
+                self.checkpoint.fingerprint(
+                    files=pdf_files,
+                    modules=["core.file_classifier", "core.page_classifier"],
+                    extra={"dpi": IMAGE_DPI}
+                ),
+                lambda: self._step1_classify_and_convert(pdf_dir),
+                validate=lambda _, images: all(os.path.exists(p) for p in self._all_images(images))
+            )
 
             # 步骤2: 从PDF提取BOM数据
             self.current_step = 2
-            bom_data = self._step2_extract_bom_from_pdfs(file_hierarchy)
+            bom_data = self._run_checkpointed(
+                2,
+                self.checkpoint.fingerprint(
+                    files=pdf_files,
+                    artifacts=STEP_ARTIFACTS[1][:1],
+                    modules=["core.bom_parser"]
+                ),
+                lambda: self._step2_extract_bom_from_pdfs(file_hierarchy)
+            )
 
             # 步骤3: Agent 1 - 视觉规划
             self.current_step = 3
-            planning_result = self._step3_vision_planning(image_hierarchy, bom_data)
+            planning_result = self._run_checkpointed(
+                3,
+                self.checkpoint.fingerprint(
+                    files=self._all_images(image_hierarchy),
+                    artifacts=STEP_ARTIFACTS[1] + STEP_ARTIFACTS[2],
+                    modules=self._agent_modules(self.vision_agent, "prompts.agent_1_vision_planning"),
+                    models=[self.vision_agent.model_name]
+                ),
+                lambda: self._step3_vision_planning(image_hierarchy, bom_data)
+            )
             
             # ========== 支路2: 3D处理 ==========
             # 步骤4: Agent 2 - BOM-3D匹配
             self.current_step = 4
-            matching_result = self._step4_bom_3d_matching(
-                step_dir, bom_data, planning_result
+            matching_result = self._run_checkpointed(
+                4,
+                self.checkpoint.fingerprint(
+                    files=step_files,
+                    artifacts=STEP_ARTIFACTS[2] + STEP_ARTIFACTS[3],
+                    modules=[
+                        "core.hierarchical_bom_matcher_v2",
+                        "core.ai_matcher",
+                        "prompts.agent_2_bom_3d_matching"
+                    ]
+                ),
+                lambda: self._step4_bom_3d_matching(step_dir, bom_data, planning_result)
             )
+            # 步骤3、4无论是新计算还是从检查点加载，都在这里附上候选顺序，续跑时Agent 3的输入不变
+            self._attach_candidate_sequences(planning_result, matching_result)
             
             # ========== 主线路: Agent 3-6 ==========
-            # 步骤5: Agent 3 - 组件装配（可复用）
+            # 步骤5-7: 每个组件一条链路（Agent 3 → 5 → 6），产品总装一条链路（Agent 4 → 5 → 6）
+            # 各链路互不依赖，有界并发执行
             self.current_step = 5
-            component_results = self._step5_component_assembly(
-                file_hierarchy, image_hierarchy, planning_result, matching_result
-            )
-            
-            # 步骤6: Agent 4 - 产品总装
-            self.current_step = 6
-            product_result = self._step6_product_assembly(
-                file_hierarchy, image_hierarchy, planning_result, matching_result
-            )
-
-            # 步骤7: Agent 5 & 6 - 焊接和安全（增强装配步骤）
-            self.current_step = 7
-            enhanced_component_results, enhanced_product_result = self._step7_welding_and_safety(
-                file_hierarchy, image_hierarchy, component_results, product_result
+            chain_agents = [
+                (self.component_agent, "prompts.agent_3_component_assembly"),
+                (self.product_agent, "prompts.agent_4_product_assembly"),
+                (self.welding_agent, "prompts.agent_5_welding"),
+                (self.safety_agent, "prompts.agent_6_safety_faq")
+            ]
+            (
+                component_results, product_result,
+                enhanced_component_results, enhanced_product_result
+            ) = self._run_checkpointed(
+                5,
+                self.checkpoint.fingerprint(
+                    files=self._all_images(image_hierarchy),
+                    artifacts=STEP_ARTIFACTS[1] + STEP_ARTIFACTS[2] + STEP_ARTIFACTS[3] + STEP_ARTIFACTS[4],
+                    modules=[m for agent, prompt in chain_agents for m in self._agent_modules(agent, prompt)],
+                    models=[agent.model_name for agent, _ in chain_agents]
+                ),
+                lambda: self._step5_to_7_assembly_chains(
+                    file_hierarchy, image_hierarchy, planning_result, matching_result
+                ),
+                validate=self._chains_succeeded
             )
 
             # 步骤8: 整合最终手册
@@ -179,11 +285,29 @@ class GeminiAssemblyPipeline:
             print_step("🎉 工作流完成")
             print_success(f"⏱️  总耗时: {elapsed_time:.1f}秒")
             print_success(f"📄 输出文件: {self.output_dir / 'assembly_manual.json'}")
+
+            cache_stats = get_response_cache().stats()
+            print_info(f"♻️  响应缓存: 命中 {cache_stats['hits']} 次, 未命中 {cache_stats['misses']} 次")
+
+            image_stats = get_image_preparer().stats()
+            if image_stats["encoded_bytes"]:
+                print_info(
+                    f"🖼️  图片上传: {image_stats['encoded_bytes'] / 1024 / 1024:.1f}MB "
+                    f"(原始 {image_stats['source_bytes'] / 1024 / 1024:.1f}MB)"
+                )
+
+            for provider, metrics in get_rate_governor().metrics()["providers"].items():
+                if metrics["retries"]:
+                    print_info(
+                        f"⏳ {provider}: 限流 {metrics['throttled']} 次, 服务端错误 {metrics['server_errors']} 次, "
+                        f"重试 {metrics['retries']} 次, 当前并发上限 {metrics['concurrency_limit']}"
+                    )
             
             return {
                 "success": True,
                 "output_file": str(self.output_dir / "assembly_manual.json"),
                 "elapsed_time": elapsed_time,
+                "cache_stats": cache_stats,
                 "manual": final_manual
             }
             
@@ -195,7 +319,99 @@ class GeminiAssemblyPipeline:
                 "success": False,
                 "error": str(e)
             }
+        finally:
+            current_job.reset(job_token)
     
+    def _run_checkpointed(self, step: int, fingerprint: str, compute, validate=None):
+        """
+        运行带检查点的步骤：指纹一致且产物有效时从磁盘加载，否则计算并记录指纹
+
+        Args:
+            step: 步骤编号（STEP_ARTIFACTS的键）
+            fingerprint: 步骤输入指纹
+            compute: 实际执行步骤的函数
+            validate: 可选，校验产物是否可用（加载的：如图片文件是否存在；新计算的：如各链路是否都成功），
+                参数同返回值；不提供时只检查结果字典的 success
+
+        Returns:
+            步骤结果；多个产物时返回元组（顺序同STEP_ARTIFACTS）
+        """
+        artifacts = STEP_ARTIFACTS[step]
+
+        if self.checkpoint.is_fresh(step, fingerprint, artifacts):
+            loaded = [self.checkpoint.load_json(name) for name in artifacts]
+            if validate is None or validate(*loaded):
+                return loaded[0] if len(loaded) == 1 else tuple(loaded)
+            print_warning(f"步骤{step}的检查点产物已失效，重新计算", indent=1)
+
+        result = compute()
+
+        # 失败的结果不记录，下次运行会重新计算
+        if validate is not None:
+            usable = validate(*(result if isinstance(result, tuple) else (result,)))
+        else:
+            usable = not (isinstance(result, dict) and result.get("success") is False)
+        if usable:
+            self.checkpoint.record(step, fingerprint, artifacts)
+        else:
+            print_warning(f"步骤{step}有失败的结果，不记录检查点，下次运行重新计算", indent=1)
+        return result
+
+    @staticmethod
+    def _attach_candidate_sequences(planning_result: Dict, matching_result: Dict):
+        """几何推算的候选装配顺序附到组件装配规划上，由Agent 3核对而不是从头编排"""
+        component_level_mappings = matching_result.get("component_level_mappings", {})
+        for comp_plan in planning_result.get("component_assembly_plan", []):
+            mapping = component_level_mappings.get(comp_plan.get("component_code", ""))
+            if mapping and mapping.get("candidate_sequence"):
+                comp_plan["candidate_sequence"] = mapping["candidate_sequence"]
+
+    @staticmethod
+    def _chains_succeeded(component_results, product_result, *_) -> bool:
+        """步骤5-7的每条链路（各组件、产品总装）是否都成功"""
+        return all(r.get("success") for r in component_results) and bool(product_result.get("success"))
+
+    @staticmethod
+    def _all_images(image_hierarchy: Dict) -> List[str]:
+        """产品图片 + 所有组件图片"""
+        images = list(image_hierarchy.get("product_images", []))
+        for comp_images in image_hierarchy.get("component_images", {}).values():
+            images.extend(comp_images)
+        return images
+
+    @staticmethod
+    def _classify_pages(file_hierarchy: Dict, image_hierarchy: Dict) -> Dict[str, List[str]]:
+        """给每张页面图片打上类别标签：{图片路径: 类别列表}"""
+        pdf_images = {}
+        if file_hierarchy["product"] and file_hierarchy["product"]["pdf"]:
+            pdf_images[file_hierarchy["product"]["pdf"]] = image_hierarchy.get("product_images", [])
+        for component in file_hierarchy["components"]:
+            if component["pdf"]:
+                pdf_images[component["pdf"]] = image_hierarchy.get("component_images", {}).get(
+                    str(component["index"]), []
+                )
+
+        page_classes = {}
+        for pdf_path, pages in classify_pdfs(pdf_images).items():
+            page_classes.update(zip(pdf_images[pdf_path], pages))
+        return page_classes
+
+    def _select_pages(self, agent, image_hierarchy: Dict, images: List[str]) -> List[str]:
+        """按Agent声明的页面类别（PAGE_CLASSES）过滤图片"""
+        selected = select_pages(images, image_hierarchy.get("page_classes", {}), agent.PAGE_CLASSES)
+        if len(selected) < len(images):
+            print_info(
+                f"🏷️  {agent.agent_name} 只需要 {len(selected)}/{len(images)} 页"
+                f"（{', '.join(agent.PAGE_CLASSES)}）",
+                indent=1
+            )
+        return selected
+
+    @staticmethod
+    def _agent_modules(agent, prompt_module: str) -> List[str]:
+        """Agent输出依赖的源码模块：Agent实现 + 基类 + 提示词模块"""
+        return [type(agent).__module__, "agents.base_gemini_agent", prompt_module]
+
     def _step1_classify_and_convert(self, pdf_dir: str) -> tuple:
         """步骤1: 文件分类 + PDF转图片"""
         print_substep(f"[{self.current_step}/{self.total_steps}] 📂 文件管理员")
@@ -228,7 +444,7 @@ class GeminiAssemblyPipeline:
         image_hierarchy = self.file_classifier.convert_pdfs_to_images(
             file_hierarchy=file_hierarchy,
             output_base_dir=str(images_dir),
-            dpi=200  # 降低DPI加快速度
+            dpi=IMAGE_DPI  # 降低DPI加快速度
         )
 
         total_images = len(image_hierarchy.get("product_images", []))
@@ -236,6 +452,17 @@ class GeminiAssemblyPipeline:
             total_images += len(comp_images)
 
         print_success(f"🖼️  他转换了 {total_images} 张图片", indent=1)
+
+        # 页面分类（本地规则，各Agent只拿自己需要的页面）
+        image_hierarchy["page_classes"] = self._classify_pages(file_hierarchy, image_hierarchy)
+        class_counts = {}
+        for tags in image_hierarchy["page_classes"].values():
+            for tag in tags:
+                class_counts[tag] = class_counts.get(tag, 0) + 1
+        print_info(
+            "🏷️  页面分类: " + ", ".join(f"{tag} {count}" for tag, count in sorted(class_counts.items())),
+            indent=1
+        )
         sys.stdout.flush()
 
         self.log_agent_call("文件管理", "整理好了所有图纸和图片", "success")
@@ -255,9 +482,6 @@ class GeminiAssemblyPipeline:
 
         self.log_agent_call("BOM分析", "从图纸中读取零件清单", "running")
 
-        from pypdf import PdfReader
-        import re
-
         all_bom_items = []
         seen_codes = set()
 
@@ -284,77 +508,8 @@ class GeminiAssemblyPipeline:
             pdf_bom_count = 0
 
             try:
-                reader = PdfReader(pdf_path)
-                all_text = ""
-                for page in reader.pages:
-                    all_text += page.extract_text() + "\n"
-
-                lines = all_text.split('\n')
-
-                for line in lines:
-                    if not line.strip() or '序号' in line or '物料代码' in line:
-                        continue
-
-                    parts = line.split()
-                    if len(parts) < 4:
-                        continue
-
-                    # 第一个应该是序号
-                    try:
-                        seq = int(parts[0])
-                        if not (1 <= seq <= 200):
-                            continue
-                    except:
-                        continue
-
-                    # 查找BOM代号
-                    code = None
-                    code_idx = -1
-                    for j, part in enumerate(parts[1:], 1):
-                        if re.match(r'^\d{2}\.\d{2}\.', part):
-                            code = part
-                            code_idx = j
-                            break
-
-                    if not code or code in seen_codes:
-                        continue
-                    seen_codes.add(code)
-
-                    # 提取产品代号
-                    product_code = ""
-                    if code_idx + 1 < len(parts):
-                        next_part = parts[code_idx + 1]
-                        if any(c in next_part for c in ['-', '*', 'φ', 'Φ', 'M', 'T-']):
-                            product_code = next_part
-
-                    # 提取名称
-                    name_start_idx = code_idx + 2 if product_code else code_idx + 1
-                    name_parts = []
-                    for j in range(name_start_idx, len(parts) - 2):
-                        name_parts.append(parts[j])
-                    name = ' '.join(name_parts) if name_parts else "未知"
-
-                    # 提取数量和重量
-                    try:
-                        qty = int(parts[-2])
-                        weight = float(parts[-1])
-                    except:
-                        try:
-                            qty = int(parts[-3])
-                            weight = float(parts[-1])
-                        except:
-                            continue
-
-                    all_bom_items.append({
-                        "seq": str(seq),
-                        "code": code,
-                        "product_code": product_code,
-                        "name": name,
-                        "quantity": qty,
-                        "weight": weight,
-                        "source_pdf": pdf_name
-                    })
-
+                for row in iter_bom_rows(pdf_path, seen_codes=seen_codes):
+                    all_bom_items.append(row.to_dict())
                     pdf_bom_count += 1
 
                 # 记录这个PDF的BOM数量
@@ -392,6 +547,7 @@ class GeminiAssemblyPipeline:
         all_images.extend(image_hierarchy.get("product_images", []))
         for comp_images in image_hierarchy.get("component_images", {}).values():
             all_images.extend(comp_images)
+        all_images = self._select_pages(self.vision_agent, image_hierarchy, all_images)
 
         print_info(f"🖼️  他拿到了 {len(all_images)} 张图片", indent=1)
         print_info(f"📊 他参考了 {len(bom_data)} 个零件的信息", indent=1)
@@ -458,116 +614,252 @@ class GeminiAssemblyPipeline:
 
         return matching_result
 
-    def _step5_component_assembly(
+    def _step5_to_7_assembly_chains(
         self, file_hierarchy: Dict, image_hierarchy: Dict, planning_result: Dict, matching_result: Dict
-    ) -> List[Dict]:
-        """步骤5: Agent 3 - 组件装配"""
-        print_substep(f"[{self.current_step}/{self.total_steps}] 🔨 组件装配工程师")
+    ) -> tuple:
+        """
+        步骤5-7: Agent 3-6 按链路并发执行
+
+        每个组件是一条独立链路（Agent 3组件装配 → Agent 5焊接 → Agent 6安全），
+        产品总装也是一条链路（Agent 4产品总装 → Agent 5焊接 → Agent 6安全），
+        所有链路提交到有界线程池。每条链路同一时刻只有一个LLM请求在途，
+        因此并发上限即同时在途的请求数（PERFORMANCE_CONFIG["max_concurrent_agent_calls"]）。
+
+        Returns:
+            (component_results, product_result, enhanced_component_results, enhanced_product_result)
+            组件结果按 assembly_order 排序
+        """
+        print_substep(
+            f"[5-7/{self.total_steps}] 🔨 组件装配 → ⚡ 焊接 → 🛡️ 安全"
+            f"（最多 {self.max_concurrency} 条链路并发）"
+        )
 
         component_plans = planning_result.get("component_assembly_plan", [])
         component_level_mappings = matching_result.get("component_level_mappings", {})
 
-        # ✅ 读取BOM数据
+        # ✅ 读取BOM数据（所有组件链路共享，只读）
         bom_data = []
         bom_file = self.output_dir / "step2_bom_data.json"
         if bom_file.exists():
-            import json
             with open(bom_file, 'r', encoding='utf-8') as f:
                 bom_data = json.load(f)
 
-        component_results = []
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="agent-chain") as executor:
+            # 产品总装链路通常最长，最先提交
+            # 每条链路带上当前任务的上下文（线程池不会自动传递上下文变量）
+            product_future = executor.submit(
+                contextvars.copy_context().run, self._product_chain, file_hierarchy, image_hierarchy, planning_result, matching_result
+            )
+            component_futures = [
+                executor.submit(
+                    contextvars.copy_context().run, self._component_chain, i, comp_plan, image_hierarchy, bom_data, component_level_mappings
+                )
+                for i, comp_plan in enumerate(component_plans, 1)
+            ]
 
-        import sys
+            chain_results = [future.result() for future in component_futures]
+            product_result, enhanced_product_result = product_future.result()
 
-        for i, comp_plan in enumerate(component_plans, 1):
-            comp_code = comp_plan.get("component_code", "")
-            comp_name = comp_plan.get("component_name", "")
+        # 跳过的组件（无图纸）返回None；其余按assembly_order排序，保证输出确定
+        chain_results = [r for r in chain_results if r is not None]
+        chain_results.sort(key=lambda r: self._assembly_order_key(r[0].get("assembly_order")))
 
-            self.log_agent_call(
-                f"组件装配工 #{i}",
-                f"编写【{comp_name}】的装配步骤",
-                "running"
-            )
-            sys.stdout.flush()
+        component_results = [raw for raw, _ in chain_results]
+        enhanced_component_results = [enhanced for _, enhanced in chain_results]
+
+        # 保存结果
+        with open(self.output_dir / "step5_component_results.json", "w", encoding="utf-8") as f:
+            json.dump(component_results, f, ensure_ascii=False, indent=2)
 
-            # ✅ 获取组件的图纸（通过assembly_order匹配）
-            comp_order = comp_plan.get("assembly_order", 0)
-            component_images = image_hierarchy.get('component_images', {}).get(str(comp_order), [])
+        with open(self.output_dir / "step7_enhanced_component_results.json", "w", encoding="utf-8") as f:
+            json.dump(enhanced_component_results, f, ensure_ascii=False, indent=2)
 
-            if not component_images:
-                print_warning(f"未找到组件{comp_code}的图片", indent=1)
-                continue
+        with open(self.output_dir / "step7_enhanced_product_result.json", "w", encoding="utf-8") as f:
+            json.dump(enhanced_product_result, f, ensure_ascii=False, indent=2)
 
-            # ✅ 获取组件的BOM列表（从BOM数据中筛选）
-            # 通过source_pdf匹配（如"组件图1.pdf"）
-            comp_pdf_name = f"组件图{comp_order}.pdf"
-            component_bom = [
-                item for item in bom_data
-                if item.get("source_pdf", "").startswith(comp_pdf_name.replace(".pdf", ""))
-            ]
+        print_success(f"⚡ 焊接要点和 🛡️ 安全警告已嵌入到装配步骤中", indent=1)
+        sys.stdout.flush()
+
+        return component_results, product_result, enhanced_component_results, enhanced_product_result
+
+    @staticmethod
+    def _assembly_order_key(assembly_order) -> tuple:
+        """assembly_order排序键（数字优先，兼容字符串）"""
+        try:
+            return (0, int(assembly_order))
+        except (TypeError, ValueError):
+            return (1, str(assembly_order))
+
+    def _component_chain(
+        self,
+        index: int,
+        comp_plan: Dict,
+        image_hierarchy: Dict,
+        bom_data: List[Dict],
+        component_level_mappings: Dict
+    ) -> Optional[tuple]:
+        """
+        单个组件的链路：Agent 3组件装配 → Agent 5焊接 → Agent 6安全
+
+        Returns:
+            (Agent 3原始结果, 焊接/安全增强后的结果)；组件没有图纸时返回None
+        """
+        comp_code = comp_plan.get("component_code", "")
+        comp_name = comp_plan.get("component_name", "")
+
+        self.log_agent_call(
+            f"组件装配工 #{index}",
+            f"编写【{comp_name}】的装配步骤",
+            "running"
+        )
+
+        # ✅ 获取组件的图纸（通过assembly_order匹配）
+        comp_order = comp_plan.get("assembly_order", 0)
+        component_images = image_hierarchy.get('component_images', {}).get(str(comp_order), [])
+
+        if not component_images:
+            print_warning(f"未找到组件{comp_code}的图片", indent=1)
+            return None
+
+        # ✅ 获取组件的BOM列表（从BOM数据中筛选）
+        # 通过source_pdf匹配（如"组件图1.pdf"）
+        comp_pdf_name = f"组件图{comp_order}.pdf"
+        component_bom = [
+            item for item in bom_data
+            if item.get("source_pdf", "").startswith(comp_pdf_name.replace(".pdf", ""))
+        ]
+
+        # 获取组件的BOM-3D映射
+        bom_to_mesh = None
+        if comp_code in component_level_mappings:
+            bom_to_mesh = component_level_mappings[comp_code].get("bom_to_mesh", {})
+
+        # 调用Agent 3
+        print_info(f"   📖 他正在研究【{comp_name}】的图纸", indent=1)
+        print_info(f"   📋 组件BOM: {len(component_bom)} 个零件", indent=1)
+        sys.stdout.flush()
+
+        result = self.component_agent.process(
+            component_plan=comp_plan,
+            component_images=self._select_pages(self.component_agent, image_hierarchy, component_images),
+            parts_list=component_bom,  # ✅ 传入组件的BOM列表
+            bom_to_mesh_mapping=bom_to_mesh
+        )
+
+        if result["success"]:
+            step_count = len(result.get("assembly_steps", []))
+
+            # ✅ 验证BOM覆盖率
+            assembly_steps = result.get("assembly_steps", [])
+            used_bom_codes = set()
+            for step in assembly_steps:
+                parts_used = step.get("parts_used", [])
+                for part in parts_used:
+                    if isinstance(part, dict):
+                        bom_code = part.get("bom_code")
+                        if bom_code:
+                            used_bom_codes.add(bom_code)
+
+            bom_coverage = len(used_bom_codes) / len(component_bom) * 100 if component_bom else 0
 
-            # 获取组件的BOM-3D映射
-            bom_to_mesh = None
-            if comp_code in component_level_mappings:
-                bom_to_mesh = component_level_mappings[comp_code].get("bom_to_mesh", {})
+            print_success(f"   ✅ 【{comp_name}】生成了 {step_count} 个装配步骤", indent=1)
+            print_info(f"   📋 【{comp_name}】BOM覆盖率: {len(used_bom_codes)}/{len(component_bom)} ({bom_coverage:.1f}%)", indent=1)
+
+            if bom_coverage < 100:
+                print_warning(f"   ⚠️  【{comp_name}】有 {len(component_bom) - len(used_bom_codes)} 个BOM未覆盖", indent=1)
 
-            # 调用Agent 3
-            print_info(f"   📖 他正在研究【{comp_name}】的图纸", indent=1)
-            print_info(f"   📋 组件BOM: {len(component_bom)} 个零件", indent=1)
             sys.stdout.flush()
+            self.log_agent_call(f"组件装配工 #{index}", f"完成了【{comp_name}】的装配说明", "success")
+        else:
+            self.log_agent_call(f"组件装配工 #{index}", "装配步骤编写", "error")
+
+        # ✅ 添加组件代号和装配顺序到结果中（供Agent 5和Agent 6使用）
+        result["component_code"] = comp_code
+        result["component_name"] = comp_name
+        result["assembly_order"] = comp_order
 
-            result = self.component_agent.process(
-                component_plan=comp_plan,
-                component_images=component_images,
-                parts_list=component_bom,  # ✅ 传入组件的BOM列表
-                bom_to_mesh_mapping=bom_to_mesh
+        # 步骤5的产物保存增强前的结果
+        raw_result = copy.deepcopy(result)
+
+        if result.get("success"):
+            result["assembly_steps"] = self._enhance_assembly_steps(
+                f"【{comp_name}】", result.get("assembly_steps", []),
+                self._select_pages(self.welding_agent, image_hierarchy, component_images)
             )
 
-            if result["success"]:
-                step_count = len(result.get("assembly_steps", []))
+        return raw_result, result
+
+    def _product_chain(
+        self, file_hierarchy: Dict, image_hierarchy: Dict, planning_result: Dict, matching_result: Dict
+    ) -> tuple:
+        """
+        产品总装链路：Agent 4产品总装 → Agent 5焊接 → Agent 6安全
 
-                # ✅ 验证BOM覆盖率
-                assembly_steps = result.get("assembly_steps", [])
-                used_bom_codes = set()
-                for step in assembly_steps:
-                    parts_used = step.get("parts_used", [])
-                    for part in parts_used:
-                        if isinstance(part, dict):
-                            bom_code = part.get("bom_code")
-                            if bom_code:
-                                used_bom_codes.add(bom_code)
+        Returns:
+            (Agent 4原始结果, 焊接/安全增强后的结果)
+        """
+        product_result = self._step6_product_assembly(
+            file_hierarchy, image_hierarchy, planning_result, matching_result
+        )
 
-                bom_coverage = len(used_bom_codes) / len(component_bom) * 100 if component_bom else 0
+        enhanced_product_result = product_result.copy()
+        if product_result.get("success"):
+            enhanced_product_result["assembly_steps"] = self._enhance_assembly_steps(
+                "【产品总装】",
+                product_result.get("assembly_steps", []),
+                self._select_pages(self.welding_agent, image_hierarchy, image_hierarchy.get('product_images', []))
+            )
 
-                print_success(f"   ✅ 生成了 {step_count} 个装配步骤", indent=1)
-                print_info(f"   📋 BOM覆盖率: {len(used_bom_codes)}/{len(component_bom)} ({bom_coverage:.1f}%)", indent=1)
+        return product_result, enhanced_product_result
 
-                if bom_coverage < 100:
-                    print_warning(f"   ⚠️  有 {len(component_bom) - len(used_bom_codes)} 个BOM未覆盖", indent=1)
+    def _enhance_assembly_steps(self, label: str, assembly_steps: List[Dict], images: List[str]) -> List[Dict]:
+        """
+        Agent 5 & 6: 依次为装配步骤嵌入焊接要点和安全警告
 
-                sys.stdout.flush()
-                self.log_agent_call(f"组件装配工 #{i}", f"完成了【{comp_name}】的装配说明", "success")
-            else:
-                self.log_agent_call(f"组件装配工 #{i}", "装配步骤编写", "error")
+        Args:
+            label: 日志中显示的组件/产品名称
+            assembly_steps: 装配步骤
+            images: 对应的图纸图片（焊接工程师使用）
 
-            # ✅ 添加组件代号和装配顺序到结果中（供Agent 5和Agent 6使用）
-            result["component_code"] = comp_code
-            result["component_name"] = comp_name
-            result["assembly_order"] = comp_order
+        Returns:
+            增强后的装配步骤（Agent调用失败时保留原步骤）
+        """
+        # ========== Agent 5: 焊接工程师 ==========
+        self.log_agent_call("焊接工程师", f"为{label}的装配步骤添加焊接要点", "running")
 
-            component_results.append(result)
+        welding_result = self.welding_agent.process(
+            all_images=images,
+            assembly_steps=assembly_steps
+        )
 
-        # 保存结果
-        with open(self.output_dir / "step5_component_results.json", "w", encoding="utf-8") as f:
-            json.dump(component_results, f, ensure_ascii=False, indent=2)
+        # 将焊接要点嵌入到步骤中
+        if welding_result.get("success"):
+            assembly_steps = welding_result.get("enhanced_steps", assembly_steps)
+            self.log_agent_call("焊接工程师", f"完成{label}的焊接要点标注", "success")
+        else:
+            self.log_agent_call("焊接工程师", f"{label}的焊接要点标注", "error")
+
+        # ========== Agent 6: 安全专员 ==========
+        self.log_agent_call("安全专员", f"为{label}的装配步骤添加安全警告", "running")
 
-        return component_results
+        safety_result = self.safety_agent.process(
+            assembly_steps=assembly_steps
+        )
+
+        # 将安全警告嵌入到步骤中
+        if safety_result.get("success"):
+            assembly_steps = safety_result.get("enhanced_steps", assembly_steps)
+            self.log_agent_call("安全专员", f"完成{label}的安全警告标注", "success")
+        else:
+            self.log_agent_call("安全专员", f"{label}的安全警告标注", "error")
+
+        return assembly_steps
 
     def _step6_product_assembly(
         self, file_hierarchy: Dict, image_hierarchy: Dict, planning_result: Dict, matching_result: Dict
     ) -> Dict:
         """步骤6: Agent 4 - 产品总装"""
-        print_substep(f"[{self.current_step}/{self.total_steps}] 🏗️ 产品总装工程师")
+        print_substep(f"[6/{self.total_steps}] 🏗️ 产品总装工程师")
 
         self.log_agent_call("产品总装", "规划如何把组件组装成最终产品", "running")
 
@@ -582,7 +874,6 @@ class GeminiAssemblyPipeline:
         bom_data = []
         bom_file = self.output_dir / "step2_bom_data.json"
         if bom_file.exists():
-            import json
             with open(bom_file, 'r', encoding='utf-8') as f:
                 bom_data = json.load(f)
 
@@ -609,7 +900,7 @@ class GeminiAssemblyPipeline:
 
         result = self.product_agent.process(
             product_plan=planning_result,
-            product_images=product_images,
+            product_images=self._select_pages(self.product_agent, image_hierarchy, product_images),
             components_list=planning_result.get("component_assembly_plan", []),
             product_bom=product_bom,  # ✅ 传入产品级BOM
             bom_to_mesh_mapping=product_bom_to_mesh  # ✅ 传入BOM-3D映射
@@ -648,124 +939,6 @@ class GeminiAssemblyPipeline:
 
         return result
 
-    def _step7_welding_and_safety(
-        self, file_hierarchy: Dict, image_hierarchy: Dict, component_results: List[Dict], product_result: Dict
-    ) -> tuple:
-        """
-        步骤7: Agent 5 & 6 - 焊接和安全
-
-        新逻辑：
-        1. Agent 5接收装配步骤+图片，为每个步骤添加焊接要点
-        2. Agent 6接收增强后的步骤，为每个步骤添加安全警告
-        3. 返回增强后的组件和产品装配步骤
-        """
-        print_substep(f"[{self.current_step}/{self.total_steps}] ⚡ 焊接工程师 & 🛡️ 安全专员")
-
-        # ✅ 使用图片而不是PDF
-        all_images = []
-        all_images.extend(image_hierarchy.get('product_images', []))
-        for comp_images in image_hierarchy.get('component_images', {}).values():
-            all_images.extend(comp_images)
-
-        import sys
-        sys.stdout.flush()
-
-        # ========== Agent 5: 焊接工程师 ==========
-        self.log_agent_call("焊接工程师", "为每个装配步骤添加焊接要点", "running")
-
-        # 处理组件装配步骤
-        enhanced_component_results = []
-        for comp_result in component_results:
-            if not comp_result.get("success"):
-                enhanced_component_results.append(comp_result)
-                continue
-
-            assembly_steps = comp_result.get("assembly_steps", [])
-
-            # ✅ 使用assembly_order来获取组件图片
-            assembly_order = comp_result.get("assembly_order", "")
-            component_images = image_hierarchy.get('component_images', {}).get(str(assembly_order), [])
-
-            welding_result = self.welding_agent.process(
-                all_images=component_images,
-                assembly_steps=assembly_steps
-            )
-
-            # 将焊接要点嵌入到步骤中
-            if welding_result.get("success"):
-                enhanced_steps = welding_result.get("enhanced_steps", assembly_steps)
-                comp_result["assembly_steps"] = enhanced_steps
-
-            enhanced_component_results.append(comp_result)
-
-        # 处理产品装配步骤
-        enhanced_product_result = product_result.copy()
-        if product_result.get("success"):
-            product_steps = product_result.get("assembly_steps", [])
-            product_images = image_hierarchy.get('product_images', [])
-
-            welding_result = self.welding_agent.process(
-                all_images=product_images,
-                assembly_steps=product_steps
-            )
-
-            if welding_result.get("success"):
-                enhanced_steps = welding_result.get("enhanced_steps", product_steps)
-                enhanced_product_result["assembly_steps"] = enhanced_steps
-
-        print_success(f"⚡ 焊接要点已嵌入到装配步骤中", indent=1)
-        sys.stdout.flush()
-        self.log_agent_call("焊接工程师", "完成焊接要点标注", "success")
-
-        # ========== Agent 6: 安全专员 ==========
-        self.log_agent_call("安全专员", "为每个装配步骤添加安全警告", "running")
-
-        # 处理组件装配步骤
-        final_component_results = []
-        for comp_result in enhanced_component_results:
-            if not comp_result.get("success"):
-                final_component_results.append(comp_result)
-                continue
-
-            assembly_steps = comp_result.get("assembly_steps", [])
-
-            safety_result = self.safety_agent.process(
-                assembly_steps=assembly_steps
-            )
-
-            # 将安全警告嵌入到步骤中
-            if safety_result.get("success"):
-                enhanced_steps = safety_result.get("enhanced_steps", assembly_steps)
-                comp_result["assembly_steps"] = enhanced_steps
-
-            final_component_results.append(comp_result)
-
-        # 处理产品装配步骤
-        final_product_result = enhanced_product_result.copy()
-        if enhanced_product_result.get("success"):
-            product_steps = enhanced_product_result.get("assembly_steps", [])
-
-            safety_result = self.safety_agent.process(
-                assembly_steps=product_steps
-            )
-
-            if safety_result.get("success"):
-                enhanced_steps = safety_result.get("enhanced_steps", product_steps)
-                final_product_result["assembly_steps"] = enhanced_steps
-
-        print_success(f"🛡️ 安全警告已嵌入到装配步骤中", indent=1)
-        sys.stdout.flush()
-        self.log_agent_call("安全专员", "完成安全警告标注", "success")
-
-        # 保存增强后的结果
-        with open(self.output_dir / "step7_enhanced_component_results.json", "w", encoding="utf-8") as f:
-            json.dump(final_component_results, f, ensure_ascii=False, indent=2)
-
-        with open(self.output_dir / "step7_enhanced_product_result.json", "w", encoding="utf-8") as f:
-            json.dump(final_product_result, f, ensure_ascii=False, indent=2)
-
-        return final_component_results, final_product_result
-
     def _step8_integrate_manual(
         self,
         planning_result: Dict,
@@ -823,8 +996,14 @@ class GeminiAssemblyPipeline:
 
 
 # ========== 测试入口 ==========
-def test_gemini_pipeline():
-    """测试Gemini 6-Agent工作流"""
+def test_gemini_pipeline(resume: bool = False, from_step: Optional[int] = None):
+    """
+    测试Gemini 6-Agent工作流
+
+    Args:
+        resume: 续跑模式，复用输出目录中输入未变化的步骤结果
+        from_step: 强制从第N步开始重新计算
+    """
 
     # 配置
     api_key = "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"
@@ -835,7 +1014,9 @@ def test_gemini_pipeline():
     # 创建工作流实例
     pipeline = GeminiAssemblyPipeline(
         api_key=api_key,
-        output_dir=output_dir
+        output_dir=output_dir,
+        resume=resume,
+        from_step=from_step
     )
 
     # 运行工作流
@@ -859,6 +1040,14 @@ def test_gemini_pipeline():
 
 
 if __name__ == "__main__":
-    test_gemini_pipeline()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Gemini 6-Agent装配说明书生成工作流")
+    parser.add_argument("--resume", action="store_true", help="续跑：输入未变化的步骤直接加载上次的结果")
+    parser.add_argument("--from-step", type=int, choices=range(1, 9), metavar="N",
+                        help="强制从第N步开始重新计算（之前的步骤从检查点加载）")
+    args = parser.parse_args()
+
+    test_gemini_pipeline(resume=args.resume, from_step=args.from_step)
 
 
@@ -0,0 +1,192 @@
+"""
+几何BOM匹配器
+在代码匹配之后、AI匹配之前，用转换时计算的零件几何描述（processors/part_descriptors.py）
+把未匹配的3D零件对应到BOM行，不调用大模型
+
+评分（0~1，各项按可用的证据加权平均）：
+- 质量：体积 × 材料密度（按名称中的材料关键词，默认钢）与BOM单重比较
+- 规格尺寸：名称/代号中的 φ8*45、M8×30 等规格与有向包围盒尺寸比较
+- 数量：BOM数量与装配体中几何上相同的零件个数比较
+只有质量或尺寸之一可用时才评分（数量本身不足以区分零件）；
+最高分达到阈值且明显高于次高分的零件才接受，其余留给AI匹配
+"""
+
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# 材料关键词 → 密度（kg/m³），按顺序匹配（不锈钢要在钢之前）
+MATERIAL_DENSITIES = [
+    (("不锈钢", "SUS"), 7930.0),
+    (("铸铁", "HT200", "HT250", "QT400", "QT500"), 7200.0),
+    (("铝", "6061", "6063", "7075"), 2700.0),
+    (("铜", "H62"), 8500.0),
+    (("尼龙", "PA6", "聚氨酯", "塑料", "POM", "PVC"), 1150.0),
+    (("橡胶",), 1200.0),
+]
+DEFAULT_DENSITY = 7850.0  # 钢
+
+# 质量比在该倍数内得分线性下降到0（按对数）
+MASS_TOLERANCE_RATIO = 1.5
+
+# 规格尺寸的相对误差在该值内得分线性下降到0
+DIMENSION_TOLERANCE = 0.3
+
+# 各项权重
+SCORE_WEIGHTS = {"mass": 0.5, "dimension": 0.3, "quantity": 0.2}
+
+# 接受匹配的最低分数，以及相对次高分的最小领先
+MIN_SCORE = 0.75
+MIN_MARGIN = 0.1
+
+# φ8*45 / Φ8×45 / ø8 ；M8×30 / M8*30 / M8
+DIAMETER_PATTERN = re.compile(r"[φΦøØ]\s*(\d+(?:\.\d+)?)(?:\s*[*×xX]\s*(\d+(?:\.\d+)?))?")
+THREAD_PATTERN = re.compile(r"(?<![A-Za-z])M(\d+(?:\.\d+)?)(?:\s*[*×xX]\s*(\d+(?:\.\d+)?))?")
+
+
+def material_density(text: str) -> float:
+    """按名称中的材料关键词估计密度（kg/m³）"""
+    upper = text.upper()
+    for keywords, density in MATERIAL_DENSITIES:
+        if any(keyword in upper for keyword in keywords):
+            return density
+    return DEFAULT_DENSITY
+
+
+def bom_unit_weight(bom: Dict) -> Optional[float]:
+    """BOM单件重量（kg）：单重列，没有时用总重/数量"""
+    unit_weight = bom.get("unit_weight")
+    if unit_weight:
+        return float(unit_weight)
+    weight, quantity = bom.get("weight"), bom.get("quantity") or 1
+    if weight:
+        return float(weight) / quantity
+    return None
+
+
+def dimension_hints(text: str) -> Tuple[List[float], Optional[float]]:
+    """
+    从名称/代号解析规格尺寸
+
+    Returns:
+        (应与包围盒尺寸对应的尺寸列表, 螺纹公称直径)
+        φd*L 的 d、L 都是外形尺寸；M d×L 只有长度 L 是外形尺寸（螺栓头、螺母对边都大于 d），
+        d 只作为下限检查
+    """
+    match = DIAMETER_PATTERN.search(text)
+    if match:
+        return [float(value) for value in match.groups() if value], None
+    match = THREAD_PATTERN.search(text)
+    if match:
+        diameter, length = match.groups()
+        return ([float(length)] if length else []), float(diameter)
+    return [], None
+
+
+class GeometricBOMMatcher:
+    """按质量、规格尺寸、数量匹配BOM（不调用大模型）"""
+
+    def match_unmatched_parts(self, parts: List[Dict], bom_items: List[Dict]) -> List[Dict]:
+        """
+        匹配零件与BOM
+
+        Args:
+            parts: 未匹配的零件（需含 volume_mm3、dimensions_mm、instance_count，缺少描述的零件跳过）
+            bom_items: 未匹配的BOM行
+
+        Returns:
+            与 AIBOMMatcher.match_unmatched_parts 相同格式的结果列表（只含接受的匹配）
+        """
+        parts = [part for part in parts if part.get("volume_mm3") is not None and part.get("dimensions_mm")]
+        bom_items = [bom for bom in bom_items if bom.get("code")]
+        if not parts or not bom_items:
+            return []
+
+        scores, masses = self._score_matrix(parts, bom_items)
+
+        # 每个零件的最高分与次高分
+        order = np.argsort(-scores, axis=1)
+        best = scores[np.arange(len(parts)), order[:, 0]]
+        runner_up = scores[np.arange(len(parts)), order[:, 1]] if len(bom_items) > 1 else np.zeros(len(parts))
+        confident = (best >= MIN_SCORE) & (best - runner_up >= MIN_MARGIN)
+
+        # 按分数从高到低分配，每行BOM最多分配其数量个零件
+        capacity = [max(int(bom.get("quantity") or 1), 1) for bom in bom_items]
+        results = []
+        for part_index in np.argsort(-best):
+            if not confident[part_index]:
+                continue
+            bom_index = int(order[part_index, 0])
+            if capacity[bom_index] <= 0:
+                continue
+            capacity[bom_index] -= 1
+
+            part, bom = parts[part_index], bom_items[bom_index]
+            reason = [f"相同零件{part.get('instance_count') or 1}个/BOM数量{bom.get('quantity') or 1}"]
+            if np.isfinite(masses[part_index, bom_index]):
+                reason.insert(0, f"估算质量{masses[part_index, bom_index]:.3g}kg/BOM单重{bom_unit_weight(bom):g}kg")
+            sizes, thread = dimension_hints(f"{bom.get('name', '')} {bom.get('product_code', '')}")
+            if sizes or thread:
+                dimensions = "×".join(f"{value:.3g}" for value in part["dimensions_mm"])
+                reason.insert(-1, f"包围盒{dimensions}mm/规格{'/'.join(f'{v:g}' for v in sizes) or f'M{thread:g}'}")
+
+            results.append({
+                "mesh_id": part.get("mesh_id") or part.get("node_name"),
+                "geometry_name": part.get("geometry_name"),
+                "node_name": part.get("node_name"),
+                "matched_bom_code": bom["code"],
+                "confidence": round(float(best[part_index]), 3),
+                "reason": "几何匹配: " + ", ".join(reason)
+            })
+        return results
+
+    def _score_matrix(self, parts: List[Dict], bom_items: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        零件 × BOM 的分数矩阵
+
+        Returns:
+            (分数 (零件数, BOM数), 估算质量kg (零件数, BOM数)，BOM没有重量时为nan)
+        """
+        volume = np.array([part["volume_mm3"] for part in parts], dtype=np.float64) * 1e-9  # m³
+        dimensions = np.array([part["dimensions_mm"] for part in parts], dtype=np.float64)  # 从大到小
+        instances = np.array([part.get("instance_count") or 1 for part in parts], dtype=np.float64)
+
+        scores = np.zeros((len(parts), len(bom_items)))
+        masses = np.full((len(parts), len(bom_items)), np.nan)
+        for column, bom in enumerate(bom_items):
+            text = f"{bom.get('name', '')} {bom.get('product_code', '')}"
+            total = np.zeros(len(parts))
+            weight = 0.0
+
+            unit_weight = bom_unit_weight(bom)
+            if unit_weight:
+                mass = volume * material_density(text)
+                ratio = np.log(np.maximum(mass, 1e-12) / unit_weight)
+                mass_score = np.clip(1 - np.abs(ratio) / math.log(MASS_TOLERANCE_RATIO), 0, 1)
+                total += SCORE_WEIGHTS["mass"] * mass_score
+                weight += SCORE_WEIGHTS["mass"]
+                masses[:, column] = mass
+
+            sizes, thread = dimension_hints(text)
+            if sizes or thread:
+                dimension_score = np.ones(len(parts))
+                for size in sizes:
+                    error = np.abs(dimensions - size).min(axis=1) / size
+                    dimension_score *= np.clip(1 - error / DIMENSION_TOLERANCE, 0, 1)
+                if thread:
+                    # 螺纹件的中间尺寸（杆径/螺母对边）不小于公称直径
+                    dimension_score *= dimensions[:, 1] >= thread * (1 - DIMENSION_TOLERANCE)
+                total += SCORE_WEIGHTS["dimension"] * dimension_score
+                weight += SCORE_WEIGHTS["dimension"]
+
+            if weight == 0:
+                continue
+
+            quantity = max(float(bom.get("quantity") or 1), 1.0)
+            total += SCORE_WEIGHTS["quantity"] * np.minimum(instances, quantity) / np.maximum(instances, quantity)
+            weight += SCORE_WEIGHTS["quantity"]
+            scores[:, column] = total / weight
+        return scores, masses
@@ -2,21 +2,35 @@
 """
 分层级的BOM-3D匹配器 V2
 处理组件级别和产品级别的分开匹配
+STEP→GLB在子进程中并行转换（processors/glb_converter.py），每个文件转换完成立即匹配；
+内容未变的STEP文件直接复用GLB转换缓存（utils/glb_cache.py）
 """
 
-from typing import Dict, List
+import os
+import sys
+from typing import Dict, List, Optional
 from pathlib import Path
 from processors.file_processor import ModelProcessor
+from processors.glb_converter import ConversionJob, iter_convert_step_files
 from core.bom_3d_matcher import match_bom_to_3d
+from core.geometric_matcher import GeometricBOMMatcher
+from processors.disassembly_planner import candidate_sequence, plan_disassembly
 from utils.logger import print_step, print_substep, print_info, print_success, print_error, print_warning
 
 
 class HierarchicalBOMMatcher:
     """分层级的BOM-3D匹配器"""
     
-    def __init__(self):
-        """初始化匹配器"""
-        self.model_processor = ModelProcessor()
+    def __init__(self, tessellation: Optional[str] = None):
+        """
+        初始化匹配器
+
+        Args:
+            tessellation: STEP曲面细分精度预设（preview/standard/fine），默认使用配置
+        """
+        self.tessellation = tessellation
+        self.model_processor = ModelProcessor(tessellation=tessellation)
+        self.ai_matcher = None  # AI匹配器（首次需要时创建，各组件共用）
     
     def process_hierarchical_matching(
         self,
@@ -55,133 +69,32 @@ class HierarchicalBOMMatcher:
         component_level_mappings = {}
         product_level_mapping = {}
         glb_files = {}
-        
-        # ========== 1. 处理组件级别 ==========
-        print_substep("步骤1：处理组件级别的STEP文件")
-        
+
+        # ========== 1. 收集转换任务 ==========
+        print_substep("步骤1：收集组件级别和产品级别的STEP文件")
+
+        jobs = []
+        plans_by_key = {}
         for comp_plan in component_plans:
             comp_code = comp_plan.get("component_code", "")
             comp_name = comp_plan.get("component_name", "")
             comp_order = comp_plan.get("assembly_order", 0)
-            
-            print_info(f"\n处理组件{comp_order}: {comp_name}")
-            
+
             # 查找对应的STEP文件
             step_file = step_path / f"组件图{comp_order}.STEP"
             if not step_file.exists():
                 step_file = step_path / f"组件图{comp_order}.step"
-            
+
             if not step_file.exists():
-                print_warning(f"组件{comp_order}的STEP文件不存在", indent=1)
+                print_warning(f"组件{comp_order}（{comp_name}）的STEP文件不存在", indent=1)
                 continue
-            
-            print_info(f"STEP文件: {step_file.name}", indent=1)
 
-            # 转换为GLB
+            key = f"component_{comp_order}"
             glb_file = glb_output / f"component_{comp_code.replace('.', '_')}.glb"
-            print_info(f"开始转换STEP -> GLB: {glb_file.name}", indent=1)
-
-            import sys
-            sys.stdout.flush()
-
-            convert_result = self.model_processor.step_to_glb(
-                step_path=str(step_file),
-                output_path=str(glb_file),
-                scale_factor=0.001  # mm -> m
-            )
+            jobs.append(ConversionJob(key, str(step_file), str(glb_file), 0.001, self.tessellation))  # mm -> m
+            plans_by_key[key] = comp_plan
+            print_info(f"组件{comp_order}: {comp_name} ← {step_file.name}", indent=1)
 
-            sys.stdout.flush()
-            
-            if not convert_result["success"]:
-                print_error(f"GLB转换失败: {convert_result.get('error')}", indent=1)
-                continue
-            
-            parts_list = convert_result.get("parts_info", [])
-            print_success(f"GLB转换成功: {len(parts_list)} 个零件", indent=1)
-            
-            # 获取组件的BOM数据（只包含组件内部的零件）
-            component_bom = self._get_component_bom(bom_data, comp_plan)
-            print_info(f"组件BOM: {len(component_bom)} 个零件", indent=1)
-            
-            # BOM-3D匹配（双匹配策略：代码匹配 + AI跟进匹配）
-            if parts_list and component_bom:
-                # 步骤1：代码匹配
-                code_matching_result = match_bom_to_3d(component_bom, parts_list)
-
-                code_bom_to_mesh = code_matching_result.get("bom_to_mesh_mapping", {})
-                code_summary = code_matching_result.get("summary", {})
-                unmatched_parts = code_matching_result.get("unmatched_parts", [])
-
-                code_bom_matched = code_summary.get('bom_matched_count', 0)
-                total_bom = code_summary.get('total_bom_count', 0)
-
-                print_success(f"代码匹配完成: BOM {code_bom_matched}/{total_bom} ({code_summary.get('matching_rate', 0)*100:.1f}%)", indent=1)
-
-                # 步骤2：AI跟进匹配未匹配的零件
-                ai_bom_to_mesh = {}
-                ai_bom_matched_count = 0
-
-                if unmatched_parts:
-                    print_info(f"👷 AI匹配员工加入工作，他开始智能分析 {len(unmatched_parts)} 个未匹配的3D零件...", indent=1)
-                    import sys
-                    sys.stdout.flush()
-
-                    # ✅ 计算未匹配的BOM（排除已经被代码匹配的BOM）
-                    matched_bom_codes = set(code_bom_to_mesh.keys())
-                    unmatched_bom = [bom for bom in component_bom if bom.get('code') not in matched_bom_codes]
-
-                    from core.ai_matcher import AIBOMMatcher
-                    ai_matcher = AIBOMMatcher()
-                    ai_results = ai_matcher.match_unmatched_parts(unmatched_parts, unmatched_bom)
-
-                    # 合并AI匹配结果到bom_to_mesh映射
-                    for ai_result in ai_results:
-                        bom_code = ai_result.get("matched_bom_code")
-                        mesh_id = ai_result.get("mesh_id")
-                        if bom_code and mesh_id:
-                            if bom_code not in ai_bom_to_mesh:
-                                ai_bom_to_mesh[bom_code] = []
-                            ai_bom_to_mesh[bom_code].append(mesh_id)
-
-                    # 计算AI新增匹配的BOM数量（不在代码匹配中的）
-                    ai_bom_matched_count = len([k for k in ai_bom_to_mesh.keys() if k not in code_bom_to_mesh])
-
-                    print_success(f"✅ AI匹配员工完成了工作，他新增匹配了 {ai_bom_matched_count} 个BOM", indent=1)
-                    import sys
-                    sys.stdout.flush()
-
-                # 合并代码匹配和AI匹配的结果
-                final_bom_to_mesh = {**code_bom_to_mesh, **ai_bom_to_mesh}
-                total_bom_matched = len(final_bom_to_mesh)  # 最终匹配的BOM数量
-                final_matching_rate = total_bom_matched / total_bom if total_bom else 0
-
-                print_success(f"总匹配率: BOM {total_bom_matched}/{total_bom} ({final_matching_rate*100:.1f}%) [代码: {code_bom_matched}, AI: {ai_bom_matched_count}]", indent=1)
-
-                # 保存组件级别的映射
-                component_level_mappings[comp_code] = {
-                    "component_name": comp_name,
-                    "glb_file": str(glb_file),
-                    "bom_to_mesh": final_bom_to_mesh,
-                    "total_bom_count": total_bom,
-                    "bom_matched_count": total_bom_matched,
-                    "total_3d_parts": len(parts_list),
-                    "code_matched": code_bom_matched,
-                    "ai_matched": ai_bom_matched_count,
-                    "matching_rate": final_matching_rate
-                }
-
-                glb_files[f"component_{comp_order}"] = str(glb_file)
-            else:
-                if not parts_list:
-                    print_warning("没有提取到零件信息", indent=1)
-                if not component_bom:
-                    print_warning("没有组件BOM数据", indent=1)
-        
-        print_success(f"组件级别处理完成: {len(component_level_mappings)} 个组件")
-        
-        # ========== 2. 处理产品级别 ==========
-        print_substep("步骤2：处理产品级别的STEP文件")
-        
         # 查找产品总图的STEP文件
         product_step = step_path / "产品测试.STEP"
         if not product_step.exists():
@@ -190,108 +103,42 @@ class HierarchicalBOMMatcher:
             product_step = step_path / "产品测试.step"
         if not product_step.exists():
             product_step = step_path / "产品总图.step"
-        
+
         if product_step.exists():
-            print_info(f"处理产品总图: {product_step.name}")
-            
-            # 转换为GLB
             product_glb = glb_output / "product_total.glb"
-            convert_result = self.model_processor.step_to_glb(
-                step_path=str(product_step),
-                output_path=str(product_glb),
-                scale_factor=0.001
-            )
-            
-            if convert_result["success"]:
-                parts_list = convert_result.get("parts_info", [])
-                print_success(f"GLB转换成功: {len(parts_list)} 个零件", indent=1)
-                
-                # ✅ 产品级别的BOM数据（从产品总图PDF提取的零件）
-                # ⚠️  排除组件：产品级3D模型中，组件是整体，不会有单独的零件名称
-                product_bom_all = [
-                    item for item in bom_data
-                    if item.get("source_pdf", "").startswith("产品总图")
-                ]
+            jobs.append(ConversionJob("product_total", str(product_step), str(product_glb), 0.001, self.tessellation))
+            print_info(f"产品总图: {product_step.name}", indent=1)
+        else:
+            print_warning("未找到产品总图的STEP文件")
 
-                # 筛选出真正的零件（排除组件）
-                product_bom = [
-                    item for item in product_bom_all
-                    if '组件' not in item.get('name', '')
-                ]
+        # ========== 2. 并行转换，每个文件转换完成立即匹配 ==========
+        print_substep(f"步骤2：并行转换 {len(jobs)} 个STEP文件（转换完成即开始BOM匹配）")
+        sys.stdout.flush()
 
-                component_count = len(product_bom_all) - len(product_bom)
-                print(f"  产品BOM: {len(product_bom)} 个零件（排除了 {component_count} 个组件）", flush=True)
-                
-                # BOM-3D匹配（双匹配策略：代码匹配 + AI跟进匹配）
-                # 步骤1：代码匹配
-                code_matching_result = match_bom_to_3d(product_bom, parts_list)
-
-                code_bom_to_mesh = code_matching_result.get("bom_to_mesh_mapping", {})
-                code_summary = code_matching_result.get("summary", {})
-                unmatched_parts = code_matching_result.get("unmatched_parts", [])
-
-                code_bom_matched = code_summary.get('bom_matched_count', 0)
-                total_bom = code_summary.get('total_bom_count', 0)
-
-                print_success(f"代码匹配完成: BOM {code_bom_matched}/{total_bom} ({code_summary.get('matching_rate', 0)*100:.1f}%)", indent=1)
-
-                # 步骤2：AI跟进匹配未匹配的零件
-                ai_bom_to_mesh = {}
-                ai_bom_matched_count = 0
-
-                if unmatched_parts:
-                    print_info(f"👷 AI匹配员工加入工作，他开始智能分析 {len(unmatched_parts)} 个未匹配的3D零件...", indent=1)
-                    import sys
-                    sys.stdout.flush()
-
-                    # ✅ 计算未匹配的BOM（排除已经被代码匹配的BOM）
-                    matched_bom_codes = set(code_bom_to_mesh.keys())
-                    unmatched_bom = [bom for bom in product_bom if bom.get('code') not in matched_bom_codes]
-
-                    from core.ai_matcher import AIBOMMatcher
-                    ai_matcher = AIBOMMatcher()
-                    ai_results = ai_matcher.match_unmatched_parts(unmatched_parts, unmatched_bom)
-
-                    # 合并AI匹配结果到bom_to_mesh映射
-                    for ai_result in ai_results:
-                        bom_code = ai_result.get("matched_bom_code")
-                        mesh_id = ai_result.get("mesh_id")
-                        if bom_code and mesh_id:
-                            if bom_code not in ai_bom_to_mesh:
-                                ai_bom_to_mesh[bom_code] = []
-                            ai_bom_to_mesh[bom_code].append(mesh_id)
-
-                    # 计算AI新增匹配的BOM数量（不在代码匹配中的）
-                    ai_bom_matched_count = len([k for k in ai_bom_to_mesh.keys() if k not in code_bom_to_mesh])
-
-                    print_success(f"✅ AI匹配员工完成了工作，他新增匹配了 {ai_bom_matched_count} 个BOM", indent=1)
-                    import sys
-                    sys.stdout.flush()
-
-                # 合并代码匹配和AI匹配的结果
-                final_bom_to_mesh = {**code_bom_to_mesh, **ai_bom_to_mesh}
-                total_bom_matched = len(final_bom_to_mesh)  # 最终匹配的BOM数量
-                final_matching_rate = total_bom_matched / total_bom if total_bom else 0
-
-                print_success(f"总匹配率: BOM {total_bom_matched}/{total_bom} ({final_matching_rate*100:.1f}%) [代码: {code_bom_matched}, AI: {ai_bom_matched_count}]", indent=1)
-
-                product_level_mapping = {
-                    "glb_file": str(product_glb),
-                    "bom_to_mesh": final_bom_to_mesh,
-                    "total_bom_count": total_bom,
-                    "bom_matched_count": total_bom_matched,
-                    "total_3d_parts": len(parts_list),
-                    "code_matched": code_bom_matched,
-                    "ai_matched": ai_bom_matched_count,
-                    "matching_rate": final_matching_rate
-                }
-
-                glb_files["product_total"] = str(product_glb)
+        for job, convert_result in iter_convert_step_files(jobs):
+            if job.key == "product_total":
+                mapping = self._match_product(bom_data, job, convert_result)
+                if mapping:
+                    product_level_mapping = mapping
+                    glb_files["product_total"] = job.output_path
             else:
-                print_error(f"GLB转换失败: {convert_result.get('error')}", indent=1)
-        else:
-            print_warning("未找到产品总图的STEP文件")
-        
+                comp_plan = plans_by_key[job.key]
+                mapping = self._match_component(bom_data, comp_plan, job, convert_result)
+                if mapping:
+                    component_level_mappings[comp_plan.get("component_code", "")] = mapping
+                    glb_files[job.key] = job.output_path
+            sys.stdout.flush()
+
+        # 按装配顺序整理结果（转换完成顺序不固定）
+        component_level_mappings = {
+            comp_plan.get("component_code", ""): component_level_mappings[comp_plan.get("component_code", "")]
+            for comp_plan in component_plans
+            if comp_plan.get("component_code", "") in component_level_mappings
+        }
+        glb_files = {key: glb_files[key] for key in [*plans_by_key, "product_total"] if key in glb_files}
+
+        print_success(f"组件级别处理完成: {len(component_level_mappings)} 个组件")
+
         # ========== 3. 汇总结果 ==========
         print_substep("分层级匹配汇总")
         print_info(f"组件级别: {len(component_level_mappings)} 个组件")
@@ -308,6 +155,213 @@ class HierarchicalBOMMatcher:
             "glb_files": glb_files
         }
     
+    def _match_component(
+        self, bom_data: List[Dict], comp_plan: Dict, job: ConversionJob, convert_result: Dict
+    ) -> Optional[Dict]:
+        """
+        单个组件：GLB转换结果 → BOM-3D匹配
+
+        Returns:
+            组件级别的映射；转换失败或没有可匹配的数据时返回None
+        """
+        comp_name = comp_plan.get("component_name", "")
+        comp_order = comp_plan.get("assembly_order", 0)
+        print_info(f"\n处理组件{comp_order}: {comp_name}")
+
+        if not convert_result["success"]:
+            print_error(f"GLB转换失败: {convert_result.get('error')}", indent=1)
+            return None
+
+        parts_list = convert_result.get("parts_info", [])
+        source = "（复用缓存）" if convert_result.get("cached") else ""
+        print_success(f"GLB转换成功{source}: {len(parts_list)} 个零件", indent=1)
+
+        # 获取组件的BOM数据（只包含组件内部的零件）
+        component_bom = self._get_component_bom(bom_data, comp_plan)
+        print_info(f"组件BOM: {len(component_bom)} 个零件", indent=1)
+
+        if not parts_list or not component_bom:
+            if not parts_list:
+                print_warning("没有提取到零件信息", indent=1)
+            if not component_bom:
+                print_warning("没有组件BOM数据", indent=1)
+            return None
+
+        mapping = {
+            "component_name": comp_name,
+            "glb_file": job.output_path,
+            "lods": convert_result.get("lods"),  # 多级细节清单（未开启时为None）
+            "contact_graph": convert_result.get("contact_graph"),  # 零件接触/包含关系（见 processors/spatial_index.py）
+            **self._dual_match(component_bom, parts_list)
+        }
+        # 几何推算的候选装配顺序（见 processors/disassembly_planner.py），由流水线附到组件装配规划上
+        mapping["candidate_sequence"] = self._candidate_sequence(
+            mapping["contact_graph"], mapping["bom_to_mesh"], comp_plan.get("base_part_code")
+        )
+        return mapping
+
+    def _match_product(self, bom_data: List[Dict], job: ConversionJob, convert_result: Dict) -> Optional[Dict]:
+        """
+        产品总装：GLB转换结果 → BOM-3D匹配
+
+        Returns:
+            产品级别的映射；转换失败时返回None
+        """
+        print_info(f"\n处理产品总图: {os.path.basename(job.step_path)}")
+
+        if not convert_result["success"]:
+            print_error(f"GLB转换失败: {convert_result.get('error')}", indent=1)
+            return None
+
+        parts_list = convert_result.get("parts_info", [])
+        source = "（复用缓存）" if convert_result.get("cached") else ""
+        print_success(f"GLB转换成功{source}: {len(parts_list)} 个零件", indent=1)
+
+        # ✅ 产品级别的BOM数据（从产品总图PDF提取的零件）
+        # ⚠️  排除组件：产品级3D模型中，组件是整体，不会有单独的零件名称
+        product_bom_all = [
+            item for item in bom_data
+            if item.get("source_pdf", "").startswith("产品总图")
+        ]
+
+        # 筛选出真正的零件（排除组件）
+        product_bom = [
+            item for item in product_bom_all
+            if '组件' not in item.get('name', '')
+        ]
+
+        component_count = len(product_bom_all) - len(product_bom)
+        print(f"  产品BOM: {len(product_bom)} 个零件（排除了 {component_count} 个组件）", flush=True)
+
+        return {
+            "glb_file": job.output_path,
+            "lods": convert_result.get("lods"),  # 多级细节清单（未开启时为None）
+            "contact_graph": convert_result.get("contact_graph"),  # 零件接触/包含关系（见 processors/spatial_index.py）
+            **self._dual_match(product_bom, parts_list)
+        }
+
+    def _candidate_sequence(
+        self, contact_graph: Optional[Dict], bom_to_mesh: Dict[str, List[str]], base_code: Optional[str]
+    ) -> Optional[List[Dict]]:
+        """
+        由接触图推算拆卸优先关系，换成BOM代号的候选装配顺序
+
+        Args:
+            contact_graph: 零件接触图（未开启时为None）
+            bom_to_mesh: BOM-3D映射
+            base_code: 装配规划中的基准件BOM代号（最先装配）
+
+        Returns:
+            candidate_sequence 的结果；没有接触图或没有匹配到BOM时返回None
+        """
+        if not contact_graph or not contact_graph.get("bounds_mm") or not bom_to_mesh:
+            return None
+
+        plan = plan_disassembly(contact_graph, bom_to_mesh.get(base_code, []) if base_code else [])
+        sequence = candidate_sequence(plan, bom_to_mesh)
+        forced = f"，{len(plan['forced'])} 个零件没有直线装入路径" if plan["forced"] else ""
+        print_info(f"🧩 几何候选装配顺序: {len(sequence)} 步{forced}", indent=1)
+        return sequence or None
+
+    def _dual_match(self, bom_items: List[Dict], parts_list: List[Dict]) -> Dict:
+        """
+        BOM-3D匹配（代码匹配 → 几何匹配（质量/规格/数量，不调用大模型） → AI跟进匹配）
+
+        Returns:
+            bom_to_mesh映射及匹配统计
+        """
+        # 步骤1：代码匹配
+        code_matching_result = match_bom_to_3d(bom_items, parts_list)
+
+        code_bom_to_mesh = code_matching_result.get("bom_to_mesh_mapping", {})
+        code_summary = code_matching_result.get("summary", {})
+        unmatched_parts = code_matching_result.get("unmatched_parts", [])
+
+        code_bom_matched = code_summary.get('bom_matched_count', 0)
+        total_bom = code_summary.get('total_bom_count', 0)
+
+        print_success(f"代码匹配完成: BOM {code_bom_matched}/{total_bom} ({code_summary.get('matching_rate', 0)*100:.1f}%)", indent=1)
+
+        # 步骤2：几何匹配（转换时计算的零件描述 vs BOM重量/规格/数量）
+        geometry_bom_to_mesh = {}
+        geometry_bom_matched_count = 0
+
+        if unmatched_parts:
+            matched_bom_codes = set(code_bom_to_mesh.keys())
+            unmatched_bom = [bom for bom in bom_items if bom.get('code') not in matched_bom_codes]
+
+            # 代码匹配返回的未匹配零件可能不带几何描述：按节点名从parts_list补齐
+            descriptors = {part.get('node_name'): part for part in parts_list}
+            unmatched_parts = [
+                {**descriptors.get(part.get('node_name'), {}), **part} for part in unmatched_parts
+            ]
+
+            geometry_results = GeometricBOMMatcher().match_unmatched_parts(unmatched_parts, unmatched_bom)
+            for geometry_result in geometry_results:
+                bom_code = geometry_result["matched_bom_code"]
+                geometry_bom_to_mesh.setdefault(bom_code, []).append(geometry_result["mesh_id"])
+
+            geometry_bom_matched_count = len(geometry_bom_to_mesh)
+            if geometry_results:
+                matched_meshes = {result["mesh_id"] for result in geometry_results}
+                unmatched_parts = [
+                    part for part in unmatched_parts
+                    if (part.get('mesh_id') or part.get('node_name')) not in matched_meshes
+                ]
+                print_success(f"几何匹配完成: 新增 {geometry_bom_matched_count} 个BOM（{len(geometry_results)} 个零件）", indent=1)
+
+        # 步骤3：AI跟进匹配未匹配的零件
+        ai_bom_to_mesh = {}
+        ai_bom_matched_count = 0
+
+        if unmatched_parts:
+            print_info(f"👷 AI匹配员工加入工作，他开始智能分析 {len(unmatched_parts)} 个未匹配的3D零件...", indent=1)
+            sys.stdout.flush()
+
+            # ✅ 计算未匹配的BOM（排除已经被代码匹配、几何匹配的BOM）
+            matched_bom_codes = set(code_bom_to_mesh.keys()) | set(geometry_bom_to_mesh.keys())
+            unmatched_bom = [bom for bom in bom_items if bom.get('code') not in matched_bom_codes]
+
+            if self.ai_matcher is None:
+                from core.ai_matcher import AIBOMMatcher
+                self.ai_matcher = AIBOMMatcher()
+            ai_results = self.ai_matcher.match_unmatched_parts(unmatched_parts, unmatched_bom)
+
+            # 合并AI匹配结果到bom_to_mesh映射
+            for ai_result in ai_results:
+                bom_code = ai_result.get("matched_bom_code")
+                mesh_id = ai_result.get("mesh_id")
+                if bom_code and mesh_id:
+                    if bom_code not in ai_bom_to_mesh:
+                        ai_bom_to_mesh[bom_code] = []
+                    ai_bom_to_mesh[bom_code].append(mesh_id)
+
+            # 计算AI新增匹配的BOM数量（不在代码匹配中的）
+            ai_bom_matched_count = len([
+                k for k in ai_bom_to_mesh.keys() if k not in code_bom_to_mesh and k not in geometry_bom_to_mesh
+            ])
+
+            print_success(f"✅ AI匹配员工完成了工作，他新增匹配了 {ai_bom_matched_count} 个BOM", indent=1)
+            sys.stdout.flush()
+
+        # 合并代码匹配、几何匹配和AI匹配的结果
+        final_bom_to_mesh = {**code_bom_to_mesh, **geometry_bom_to_mesh, **ai_bom_to_mesh}
+        total_bom_matched = len(final_bom_to_mesh)  # 最终匹配的BOM数量
+        final_matching_rate = total_bom_matched / total_bom if total_bom else 0
+
+        print_success(f"总匹配率: BOM {total_bom_matched}/{total_bom} ({final_matching_rate*100:.1f}%) [代码: {code_bom_matched}, 几何: {geometry_bom_matched_count}, AI: {ai_bom_matched_count}]", indent=1)
+
+        return {
+            "bom_to_mesh": final_bom_to_mesh,
+            "total_bom_count": total_bom,
+            "bom_matched_count": total_bom_matched,
+            "total_3d_parts": len(parts_list),
+            "code_matched": code_bom_matched,
+            "geometry_matched": geometry_bom_matched_count,
+            "ai_matched": ai_bom_matched_count,
+            "matching_rate": final_matching_rate
+        }
+
     def _get_component_bom(self, bom_data: List[Dict], comp_plan: Dict) -> List[Dict]:
         """
         获取组件的BOM数据（只包含组件内部的零件）
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+图纸页面快速分类（调用任何LLM之前的本地预处理）
+只读取PDF文本层、嵌入图片位置和矢量路径数量，不做栅格化，每页毫秒级
+
+页面类别（一页可同时属于多个类别）：
+- bom: 页面上有BOM明细表（复用 core.bom_table 的按页缓存，步骤2不再重复提取）
+- assembly_view: 有装配视图（大面积嵌入图片或大量矢量路径）
+- weld_detail: 页面专属文字中有焊接关键字或焊接符号
+- tech_requirements: 有“技术要求”
+- title_only: 只有图框/标题栏，没有明细表、视图和焊接信息
+- blank: 没有文字、图片和矢量内容
+
+图框、标题栏、通用技术要求等在同一套图纸每页相同位置重复出现的文字视为模板，
+不参与关键字判断（否则每页都会命中“焊接”）。
+
+各Agent通过 PAGE_CLASSES 声明自己需要的页面类别，由 select_pages 过滤图片。
+"""
+
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import fitz  # PyMuPDF
+
+from core.bom_table import get_table_cache
+from utils.file_hash import hash_file
+
+
+PAGE_CLASSES = (
+    "bom", "assembly_view", "weld_detail", "tech_requirements", "title_only", "blank"
+)
+
+# 不含实际内容的类别（Agent声明的类别都不匹配时，回退到去掉这些页面）
+EMPTY_CLASSES = {"title_only", "blank"}
+
+# 单张嵌入图片面积占页面比例低于该值时忽略（Logo、签章等）
+MIN_IMAGE_RATIO = 0.02
+
+# 有效图片总面积占页面比例达到该值视为有装配视图
+VIEW_IMAGE_COVERAGE = 0.05
+
+# 矢量路径数达到该值视为有矢量绘制的装配视图（图框+明细表通常只有十几条路径）
+VIEW_MIN_PATHS = 200
+
+# 内容流字节数/页面面积超过该值时直接视为矢量视图（不再逐条统计路径）
+DENSE_CONTENT_RATIO = 2.0
+
+# 矢量路径不超过该值、没有文字和图片的页面视为空白页
+BLANK_MAX_PATHS = 20
+
+# 模板文字判定：至少3页时，同一文字出现在相同位置的页数比例
+TEMPLATE_MIN_PAGES = 3
+TEMPLATE_PAGE_RATIO = 0.6
+
+# 模板文字位置的量化步长（pt）
+TEMPLATE_GRID = 5
+
+WELD_PATTERN = re.compile(r"焊|weld|[△▽⊿◺◿]", re.IGNORECASE)
+TECH_REQUIREMENTS_PATTERN = re.compile(r"技术要求")
+
+
+def _template_key(word) -> tuple:
+    return word[4], round(word[0] / TEMPLATE_GRID), round(word[1] / TEMPLATE_GRID)
+
+
+def _image_coverage(page) -> float:
+    """有效嵌入图片面积占页面面积的比例"""
+    page_area = abs(page.rect)
+    if not page_area:
+        return 0.0
+    covered = 0.0
+    for info in page.get_image_info():
+        area = abs(fitz.Rect(info["bbox"]) & page.rect)
+        if area >= page_area * MIN_IMAGE_RATIO:
+            covered += area
+    return min(covered / page_area, 1.0)
+
+
+def _path_count(page) -> int:
+    """矢量路径数量；内容流非常密集时直接返回视图阈值，避免逐条解析"""
+    page_area = abs(page.rect) or 1.0
+    if len(page.read_contents()) / page_area >= DENSE_CONTENT_RATIO:
+        return VIEW_MIN_PATHS
+    return len(page.get_cdrawings())
+
+
+def _classify_page(page, words: Sequence, is_template, digest: str) -> List[str]:
+    """根据页面特征给出类别列表"""
+    own_text = " ".join(w[4] for w in words if not is_template(w))
+    coverage = _image_coverage(page)
+    paths = _path_count(page)
+
+    tags = []
+    if get_table_cache().get_rows(page, digest):
+        tags.append("bom")
+    if coverage >= VIEW_IMAGE_COVERAGE or paths >= VIEW_MIN_PATHS:
+        tags.append("assembly_view")
+    if WELD_PATTERN.search(own_text):
+        tags.append("weld_detail")
+    if any(TECH_REQUIREMENTS_PATTERN.search(w[4]) for w in words):
+        tags.append("tech_requirements")
+
+    if not words and not coverage and paths <= BLANK_MAX_PATHS:
+        tags.append("blank")
+    elif not {"bom", "assembly_view", "weld_detail"} & set(tags):
+        tags.append("title_only")
+    return tags
+
+
+def classify_pdfs(pdf_paths: Iterable[str]) -> Dict[str, List[List[str]]]:
+    """
+    对一套图纸的所有页面分类
+
+    Args:
+        pdf_paths: 同一产品的PDF路径（模板文字按整套图纸统计）
+
+    Returns:
+        {PDF路径: [第1页类别列表, 第2页类别列表, ...]}
+    """
+    pdf_paths = list(pdf_paths)
+    docs = {pdf_path: fitz.open(pdf_path) for pdf_path in pdf_paths}
+    try:
+        page_words = {
+            pdf_path: [page.get_text("words") for page in doc]
+            for pdf_path, doc in docs.items()
+        }
+
+        # 统计每个(文字, 位置)出现的页数
+        total_pages = sum(len(pages) for pages in page_words.values())
+        occurrences = Counter()
+        for pages in page_words.values():
+            for words in pages:
+                occurrences.update({_template_key(w) for w in words})
+
+        if total_pages >= TEMPLATE_MIN_PAGES:
+            min_count = max(2, total_pages * TEMPLATE_PAGE_RATIO)
+            is_template = lambda w: occurrences[_template_key(w)] >= min_count
+        else:
+            is_template = lambda w: False
+
+        result = {}
+        for pdf_path, doc in docs.items():
+            digest = hash_file(pdf_path)
+            result[pdf_path] = [
+                _classify_page(page, page_words[pdf_path][page.number], is_template, digest)
+                for page in doc
+            ]
+        return result
+    finally:
+        for doc in docs.values():
+            doc.close()
+
+
+def select_pages(
+    images: Sequence[str],
+    page_classes: Dict[str, List[str]],
+    wanted: Optional[Sequence[str]]
+) -> List[str]:
+    """
+    按Agent需要的页面类别过滤图片
+
+    Args:
+        images: 图片路径（按页码顺序）
+        page_classes: {图片路径: 类别列表}（没有分类信息的图片一律保留）
+        wanted: Agent需要的类别，None表示全部页面
+
+    Returns:
+        保留的图片路径（保持原顺序）；一张都不匹配时回退到去掉空白/仅标题栏页，
+        仍为空则返回全部图片
+    """
+    if not wanted or not page_classes:
+        return list(images)
+
+    wanted = set(wanted)
+    selected = [
+        image for image in images
+        if image not in page_classes or wanted & set(page_classes[image])
+    ]
+    if selected:
+        return selected
+
+    selected = [
+        image for image in images
+        if not EMPTY_CLASSES & set(page_classes.get(image, []))
+    ]
+    return selected or list(images)
@@ -0,0 +1,518 @@
+# -*- coding: utf-8 -*-
+"""
+并行装配说明书生成流水线（基于asyncio）
+
+三个通道同时运行，总耗时由最长的单条链路决定，而不是各阶段之和：
+- glb通道：STEP → GLB 转换，在进程池中执行（CPU密集，绕开GIL）
+- pdf通道：BOM文本提取，在线程中执行
+- vision通道：PDF渲染为图片 → 视觉分析；视觉分析是一次多图请求（所有页面一起送入Qwen-VL），
+  在全部页面渲染完成后开始，渲染和分析期间与pdf、glb通道并行
+
+三个通道汇合后：DeepSeek装配专家生成装配规程 → 生成HTML说明书
+
+每个通道通过 ProgressReporter.report_parallel 推送进度，格式与
+backend/websocket_manager.send_parallel_progress 约定一致。
+
+续跑：各阶段产物与输入指纹记录在输出目录（见 utils/checkpoint.py），
+resume=True 时指纹一致的阶段直接加载（阶段编号见 STAGE_ARTIFACTS）。
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+# 添加项目根目录到路径（进程池子进程同样需要）
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from config import PERFORMANCE_CONFIG
+from core.bom_parser import extract_bom_rows
+from processors.file_processor import PDFProcessor, ModelProcessor
+from utils.checkpoint import StepCheckpoint
+
+
+# 各阶段产物（检查点续跑时从磁盘加载）
+STAGE_ARTIFACTS = {
+    1: "bom_data.json",                  # pdf通道
+    2: "glb_results.json",               # glb通道
+    3: "vision_result.json",             # vision通道
+    4: "assembly_specification.json"     # 装配专家
+}
+
+
+def _convert_model_file(model_path: str, output_path: str, scale_factor: float) -> Dict:
+    """
+    进程池任务：转换单个STEP文件为GLB
+
+    必须是模块级函数，才能被子进程序列化调用
+    """
+    processor = ModelProcessor()
+    result = processor.step_to_glb(model_path, output_path, scale_factor=scale_factor)
+    result["source_file"] = model_path
+    return result
+
+
+class ParallelAssemblyPipeline:
+    """三通道并行装配说明书生成流水线"""
+
+    def __init__(
+        self,
+        dashscope_api_key: Optional[str] = None,
+        deepseek_api_key: Optional[str] = None,
+        progress_reporter=None,
+        max_workers: Optional[int] = None,
+        render_dpi: int = 200,
+        scale_factor: float = 0.001
+    ):
+        """
+        初始化并行流水线
+
+        Args:
+            dashscope_api_key: DashScope API密钥（Qwen-VL视觉通道）
+            deepseek_api_key: DeepSeek API密钥（装配专家）
+            progress_reporter: 进度报告器（backend.websocket_manager.ProgressReporter）
+            max_workers: STEP转换进程池大小，默认CPU核数
+            render_dpi: PDF渲染DPI
+            scale_factor: STEP单位缩放（默认 mm -> m）
+        """
+        if dashscope_api_key:
+            os.environ["DASHSCOPE_API_KEY"] = dashscope_api_key
+        if deepseek_api_key:
+            os.environ["DEEPSEEK_API_KEY"] = deepseek_api_key
+
+        self.dashscope_api_key = dashscope_api_key
+        self.deepseek_api_key = deepseek_api_key
+        self.progress_reporter = progress_reporter
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.render_dpi = render_dpi
+        self.scale_factor = scale_factor
+
+        self.pdf_processor = PDFProcessor(dpi=render_dpi)
+
+        # 视觉通道解析器（持有Qwen-VL客户端），首次使用时创建
+        self._parser = None
+
+        # 三个通道的实时状态
+        self.channel_state: Dict[str, Dict[str, Any]] = {
+            "glb": {"progress": 0, "message": "等待开始"},
+            "pdf": {"progress": 0, "message": "等待开始"},
+            "vision": {"progress": 0, "message": "等待开始"}
+        }
+        self.channel_times: Dict[str, float] = {}
+
+        # 阶段检查点（输出目录在 process_files_parallel 中确定）
+        self.checkpoint: Optional[StepCheckpoint] = None
+
+    # ========== 进度报告 ==========
+
+    def _report(self, channel: str, progress: int, message: str, **data):
+        """更新单个通道状态并推送三通道整体进度"""
+        state = self.channel_state[channel]
+        state.update(data)
+        state["progress"] = progress
+        state["message"] = message
+
+        print(f"[{channel}] {progress:3d}% {message}")
+        if self.progress_reporter:
+            self.progress_reporter.report_parallel(
+                {name: dict(value) for name, value in self.channel_state.items()}
+            )
+
+    def _log(self, message: str, level: str = "info"):
+        print(f"[{level.upper()}] {message}")
+        if self.progress_reporter:
+            self.progress_reporter.log(message, level)
+
+    @property
+    def parser(self):
+        if self._parser is None:
+            from core.dual_channel_parser import DualChannelParser
+            self._parser = DualChannelParser(progress_reporter=self.progress_reporter)
+        return self._parser
+
+    # ========== 主流程 ==========
+
+    async def process_files_parallel(
+        self,
+        pdf_files: List[str],
+        model_files: List[str],
+        output_dir: str,
+        focus_type: str = "general",
+        special_requirements: str = "",
+        resume: bool = False,
+        from_step: Optional[int] = None
+    ) -> Dict:
+        """
+        并行处理PDF和3D模型文件，生成装配说明书
+
+        Args:
+            pdf_files: PDF文件路径列表
+            model_files: STEP文件路径列表
+            output_dir: 输出目录
+            focus_type: 专业重点类型
+            special_requirements: 特殊要求
+            resume: 续跑模式，输入指纹未变化的阶段直接加载output_dir中的产物
+            from_step: 强制从第N阶段开始重新计算（隐含resume）
+
+        Returns:
+            {
+                "success": bool,
+                "output_file": str,               # HTML说明书路径
+                "pdf_analysis": [...],            # 每个PDF的BOM统计
+                "glb_results": [...],             # 每个STEP的转换结果
+                "vision_result": {...},           # 视觉通道分析结果
+                "assembly_specification": {...},  # 装配规程（含statistics）
+                "channel_times": {...},           # 各通道耗时
+                "elapsed_time": float
+            }
+        """
+        start_time = time.time()
+        output_path = Path(output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
+        self.checkpoint = StepCheckpoint(output_path, resume=resume, from_step=from_step)
+
+        self._log(f"🚀 并行流水线启动: {len(pdf_files)} 个PDF, {len(model_files)} 个3D模型", "info")
+
+        try:
+            # pdf通道先启动；vision通道在全部页面渲染完成后等待它的BOM结果作为上下文
+            bom_task = asyncio.create_task(self._run_checkpointed(
+                1, "pdf",
+                dict(files=pdf_files, modules=["core.bom_parser"]),
+                lambda: self._pdf_channel(pdf_files)
+            ))
+            glb_task = asyncio.create_task(self._run_checkpointed(
+                2, "glb",
+                dict(
+                    files=model_files,
+                    modules=["processors.file_processor"],
+                    extra={"scale_factor": self.scale_factor}
+                ),
+                lambda: self._glb_channel(model_files, output_path / "models"),
+                validate=lambda results: all(
+                    os.path.exists(r["output_path"]) for r in results if r.get("success")
+                )
+            ))
+            vision_task = asyncio.create_task(self._run_checkpointed(
+                3, "vision",
+                dict(
+                    files=pdf_files,
+                    modules=[
+                        "core.bom_parser",  # 视觉分析的BOM上下文来自pdf通道
+                        "core.dual_channel_parser",
+                        "models.vision_model",
+                        "prompts.agent_1_vision_prompts"
+                    ],
+                    models=["qwen-vl-plus"],
+                    extra={"dpi": self.render_dpi}
+                ),
+                lambda: self._vision_channel(pdf_files, output_path / "pdf_images", bom_task)
+            ))
+
+            pdf_analysis, glb_results, vision_result = await asyncio.gather(
+                bom_task, glb_task, vision_task
+            )
+
+            # ========== 汇合：装配专家 + HTML生成 ==========
+            all_bom_items = [item for entry in pdf_analysis for item in entry["bom_items"]]
+            assembly_spec = await self._run_checkpointed(
+                4, None,
+                dict(
+                    artifacts=[STAGE_ARTIFACTS[1], STAGE_ARTIFACTS[2], STAGE_ARTIFACTS[3]],
+                    modules=["models.assembly_expert", "prompts.assembly_expert_prompts"],
+                    models=["deepseek-chat"],
+                    extra={"focus_type": focus_type, "special_requirements": special_requirements}
+                ),
+                lambda: asyncio.to_thread(
+                    self._generate_specification,
+                    vision_result, glb_results, all_bom_items,
+                    focus_type, special_requirements or "无特殊要求"
+                )
+            )
+
+            glb_files = [
+                Path(r["output_path"]).name for r in glb_results if r.get("success")
+            ]
+            html_result = await asyncio.to_thread(
+                self._generate_html, assembly_spec, glb_files, str(output_path)
+            )
+            if not html_result.get("success"):
+                raise RuntimeError(f"HTML生成失败: {html_result.get('error')}")
+
+            assembly_spec["statistics"] = {
+                "bom_items": len(all_bom_items),
+                "glb_models": len(glb_files),
+                "assembly_steps": len(
+                    assembly_spec.get("result", {}).get("assembly_sequence", [])
+                )
+            }
+
+            elapsed_time = time.time() - start_time
+            self._log(
+                f"✅ 并行流水线完成，总耗时 {elapsed_time:.1f}秒 "
+                f"(各通道: " + ", ".join(f"{k} {v:.1f}s" for k, v in self.channel_times.items()) + ")",
+                "success"
+            )
+
+            result = {
+                "success": True,
+                "output_file": html_result["html_file"],
+                "pdf_analysis": [
+                    {k: v for k, v in entry.items() if k != "bom_items"} for entry in pdf_analysis
+                ],
+                "glb_results": glb_results,
+                "vision_result": vision_result,
+                "assembly_specification": assembly_spec,
+                "channel_times": self.channel_times,
+                "elapsed_time": elapsed_time
+            }
+
+            with open(output_path / "parallel_result.json", "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2, default=str)
+
+            return result
+
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            self._log(f"❌ 并行流水线失败: {e}", "error")
+            return {
+                "success": False,
+                "error": str(e),
+                "channel_times": self.channel_times,
+                "elapsed_time": time.time() - start_time
+            }
+
+    # ========== 检查点 ==========
+
+    async def _run_checkpointed(
+        self,
+        stage: int,
+        channel: Optional[str],
+        fingerprint_inputs: Dict,
+        compute,
+        validate=None
+    ):
+        """
+        运行带检查点的阶段：指纹一致且产物有效时从磁盘加载，否则计算并保存产物
+
+        Args:
+            stage: 阶段编号（STAGE_ARTIFACTS的键）
+            channel: 对应的进度通道（加载时直接报告100%），汇合阶段为None
+            fingerprint_inputs: StepCheckpoint.fingerprint 的参数
+            compute: 返回协程的函数，实际执行该阶段
+            validate: 可选，校验加载的产物是否仍可用
+
+        Returns:
+            阶段结果
+        """
+        artifact = STAGE_ARTIFACTS[stage]
+        # 哈希大文件不阻塞事件循环
+        fingerprint = await asyncio.to_thread(self.checkpoint.fingerprint, **fingerprint_inputs)
+
+        if self.checkpoint.is_fresh(stage, fingerprint, [artifact]):
+            loaded = self.checkpoint.load_json(artifact)
+            if validate is None or validate(loaded):
+                if channel:
+                    self._report(channel, 100, "♻️ 输入未变化，已从检查点加载")
+                    self.channel_times[channel] = 0.0
+                return loaded
+
+        result = await compute()
+
+        with open(self.checkpoint.output_dir / artifact, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2, default=str)
+        self.checkpoint.record(stage, fingerprint, [artifact])
+        return result
+
+    # ========== glb通道 ==========
+
+    async def _glb_channel(self, model_files: List[str], glb_dir: Path) -> List[Dict]:
+        """STEP → GLB，进程池并行转换"""
+        channel_start = time.time()
+        glb_dir.mkdir(parents=True, exist_ok=True)
+
+        if not model_files:
+            self._report("glb", 100, "没有3D模型需要转换")
+            self.channel_times["glb"] = 0.0
+            return []
+
+        self._report("glb", 5, f"开始转换 {len(model_files)} 个STEP文件", total_files=len(model_files))
+
+        loop = asyncio.get_running_loop()
+        results = []
+        workers = min(self.max_workers, len(model_files))
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                loop.run_in_executor(
+                    pool, _convert_model_file,
+                    model_path, str(glb_dir / f"{Path(model_path).stem}.glb"), self.scale_factor
+                )
+                for model_path in model_files
+            ]
+
+            for done_count, future in enumerate(asyncio.as_completed(futures), 1):
+                try:
+                    result = await future
+                except Exception as e:
+                    result = {"success": False, "error": str(e)}
+                results.append(result)
+
+                name = Path(result.get("source_file", "")).name
+                self._report(
+                    "glb",
+                    5 + int(95 * done_count / len(model_files)),
+                    f"已转换 {done_count}/{len(model_files)}: {name}",
+                    current_file=name,
+                    completed_files=done_count
+                )
+
+        # 按输入顺序返回
+        order = {path: i for i, path in enumerate(model_files)}
+        results.sort(key=lambda r: order.get(r.get("source_file"), len(order)))
+
+        failed = [r for r in results if not r.get("success")]
+        if failed:
+            self._log(f"⚠️ {len(failed)} 个STEP文件转换失败", "warning")
+
+        self.channel_times["glb"] = time.time() - channel_start
+        return results
+
+    # ========== pdf通道 ==========
+
+    async def _pdf_channel(self, pdf_files: List[str]) -> List[Dict]:
+        """BOM文本提取，每个PDF一个线程"""
+        channel_start = time.time()
+        self._report("pdf", 5, f"开始从 {len(pdf_files)} 个PDF提取BOM")
+
+        async def extract(pdf_path: str) -> Dict:
+            rows = await asyncio.to_thread(extract_bom_rows, pdf_path, None, set())
+            items = [row.to_dict() for row in rows]
+            pdf_name = Path(pdf_path).name
+            return {
+                "pdf": pdf_name,
+                "bom_items": items,
+                "statistics": {"bom_items": len(items)}
+            }
+
+        pdf_analysis = []
+        tasks = [asyncio.create_task(extract(p)) for p in pdf_files]
+        for done_count, task in enumerate(asyncio.as_completed(tasks), 1):
+            entry = await task
+            pdf_analysis.append(entry)
+            self._report(
+                "pdf",
+                5 + int(95 * done_count / max(len(pdf_files), 1)),
+                f"已解析 {done_count}/{len(pdf_files)}: {entry['pdf']}",
+                bom_items=sum(e["statistics"]["bom_items"] for e in pdf_analysis)
+            )
+
+        order = {Path(p).name: i for i, p in enumerate(pdf_files)}
+        pdf_analysis.sort(key=lambda e: order.get(e["pdf"], len(order)))
+
+        self.channel_times["pdf"] = time.time() - channel_start
+        return pdf_analysis
+
+    # ========== vision通道 ==========
+
+    async def _vision_channel(
+        self,
+        pdf_files: List[str],
+        images_dir: Path,
+        bom_task: "asyncio.Task"
+    ) -> Dict:
+        """
+        PDF渲染 → 视觉分析
+
+        所有页面在一次多图请求中分析（模型需要同时看到产品总图和组件图），因此等全部PDF渲染完成后才开始；
+        与其他通道的重叠来自渲染、分析期间pdf和glb通道同时运行
+        """
+        channel_start = time.time()
+        self._report("vision", 5, f"开始渲染 {len(pdf_files)} 个PDF")
+
+        # 每个PDF内部已按页分发到进程池，PDF之间顺序渲染以免进程数叠加
+        def render_all() -> List[str]:
+            paths = []
+            for index, pdf_path in enumerate(pdf_files):
+                name = Path(pdf_path).name
+
+                def page_done(done: int, total: int, page_index: int):
+                    progress = 5 + 25 * (index + done / total) // len(pdf_files)
+                    self._report("vision", int(progress), f"{name} 第 {page_index + 1} 页已渲染 ({done}/{total})")
+
+                target = images_dir / f"pdf{index + 1}_{Path(pdf_path).stem}"
+                paths.extend(self.pdf_processor.pdf_to_images(pdf_path, str(target), progress_callback=page_done))
+            return paths
+
+        image_paths = await asyncio.to_thread(render_all)
+
+        self._report("vision", 30, f"已渲染 {len(image_paths)} 页，开始视觉分析", pages=len(image_paths))
+
+        # BOM文本提取远快于渲染，这里通常无需等待
+        pdf_analysis = await bom_task
+        bom_items = [item for entry in pdf_analysis for item in entry["bom_items"]]
+
+        vision_result = await asyncio.to_thread(
+            self.parser._vision_channel_parse_images, image_paths, bom_items
+        )
+
+        self._report(
+            "vision", 100, "视觉分析完成",
+            results=len(vision_result.get("assembly_connections", [])) if vision_result else 0
+        )
+        self.channel_times["vision"] = time.time() - channel_start
+        return {
+            "image_paths": image_paths,
+            "analysis": vision_result or {}
+        }
+
+    # ========== 汇合阶段 ==========
+
+    def _generate_specification(
+        self,
+        vision_result: Dict,
+        glb_results: List[Dict],
+        bom_items: List[Dict],
+        focus_type: str,
+        special_requirements: str
+    ) -> Dict:
+        """调用DeepSeek装配专家生成装配规程"""
+        from models.assembly_expert import AssemblyExpertModel
+
+        self._log("🧠 装配专家生成装配规程...", "info")
+        expert = AssemblyExpertModel(api_key=self.deepseek_api_key)
+
+        model_analysis = {
+            "models": [
+                {
+                    "file": Path(r.get("source_file", "")).name,
+                    "parts_count": r.get("parts_count", 0),
+                    "parts_info": r.get("parts_info", [])
+                }
+                for r in glb_results if r.get("success")
+            ]
+        }
+
+        spec = expert.generate_assembly_specification(
+            vision_analysis_results=[{
+                "bom_items": bom_items,
+                "assembly_analysis": vision_result.get("analysis", {})
+            }],
+            model_analysis_results=model_analysis,
+            focus_type=focus_type,
+            special_requirements=special_requirements
+        )
+        if not spec.get("success"):
+            raise RuntimeError(f"装配规程生成失败: {spec.get('error')}")
+        return spec
+
+    def _generate_html(self, assembly_spec: Dict, glb_files: List[str], output_dir: str) -> Dict:
+        """生成HTML装配说明书"""
+        from generators.html_generator import HTMLManualGenerator
+        return HTMLManualGenerator().generate_manual(assembly_spec, glb_files, output_dir)
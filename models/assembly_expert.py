@@ -7,12 +7,17 @@ DeepSeek装配专家模型调用模块
 import os
 import json
 from typing import Dict, List, Optional, Any
-from openai import OpenAI
 from prompts.assembly_expert_prompts import build_assembly_expert_prompt, build_user_input
+from utils.response_cache import get_response_cache
+from utils.llm_clients import PooledLLMClient
+from utils.json_stream import parse_complete_json, parse_json_text
 
 
-class AssemblyExpertModel:
+class AssemblyExpertModel(PooledLLMClient):
     """DeepSeek装配专家模型封装类"""
+
+    # 共享客户端池中的服务商（见 utils/llm_clients.py）
+    provider = "deepseek"
     
     def __init__(self, api_key: Optional[str] = None):
         """
@@ -25,28 +30,81 @@ class AssemblyExpertModel:
         if not self.api_key:
             raise ValueError("请设置DEEPSEEK_API_KEY环境变量或传入api_key参数")
         
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url="https://api.deepseek.com"
-        )
-        
         self.model_name = "deepseek-chat"
 
+        # 共享响应缓存
+        self.response_cache = get_response_cache()
+
+    def _chat(
+        self,
+        system_prompt: str,
+        user_input: str,
+        temperature: float = 0.1,
+        max_tokens: Optional[int] = None
+    ) -> tuple:
+        """
+        调用DeepSeek（带响应缓存）
+
+        Args:
+            system_prompt: 系统提示词
+            user_input: 用户输入
+            temperature: 温度
+            max_tokens: 最大输出token数
+
+        Returns:
+            (响应文本, token用量字典) 元组
+        """
+        cache_key = self.response_cache.make_key(
+            model=self.model_name,
+            temperature=temperature,
+            system_prompt=system_prompt,
+            user_query=user_input,
+            extra={"max_tokens": max_tokens}
+        )
+        cached = self.response_cache.get_json(cache_key, roots="{")
+        if cached is not None:
+            print(f"♻️ DeepSeek命中缓存 ({cache_key[:12]})")
+            return cached["raw_response"], cached.get("token_usage", {})
+
+        request = {
+            "model": self.model_name,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_input}
+            ],
+            "stream": False,
+            "temperature": temperature
+        }
+        if max_tokens:
+            request["max_tokens"] = max_tokens
+
+        response = self.call(**request)
+
+        raw_content = response.choices[0].message.content or ""
+        usage = getattr(response, 'usage', None)
+        token_usage = {
+            "prompt_tokens": getattr(usage, 'prompt_tokens', None),
+            "completion_tokens": getattr(usage, 'completion_tokens', None),
+            "total_tokens": getattr(usage, 'total_tokens', None)
+        }
+
+        # 只缓存完整解析的输出（达到长度上限被截断或无法解析的输出下次重新请求）
+        parsed, _ = parse_complete_json(raw_content, roots="{")
+        if parsed is not None and response.choices[0].finish_reason != "length":
+            self.response_cache.set(cache_key, {
+                "raw_response": raw_content,
+                "token_usage": token_usage
+            })
+        return raw_content, token_usage
+
     @staticmethod
     def _parse_json_from_content(content: str) -> Dict[str, Any]:
         """从模型响应中提取JSON数据"""
         if not content or not content.strip():
             raise ValueError('DeepSeek返回内容为空')
 
-        cleaned = content.strip()
-        json_start = cleaned.find('{')
-        json_end = cleaned.rfind('}')
-
-        if json_start == -1 or json_end == -1 or json_end <= json_start:
-            raise ValueError('DeepSeek返回内容不包含有效JSON')
-
-        json_str = cleaned[json_start:json_end + 1]
-        return json.loads(json_str)
+        # 容错解析：截取JSON、修复末尾逗号和截断（见 utils/json_stream.py）
+        return parse_json_text(content, roots="{")
 
     
     def generate_assembly_specification(
@@ -86,24 +144,12 @@ class AssemblyExpertModel:
         
         try:
             # 调用DeepSeek API
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_input}
-                ],
-                stream=False,
+            raw_content, token_usage = self._chat(
+                system_prompt,
+                user_input,
                 temperature=0.1,  # 降低随机性，提高一致性
                 max_tokens=8000
             )
-            
-            raw_content = response.choices[0].message.content or ""
-            usage = getattr(response, 'usage', None)
-            token_usage = {
-                "prompt_tokens": getattr(usage, 'prompt_tokens', None),
-                "completion_tokens": getattr(usage, 'completion_tokens', None),
-                "total_tokens": getattr(usage, 'total_tokens', None)
-            }
 
             try:
                 parsed_result = self._parse_json_from_content(raw_content)
@@ -163,33 +209,19 @@ class AssemblyExpertModel:
 输出优化后的装配顺序，并说明优化理由。"""
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": build_assembly_expert_prompt("general")
-                    },
-                    {
-                        "role": "user", 
-                        "content": optimization_prompt.format(
-                            current_sequence=json.dumps(current_sequence, ensure_ascii=False, indent=2),
-                            constraints=json.dumps(constraints or {}, ensure_ascii=False, indent=2)
-                        )
-                    }
-                ],
-                stream=False,
+            content, token_usage = self._chat(
+                build_assembly_expert_prompt("general"),
+                optimization_prompt.format(
+                    current_sequence=json.dumps(current_sequence, ensure_ascii=False, indent=2),
+                    constraints=json.dumps(constraints or {}, ensure_ascii=False, indent=2)
+                ),
                 temperature=0.1
             )
             
             return {
                 "success": True,
-                "optimized_sequence": response.choices[0].message.content,
-                "token_usage": {
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens
-                }
+                "optimized_sequence": content,
+                "token_usage": token_usage
             }
             
         except Exception as e:
@@ -231,33 +263,19 @@ class AssemblyExpertModel:
 输出格式为结构化的检查清单。"""
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": build_assembly_expert_prompt("general")
-                    },
-                    {
-                        "role": "user", 
-                        "content": quality_prompt.format(
-                            assembly_spec=json.dumps(assembly_spec, ensure_ascii=False, indent=2),
-                            quality_level=quality_level
-                        )
-                    }
-                ],
-                stream=False,
+            content, token_usage = self._chat(
+                build_assembly_expert_prompt("general"),
+                quality_prompt.format(
+                    assembly_spec=json.dumps(assembly_spec, ensure_ascii=False, indent=2),
+                    quality_level=quality_level
+                ),
                 temperature=0.1
             )
             
             return {
                 "success": True,
-                "quality_checklist": response.choices[0].message.content,
-                "token_usage": {
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens
-                }
+                "quality_checklist": content,
+                "token_usage": token_usage
             }
             
         except Exception as e:
@@ -7,22 +7,26 @@
 import os
 import json
 from typing import Dict, List, Any, Optional
-from openai import OpenAI
 
+from utils.response_cache import get_response_cache
+from utils.llm_clients import PooledLLMClient
+from utils.json_stream import try_parse_json
 
-class FusionExpertModel:
+
+class FusionExpertModel(PooledLLMClient):
     """融合推理专家模型 - 严格按照设计文档实现"""
+
+    # 共享客户端池中的服务商（见 utils/llm_clients.py）
+    provider = "deepseek"
     
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key or os.getenv("DEEPSEEK_API_KEY")
         if not self.api_key:
             raise ValueError("DEEPSEEK_API_KEY is required")
         
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url="https://api.deepseek.com"
-        )
-        
+        # 共享响应缓存
+        self.response_cache = get_response_cache()
+
         # 设计文档中的系统提示词
         self.system_prompt = """你是"机械装配与工艺规划汇总器"。
 
@@ -72,18 +76,36 @@ class FusionExpertModel:
 
 请先输出完整的JSON，然后用不超过10行中文总结要点。"""
             
-            response = self.client.chat.completions.create(
+            cache_key = self.response_cache.make_key(
                 model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": user_query}
-                ],
                 temperature=0.1,
-                max_tokens=8000,
-                stream=False
+                system_prompt=self.system_prompt,
+                user_query=user_query,
+                extra={"max_tokens": 8000}
             )
-            
-            content = response.choices[0].message.content
+            cached = self.response_cache.get_json(cache_key, roots="{")
+
+            if cached is not None:
+                print(f"♻️ 融合推理命中缓存 ({cache_key[:12]})")
+                content = cached["raw_response"]
+            else:
+                # 截断时续写，不整个重试
+                response = self.call_json(
+                    roots="{",
+                    model="deepseek-chat",
+                    messages=[
+                        {"role": "system", "content": self.system_prompt},
+                        {"role": "user", "content": user_query}
+                    ],
+                    temperature=0.1,
+                    max_tokens=8000,
+                    stream=False
+                )
+
+                content = response["raw_response"]
+                # 只缓存完整解析的输出
+                if response["success"] and response["complete"]:
+                    self.response_cache.set(cache_key, {"raw_response": content})
             
             # 解析JSON部分
             assembly_spec = self._extract_json_from_response(content)
@@ -113,36 +135,11 @@ class FusionExpertModel:
     
     def _extract_json_from_response(self, response: str) -> Optional[Dict[str, Any]]:
         """从响应中提取JSON部分"""
-        try:
-            # 查找JSON代码块
-            if "```json" in response:
-                start = response.find("```json") + 7
-                end = response.find("```", start)
-                json_str = response[start:end].strip()
-            elif "{" in response and "}" in response:
-                # 查找第一个完整的JSON对象
-                start = response.find("{")
-                brace_count = 0
-                end = start
-                
-                for i in range(start, len(response)):
-                    if response[i] == "{":
-                        brace_count += 1
-                    elif response[i] == "}":
-                        brace_count -= 1
-                        if brace_count == 0:
-                            end = i + 1
-                            break
-                
-                json_str = response[start:end]
-            else:
-                return None
-            
-            return json.loads(json_str)
-            
-        except Exception as e:
-            print(f"⚠️ JSON解析失败: {e}")
-            return None
+        # 容错解析：截取第一个完整的JSON对象，修复末尾逗号和截断（见 utils/json_stream.py）
+        result, error = try_parse_json(response, roots="{")
+        if result is None:
+            print(f"⚠️ JSON解析失败: {error}")
+        return result
     
     def _extract_summary_from_response(self, response: str) -> str:
         """从响应中提取总结部分"""
@@ -6,13 +6,19 @@ Gemini 2.5 Flash 视觉模型封装
 
 import os
 import json
-import base64
 from typing import Dict, List, Optional, Union
-from openai import OpenAI
 
+from utils.response_cache import get_response_cache
+from utils.llm_clients import PooledLLMClient
+from utils.image_prep import get_image_preparer
+from utils.json_stream import try_parse_json
 
-class GeminiVisionModel:
+
+class GeminiVisionModel(PooledLLMClient):
     """Gemini 2.5 Flash 视觉模型封装类"""
+
+    # 共享客户端池中的服务商（见 utils/llm_clients.py）
+    provider = "openrouter"
     
     def __init__(self, api_key: Optional[str] = None):
         """
@@ -25,12 +31,13 @@ class GeminiVisionModel:
         if not self.api_key:
             raise ValueError("请设置OPENROUTER_API_KEY环境变量或传入api_key参数")
         
-        self.client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=self.api_key
-        )
-        
         self.model_name = "google/gemini-2.5-flash-preview-09-2025"
+
+        # 共享响应缓存
+        self.response_cache = get_response_cache()
+
+        # 共享图片编码器
+        self.image_preparer = get_image_preparer()
     
     def encode_image_to_base64(self, image_path: str) -> str:
         """
@@ -40,11 +47,9 @@ class GeminiVisionModel:
             image_path: 图片文件路径
             
         Returns:
-            base64编码的图片数据URL
+            base64编码的图片数据URL（MIME类型与实际编码格式一致）
         """
-        with open(image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-            return f"data:image/png;base64,{encoded_string}"
+        return self.image_preparer.encode_file(image_path)
     
     def analyze_engineering_drawing(
         self,
@@ -66,6 +71,17 @@ class GeminiVisionModel:
         # 准备图片数据（支持单张或多张）
         image_paths = [image_path] if isinstance(image_path, str) else image_path
         
+        # 命中缓存则跳过API调用
+        cache_key = self.response_cache.make_key(
+            model=self.model_name,
+            temperature=0.1,
+            system_prompt=system_prompt,
+            user_query=user_query,
+            images=image_paths,
+            extra={"image_prep": self.image_preparer.signature}
+        )
+        cached = self.response_cache.get_json(cache_key, roots="{")
+
         # 构建用户消息内容（多张图片）
         user_content = []
         
@@ -75,13 +91,8 @@ class GeminiVisionModel:
             "text": user_query
         })
         
-        # 添加所有图片
-        for img_path in image_paths:
-            if img_path.startswith('http'):
-                image_url = img_path
-            else:
-                image_url = self.encode_image_to_base64(img_path)
-            
+        # 添加所有图片（命中缓存时无需编码；所有图片共享单次请求预算）
+        for image_url in ([] if cached is not None else self.image_preparer.prepare(image_paths)):
             user_content.append({
                 "type": "image_url",
                 "image_url": {"url": image_url}
@@ -100,48 +111,33 @@ class GeminiVisionModel:
         ]
         
         try:
-            # 调用API
-            completion = self.client.chat.completions.create(
-                extra_headers={
-                    "HTTP-Referer": "https://mecagent.com",
-                    "X-Title": "MecAgent Assembly Planning"
-                },
-                model=self.model_name,
-                messages=messages,
-                temperature=0.1  # 降低温度，提高确定性
-            )
-            
-            # 获取响应
-            response_content = completion.choices[0].message.content
+            if cached is not None:
+                print(f"♻️ Gemini命中缓存 ({cache_key[:12]})")
+                response_content = cached["raw_response"]
+            else:
+                # 调用API（截断时续写，不整个重试）
+                response = self.call_json(
+                    roots="{",
+                    extra_headers={
+                        "HTTP-Referer": "https://mecagent.com",
+                        "X-Title": "MecAgent Assembly Planning"
+                    },
+                    model=self.model_name,
+                    messages=messages,
+                    temperature=0.1  # 降低温度，提高确定性
+                )
+
+                # 获取响应
+                response_content = response["raw_response"]
+                # 只缓存完整解析的输出
+                if response["success"] and response["complete"]:
+                    self.response_cache.set(cache_key, {"raw_response": response_content})
             
-            # 尝试解析JSON结果
-            try:
-                # 提取JSON部分
-                json_start = response_content.find('{')
-                json_end = response_content.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    json_str = response_content[json_start:json_end]
-                    parsed_result = json.loads(json_str)
-                else:
-                    parsed_result = {"raw_content": response_content}
-            except json.JSONDecodeError as e:
-                # JSON解析失败，尝试修复
-                print(f"⚠️ JSON解析失败: {e}")
-                
-                # 尝试提取```json代码块
-                if "```json" in response_content:
-                    json_start = response_content.find("```json") + 7
-                    json_end = response_content.find("```", json_start)
-                    if json_end > json_start:
-                        json_str = response_content[json_start:json_end].strip()
-                        try:
-                            parsed_result = json.loads(json_str)
-                        except:
-                            parsed_result = {"raw_content": response_content, "parse_error": str(e)}
-                    else:
-                        parsed_result = {"raw_content": response_content, "parse_error": str(e)}
-                else:
-                    parsed_result = {"raw_content": response_content, "parse_error": str(e)}
+            # 容错解析JSON结果（见 utils/json_stream.py）
+            parsed_result, parse_error = try_parse_json(response_content, roots="{")
+            if parsed_result is None:
+                print(f"⚠️ JSON解析失败: {parse_error}")
+                parsed_result = {"raw_content": response_content, "parse_error": parse_error}
             
             # 保存输出结果到临时文件
             import datetime
@@ -6,20 +6,25 @@ Qwen3-VL视觉模型调用模块
 
 import os
 import json
-import base64
 import ssl
 import certifi
 from typing import Dict, List, Optional, Union
-from openai import OpenAI
 from prompts.agent_1_vision_prompts import build_vision_prompt, build_user_query
+from utils.response_cache import get_response_cache
+from utils.llm_clients import PooledLLMClient
+from utils.image_prep import get_image_preparer
+from utils.json_stream import try_parse_json
 
 # 禁用SSL验证警告
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
-class Qwen3VLModel:
+class Qwen3VLModel(PooledLLMClient):
     """Qwen3-VL视觉模型封装类"""
+
+    # 共享客户端池中的服务商（见 utils/llm_clients.py）
+    provider = "dashscope"
     
     def __init__(self, api_key: Optional[str] = None):
         """
@@ -32,12 +37,13 @@ class Qwen3VLModel:
         if not self.api_key:
             raise ValueError("请设置DASHSCOPE_API_KEY环境变量或传入api_key参数")
         
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-        )
-        
         self.model_name = "qwen-vl-plus"
+
+        # 共享响应缓存
+        self.response_cache = get_response_cache()
+
+        # 共享图片编码器
+        self.image_preparer = get_image_preparer()
     
     def encode_image_to_base64(self, image_path: str) -> str:
         """
@@ -47,11 +53,9 @@ class Qwen3VLModel:
             image_path: 图片文件路径
             
         Returns:
-            base64编码的图片数据URL
+            base64编码的图片数据URL（MIME类型与实际编码格式一致）
         """
-        with open(image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-            return f"data:image/jpeg;base64,{encoded_string}"
+        return self.image_preparer.encode_file(image_path)
     
     def analyze_engineering_drawing(
         self,
@@ -93,16 +97,26 @@ class Qwen3VLModel:
         # 准备图片数据（支持单张或多张）
         image_paths = [image_path] if isinstance(image_path, str) else image_path
 
+        # 命中缓存则跳过API调用
+        cache_key = self.response_cache.make_key(
+            model=self.model_name,
+            temperature=None,
+            system_prompt=system_prompt,
+            user_query=user_query,
+            images=image_paths,
+            extra={
+                "enable_thinking": enable_thinking,
+                "thinking_budget": 1000,
+                "image_prep": self.image_preparer.signature
+            }
+        )
+        cached = self.response_cache.get_json(cache_key, roots="{")
+
         # 构建用户消息内容（多张图片）
         user_content = []
 
-        # 添加所有图片
-        for img_path in image_paths:
-            if img_path.startswith('http'):
-                image_url = img_path
-            else:
-                image_url = self.encode_image_to_base64(img_path)
-
+        # 添加所有图片（命中缓存时无需编码；所有图片共享单次请求预算）
+        for image_url in ([] if cached is not None else self.image_preparer.prepare(image_paths)):
             user_content.append({
                 "type": "image_url",
                 "image_url": {"url": image_url}
@@ -127,67 +141,39 @@ class Qwen3VLModel:
         ]
         
         try:
-            # 调用API
-            completion = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                stream=True,
-                extra_body={
-                    'enable_thinking': enable_thinking,
-                    "thinking_budget": 1000
-                }
-            )
-            
-            # 处理流式响应
-            reasoning_content = ""
-            answer_content = ""
-            is_answering = False
-            
-            for chunk in completion:
-                if not chunk.choices:
-                    continue
-                    
-                delta = chunk.choices[0].delta
-                
-                # 收集思考过程
-                if hasattr(delta, 'reasoning_content') and delta.reasoning_content:
-                    reasoning_content += delta.reasoning_content
-                else:
-                    # 收集回复内容
-                    if delta.content and not is_answering:
-                        is_answering = True
-                    if delta.content:
-                        answer_content += delta.content
-            
-            # 尝试解析JSON结果
-            try:
-                # 提取JSON部分
-                json_start = answer_content.find('{')
-                json_end = answer_content.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    json_str = answer_content[json_start:json_end]
-                    parsed_result = json.loads(json_str)
-                else:
-                    parsed_result = {"raw_content": answer_content}
-            except json.JSONDecodeError as e:
-                # JSON解析失败，尝试修复
-                print(f"⚠️ JSON解析失败: {e}")
-                print(f"⚠️ 错误位置: line {e.lineno} column {e.colno}")
+            if cached is not None:
+                print(f"♻️ 视觉模型命中缓存 ({cache_key[:12]})")
+                reasoning_content = cached.get("reasoning", "")
+                answer_content = cached["raw_response"]
+            else:
+                # 调用API（流式；截断时续写，不整个重试）
+                reasoning_parts = []
+                response = self.call_json(
+                    roots="{",
+                    on_reasoning=reasoning_parts.append,
+                    model=self.model_name,
+                    messages=messages,
+                    stream=True,
+                    extra_body={
+                        'enable_thinking': enable_thinking,
+                        "thinking_budget": 1000
+                    }
+                )
+                reasoning_content = "".join(reasoning_parts)
+                answer_content = response["raw_response"]
+
+                # 只缓存完整解析的输出
+                if response["success"] and response["complete"]:
+                    self.response_cache.set(cache_key, {
+                        "reasoning": reasoning_content,
+                        "raw_response": answer_content
+                    })
 
-                # 尝试提取```json代码块
-                if "```json" in answer_content:
-                    json_start = answer_content.find("```json") + 7
-                    json_end = answer_content.find("```", json_start)
-                    if json_end > json_start:
-                        json_str = answer_content[json_start:json_end].strip()
-                        try:
-                            parsed_result = json.loads(json_str)
-                        except:
-                            parsed_result = {"raw_content": answer_content, "parse_error": str(e)}
-                    else:
-                        parsed_result = {"raw_content": answer_content, "parse_error": str(e)}
-                else:
-                    parsed_result = {"raw_content": answer_content, "parse_error": str(e)}
+            # 容错解析JSON结果（见 utils/json_stream.py）
+            parsed_result, parse_error = try_parse_json(answer_content, roots="{")
+            if parsed_result is None:
+                print(f"⚠️ JSON解析失败: {parse_error}")
+                parsed_result = {"raw_content": answer_content, "parse_error": parse_error}
             
             # 保存输出结果到临时文件
             import datetime
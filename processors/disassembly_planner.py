@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+几何推算的拆卸/装配顺序
+根据接触图（processors/spatial_index.py）在本地求每个零件无碰撞的移出方向和可行的拆卸优先关系，
+反过来就是候选装配顺序，附在装配规划上交给装配Agent核对、补充说明，而不是让大模型凭图片编排顺序
+
+- 方向：六个坐标轴方向
+- 阻挡张量 B[方向, i, j]：零件 i 沿该方向移出时会碰到零件 j
+  - 相接触的零件对：接触采样点法线给出的受阻方向（贴合面、轴孔的局部约束）
+  - 不接触的零件对：包围盒沿方向扫掠的批量测试（垂直两轴上重叠，且 j 在 i 的前方）
+- 逐层剥离：每一轮移出能直接离开贴合面的零件（与剩余接触零件的受阻方向相反的方向不受阻挡，
+  如叠放在上面的零件向上取出），基准件最后移出；只能沿贴合面滑出的零件（如被压住的垫块可以横向滑出）
+  要等没有零件能直接离开时才移出，叠放关系不会被并到同一步；
+  没有零件可移出时（包围盒测试过于保守，或零件需要斜向/组合运动）强制移出受阻最少的零件并标记
+- 装配顺序 = 拆卸层的逆序，装配方向 = 移出方向的反方向
+
+阻挡计数在移出零件后增量更新，整个求解为 O(6·n²)。
+
+回归检查（叠放零件的顺序）：python processors/disassembly_planner.py
+"""
+
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# 添加项目根目录到路径（直接运行本文件做回归检查时）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from processors.spatial_index import DIRECTION_VECTORS, DIRECTIONS, opposite_direction
+
+
+def _blocking_tensor(graph: Dict, names: List[str]) -> np.ndarray:
+    """
+    阻挡张量
+
+    Returns:
+        (6, n, n) 布尔数组，[方向, i, j] 为 i 沿该方向移出时被 j 阻挡
+    """
+    bounds = graph["bounds_mm"]
+    lower = np.array([bounds[name][0] for name in names], dtype=np.float64)
+    upper = np.array([bounds[name][1] for name in names], dtype=np.float64)
+    # 相接触零件的包围盒会重叠接触半径以内，扫掠测试按该容差收缩
+    tolerance = float(graph.get("contact_radius_mm", 0.0))
+
+    # 每个轴上包围盒（收缩容差后）是否重叠：(3, n, n)
+    overlap = (
+        (lower[:, None, :] < upper[None, :, :] - tolerance)
+        & (lower[None, :, :] < upper[:, None, :] - tolerance)
+    ).transpose(2, 0, 1)
+
+    blocking = np.zeros((len(DIRECTIONS), len(names), len(names)), dtype=bool)
+    for d, vector in enumerate(DIRECTION_VECTORS):
+        axis = int(np.abs(vector).argmax())
+        others = [k for k in range(3) if k != axis]
+        if vector[axis] > 0:
+            ahead = upper[None, :, axis] > lower[:, None, axis] + tolerance
+        else:
+            ahead = lower[None, :, axis] < upper[:, None, axis] - tolerance
+        blocking[d] = overlap[others[0]] & overlap[others[1]] & ahead
+    index = np.arange(len(names))
+    blocking[:, index, index] = False
+
+    # 相接触的零件对以接触法线为准（包围盒测试对轴孔、斜面等过于保守）
+    position = {name: i for i, name in enumerate(names)}
+    direction_index = {direction: d for d, direction in enumerate(DIRECTIONS)}
+    for edge in graph.get("edges", []):
+        if edge.get("contact_area_mm2", 0) <= 0 or edge["a"] not in position or edge["b"] not in position:
+            continue
+        a, b = position[edge["a"]], position[edge["b"]]
+        blocking[:, a, b] = False
+        blocking[:, b, a] = False
+        for direction in edge.get("blocked_directions", []):
+            blocking[direction_index[direction], a, b] = True
+            blocking[direction_index[opposite_direction(direction)], b, a] = True
+    return blocking
+
+
+def plan_disassembly(graph: Dict, base_nodes: Iterable[str] = ()) -> Dict:
+    """
+    求拆卸优先关系和候选装配顺序
+
+    Args:
+        graph: build_contact_graph 的结果（需含 bounds_mm、contact_radius_mm、edges）
+        base_nodes: 基准件的节点名（最后拆卸、最先装配）；为空时取包围盒体积最大的零件
+
+    Returns:
+        {
+            "steps": [{"step": 装配步骤号, "nodes": [节点名, ...]}, ...]（装配顺序，第1步是基准件），
+            "parts": {节点名: {
+                "step": 装配步骤号,
+                "insert_directions": [装配方向, ...]（移出方向的反方向，优先直接离开贴合面的方向；
+                    基准件和强制移出的零件为空），
+                "after": [先于该零件装配的相接触零件, ...],
+                "forced": 是否是为打破死锁强制移出的零件
+            }},
+            "forced": [强制移出的节点名, ...]
+        }
+    """
+    names = list(graph.get("bounds_mm", {}))
+    result = {"steps": [], "parts": {}, "forced": []}
+    if not names:
+        return result
+
+    blocking = _blocking_tensor(graph, names)
+    count = len(names)
+
+    is_base = np.isin(names, list(base_nodes))
+    if not is_base.any():
+        bounds = np.array([graph["bounds_mm"][name] for name in names], dtype=np.float64)
+        is_base[np.prod(bounds[:, 1] - bounds[:, 0], axis=1).argmax()] = True
+
+    # 每个零件的接触零件及其受阻方向
+    position = {name: i for i, name in enumerate(names)}
+    contacts: Dict[int, List] = {i: [] for i in range(count)}
+    neighbours: Dict[int, List[int]] = {i: [] for i in range(count)}
+    direction_index = {direction: d for d, direction in enumerate(DIRECTIONS)}
+    # [方向, i, j]：沿该方向移出时 i 离开与 j 的贴合面（i 在反方向上被 j 顶住）
+    lifting = np.zeros((len(DIRECTIONS), count, count), dtype=bool)
+    for edge in graph.get("edges", []):
+        a, b = position.get(edge["a"]), position.get(edge["b"])
+        if a is None or b is None:
+            continue
+        if edge.get("contact_area_mm2", 0) > 0 or edge.get("inside"):
+            neighbours[a].append(b)
+            neighbours[b].append(a)
+        blocked = edge.get("blocked_directions", [])
+        contacts[a].append((b, blocked))
+        contacts[b].append((a, [opposite_direction(direction) for direction in blocked]))
+        for direction in blocked:
+            lifting[direction_index[opposite_direction(direction)], a, b] = True
+            lifting[direction_index[direction], b, a] = True
+
+    alive = np.ones(count, dtype=bool)
+    blockers = blocking.sum(axis=2)  # (6, n)：每个零件每个方向上剩余的阻挡零件数
+    lifts = lifting.sum(axis=2)  # (6, n)：沿每个方向移出时离开的剩余贴合面数
+    layer = np.zeros(count, dtype=np.int64)
+    free_directions: Dict[int, List[str]] = {}
+    forced = []
+    layers = []
+
+    while alive.any():
+        free = (blockers == 0) & alive
+        removable = free.any(axis=0) & ~is_base
+        # 优先移出能直接离开贴合面的零件（没有剩余贴合面的零件任一方向均可）
+        lifted = (free & (lifts > 0)).any(axis=0) | ~(lifts > 0).any(axis=0)
+        if (removable & lifted).any():
+            removable &= lifted
+        if not removable.any():
+            if not (alive & ~is_base).any():
+                removable = alive.copy()
+            else:
+                # 死锁：移出阻挡方向上剩余阻挡零件最少的零件
+                fewest = np.where(alive & ~is_base, blockers.min(axis=0), np.iinfo(np.int64).max)
+                removable = np.zeros(count, dtype=bool)
+                removable[fewest.argmin()] = True
+                forced.append(int(fewest.argmin()))
+
+        removed = np.flatnonzero(removable)
+        for i in removed.tolist():
+            directions = [direction for d, direction in enumerate(DIRECTIONS) if free[d, i]]
+            # 优先直接离开贴合面的方向（与剩余接触零件的受阻方向相反）
+            leaving = {
+                opposite_direction(direction)
+                for j, blocked in contacts[i] if alive[j] and not removable[j]
+                for direction in blocked
+            }
+            preferred = [direction for direction in directions if direction in leaving]
+            free_directions[i] = (preferred or directions) if (alive & ~removable).any() else []
+        layer[removed] = len(layers)
+        layers.append(removed)
+        alive[removed] = False
+        blockers -= blocking[:, :, removed].sum(axis=2)
+        lifts -= lifting[:, :, removed].sum(axis=2)
+
+    # 拆卸层逆序即装配顺序
+    step = len(layers) - layer
+    result["steps"] = [
+        {"step": number, "nodes": [names[i] for i in removed.tolist()]}
+        for number, removed in enumerate(reversed(layers), start=1)
+    ]
+    result["parts"] = {
+        names[i]: {
+            "step": int(step[i]),
+            "insert_directions": [opposite_direction(direction) for direction in free_directions[i]],
+            "after": sorted({names[j] for j in neighbours[i] if step[j] < step[i]}),
+            "forced": i in forced
+        }
+        for i in range(count)
+    }
+    result["forced"] = [names[i] for i in forced]
+    return result
+
+
+def candidate_sequence(plan: Dict, bom_to_mesh: Dict[str, List[str]]) -> List[Dict]:
+    """
+    把装配顺序换成BOM代号（附到装配规划上给装配Agent）
+
+    同一BOM代号的多个零件归到其最早的装配步骤；没有匹配到BOM的零件不出现
+
+    Args:
+        plan: plan_disassembly 的结果
+        bom_to_mesh: {BOM代号: [节点名, ...]}
+
+    Returns:
+        [{"step": 步骤号, "parts": [{"bom_code", "count", "insert_directions", "after", "forced"}]}, ...]，
+        步骤号从1连续编号
+    """
+    parts = plan.get("parts", {})
+    node_to_bom = {
+        node: bom_code for bom_code, nodes in bom_to_mesh.items() for node in nodes if node in parts
+    }
+
+    entries: Dict[str, Dict] = {}
+    for bom_code, nodes in bom_to_mesh.items():
+        nodes = [node for node in nodes if node in parts]
+        if not nodes:
+            continue
+        first = min(nodes, key=lambda node: parts[node]["step"])
+        entries[bom_code] = {
+            "bom_code": bom_code,
+            "count": len(nodes),
+            "step": parts[first]["step"],
+            "insert_directions": parts[first]["insert_directions"],
+            "after": sorted({
+                node_to_bom[other] for node in nodes for other in parts[node]["after"]
+                if other in node_to_bom and node_to_bom[other] != bom_code
+            }),
+            "forced": any(parts[node]["forced"] for node in nodes)
+        }
+
+    sequence: List[Dict] = []
+    for original_step in sorted({entry["step"] for entry in entries.values()}):
+        sequence.append({
+            "step": len(sequence) + 1,
+            "parts": [
+                {key: value for key, value in entry.items() if key != "step"}
+                for entry in entries.values() if entry["step"] == original_step
+            ]
+        })
+    return sequence
+
+
+def format_candidate_sequence(sequence: Optional[List[Dict]]) -> str:
+    """候选装配顺序的文字说明（写入装配Agent的提示词）"""
+    lines = []
+    for step in sequence or []:
+        descriptions = []
+        for part in step["parts"]:
+            text = part["bom_code"] + (f" ×{part['count']}" if part["count"] > 1 else "")
+            if part["insert_directions"]:
+                text += f"（沿{'/'.join(part['insert_directions'])}装入）"
+            if part["forced"]:
+                text += "（无直线装入路径，需核对）"
+            descriptions.append(text)
+        lines.append(f"{step['step']}. " + "；".join(descriptions))
+    return "\n".join(lines)
+
+
+def check_stacked_parts() -> Dict:
+    """
+    回归检查：底板上放垫块、垫块上放压板
+
+    垫块在压板还在时也能横向滑出，但必须在压板之前装配（不能与压板并为同一步）
+
+    Returns:
+        plan_disassembly 的结果
+
+    Raises:
+        AssertionError: 装配顺序不是 底板 → 垫块 → 压板
+    """
+    import trimesh
+
+    from processors.spatial_index import build_contact_graph
+
+    boxes = {
+        "plate": ([100, 100, 10], [0, 0, 5]),
+        "block": ([40, 40, 20], [0, 0, 20]),
+        "pad": ([20, 20, 5], [0, 0, 32.5])
+    }
+    geometries, nodes = {}, []
+    for name, (extents, center) in boxes.items():
+        mesh = trimesh.creation.box(extents=extents)
+        geometries[name] = (np.asarray(mesh.vertices), np.asarray(mesh.faces))
+        nodes.append((name, name, trimesh.transformations.translation_matrix(center)))
+
+    plan = plan_disassembly(build_contact_graph(geometries, nodes))
+    order = [step["nodes"] for step in plan["steps"]]
+    assert order == [["plate"], ["block"], ["pad"]], f"叠放零件的装配顺序错误: {order}"
+    assert plan["parts"]["pad"]["insert_directions"] == ["-z"], plan["parts"]["pad"]
+    return plan
+
+
+if __name__ == "__main__":
+    result = check_stacked_parts()
+    for step in result["steps"]:
+        directions = {name: result["parts"][name]["insert_directions"] for name in step["nodes"]}
+        print(f"{step['step']}. {directions}")
+    print("✅ 叠放零件按 底板 → 垫块 → 压板 装配")
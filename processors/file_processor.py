@@ -9,11 +9,19 @@ import json
 import tempfile
 import subprocess
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Optional, Sequence, Tuple, Union
 from datetime import datetime
 import fitz  # PyMuPDF
 from PIL import Image
 
+from config import FILE_CONFIG
+from utils.render_cache import get_render_cache
+from utils.glb_cache import get_glb_cache
+from processors.glb_lod import generate_lods, lod_files, relocate_manifest, write_manifest
+from processors.glb_compact import compact_glb
+from processors.part_descriptors import compute_descriptors, glb_geometry_nodes, scene_geometry_nodes
+from processors.spatial_index import build_contact_graph, contact_groups
+
 
 class PDFProcessor:
     """PDF文件处理器"""
@@ -27,44 +35,28 @@ class PDFProcessor:
         """
         self.dpi = dpi
     
-    def pdf_to_images(self, pdf_path: str, output_dir: Optional[str] = None) -> List[str]:
+    def pdf_to_images(
+        self,
+        pdf_path: str,
+        output_dir: Optional[str] = None,
+        progress_callback: Optional[Callable[[int, int, int], None]] = None
+    ) -> List[str]:
         """
         将PDF转换为高分辨率图片
         
         Args:
             pdf_path: PDF文件路径
-            output_dir: 输出目录，如果不指定则使用临时目录
+            output_dir: 输出目录，如果不指定则直接返回渲染缓存中的图片（只读使用）
+            progress_callback: 每页就绪后调用 (已完成页数, 总页数, 页码)
             
         Returns:
             生成的图片文件路径列表
         """
-        if output_dir is None:
-            output_dir = tempfile.mkdtemp()
-        
-        output_dir = Path(output_dir)
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 打开PDF文件
-        pdf_document = fitz.open(pdf_path)
-        image_paths = []
-        
-        try:
-            for page_num in range(len(pdf_document)):
-                page = pdf_document[page_num]
-                
-                # 设置渲染参数
-                mat = fitz.Matrix(self.dpi / 72, self.dpi / 72)  # 缩放矩阵
-                pix = page.get_pixmap(matrix=mat)
-                
-                # 保存图片
-                image_path = output_dir / f"page_{page_num + 1:03d}.png"
-                pix.save(str(image_path))
-                image_paths.append(str(image_path))
-                
-                print(f"已转换第 {page_num + 1}/{len(pdf_document)} 页")
-        
-        finally:
-            pdf_document.close()
+        # 从共享渲染缓存取得（同一页面每个DPI只渲染一次）
+        image_paths = get_render_cache().render_pdf(
+            pdf_path, self.dpi, output_dir=output_dir, progress_callback=progress_callback
+        )
+        print(f"已转换 {len(image_paths)} 页")
         
         return image_paths
     
@@ -101,14 +93,40 @@ class PDFProcessor:
 class ModelProcessor:
     """3D模型文件处理器"""
 
-    def __init__(self, blender_path: Optional[str] = None):
+    # 转换逻辑（零件信息格式、场景结构）变化时递增，使旧的GLB缓存失效
+    CONVERTER_VERSION = 3
+
+    # 由OpenCASCADE（cascadio）细分的格式
+    STEP_SUFFIXES = (".step", ".stp")
+
+    # 模型长度单位 → 毫米（cascadio细分的STEP为米，其它格式按毫米）
+    STEP_LENGTH_TO_MM = 1000.0
+
+    def __init__(
+        self,
+        blender_path: Optional[str] = None,
+        tessellation: Optional[Union[str, Dict]] = None,
+        lod_ratios: Optional[Sequence[float]] = None
+    ):
         """
         初始化3D模型处理器
 
         Args:
             blender_path: Blender可执行文件路径（保留兼容性，但优先使用trimesh）
+            tessellation: STEP曲面细分精度，预设名（preview/standard/fine）或
+                {"tol_linear": ..., "tol_angular": ...}，默认 FILE_CONFIG["model"]["tessellation"]
+            lod_ratios: 多级细节的三角形比例（如 [1.0, 0.25, 0.05]），空列表表示不生成；
+                默认在 FILE_CONFIG["model"]["generate_lods"] 开启时使用 FILE_CONFIG["model"]["lod_ratios"]
         """
         self.blender_path = blender_path or os.getenv("BLENDER_EXE", "blender")
+        self.tessellation = self.resolve_tessellation(tessellation)
+        if lod_ratios is None:
+            model_config = FILE_CONFIG["model"]
+            lod_ratios = model_config["lod_ratios"] if model_config["generate_lods"] else []
+        self.lod_ratios = [float(ratio) for ratio in lod_ratios]
+        self.compact = FILE_CONFIG["model"]["compact_glb"]
+        self.share_meshes = FILE_CONFIG["model"]["share_meshes"]
+        self.contact_graph = FILE_CONFIG["model"]["contact_graph"]
 
         # 导入trimesh用于GLB转换
         try:
@@ -118,6 +136,42 @@ class ModelProcessor:
         except ImportError:
             self.trimesh = None
             self.use_trimesh = False
+
+        # 本处理器转换出的场景（生成爆炸数据时复用，不再重新读取GLB）
+        self._scenes = {}
+
+        # cascadio直接输出GLB（STEP直通路径）
+        try:
+            import cascadio
+            self.cascadio = cascadio
+        except ImportError:
+            self.cascadio = None
+
+    @staticmethod
+    def resolve_tessellation(tessellation: Optional[Union[str, Dict]] = None) -> Dict:
+        """
+        细分精度 → {"tol_linear": 弦高误差, "tol_angular": 角度误差(弧度)}
+
+        Args:
+            tessellation: 预设名或参数字典，None时使用配置默认值
+        """
+        model_config = FILE_CONFIG["model"]
+        presets = model_config["tessellation_presets"]
+        tessellation = tessellation or model_config["tessellation"]
+        if isinstance(tessellation, str):
+            if tessellation not in presets:
+                raise ValueError(f"未知的细分精度: {tessellation}（可选: {', '.join(presets)}）")
+            tessellation = presets[tessellation]
+        return {
+            "tol_linear": float(tessellation["tol_linear"]),
+            "tol_angular": float(tessellation["tol_angular"])
+        }
+
+    def _conversion_method(self, step_path: str) -> str:
+        if str(step_path).lower().endswith(self.STEP_SUFFIXES):
+            if self.cascadio is not None and self.use_trimesh and FILE_CONFIG["model"]["glb_passthrough"]:
+                return "cascadio"
+        return "trimesh" if self.use_trimesh else "blender"
     
     def step_to_glb(
         self,
@@ -134,12 +188,192 @@ class ModelProcessor:
             scale_factor: 缩放因子
 
         Returns:
-            转换结果信息
+            转换结果信息（命中转换缓存时带 "cached": True；生成LOD时带 "lods" 清单）
         """
-        if self.use_trimesh:
-            return self._convert_with_trimesh(step_path, output_path, scale_factor)
+        # 相同内容、相同参数的文件直接复用缓存的GLB和零件信息
+        glb_cache = get_glb_cache()
+        settings = self.conversion_settings(step_path)
+        cached = glb_cache.get(step_path, output_path, scale_factor, settings)
+        if cached is not None:
+            print(f"   ♻️ 复用GLB转换缓存: {os.path.basename(step_path)}")
+            if cached.get("lods"):
+                cached["lods"] = relocate_manifest(cached["lods"], output_path)
+                write_manifest(output_path, cached["lods"])
+            return cached
+
+        method = settings["method"]
+        if method == "cascadio":
+            result = self._convert_with_cascadio(step_path, output_path, scale_factor)
+        elif method == "trimesh":
+            result = self._convert_with_trimesh(step_path, output_path, scale_factor)
         else:
-            return self._convert_with_blender(step_path, output_path, scale_factor)
+            result = self._convert_with_blender(step_path, output_path, scale_factor)
+
+        if result.get("success") and (self.compact or self.share_meshes) and os.path.exists(output_path):
+            result["compaction"] = self._compact_glb(output_path)
+
+        # LOD从压缩后的GLB简化，各级文件写出后同样压缩
+        extra_files = {}
+        if result.get("success") and self.lod_ratios and os.path.exists(output_path):
+            result["lods"] = self._generate_lods(output_path)
+            if result["lods"]:
+                extra_files = lod_files(output_path, result["lods"])
+
+        if result.get("success") and os.path.exists(output_path):
+            try:
+                glb_cache.put(step_path, scale_factor, settings, output_path, result, extra_files)
+            except OSError as e:
+                print(f"   ⚠️ GLB转换缓存写入失败: {e}")
+        return result
+
+    def conversion_settings(self, step_path: str) -> Dict:
+        """影响转换输出的参数（GLB转换缓存键的一部分）"""
+        is_step = str(step_path).lower().endswith(self.STEP_SUFFIXES)
+        return {
+            "method": self._conversion_method(step_path),
+            "tessellation": self.tessellation if is_step else None,
+            "lods": self.lod_ratios or None,
+            "compact": self.compact,
+            "share_meshes": self.share_meshes,
+            "contact_graph": self.contact_graph,
+            "version": self.CONVERTER_VERSION
+        }
+
+    def _generate_lods(self, glb_path: str) -> Optional[Dict]:
+        """生成多级细节GLB并打印每级的三角形数和文件大小；失败时只警告，不影响转换结果"""
+        try:
+            postprocess = self._compact_glb if (self.compact or self.share_meshes) else None
+            manifest = generate_lods(glb_path, self.lod_ratios, postprocess=postprocess)
+        except Exception as e:
+            print(f"   ⚠️ LOD生成失败: {e}")
+            return None
+
+        for level in manifest["levels"]:
+            print(f"   🔻 LOD{level['level']} ({level['ratio']:.0%}): "
+                  f"{level['triangles']} 三角形, {level['bytes'] / 1024:.1f} KB → {level['file']}")
+        return manifest
+
+    def _compact_glb(self, glb_path: str) -> Optional[Dict]:
+        """
+        压缩输出GLB的几何数据（重复网格共享、焊接、删除退化三角形、量化）
+
+        Returns:
+            压缩统计；不适合压缩或失败时返回None（文件保持原样）
+        """
+        try:
+            stats = compact_glb(glb_path, quantize=self.compact, share_meshes=self.share_meshes)
+        except Exception as e:
+            print(f"   ⚠️ GLB压缩失败: {e}")
+            return None
+
+        if stats:
+            print(f"   🗜️ GLB压缩: {stats['bytes_before'] / 1024:.1f} KB → {stats['bytes_after'] / 1024:.1f} KB, "
+                  f"顶点 {stats['vertices_before']} → {stats['vertices_after']}, "
+                  f"三角形 {stats['triangles_before']} → {stats['triangles_after']}")
+            if stats["instanced_nodes"]:
+                print(f"   🔩 重复零件共用网格: {stats['instanced_nodes']} 个节点, "
+                      f"网格 {stats['meshes_before']} → {stats['meshes_after']}")
+        return stats
+
+    def _analyze_geometry(
+        self,
+        geometries: Dict,
+        nodes: List[Tuple],
+        length_scale: float
+    ) -> Tuple[Dict[str, Dict], Optional[Dict]]:
+        """
+        计算零件几何描述和接触图（毫米）
+
+        Returns:
+            ({节点名: 几何描述}, 接触图)；未开启或计算失败时接触图为None
+        """
+        descriptors = compute_descriptors(geometries, nodes, length_scale)
+        if not self.contact_graph:
+            return descriptors, None
+
+        try:
+            graph = build_contact_graph(geometries, nodes, length_scale)
+        except Exception as e:
+            print(f"   ⚠️ 接触图计算失败: {e}")
+            return descriptors, None
+
+        contacts = sum(1 for edge in graph["edges"] if edge["contact_area_mm2"] > 0)
+        print(f"   🧲 接触图: {len(graph['bounds_mm'])} 个零件, {contacts} 处接触")
+        return descriptors, graph
+
+    def _convert_with_cascadio(self, step_path: str, output_path: str, scale_factor: float = 1.0) -> Dict:
+        """
+        STEP直通转换：cascadio按设定精度细分并直接写出GLB
+
+        只改写GLB的JSON块（节点/网格名称唯一化、根节点缩放），几何数据原样保留，
+        零件信息从节点图读取，不再用trimesh解析网格再重新导出。
+        """
+        from processors import glb_io
+
+        try:
+            print(f"   🔄 开始细分STEP文件: {os.path.basename(step_path)} "
+                  f"(弦高 {self.tessellation['tol_linear']:g}, 角度 {self.tessellation['tol_angular']:g})")
+
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                raw_glb = os.path.join(tmp_dir, "converted.glb")
+                self.cascadio.step_to_glb(
+                    str(step_path),
+                    raw_glb,
+                    tol_linear=self.tessellation["tol_linear"],
+                    tol_angular=self.tessellation["tol_angular"],
+                    tol_relative=False,
+                    merge_primitives=True
+                )
+                if not os.path.exists(raw_glb):
+                    raise Exception("STEP文件读取失败，可能包含非标准格式或损坏。建议使用CAD软件重新导出STEP文件（AP214或AP203）")
+                header, binary = glb_io.read_glb(raw_glb)
+
+            nodes = glb_io.mesh_nodes(header)
+            if not nodes:
+                return {
+                    "success": False,
+                    "error": f"文件 {step_path} 不包含任何几何体",
+                    "message": "转换失败"
+                }
+            print(f"   📦 检测到装配体，包含 {len(nodes)} 个零件")
+
+            # 几何描述和接触图按缩放前的模型单位计算（供BOM按质量/尺寸匹配、装配规划）
+            descriptors, contact_graph = self._analyze_geometry(
+                *glb_geometry_nodes(header, binary), self.STEP_LENGTH_TO_MM
+            )
+
+            glb_io.apply_names(header)
+            if scale_factor != 1.0:
+                glb_io.scale_scene(header, scale_factor)
+                print(f"   📏 应用缩放因子: {scale_factor}")
+
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            glb_io.write_glb(output_path, header, binary)
+
+            parts_info = [
+                {"node_name": node_name, "geometry_name": geometry_name, **descriptors.get(node_name, {})}
+                for _, node_name, geometry_name in nodes
+            ]
+            print(f"   📊 提取零件信息: {len(parts_info)} 个零件")
+
+            return {
+                "success": True,
+                "output_path": output_path,
+                "message": "转换成功",
+                "method": "cascadio",
+                "log": f"使用cascadio直接转换 {step_path} -> {output_path}",
+                "tessellation": dict(self.tessellation),
+                "parts_count": len(parts_info),
+                "parts_info": parts_info,
+                "contact_graph": contact_graph
+            }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "message": "cascadio转换失败"
+            }
 
     def _convert_with_trimesh(self, input_path: str, output_path: str, scale_factor: float = 1.0) -> Dict:
         """
@@ -155,8 +389,12 @@ class ModelProcessor:
 
             # 加载模型文件（force='scene'保留装配结构）
             # ✅ 添加错误处理：STEP文件格式问题
+            # STEP细分精度（其它格式忽略这些参数）
+            load_kwargs = {}
+            if str(input_path).lower().endswith(self.STEP_SUFFIXES):
+                load_kwargs = dict(self.tessellation)
             try:
-                mesh = self.trimesh.load(input_path, force='scene')
+                mesh = self.trimesh.load(input_path, force='scene', **load_kwargs)
             except Exception as load_error:
                 # STEP文件格式错误的特殊处理
                 error_str = str(load_error)
@@ -183,6 +421,12 @@ class ModelProcessor:
                 scene = self.trimesh.Scene(mesh)
                 print(f"   📦 单个网格，创建场景")
 
+            # 几何描述和接触图按缩放前的模型单位计算（供BOM按质量/尺寸匹配、装配规划）
+            is_step = str(input_path).lower().endswith(self.STEP_SUFFIXES)
+            descriptors, contact_graph = self._analyze_geometry(
+                *scene_geometry_nodes(scene), self.STEP_LENGTH_TO_MM if is_step else 1.0
+            )
+
             # 应用缩放
             if scale_factor != 1.0:
                 scene.apply_scale(scale_factor)
@@ -193,6 +437,7 @@ class ModelProcessor:
 
             # 导出GLB（保留场景层级）
             glb_data = scene.export(file_type='glb')
+            self._scenes[os.path.abspath(output_path)] = scene
 
             # 写入文件
             with open(output_path, 'wb') as f:
@@ -217,7 +462,8 @@ class ModelProcessor:
 
                     parts_info.append({
                         "node_name": str(node_name),  # 确保是字符串
-                        "geometry_name": geometry_name
+                        "geometry_name": geometry_name,
+                        **descriptors.get(str(node_name), {})
                     })
                 part_count = len(parts_info)
                 print(f"   📊 提取零件信息: {part_count} 个零件")
@@ -238,7 +484,8 @@ class ModelProcessor:
                 "log": f"使用trimesh成功转换 {input_path} -> {output_path}",
                 # "scene": scene,  # ❌ 不能序列化Scene对象！会导致WebSocket错误
                 "parts_count": part_count,
-                "parts_info": parts_info  # 零件信息列表
+                "parts_info": parts_info,  # 零件信息列表
+                "contact_graph": contact_graph  # 零件接触/包含关系（见 processors/spatial_index.py）
             }
 
         except Exception as e:
@@ -252,7 +499,10 @@ class ModelProcessor:
         self,
         glb_path: str,
         assembly_spec: Dict,
-        output_dir: str
+        output_dir: str,
+        scene=None,
+        groups: Optional[Dict[str, str]] = None,
+        contact_graph: Optional[Dict] = None
     ) -> Dict:
         """
         生成爆炸动画数据
@@ -261,15 +511,19 @@ class ModelProcessor:
             glb_path: GLB文件路径
             assembly_spec: 装配规程JSON
             output_dir: 输出目录
+            scene: 已在内存中的trimesh场景；默认复用本处理器转换该GLB时的场景，没有时才读取文件
+            groups: {节点名: 所属组件名}，默认按场景图中的父节点分组
+            contact_graph: 转换结果中的接触图；场景没有装配层级（所有零件都在根节点下）时
+                按接触连通分量分组
 
         Returns:
             包含manifest.json路径和爆炸数据的字典
         """
         try:
-            import numpy as np
-
-            # 加载GLB文件
-            scene = self.trimesh.load(glb_path)
+            if scene is None:
+                scene = self._scenes.get(os.path.abspath(glb_path))
+            if scene is None:
+                scene = self.trimesh.load(glb_path)
 
             if not isinstance(scene, self.trimesh.Scene):
                 # 单个网格，无法分解
@@ -289,52 +543,15 @@ class ModelProcessor:
                     "message": f"只有{len(node_names)}个零件，无法生成爆炸动画"
                 }
 
-            # 计算装配体中心
-            bounds = scene.bounds
-            center = (bounds[0] + bounds[1]) / 2
-
-            # 生成爆炸向量
-            explosion_vectors = {}
-            node_map = {}
-
-            for i, node_name in enumerate(node_names):
-                # 获取节点的变换矩阵
-                transform, geometry_name = scene.graph[node_name]
+            if groups is None and contact_graph:
+                parents = scene.graph.transforms.parents
+                if all(parents.get(name, scene.graph.base_frame) == scene.graph.base_frame for name in node_names):
+                    groups = contact_groups(contact_graph)
 
-                # 获取几何体
-                geometry = scene.geometry[geometry_name]
+            explosion_vectors = self._explosion_vectors(scene, node_names, groups)
 
-                # 计算零件中心
-                part_center = geometry.centroid
-                if transform is not None:
-                    part_center = transform[:3, :3] @ part_center + transform[:3, 3]
-
-                # 计算爆炸方向（从装配体中心指向零件中心）
-                direction = part_center - center
-                distance = np.linalg.norm(direction)
-
-                if distance > 0.001:  # 避免除零
-                    direction = direction / distance
-                else:
-                    # 如果零件在中心，使用随机方向
-                    direction = np.array([
-                        np.cos(i * 2 * np.pi / len(node_names)),
-                        np.sin(i * 2 * np.pi / len(node_names)),
-                        0.5
-                    ])
-                    direction = direction / np.linalg.norm(direction)
-
-                # 爆炸距离（基于装配体尺寸）
-                explosion_distance = np.linalg.norm(bounds[1] - bounds[0]) * 0.5
-
-                explosion_vectors[node_name] = {
-                    "direction": direction.tolist(),
-                    "distance": float(explosion_distance),
-                    "original_position": part_center.tolist()
-                }
-
-                # 创建节点映射
-                node_map[f"part_{i:03d}"] = node_name
+            # 创建节点映射
+            node_map = {f"part_{i:03d}": node_name for i, node_name in enumerate(node_names)}
 
             # 生成manifest.json
             manifest = self._generate_manifest(
@@ -364,6 +581,87 @@ class ModelProcessor:
                 "message": "生成爆炸数据失败"
             }
 
+    @staticmethod
+    def _explosion_vectors(scene, node_names: List[str], groups: Optional[Dict[str, str]] = None) -> Dict:
+        """
+        分层计算爆炸向量（整体向量化，几何体质心和包围盒按几何体只算一次）
+
+        - 组件：从产品中心沿组件中心方向移开，距离为产品包围盒对角线的一半
+        - 零件：从所属组件中心沿零件中心方向移开，距离为组件包围盒对角线的一半
+        只有一个组件时组件不移动，零件相对整个产品径向爆炸（与不分组时相同）
+
+        Returns:
+            {节点名: {"direction", "distance", "original_position", "group"}}
+        """
+        import numpy as np
+
+        count = len(node_names)
+        transforms = np.empty((count, 4, 4))
+        geometry_names = []
+        for i, node_name in enumerate(node_names):
+            transforms[i], geometry_name = scene.graph[node_name]
+            geometry_names.append(geometry_name)
+
+        # 每个几何体的质心和包围盒角点（共用网格的实例只算一次）
+        unique_geometries, geometry_index = np.unique(geometry_names, return_inverse=True)
+        local_centroids = np.array([scene.geometry[name].centroid for name in unique_geometries])
+        local_bounds = np.array([scene.geometry[name].bounds for name in unique_geometries])
+        corner_pattern = (np.arange(8)[:, None] >> np.arange(3)) & 1  # 8个角点各轴取min/max
+        local_corners = local_bounds[:, corner_pattern, np.arange(3)]
+
+        rotations, translations = transforms[:, :3, :3], transforms[:, :3, 3]
+        centers = np.einsum("nij,nj->ni", rotations, local_centroids[geometry_index]) + translations
+        corners = np.einsum("nij,nkj->nki", rotations, local_corners[geometry_index]) + translations[:, None]
+        part_min, part_max = corners.min(axis=1), corners.max(axis=1)
+
+        # 分组：默认取场景图中的父节点
+        if groups is None:
+            parents = scene.graph.transforms.parents
+            groups = {name: parents.get(name, scene.graph.base_frame) for name in node_names}
+        group_names, group_index = np.unique(
+            [groups.get(name, scene.graph.base_frame) for name in node_names], return_inverse=True
+        )
+        group_min = np.full((len(group_names), 3), np.inf)
+        group_max = np.full((len(group_names), 3), -np.inf)
+        np.minimum.at(group_min, group_index, part_min)
+        np.maximum.at(group_max, group_index, part_max)
+        group_centers = (group_min + group_max) / 2
+        group_sizes = np.linalg.norm(group_max - group_min, axis=1)
+
+        product_min, product_max = part_min.min(axis=0), part_max.max(axis=0)
+        product_center = (product_min + product_max) / 2
+        product_size = float(np.linalg.norm(product_max - product_min))
+        min_offset = max(product_size * 1e-3, 1e-12)
+
+        def unit(vectors: np.ndarray) -> np.ndarray:
+            """单位化；长度过小（零件/组件在中心）时按序号在水平圆周上取方向"""
+            length = np.linalg.norm(vectors, axis=1, keepdims=True)
+            angle = np.arange(len(vectors)) * 2 * np.pi / len(vectors)
+            fallback = np.stack([np.cos(angle), np.sin(angle), np.full(len(vectors), 0.5)], axis=1)
+            fallback /= np.linalg.norm(fallback, axis=1, keepdims=True)
+            return np.where(length > min_offset, vectors / np.maximum(length, min_offset), fallback)
+
+        offsets = unit(centers - group_centers[group_index]) * (group_sizes[group_index, None] * 0.5)
+        if len(group_names) > 1:
+            group_offsets = unit(group_centers - product_center) * (product_size * 0.5)
+            offsets += group_offsets[group_index]
+
+        distances = np.linalg.norm(offsets, axis=1)
+        directions = (offsets / np.maximum(distances, 1e-12)[:, None]).tolist()
+        centers = centers.tolist()
+        distances = distances.tolist()
+        node_groups = [str(name) for name in group_names[group_index]]
+
+        return {
+            node_name: {
+                "direction": directions[i],
+                "distance": distances[i],
+                "original_position": centers[i],
+                "group": node_groups[i]
+            }
+            for i, node_name in enumerate(node_names)
+        }
+
     def _generate_manifest(
         self,
         glb_path: str,
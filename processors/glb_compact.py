@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+"""
+GLB几何压缩（转换后处理）
+CAD细分导出的GLB有大量重复顶点、退化三角形，顶点和法线都是float32；
+这里按 KHR_mesh_quantization 重写三角形网格，全部用numpy向量化实现：
+
+- 先让只差刚体变换的重复网格（螺栓、螺母等标准件）共用一个网格（processors/glb_instancing.py）
+- 位置量化为int16（非归一化），每个网格一个反量化变换 D = 平移(包围盒中心) · 均匀缩放(量化步长)，
+  乘到引用该网格的节点变换上（子节点左乘 D⁻¹ 抵消）；均匀缩放保证法线方向不变
+- 法线量化为归一化int8
+- 顶点焊接：量化后位置、法线和其它属性完全相同的顶点合并（容差即半个量化步长，
+  法线不同的硬边顶点不会合并，着色不变）
+- 删除退化三角形（焊接后有重复顶点或量化坐标下面积为0），删除未引用的顶点
+- 顶点数小于65535的图元索引用uint16，否则uint32
+
+节点名称和节点树结构不变，parts_info 和 bom_to_mesh 映射对压缩后的GLB同样有效。
+非三角形图元、带变形目标/蒙皮/稀疏访问器的网格以及多buffer、外部buffer、Draco压缩的GLB原样保留。
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from processors.glb_io import (
+    BYTE, COMPONENT_DTYPES, SHORT, UNSIGNED_INT, UNSIGNED_SHORT,
+    node_matrix, plain_triangle_meshes, read_accessor, read_glb, write_glb
+)
+from processors.glb_instancing import share_duplicate_meshes
+
+
+EXTENSION = "KHR_mesh_quantization"
+
+# 不处理的扩展（已压缩或数据不在GLB二进制块中）
+INCOMPATIBLE_EXTENSIONS = {"KHR_draco_mesh_compression", "EXT_meshopt_compression", EXTENSION}
+
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+# int16位置的量化范围（±32767，保留-32768不用以便对称）
+POSITION_RANGE = 32767
+NORMAL_RANGE = 127
+
+# uint16索引的上限（65535保留给图元重启）
+UINT16_MAX_VERTICES = 65535
+
+
+# ========== 访问器写入 ==========
+
+class _BufferBuilder:
+    """按4字节对齐拼接新的二进制块，生成bufferView和accessor"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.length = 0
+        self.views: List[Dict] = []
+        self.accessors: List[Dict] = []
+
+    def add_view(self, data: bytes, stride: Optional[int] = None, target: Optional[int] = None) -> int:
+        padding = -self.length % 4
+        if padding:
+            self.chunks.append(b"\x00" * padding)
+            self.length += padding
+
+        view = {"buffer": 0, "byteOffset": self.length, "byteLength": len(data)}
+        if stride:
+            view["byteStride"] = stride
+        if target:
+            view["target"] = target
+        self.chunks.append(data)
+        self.length += len(data)
+        self.views.append(view)
+        return len(self.views) - 1
+
+    def add_array(
+        self,
+        array: np.ndarray,
+        accessor_type: str,
+        component_type: int,
+        target: int,
+        normalized: bool = False,
+        with_bounds: bool = False
+    ) -> int:
+        """写入顶点属性或索引；行宽不是4的倍数的顶点属性补齐到4字节步长"""
+        array = np.ascontiguousarray(array, dtype=COMPONENT_DTYPES[component_type])
+        rows = array.reshape(len(array), -1)
+        row_bytes = rows.shape[1] * rows.itemsize
+
+        stride = None
+        if target == ARRAY_BUFFER and row_bytes % 4:
+            stride = row_bytes + (-row_bytes % 4)
+            padded = np.zeros((len(rows), stride), dtype=np.uint8)
+            padded[:, :row_bytes] = rows.view(np.uint8).reshape(len(rows), row_bytes)
+            data = padded.tobytes()
+        else:
+            data = rows.tobytes()
+
+        accessor = {
+            "bufferView": self.add_view(data, stride=stride, target=target),
+            "componentType": component_type,
+            "count": len(rows),
+            "type": accessor_type,
+        }
+        if normalized:
+            accessor["normalized"] = True
+        if with_bounds:
+            accessor["min"] = rows.min(axis=0).tolist()
+            accessor["max"] = rows.max(axis=0).tolist()
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+    def binary(self) -> bytes:
+        return b"".join(self.chunks)
+
+
+# ========== 网格压缩 ==========
+
+def _compact_primitive(
+    header: Dict,
+    binary: bytes,
+    primitive: Dict,
+    center: np.ndarray,
+    step: float
+) -> Tuple[Dict[str, np.ndarray], np.ndarray, int, int]:
+    """
+    量化、焊接并清理一个三角形图元
+
+    Returns:
+        (新属性数组 {属性名: 数组}, 新三角形 (m, 3), 原顶点数, 原三角形数)
+    """
+    attributes = {
+        name: read_accessor(header, binary, accessor)
+        for name, accessor in primitive["attributes"].items()
+    }
+    vertex_count = len(attributes["POSITION"])
+    if "indices" in primitive:
+        faces = read_accessor(header, binary, primitive["indices"]).reshape(-1, 3).astype(np.int64)
+    else:
+        faces = np.arange(vertex_count - vertex_count % 3, dtype=np.int64).reshape(-1, 3)
+    face_count = len(faces)
+
+    attributes["POSITION"] = np.round(
+        (attributes["POSITION"].astype(np.float64) - center) / step
+    ).clip(-POSITION_RANGE, POSITION_RANGE).astype(np.int16)
+    if "NORMAL" in attributes and attributes["NORMAL"].dtype == np.float32:
+        normals = attributes["NORMAL"].astype(np.float64)
+        length = np.linalg.norm(normals, axis=1, keepdims=True)
+        normals = np.divide(normals, length, out=np.zeros_like(normals), where=length > 0)
+        attributes["NORMAL"] = np.round(normals * NORMAL_RANGE).astype(np.int8)
+
+    # 焊接：所有属性的字节完全相同的顶点合并
+    names = sorted(attributes)
+    keys = np.concatenate(
+        [attributes[name].view(np.uint8).reshape(vertex_count, -1) for name in names], axis=1
+    )
+    keys = np.ascontiguousarray(keys).view(np.dtype((np.void, keys.shape[1]))).reshape(-1)
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    faces = inverse.reshape(-1)[faces]
+
+    # 退化三角形：重复顶点或量化坐标下面积为0
+    positions = attributes["POSITION"][first].astype(np.int64)
+    tri = positions[faces]
+    area = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    keep = (
+        (faces[:, 0] != faces[:, 1])
+        & (faces[:, 1] != faces[:, 2])
+        & (faces[:, 0] != faces[:, 2])
+        & area.any(axis=1)
+    )
+    if keep.any():  # 全部退化时保留原三角形（图元不能为空）
+        faces = faces[keep]
+
+    # 去掉未引用的顶点（保持首次出现的顺序，索引更集中）
+    used, remap = np.unique(faces, return_inverse=True)
+    faces = remap.reshape(-1, 3)
+    source = first[used]
+    return {name: attributes[name][source] for name in names}, faces, vertex_count, face_count
+
+
+# ========== 节点变换 ==========
+
+def _apply_dequantization(node: Dict, center: np.ndarray, step: float):
+    """节点变换右乘 D = 平移(center) · 缩放(step)"""
+    if "matrix" in node:
+        dequantize = np.eye(4)
+        dequantize[:3, :3] *= step
+        dequantize[:3, 3] = center
+        node["matrix"] = (node_matrix(node) @ dequantize).T.reshape(-1).tolist()
+        return
+
+    # TRS形式：T·R·S·T(c)·S(s) = T(t + R(S⊙c))·R·S(S·s)
+    scale = np.array(node.get("scale", [1.0, 1.0, 1.0]))
+    rotation = node_matrix({"rotation": node.get("rotation", [0.0, 0.0, 0.0, 1.0])})[:3, :3]
+    node["translation"] = (np.array(node.get("translation", [0.0, 0.0, 0.0])) + rotation @ (scale * center)).tolist()
+    node["scale"] = (scale * step).tolist()
+
+
+def _compensate_child(node: Dict, center: np.ndarray, step: float):
+    """子节点变换左乘 D⁻¹ = 缩放(1/step) · 平移(-center)，保持子节点世界变换不变"""
+    if "matrix" in node:
+        inverse = np.eye(4)
+        inverse[:3, :3] /= step
+        inverse[:3, 3] = -center / step
+        node["matrix"] = (inverse @ node_matrix(node)).T.reshape(-1).tolist()
+        return
+
+    node["translation"] = ((np.array(node.get("translation", [0.0, 0.0, 0.0])) - center) / step).tolist()
+    node["scale"] = (np.array(node.get("scale", [1.0, 1.0, 1.0])) / step).tolist()
+
+
+# ========== 重建GLB ==========
+
+def _referenced_accessors(header: Dict, compacted: set) -> List[int]:
+    """压缩后仍被引用的旧访问器（未压缩的网格、蒙皮、动画）"""
+    referenced = set()
+    for index, mesh in enumerate(header.get("meshes", [])):
+        if index in compacted:
+            continue
+        for primitive in mesh.get("primitives", []):
+            referenced.update(primitive.get("attributes", {}).values())
+            if "indices" in primitive:
+                referenced.add(primitive["indices"])
+            for target in primitive.get("targets", []):
+                referenced.update(target.values())
+    for skin in header.get("skins", []):
+        if "inverseBindMatrices" in skin:
+            referenced.add(skin["inverseBindMatrices"])
+    for animation in header.get("animations", []):
+        for sampler in animation.get("samplers", []):
+            referenced.update((sampler["input"], sampler["output"]))
+    return sorted(referenced)
+
+
+def _copy_old_data(header: Dict, binary: bytes, builder: _BufferBuilder, compacted: set) -> Dict[int, int]:
+    """把仍被引用的旧访问器和图片原样复制到新buffer，返回旧访问器序号 → 新序号"""
+    old_views = header.get("bufferViews", [])
+    view_map: Dict[int, int] = {}
+
+    def copy_view(index: int) -> int:
+        if index not in view_map:
+            view = old_views[index]
+            start = view.get("byteOffset", 0)
+            new_index = builder.add_view(
+                binary[start: start + view["byteLength"]],
+                stride=view.get("byteStride"),
+                target=view.get("target")
+            )
+            for key in ("name", "extensions", "extras"):
+                if key in view:
+                    builder.views[new_index][key] = view[key]
+            view_map[index] = new_index
+        return view_map[index]
+
+    accessor_map = {}
+    for index in _referenced_accessors(header, compacted):
+        accessor = dict(header["accessors"][index])
+        if "bufferView" in accessor:
+            accessor["bufferView"] = copy_view(accessor["bufferView"])
+        if "sparse" in accessor:
+            sparse = {**accessor["sparse"]}
+            sparse["indices"] = {**sparse["indices"], "bufferView": copy_view(sparse["indices"]["bufferView"])}
+            sparse["values"] = {**sparse["values"], "bufferView": copy_view(sparse["values"]["bufferView"])}
+            accessor["sparse"] = sparse
+        builder.accessors.append(accessor)
+        accessor_map[index] = len(builder.accessors) - 1
+
+    for image in header.get("images", []):
+        if "bufferView" in image:
+            image["bufferView"] = copy_view(image["bufferView"])
+    return accessor_map
+
+
+def compact_glb(
+    glb_path: str,
+    output_path: Optional[str] = None,
+    quantize: bool = True,
+    share_meshes: bool = True
+) -> Optional[Dict]:
+    """
+    压缩GLB几何数据（重复网格共享、焊接、删除退化三角形、KHR_mesh_quantization量化、uint16索引）
+
+    Args:
+        glb_path: 输入GLB
+        output_path: 输出GLB，默认覆盖输入文件
+        quantize: 是否焊接、量化三角形网格
+        share_meshes: 是否让只差刚体变换的重复网格共用一个网格（见 processors/glb_instancing.py）
+
+    Returns:
+        统计信息 {"bytes_before", "bytes_after", "vertices_before", "vertices_after",
+        "triangles_before", "triangles_after", "meshes_before", "meshes_after", "instanced_nodes"}；
+        GLB不适合压缩时返回None（文件不变）
+    """
+    output_path = output_path or glb_path
+    header, binary = read_glb(glb_path)
+
+    buffers = header.get("buffers", [])
+    used_extensions = set(header.get("extensionsUsed", []))
+    if len(buffers) != 1 or "uri" in buffers[0] or used_extensions & INCOMPATIBLE_EXTENSIONS:
+        return None
+
+    meshes_before = len(header.get("meshes", []))
+    shared = share_duplicate_meshes(header, binary) if share_meshes else None
+
+    mesh_indices = plain_triangle_meshes(header) if quantize else []
+    if not mesh_indices and not shared:
+        return None
+    compacted = set(mesh_indices)
+
+    builder = _BufferBuilder()
+    accessor_map = _copy_old_data(header, binary, builder, compacted)
+    stats = {
+        "bytes_before": os.path.getsize(glb_path),
+        "vertices_before": 0, "vertices_after": 0,
+        "triangles_before": 0, "triangles_after": 0,
+        "meshes_before": meshes_before,
+        "meshes_after": len(header.get("meshes", [])),
+        "instanced_nodes": shared["instanced_nodes"] if shared else 0
+    }
+
+    # 未压缩网格的访问器重新编号
+    for index, mesh in enumerate(header.get("meshes", [])):
+        if index in compacted:
+            continue
+        for primitive in mesh.get("primitives", []):
+            primitive["attributes"] = {k: accessor_map[v] for k, v in primitive.get("attributes", {}).items()}
+            if "indices" in primitive:
+                primitive["indices"] = accessor_map[primitive["indices"]]
+            if "targets" in primitive:
+                primitive["targets"] = [{k: accessor_map[v] for k, v in t.items()} for t in primitive["targets"]]
+    for skin in header.get("skins", []):
+        if "inverseBindMatrices" in skin:
+            skin["inverseBindMatrices"] = accessor_map[skin["inverseBindMatrices"]]
+    for animation in header.get("animations", []):
+        for sampler in animation.get("samplers", []):
+            sampler["input"] = accessor_map[sampler["input"]]
+            sampler["output"] = accessor_map[sampler["output"]]
+
+    dequantization = {}
+    for index in mesh_indices:
+        mesh = header["meshes"][index]
+
+        # 整个网格共用一个反量化变换（节点变换作用于所有图元）
+        bounds = np.array([
+            [header["accessors"][p["attributes"]["POSITION"]].get(key) or [np.nan] * 3 for key in ("min", "max")]
+            for p in mesh["primitives"]
+        ], dtype=np.float64)
+        if np.isnan(bounds).any():
+            positions = [read_accessor(header, binary, p["attributes"]["POSITION"]) for p in mesh["primitives"]]
+            bounds = np.array([[pos.min(axis=0), pos.max(axis=0)] for pos in positions if len(pos)])
+        low, high = bounds[:, 0].min(axis=0), bounds[:, 1].max(axis=0)
+        center = (low + high) / 2
+        step = float((high - low).max() / 2 / POSITION_RANGE) or 1.0
+        dequantization[index] = (center, step)
+
+        for primitive in mesh["primitives"]:
+            attributes, faces, vertex_count, face_count = _compact_primitive(
+                header, binary, primitive, center, step
+            )
+            stats["vertices_before"] += vertex_count
+            stats["triangles_before"] += face_count
+            stats["vertices_after"] += len(attributes["POSITION"])
+            stats["triangles_after"] += len(faces)
+
+            new_attributes = {}
+            for name, values in attributes.items():
+                old = header["accessors"][primitive["attributes"][name]]
+                if name == "POSITION":
+                    new_attributes[name] = builder.add_array(values, "VEC3", SHORT, ARRAY_BUFFER, with_bounds=True)
+                elif name == "NORMAL" and values.dtype == np.int8:
+                    new_attributes[name] = builder.add_array(values, "VEC3", BYTE, ARRAY_BUFFER, normalized=True)
+                else:
+                    new_attributes[name] = builder.add_array(
+                        values, old["type"], old["componentType"], ARRAY_BUFFER,
+                        normalized=old.get("normalized", False)
+                    )
+            primitive["attributes"] = new_attributes
+
+            index_type = UNSIGNED_SHORT if len(attributes["POSITION"]) < UINT16_MAX_VERTICES else UNSIGNED_INT
+            primitive["indices"] = builder.add_array(faces.reshape(-1), "SCALAR", index_type, ELEMENT_ARRAY_BUFFER)
+
+    # 反量化变换写入节点
+    nodes = header.get("nodes", [])
+    for node in nodes:
+        if node.get("mesh") in dequantization:
+            center, step = dequantization[node["mesh"]]
+            _apply_dequantization(node, center, step)
+            for child in node.get("children", []):
+                _compensate_child(nodes[child], center, step)
+
+    header["accessors"] = builder.accessors
+    header["bufferViews"] = builder.views
+    new_binary = builder.binary()
+    buffers[0]["byteLength"] = len(new_binary)
+    if compacted:
+        for key in ("extensionsUsed", "extensionsRequired"):
+            if EXTENSION not in header.setdefault(key, []):
+                header[key].append(EXTENSION)
+
+    write_glb(output_path, header, new_binary)
+    stats["bytes_after"] = os.path.getsize(output_path)
+    return stats
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+STEP → GLB 并行转换
+每个文件在独立子进程中转换，单个文件卡死或内存失控不会拖住整个任务
+
+- 每个子进程有墙钟超时（超时即终止进程）和内存上限（Unix下 RLIMIT_AS）
+- 按文件大小从大到小调度，产品总装这类大文件最先开始，与组件并行
+- 转换结果按完成顺序逐个产出，调用方可以边转换边做BOM匹配
+- 启动子进程前先查GLB转换缓存（utils/glb_cache.py），命中的文件不再加载STEP，
+  在未命中文件的子进程启动之后产出（调用方处理命中结果时转换已在进行）
+"""
+
+import os
+import time
+import multiprocessing
+from multiprocessing.connection import wait
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from config import PERFORMANCE_CONFIG
+from processors.file_processor import ModelProcessor
+from utils.glb_cache import get_glb_cache
+
+try:
+    import resource  # 仅Unix
+except ImportError:
+    resource = None
+
+
+# 子进程使用spawn启动（调用方可能持有线程/锁，fork不安全）
+_mp_context = multiprocessing.get_context("spawn")
+
+
+class ConversionJob(NamedTuple):
+    """一个待转换的STEP文件"""
+    key: str  # 调用方用于识别结果的标识（如组件序号）
+    step_path: str
+    output_path: str
+    scale_factor: float = 1.0
+    tessellation: Optional[str] = None  # 细分精度预设，None时使用配置默认值
+
+
+def _limit_memory(memory_limit: Optional[int]):
+    """限制当前进程的虚拟内存（不支持的平台上忽略）"""
+    if not memory_limit or resource is None:
+        return
+    try:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            memory_limit = min(memory_limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _convert_worker(conn, job: ConversionJob, memory_limit: Optional[int]):
+    """子进程入口：转换单个文件，结果通过管道发回"""
+    _limit_memory(memory_limit)
+    try:
+        processor = ModelProcessor(tessellation=job.tessellation)
+        result = processor.step_to_glb(job.step_path, job.output_path, scale_factor=job.scale_factor)
+    except MemoryError:
+        result = {"success": False, "error": "转换超出内存上限", "message": "转换失败"}
+    except Exception as e:
+        result = {"success": False, "error": str(e), "message": "转换失败"}
+    conn.send(result)
+    conn.close()
+
+
+def _failure(error: str) -> Dict:
+    return {"success": False, "error": error, "message": "转换失败"}
+
+
+def _receive(conn, process) -> Dict:
+    """读取已结束子进程的结果并回收进程"""
+    try:
+        result = conn.recv()
+    except (EOFError, OSError):
+        process.join()
+        result = _failure(f"转换进程异常退出（退出码 {process.exitcode}），可能超出内存上限")
+    conn.close()
+    process.join()
+    return result
+
+
+def iter_convert_step_files(
+    jobs: Iterable[ConversionJob],
+    max_workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None
+) -> Iterator[Tuple[ConversionJob, Dict]]:
+    """
+    并行转换STEP文件，按完成顺序产出结果
+
+    Args:
+        jobs: 待转换文件
+        max_workers: 同时运行的子进程数，默认 PERFORMANCE_CONFIG["convert_workers"]
+        timeout: 单个文件的墙钟超时（秒），默认 PERFORMANCE_CONFIG["convert_timeout"]
+        memory_limit: 单个子进程的内存上限（字节），默认 PERFORMANCE_CONFIG["convert_memory_limit"]
+
+    Yields:
+        (转换任务, ModelProcessor.step_to_glb 的结果字典)；超时或子进程异常退出时
+        结果为 {"success": False, "error": ...}
+    """
+    max_workers = max(1, max_workers or PERFORMANCE_CONFIG["convert_workers"])
+    timeout = timeout or PERFORMANCE_CONFIG["convert_timeout"]
+    memory_limit = PERFORMANCE_CONFIG["convert_memory_limit"] if memory_limit is None else memory_limit
+
+    # 缓存命中的文件不需要转换
+    glb_cache = get_glb_cache()
+    hits, misses = [], []
+    for job in jobs:
+        settings = ModelProcessor(tessellation=job.tessellation).conversion_settings(job.step_path)
+        cached = glb_cache.get(job.step_path, job.output_path, job.scale_factor, settings)
+        if cached is not None:
+            hits.append((job, cached))
+        else:
+            misses.append(job)
+
+    # 大文件先开始
+    pending = sorted(
+        misses,
+        key=lambda job: os.path.getsize(job.step_path) if os.path.exists(job.step_path) else 0,
+        reverse=True
+    )
+
+    running = {}  # 父进程端连接 → (任务, 子进程, 开始时间)
+    try:
+        while pending or running or hits:
+            while pending and len(running) < max_workers:
+                job = pending.pop(0)
+                parent_conn, child_conn = _mp_context.Pipe(duplex=False)
+                process = _mp_context.Process(
+                    target=_convert_worker,
+                    args=(child_conn, job, memory_limit),
+                    daemon=True
+                )
+                process.start()
+                child_conn.close()
+                running[parent_conn] = (job, process, time.monotonic())
+
+            # 子进程已经开始转换，再产出缓存命中的结果（调用方可能在每个结果上做耗时的匹配）
+            while hits:
+                yield hits.pop(0)
+            if not running:
+                continue
+
+            # 等到有结果或最早的任务超时
+            now = time.monotonic()
+            next_deadline = min(start + timeout for _, _, start in running.values())
+            ready = set(wait(list(running), timeout=max(0.0, next_deadline - now)))
+
+            # 先收取所有结果再产出：产出期间调用方可能很久才回来，
+            # 其间完成的子进程结果已在管道中（poll为真），不能当作超时终止
+            finished = []
+            now = time.monotonic()
+            for conn, (job, process, start) in list(running.items()):
+                if conn in ready or conn.poll():
+                    running.pop(conn)
+                    finished.append((job, _receive(conn, process)))
+                elif now - start >= timeout:
+                    running.pop(conn)
+                    process.terminate()
+                    process.join()
+                    conn.close()
+                    finished.append((job, _failure(f"转换超时（超过 {timeout:g} 秒）")))
+
+            for job, result in finished:
+                yield job, result
+    finally:
+        # 调用方提前结束迭代时清理子进程
+        for conn, (_, process, _) in running.items():
+            process.terminate()
+            process.join()
+            conn.close()
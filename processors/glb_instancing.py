@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+重复几何体检测与网格共享
+装配体里成百上千个相同的螺栓、螺母、垫片、销（GB/T 889.1、DIN 11023 等）在导出的GLB中
+各自是一个网格；这里找出只差一个刚体变换的网格，让这些节点引用同一个网格
+
+- 指纹（与位姿无关）：图元结构（顶点数、索引数、材质）、主轴方向的尺寸、
+  排序后的边长哈希、体积；指纹相同的网格再逐顶点用Kabsch算法求刚体变换并验证误差
+- 重复网格的节点改为引用代表网格，节点变换右乘该刚体变换（子节点左乘逆变换抵消），
+  节点名称不变，BOM映射（按节点名）不受影响
+- 只用共享网格引用，不用 EXT_mesh_gpu_instancing：该扩展把多个实例合并成一个节点，
+  实例就没有各自的节点名了
+- 镜像件（左右件）不是刚体变换，不会合并
+"""
+
+import hashlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from processors.glb_io import node_matrix, plain_triangle_meshes, read_accessor, set_node_matrix
+
+
+# 指纹中尺寸、边长、体积的量化精度（相对于网格尺度：顶点到质心的最大距离）
+FINGERPRINT_PRECISION = 1e-3
+
+# 边长哈希的取样数
+EDGE_SAMPLES = 16
+
+# 刚体变换验证：顶点最大误差（相对于网格尺度）和法线最大误差
+POSITION_TOLERANCE = 1e-5
+NORMAL_TOLERANCE = 1e-3
+
+
+class _MeshData:
+    """一个网格所有图元的顶点数据（按图元顺序拼接）"""
+
+    def __init__(self, header: Dict, binary: bytes, mesh: Dict):
+        self.signature = []
+        self.positions = []
+        self.normals = []
+        self.faces = []
+        self.others = []
+
+        offset = 0
+        for primitive in mesh["primitives"]:
+            attributes = primitive["attributes"]
+            positions = read_accessor(header, binary, attributes["POSITION"]).astype(np.float64)
+            if "indices" in primitive:
+                faces = read_accessor(header, binary, primitive["indices"]).reshape(-1, 3).astype(np.int64)
+            else:
+                faces = np.arange(len(positions) - len(positions) % 3, dtype=np.int64).reshape(-1, 3)
+
+            self.signature.append((
+                len(positions), len(faces), primitive.get("material"), tuple(sorted(attributes))
+            ))
+            self.positions.append(positions)
+            if "NORMAL" in attributes:
+                self.normals.append(read_accessor(header, binary, attributes["NORMAL"]).astype(np.float64))
+            self.faces.append(faces + offset)
+            self.others.append(b"".join(
+                read_accessor(header, binary, attributes[name]).tobytes()
+                for name in sorted(attributes) if name not in ("POSITION", "NORMAL")
+            ))
+            offset += len(positions)
+
+        self.signature = tuple(self.signature)
+        self.positions = np.concatenate(self.positions)
+        self.normals = np.concatenate(self.normals) if self.normals else None
+        self.faces = np.concatenate(self.faces)
+        # 尺度用顶点到质心的最大距离（与位姿无关，不能用轴对齐包围盒）
+        self.centroid = self.positions.mean(axis=0)
+        self.radius = float(np.linalg.norm(self.positions - self.centroid, axis=1).max())
+
+    def fingerprint(self) -> Tuple:
+        """与位姿无关的指纹（各项量化后比较，真正是否相同由 _rigid_transform 逐顶点验证）"""
+        scale = self.radius or 1.0
+
+        def quantize(values) -> Tuple:
+            return tuple(np.round(np.atleast_1d(values) / scale / FINGERPRINT_PRECISION).astype(np.int64))
+
+        # 主轴坐标系下的尺寸：协方差特征值（对旋转对称的零件也唯一，不依赖主轴朝向）
+        centered = self.positions - self.centroid
+        spread = np.sqrt(np.maximum(np.linalg.eigvalsh(centered.T @ centered / max(len(centered), 1)), 0))
+
+        # 排序后的边长在固定分位处取样再哈希（单条边的舍入抖动不影响其它取样）
+        tri = self.positions[self.faces]
+        edges = np.sort(np.linalg.norm(tri - np.roll(tri, 1, axis=1), axis=2).reshape(-1))
+        samples = edges[np.linspace(0, len(edges) - 1, EDGE_SAMPLES).astype(np.int64)] if len(edges) else []
+        edge_hash = hashlib.sha1(np.array(quantize(samples), dtype=np.int64).tobytes()).hexdigest()
+
+        volume = abs(np.einsum("ij,ij->i", tri[:, 0], np.cross(tri[:, 1], tri[:, 2])).sum()) / 6.0
+        return (
+            self.signature,
+            quantize(spread),
+            edge_hash,
+            quantize(volume / scale ** 2)
+        )
+
+
+def _rigid_transform(source: _MeshData, target: _MeshData) -> Optional[np.ndarray]:
+    """
+    求刚体变换 T 使 T·source ≈ target（顶点按顺序一一对应）
+
+    Returns:
+        4x4变换矩阵；两个网格不是同一几何体的刚体变换时返回None
+    """
+    if not np.array_equal(source.faces, target.faces) or source.others != target.others:
+        return None
+
+    source_center, target_center = source.centroid, target.centroid
+    u, _, vt = np.linalg.svd((source.positions - source_center).T @ (target.positions - target_center))
+    rotation = vt.T @ u.T
+    if np.linalg.det(rotation) < 0:
+        # 最优正交变换是镜像：改为最接近的旋转，再由误差检查决定是否接受
+        vt[-1] *= -1
+        rotation = vt.T @ u.T
+    translation = target_center - rotation @ source_center
+
+    error = np.abs(source.positions @ rotation.T + translation - target.positions).max()
+    if error > POSITION_TOLERANCE * max(target.radius, 1e-12):
+        return None
+    if source.normals is not None:
+        if np.abs(source.normals @ rotation.T - target.normals).max() > NORMAL_TOLERANCE:
+            return None
+
+    transform = np.eye(4)
+    transform[:3, :3] = rotation
+    transform[:3, 3] = translation
+    return transform
+
+
+def share_duplicate_meshes(header: Dict, binary: bytes) -> Optional[Dict]:
+    """
+    让只差一个刚体变换的网格共用同一个网格（原地修改header，二进制数据不变，
+    不再被引用的网格从 header["meshes"] 中删除，其访问器由调用方在重建buffer时丢弃）
+
+    Returns:
+        {"meshes_before", "meshes_after", "instanced_nodes"}；没有重复网格时返回None
+    """
+    meshes = header.get("meshes", [])
+    nodes = header.get("nodes", [])
+    candidates = plain_triangle_meshes(header)
+    if len(candidates) < 2:
+        return None
+
+    groups: Dict[Tuple, List[int]] = defaultdict(list)
+    data = {}
+    for index in candidates:
+        data[index] = _MeshData(header, binary, meshes[index])
+        groups[data[index].fingerprint()].append(index)
+
+    # 网格序号 → (代表网格序号, 变换)
+    replacements: Dict[int, Tuple[int, np.ndarray]] = {}
+    for members in groups.values():
+        representatives: List[int] = []
+        for index in members:
+            for representative in representatives:
+                transform = _rigid_transform(data[representative], data[index])
+                if transform is not None:
+                    replacements[index] = (representative, transform)
+                    break
+            else:
+                representatives.append(index)
+
+    if not replacements:
+        return None
+
+    instanced = 0
+    for node in nodes:
+        if node.get("mesh") not in replacements:
+            continue
+        representative, transform = replacements[node["mesh"]]
+        node["mesh"] = representative
+        set_node_matrix(node, node_matrix(node) @ transform)
+        inverse = np.linalg.inv(transform)
+        for child in node.get("children", []):
+            set_node_matrix(nodes[child], inverse @ node_matrix(nodes[child]))
+        instanced += 1
+
+    # 删除不再被引用的网格，节点的网格序号重新编号
+    used = sorted({node["mesh"] for node in nodes if "mesh" in node})
+    renumber = {old: new for new, old in enumerate(used)}
+    header["meshes"] = [meshes[old] for old in used]
+    for node in nodes:
+        if "mesh" in node:
+            node["mesh"] = renumber[node["mesh"]]
+
+    return {
+        "meshes_before": len(meshes),
+        "meshes_after": len(header["meshes"]),
+        "instanced_nodes": instanced
+    }
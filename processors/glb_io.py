@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+GLB容器读写与场景图操作
+只处理GLB的JSON块（节点、网格名称、变换），二进制几何数据原样保留，
+用于在不解析网格的情况下整理cascadio输出的GLB并提取零件信息
+
+节点/几何体命名规则与 trimesh 加载GLB时一致（重名追加 _1、_2 …），
+保证 parts_info 中的名字与后续用 trimesh/three.js 加载同一GLB看到的名字相同。
+"""
+
+import json
+import struct
+from collections import deque
+from typing import Dict, List, Tuple
+
+import numpy as np
+from trimesh.util import unique_name
+
+
+GLB_MAGIC = b"glTF"
+GLB_VERSION = 2
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+# trimesh场景根节点名（GLB中同名节点会被改名）
+BASE_FRAME = "world"
+
+# trimesh会加载为几何体的glTF图元模式（点、线、三角形、三角带）
+LOADED_MODES = {0, 1, 4, 5}
+
+MODE_TRIANGLES = 4
+
+# glTF componentType
+BYTE, UNSIGNED_BYTE, SHORT, UNSIGNED_SHORT, UNSIGNED_INT, FLOAT = 5120, 5121, 5122, 5123, 5125, 5126
+
+COMPONENT_DTYPES = {
+    BYTE: np.int8,
+    UNSIGNED_BYTE: np.uint8,
+    SHORT: np.int16,
+    UNSIGNED_SHORT: np.uint16,
+    UNSIGNED_INT: np.uint32,
+    FLOAT: np.float32,
+}
+
+TYPE_SIZES = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4, "MAT2": 4, "MAT3": 9, "MAT4": 16}
+
+
+def read_glb(path: str) -> Tuple[Dict, bytes]:
+    """
+    读取GLB文件
+
+    Returns:
+        (JSON块解析后的字典, 二进制块字节；没有二进制块时为b"")
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    magic, version, length = struct.unpack_from("<4sII", data, 0)
+    if magic != GLB_MAGIC or version != GLB_VERSION:
+        raise ValueError(f"不是glTF 2.0 GLB文件: {path}")
+
+    header, binary = None, b""
+    offset = 12
+    while offset < length:
+        chunk_length, chunk_type = struct.unpack_from("<II", data, offset)
+        chunk = data[offset + 8: offset + 8 + chunk_length]
+        if chunk_type == CHUNK_JSON:
+            header = json.loads(chunk.decode("utf-8"))
+        elif chunk_type == CHUNK_BIN:
+            binary = bytes(chunk)
+        offset += 8 + chunk_length
+
+    if header is None:
+        raise ValueError(f"GLB文件缺少JSON块: {path}")
+    return header, binary
+
+
+def write_glb(path: str, header: Dict, binary: bytes = b""):
+    """写出GLB文件（按规范4字节对齐：JSON用空格填充，二进制用0填充）"""
+    json_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    json_bytes += b" " * (-len(json_bytes) % 4)
+    binary += b"\x00" * (-len(binary) % 4)
+
+    if binary and header.get("buffers"):
+        header_buffer = header["buffers"][0]
+        if header_buffer.get("byteLength", 0) > len(binary):
+            raise ValueError("二进制块小于buffers[0].byteLength")
+
+    chunks = struct.pack("<II", len(json_bytes), CHUNK_JSON) + json_bytes
+    if binary:
+        chunks += struct.pack("<II", len(binary), CHUNK_BIN) + binary
+
+    with open(path, "wb") as f:
+        f.write(struct.pack("<4sII", GLB_MAGIC, GLB_VERSION, 12 + len(chunks)))
+        f.write(chunks)
+
+
+def geometry_names(header: Dict) -> Dict[int, str]:
+    """
+    每个网格对应的几何体名称（多图元网格按合并后的名称）
+
+    Returns:
+        {网格序号: 几何体名称}；没有可加载图元的网格不在结果中
+    """
+    names: Dict[str, None] = {}
+    counts: Dict[str, int] = {}
+    result = {}
+    for index, mesh in enumerate(header.get("meshes", [])):
+        mesh_names = []
+        for primitive in mesh.get("primitives", []):
+            if primitive.get("mode", 4) not in LOADED_MODES:
+                continue
+            name = unique_name(mesh.get("name", "GLTF"), names, counts=counts)
+            names[name] = None
+            mesh_names.append(name)
+        if mesh_names:
+            result[index] = min(mesh_names)
+    return result
+
+
+def node_names(header: Dict) -> List[str]:
+    """每个节点的唯一名称（没有名称的节点用序号）"""
+    taken: Dict[str, int] = {}
+    counts: Dict[str, int] = {}
+    for index, node in enumerate(header.get("nodes", [])):
+        taken[unique_name(node.get("name", str(index)), taken, counts=counts)] = index
+
+    names = {index: name for name, index in taken.items()}
+    if BASE_FRAME in taken:
+        names[taken[BASE_FRAME]] = unique_name(BASE_FRAME, set(names.values()))
+    return [names[index] for index in range(len(names))]
+
+
+def mesh_nodes(header: Dict) -> List[Tuple[int, str, str]]:
+    """
+    按场景遍历顺序列出带几何体的节点
+
+    Returns:
+        [(节点序号, 节点名称, 几何体名称), ...]
+    """
+    nodes = header.get("nodes", [])
+    names = node_names(header)
+    geometries = geometry_names(header)
+
+    scenes = header.get("scenes", [])
+    roots = scenes[header.get("scene", 0)].get("nodes", []) if scenes else []
+
+    result = []
+    consumed = set()
+    queue = deque((None, root) for root in roots)
+    while queue:
+        edge = queue.pop()
+        if edge in consumed:
+            continue
+        consumed.add(edge)
+
+        index = edge[1]
+        node = nodes[index]
+        queue.extend((index, child) for child in node.get("children", []))
+        if "mesh" in node and node["mesh"] in geometries:
+            result.append((index, names[index], geometries[node["mesh"]]))
+    return result
+
+
+def apply_names(header: Dict):
+    """把唯一化后的节点/几何体名称写回JSON（重新加载时名称不变）"""
+    for node, name in zip(header.get("nodes", []), node_names(header)):
+        node["name"] = name
+    for index, name in geometry_names(header).items():
+        header["meshes"][index]["name"] = name
+
+
+def scale_scene(header: Dict, factor: float):
+    """整体缩放场景：只改根节点变换，不改顶点数据"""
+    if factor == 1.0:
+        return
+
+    scenes = header.get("scenes", [])
+    roots = scenes[header.get("scene", 0)].get("nodes", []) if scenes else []
+    nodes = header.get("nodes", [])
+    for index in roots:
+        node = nodes[index]
+        if "matrix" in node:
+            # 列主序4x4：左乘均匀缩放 = 前三行乘以factor
+            node["matrix"] = [
+                value * factor if i % 4 != 3 else value
+                for i, value in enumerate(node["matrix"])
+            ]
+        else:
+            node["translation"] = [v * factor for v in node.get("translation", [0.0, 0.0, 0.0])]
+            node["scale"] = [v * factor for v in node.get("scale", [1.0, 1.0, 1.0])]
+
+
+def read_accessor(header: Dict, binary: bytes, index: int) -> np.ndarray:
+    """读取访问器数据为 (count, 分量数) 数组（支持byteStride，不支持稀疏访问器）"""
+    accessor = header["accessors"][index]
+    dtype = np.dtype(COMPONENT_DTYPES[accessor["componentType"]])
+    width = TYPE_SIZES[accessor["type"]]
+    count = accessor["count"]
+
+    view = header["bufferViews"][accessor["bufferView"]]
+    start = view.get("byteOffset", 0) + accessor.get("byteOffset", 0)
+    row_bytes = width * dtype.itemsize
+    stride = view.get("byteStride") or row_bytes
+
+    raw = np.frombuffer(binary, dtype=np.uint8, count=(count - 1) * stride + row_bytes, offset=start)
+    rows = np.lib.stride_tricks.as_strided(raw, shape=(count, row_bytes), strides=(stride, 1))
+    return np.ascontiguousarray(rows).view(dtype).reshape(count, width)
+
+
+def plain_triangle_meshes(header: Dict) -> List[int]:
+    """
+    只含普通三角形图元的网格（float位置，没有变形目标、蒙皮、图元扩展和稀疏访问器），
+    这类网格的顶点数据可以直接读取和改写
+
+    Returns:
+        网格序号列表
+    """
+    accessors = header.get("accessors", [])
+    skinned = {node["mesh"] for node in header.get("nodes", []) if "mesh" in node and "skin" in node}
+
+    result = []
+    for index, mesh in enumerate(header.get("meshes", [])):
+        if index in skinned or not mesh.get("primitives"):
+            continue
+        ok = True
+        for primitive in mesh["primitives"]:
+            attributes = primitive.get("attributes", {})
+            used = list(attributes.values()) + ([primitive["indices"]] if "indices" in primitive else [])
+            if (
+                primitive.get("mode", MODE_TRIANGLES) != MODE_TRIANGLES
+                or "targets" in primitive
+                or primitive.get("extensions")
+                or "POSITION" not in attributes
+                or accessors[attributes["POSITION"]]["componentType"] != FLOAT
+                or any("sparse" in accessors[i] or "bufferView" not in accessors[i] for i in used)
+            ):
+                ok = False
+                break
+        if ok:
+            result.append(index)
+    return result
+
+
+def node_matrix(node: Dict) -> np.ndarray:
+    """节点的局部变换（4x4，行主序）"""
+    if "matrix" in node:
+        return np.array(node["matrix"], dtype=np.float64).reshape(4, 4).T  # 列主序
+    x, y, z, w = node.get("rotation", [0.0, 0.0, 0.0, 1.0])
+    rotation = np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+    matrix = np.eye(4)
+    matrix[:3, :3] = rotation * np.array(node.get("scale", [1.0, 1.0, 1.0]))
+    matrix[:3, 3] = node.get("translation", [0.0, 0.0, 0.0])
+    return matrix
+
+
+def set_node_matrix(node: Dict, matrix: np.ndarray):
+    """用4x4矩阵替换节点的局部变换（去掉TRS）"""
+    for key in ("translation", "rotation", "scale"):
+        node.pop(key, None)
+    node["matrix"] = np.asarray(matrix, dtype=np.float64).T.reshape(-1).tolist()
+
+
+def world_matrices(header: Dict) -> Dict[int, np.ndarray]:
+    """
+    场景中每个节点的世界变换（4x4，行主序）
+
+    Returns:
+        {节点序号: 世界变换}；被多个父节点引用的节点取首次遍历到的路径
+    """
+    nodes = header.get("nodes", [])
+    scenes = header.get("scenes", [])
+    roots = scenes[header.get("scene", 0)].get("nodes", []) if scenes else []
+
+    result: Dict[int, np.ndarray] = {}
+    queue = deque((root, np.eye(4)) for root in roots)
+    while queue:
+        index, parent = queue.popleft()
+        if index in result:
+            continue
+        result[index] = parent @ node_matrix(nodes[index])
+        queue.extend((child, result[index]) for child in nodes[index].get("children", []))
+    return result
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+GLB多级细节（LOD）生成
+对每个零件按三角形比例简化，输出独立的GLB文件和清单，查看器可先加载粗模型再按需替换
+
+- 简化算法：二次误差度量的顶点聚类（Lindstrom），全部用numpy向量化实现
+  网格按体素聚类，每个体素内的顶点合并到使该体素相邻三角形平面二次误差最小的位置；
+  体素尺寸按二分法调整，使三角形数接近目标比例
+- 各级GLB的节点/几何体名称与原GLB相同，BOM映射（bom_to_mesh）对所有级别通用
+- 输出：<name>.lod1.glb、<name>.lod2.glb … 和清单 <name>.lods.json
+  （每级的比例、三角形数、字节数，以及每个零件在各级的三角形数）
+"""
+
+import os
+import json
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# 默认级别：原始、25%、5%
+DEFAULT_LOD_RATIOS = (1.0, 0.25, 0.05)
+
+# 三角形数不超过该值的零件不简化（螺栓、垫片等小零件简化后失真明显且收益很小）
+MIN_TRIANGLES = 64
+
+# 二分搜索体素尺寸的次数
+SEARCH_ITERATIONS = 14
+
+# 三角形数与目标相差在该比例内即停止搜索
+TARGET_TOLERANCE = 0.1
+
+LOD_FILE_PATTERN = "{stem}.lod{level}.glb"
+MANIFEST_FILE_PATTERN = "{stem}.lods.json"
+
+
+def lod_file_name(glb_path: str, level: int) -> str:
+    """第level级LOD的文件名（第0级为原GLB本身）"""
+    if level == 0:
+        return os.path.basename(glb_path)
+    stem = os.path.splitext(os.path.basename(glb_path))[0]
+    return LOD_FILE_PATTERN.format(stem=stem, level=level)
+
+
+def lod_files(glb_path: str, manifest: Dict) -> Dict[str, str]:
+    """清单中第1级起的LOD文件 {文件名标签: 路径}，标签为 lod<级别>.glb（供GLB转换缓存保存附属文件）"""
+    output_dir = os.path.dirname(glb_path)
+    return {
+        f"lod{level['level']}.glb": os.path.join(output_dir, lod_file_name(glb_path, level["level"]))
+        for level in manifest["levels"]
+        if level["level"] > 0
+    }
+
+
+def manifest_path(glb_path: str) -> str:
+    stem = os.path.splitext(os.path.basename(glb_path))[0]
+    return os.path.join(os.path.dirname(glb_path), MANIFEST_FILE_PATTERN.format(stem=stem))
+
+
+# ========== 网格简化 ==========
+
+def _cluster(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    quadrics: np.ndarray,
+    cell: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """按体素尺寸cell聚类一次，返回 (新顶点, 新三角形)"""
+    grid = np.floor((vertices - vertices.min(axis=0)) / cell).astype(np.int64)
+    _, cluster = np.unique(grid, axis=0, return_inverse=True)
+    cluster = cluster.reshape(-1)
+    count = cluster.max() + 1
+
+    # 每个体素的二次误差矩阵之和
+    cluster_q = np.zeros((count, 4, 4))
+    np.add.at(cluster_q, cluster, quadrics)
+
+    # 体素内顶点均值（二次误差矩阵奇异时的退路，并作为正则化中心）
+    sums = np.zeros((count, 3))
+    np.add.at(sums, cluster, vertices)
+    mean = sums / np.bincount(cluster, minlength=count)[:, None]
+
+    # 最优位置：min x^T A x + 2 b^T x  →  A x = -b（加小正则项向均值收敛）
+    a = cluster_q[:, :3, :3]
+    b = -cluster_q[:, :3, 3]
+    reg = 1e-3 * (np.trace(a, axis1=1, axis2=2) / 3.0 + 1e-12)
+    a = a + reg[:, None, None] * np.eye(3)
+    b = b + reg[:, None] * mean
+    new_vertices = np.linalg.solve(a, b[:, :, None])[:, :, 0]
+
+    # 位置偏离体素太远（病态解）时用均值
+    bad = ~np.isfinite(new_vertices).all(axis=1) | (np.abs(new_vertices - mean).max(axis=1) > cell)
+    new_vertices[bad] = mean[bad]
+
+    new_faces = cluster[faces]
+    keep = (
+        (new_faces[:, 0] != new_faces[:, 1])
+        & (new_faces[:, 1] != new_faces[:, 2])
+        & (new_faces[:, 0] != new_faces[:, 2])
+    )
+    new_faces = new_faces[keep]
+
+    # 去掉重复三角形（保持原绕序）
+    _, unique_index = np.unique(np.sort(new_faces, axis=1), axis=0, return_index=True)
+    new_faces = new_faces[np.sort(unique_index)]
+
+    # 去掉未被引用的顶点
+    used, remap = np.unique(new_faces, return_inverse=True)
+    return new_vertices[used], remap.reshape(-1, 3)
+
+
+def _face_quadrics(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """每个顶点的二次误差矩阵（相邻三角形平面按面积加权）"""
+    tri = vertices[faces]
+    normals = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    area = np.linalg.norm(normals, axis=1)
+    valid = area > 0
+    normals[valid] /= area[valid, None]
+
+    planes = np.concatenate([normals, -(normals * tri[:, 0]).sum(axis=1, keepdims=True)], axis=1)
+    face_q = area[:, None, None] * planes[:, :, None] * planes[:, None, :]
+
+    vertex_q = np.zeros((len(vertices), 4, 4))
+    for corner in range(3):
+        np.add.at(vertex_q, faces[:, corner], face_q)
+    return vertex_q
+
+
+def decimate(vertices: np.ndarray, faces: np.ndarray, target_faces: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    把网格简化到约target_faces个三角形
+
+    Args:
+        vertices: (n, 3) 顶点
+        faces: (m, 3) 三角形顶点索引
+        target_faces: 目标三角形数
+
+    Returns:
+        (顶点, 三角形)；网格已足够小或无法简化时返回原网格
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    if target_faces >= len(faces) or len(faces) <= MIN_TRIANGLES:
+        return vertices, faces
+    target_faces = max(target_faces, MIN_TRIANGLES)
+
+    quadrics = _face_quadrics(vertices, faces)
+    extent = float((vertices.max(axis=0) - vertices.min(axis=0)).max())
+    if extent <= 0:
+        return vertices, faces
+
+    # 体素尺寸越大三角形越少：在 [extent/网格上限, extent] 之间按对数二分
+    low, high = np.log(extent / 4096.0), np.log(extent)
+    best = (vertices, faces)
+    for _ in range(SEARCH_ITERATIONS):
+        cell = float(np.exp((low + high) / 2))
+        new_vertices, new_faces = _cluster(vertices, faces, quadrics, cell)
+        if len(new_faces) > target_faces:
+            low = np.log(cell)
+        else:
+            high = np.log(cell)
+            if len(new_faces) >= 4:
+                best = (new_vertices, new_faces)
+        if abs(len(new_faces) - target_faces) <= target_faces * TARGET_TOLERANCE and len(new_faces) >= 4:
+            return new_vertices, new_faces
+    return best
+
+
+# ========== 场景级LOD ==========
+
+def _decimated_geometry(trimesh, mesh, ratio: float):
+    vertices, faces = decimate(mesh.vertices, mesh.faces, int(len(mesh.faces) * ratio))
+    if len(faces) == len(mesh.faces):
+        return mesh
+
+    simplified = trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+    # 保留材质颜色（简化后UV不再有效）
+    material = getattr(mesh.visual, "material", None)
+    if material is not None:
+        simplified.visual = trimesh.visual.TextureVisuals(material=material)
+    else:
+        simplified.visual.face_colors = mesh.visual.main_color
+    return simplified
+
+
+def generate_lods(
+    glb_path: str,
+    ratios: Optional[Sequence[float]] = None,
+    postprocess: Optional[Callable[[str], object]] = None
+) -> Dict:
+    """
+    为GLB生成LOD文件和清单
+
+    Args:
+        glb_path: 原始GLB（作为第0级，不改写）
+        ratios: 各级三角形比例（第一项应为1.0），默认 DEFAULT_LOD_RATIOS
+        postprocess: 每个LOD文件写出后的处理（如几何压缩），在统计字节数之前调用
+
+    Returns:
+        清单字典：
+        {
+            "source": "component_x.glb",
+            "levels": [{"level": 0, "ratio": 1.0, "file": ..., "triangles": ..., "bytes": ...}, ...],
+            "parts": {节点名: [各级三角形数]}
+        }
+    """
+    import trimesh
+
+    ratios = list(ratios or DEFAULT_LOD_RATIOS)
+    scene = trimesh.load(glb_path, force="scene")
+    nodes = [(node, scene.graph[node][1]) for node in scene.graph.nodes_geometry]
+
+    levels: List[Dict] = []
+    part_triangles: Dict[str, List[int]] = {node: [] for node, _ in nodes}
+    output_dir = os.path.dirname(glb_path)
+
+    for level, ratio in enumerate(ratios):
+        if level == 0 and ratio >= 1.0:
+            level_scene, file_name = scene, lod_file_name(glb_path, 0)
+        else:
+            level_scene = scene.copy()
+            for name, geometry in scene.geometry.items():
+                if isinstance(geometry, trimesh.Trimesh):
+                    level_scene.geometry[name] = _decimated_geometry(trimesh, geometry, ratio)
+            file_name = lod_file_name(glb_path, level)
+            level_scene.export(os.path.join(output_dir, file_name), file_type="glb")
+            if postprocess is not None:
+                postprocess(os.path.join(output_dir, file_name))
+
+        triangles = 0
+        for node, geometry_name in nodes:
+            geometry = level_scene.geometry.get(geometry_name)
+            count = len(geometry.faces) if isinstance(geometry, trimesh.Trimesh) else 0
+            part_triangles[node].append(count)
+            triangles += count
+
+        levels.append({
+            "level": level,
+            "ratio": ratio,
+            "file": file_name,
+            "triangles": triangles,
+            "bytes": os.path.getsize(os.path.join(output_dir, file_name))
+        })
+
+    manifest = {
+        "source": os.path.basename(glb_path),
+        "levels": levels,
+        "parts": part_triangles
+    }
+    write_manifest(glb_path, manifest)
+    return manifest
+
+
+def write_manifest(glb_path: str, manifest: Dict):
+    with open(manifest_path(glb_path), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def relocate_manifest(manifest: Dict, glb_path: str) -> Dict:
+    """把清单中的文件名改为以glb_path为准（缓存命中后输出文件名可能不同）"""
+    manifest = dict(manifest)
+    manifest["source"] = os.path.basename(glb_path)
+    manifest["levels"] = [
+        dict(level, file=lod_file_name(glb_path, level["level"]))
+        for level in manifest["levels"]
+    ]
+    return manifest
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+零件几何描述（转换时计算，写入 parts_info）
+供不依赖名称的BOM匹配使用（core/geometric_matcher.py：质量、规格尺寸、数量）
+
+每个零件的描述：
+- volume_mm3: 体积（闭合网格的有向体积，法线朝内时取绝对值）
+- area_mm2: 表面积
+- dimensions_mm: 有向包围盒尺寸（顶点主成分方向上的范围，从大到小）
+- principal_moments: 单位密度下绕质心的主惯性矩（mm^5，从小到大）
+- instance_count: 装配体中几何上相同的零件个数（体积、面积、尺寸在千分之一内相同）
+
+所有三角形拼接后用 np.add.at 按几何体累加，一次算完整个装配体；
+位姿无关的量按几何体计算，再按节点的均匀缩放换算。
+"""
+
+from typing import Dict, Hashable, List, Sequence, Tuple
+
+import numpy as np
+
+from processors.glb_io import mesh_nodes, plain_triangle_meshes, read_accessor, world_matrices
+
+
+# 判断几何上相同的零件时的量化精度（相对值）
+INSTANCE_PRECISION = 1e-3
+
+# (几何体 {键: (顶点, 三角形)}, 节点 [(节点名, 几何体键, 世界变换 4x4), ...])
+GeometryNodes = Tuple[Dict[Hashable, Tuple[np.ndarray, np.ndarray]], List[Tuple[str, Hashable, np.ndarray]]]
+
+
+def _geometry_descriptors(geometries: Sequence[Tuple[np.ndarray, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+    批量计算几何体（局部坐标）的描述
+
+    Returns:
+        {"volume": (G,), "area": (G,), "dimensions": (G, 3), "moments": (G, 3)}
+    """
+    count = len(geometries)
+    vertex_counts = np.array([len(v) for v, _ in geometries])
+    face_counts = np.array([len(f) for _, f in geometries])
+    vertex_offsets = np.concatenate([[0], np.cumsum(vertex_counts)[:-1]])
+
+    vertices = np.concatenate([np.asarray(v, dtype=np.float64).reshape(-1, 3) for v, _ in geometries])
+    faces = np.concatenate([
+        np.asarray(f, dtype=np.int64).reshape(-1, 3) + offset
+        for (_, f), offset in zip(geometries, vertex_offsets)
+    ])
+    face_owner = np.repeat(np.arange(count), face_counts)
+    vertex_owner = np.repeat(np.arange(count), vertex_counts)
+
+    # 以几何体顶点均值为原点（减小大坐标下的数值误差）
+    vertex_sum = np.zeros((count, 3))
+    np.add.at(vertex_sum, vertex_owner, vertices)
+    origin = vertex_sum / np.maximum(vertex_counts, 1)[:, None]
+    local = vertices - origin[vertex_owner]
+
+    a, b, c = local[faces[:, 0]], local[faces[:, 1]], local[faces[:, 2]]
+    cross = np.cross(b - a, c - a)
+
+    area = np.bincount(face_owner, weights=np.linalg.norm(cross, axis=1) / 2, minlength=count)
+
+    # 以原点为顶点的四面体：有向体积、一阶矩、二阶矩 ∫xxᵀdV = V/20·(Σvᵢvᵢᵀ + (Σvᵢ)(Σvᵢ)ᵀ)
+    tet_volume = np.einsum("ij,ij->i", a, np.cross(b, c)) / 6
+    corner_sum = a + b + c
+    second = (
+        np.einsum("ni,nj->nij", a, a) + np.einsum("ni,nj->nij", b, b) + np.einsum("ni,nj->nij", c, c)
+        + np.einsum("ni,nj->nij", corner_sum, corner_sum)
+    ) * (tet_volume / 20)[:, None, None]
+
+    volume = np.bincount(face_owner, weights=tet_volume, minlength=count)
+    first = np.zeros((count, 3))
+    np.add.at(first, face_owner, corner_sum * (tet_volume / 4)[:, None])
+    covariance = np.zeros((count, 3, 3))
+    np.add.at(covariance, face_owner, second)
+
+    # 法线朝内的网格体积为负：整体取反
+    sign = np.where(volume < 0, -1.0, 1.0)
+    volume, first, covariance = volume * sign, first * sign[:, None], covariance * sign[:, None, None]
+
+    # 绕质心的惯性张量 → 主惯性矩
+    safe_volume = np.where(volume > 0, volume, 1.0)
+    centroid = first / safe_volume[:, None]
+    central = covariance - volume[:, None, None] * np.einsum("ni,nj->nij", centroid, centroid)
+    inertia = np.trace(central, axis1=1, axis2=2)[:, None, None] * np.eye(3) - central
+    moments = np.where((volume > 0)[:, None], np.linalg.eigvalsh(inertia), 0.0)
+
+    # 有向包围盒：顶点主成分方向上的范围
+    vertex_cov = np.zeros((count, 3, 3))
+    np.add.at(vertex_cov, vertex_owner, np.einsum("ni,nj->nij", local, local))
+    _, axes = np.linalg.eigh(vertex_cov)
+    projected = np.einsum("nij,ni->nj", axes[vertex_owner], local)
+    low = np.full((count, 3), np.inf)
+    high = np.full((count, 3), -np.inf)
+    np.minimum.at(low, vertex_owner, projected)
+    np.maximum.at(high, vertex_owner, projected)
+    dimensions = -np.sort(-np.where(np.isfinite(high - low), high - low, 0.0), axis=1)
+
+    return {"volume": volume, "area": area, "dimensions": dimensions, "moments": moments}
+
+
+def compute_descriptors(
+    geometries: Dict[Hashable, Tuple[np.ndarray, np.ndarray]],
+    nodes: List[Tuple[str, Hashable, np.ndarray]],
+    length_scale: float = 1.0
+) -> Dict[str, Dict]:
+    """
+    计算每个零件节点的几何描述
+
+    Args:
+        geometries: {几何体键: (顶点 (n, 3), 三角形 (m, 3))}，局部坐标
+        nodes: [(节点名, 几何体键, 世界变换 4x4), ...]
+        length_scale: 模型长度单位 → 毫米的换算系数
+
+    Returns:
+        {节点名: {"volume_mm3", "area_mm2", "dimensions_mm", "principal_moments", "instance_count"}}
+    """
+    nodes = [node for node in nodes if node[1] in geometries and len(geometries[node[1]][1])]
+    if not nodes:
+        return {}
+
+    keys = list(dict.fromkeys(key for _, key, _ in nodes))
+    key_index = {key: i for i, key in enumerate(keys)}
+    per_geometry = _geometry_descriptors([geometries[key] for key in keys])
+
+    index = np.array([key_index[key] for _, key, _ in nodes])
+    transforms = np.array([transform for _, _, transform in nodes], dtype=np.float64)
+    # 节点的均匀缩放（刚体变换为1）
+    scale = np.cbrt(np.abs(np.linalg.det(transforms[:, :3, :3]))) * length_scale
+
+    volume = per_geometry["volume"][index] * scale ** 3
+    area = per_geometry["area"][index] * scale ** 2
+    dimensions = per_geometry["dimensions"][index] * scale[:, None]
+    moments = per_geometry["moments"][index] * (scale ** 5)[:, None]
+
+    # 几何上相同的零件计数
+    reference = np.maximum(dimensions[:, 0], 1e-12)
+    signature = np.round(np.column_stack([
+        volume / reference ** 3, area / reference ** 2, dimensions / reference[:, None], np.log(reference)
+    ]) / INSTANCE_PRECISION).astype(np.int64)
+    _, group, counts = np.unique(signature, axis=0, return_inverse=True, return_counts=True)
+    instance_count = counts[group.reshape(-1)]
+
+    return {
+        node_name: {
+            "volume_mm3": float(volume[i]),
+            "area_mm2": float(area[i]),
+            "dimensions_mm": dimensions[i].tolist(),
+            "principal_moments": moments[i].tolist(),
+            "instance_count": int(instance_count[i])
+        }
+        for i, (node_name, _, _) in enumerate(nodes)
+    }
+
+
+def glb_geometry_nodes(header: Dict, binary: bytes) -> GeometryNodes:
+    """
+    读取GLB（JSON块 + 二进制块）中的三角网格和零件节点，节点名与 glb_io.mesh_nodes 一致
+
+    Returns:
+        (几何体 {网格序号: (顶点, 三角形)}, 节点 [(节点名, 网格序号, 世界变换), ...])，
+        即 compute_descriptors 和 spatial_index.build_contact_graph 的输入
+    """
+    geometries = {}
+    for index in plain_triangle_meshes(header):
+        vertices, faces, offset = [], [], 0
+        for primitive in header["meshes"][index]["primitives"]:
+            positions = read_accessor(header, binary, primitive["attributes"]["POSITION"])
+            if "indices" in primitive:
+                indices = read_accessor(header, binary, primitive["indices"]).reshape(-1, 3)
+            else:
+                indices = np.arange(len(positions) - len(positions) % 3).reshape(-1, 3)
+            vertices.append(positions)
+            faces.append(indices.astype(np.int64) + offset)
+            offset += len(positions)
+        geometries[index] = (np.concatenate(vertices), np.concatenate(faces))
+
+    nodes = header.get("nodes", [])
+    transforms = world_matrices(header)
+    return geometries, [
+        (name, nodes[index]["mesh"], transforms[index])
+        for index, name, _ in mesh_nodes(header)
+        if index in transforms
+    ]
+
+
+def scene_geometry_nodes(scene) -> GeometryNodes:
+    """trimesh场景中的三角网格和零件节点（节点名为 scene.graph.nodes_geometry），格式同 glb_geometry_nodes"""
+    geometries = {
+        name: (geometry.vertices, geometry.faces)
+        for name, geometry in scene.geometry.items()
+        if hasattr(geometry, "faces")
+    }
+    nodes = []
+    for node_name in scene.graph.nodes_geometry:
+        transform, geometry_name = scene.graph[node_name]
+        nodes.append((str(node_name), geometry_name, transform))
+    return geometries, nodes
@@ -0,0 +1,482 @@
+# -*- coding: utf-8 -*-
+"""
+零件空间索引与接触图
+转换时根据精确几何计算零件之间的接触/包含关系，供BOM匹配、爆炸图和装配规划使用，
+不必再让大模型只凭图片判断哪些零件相接触
+
+- 粗筛：零件世界包围盒上的BVH（AABBTree），批量遍历，所有查询一次完成
+- 精筛：按面积在零件表面均匀采样，点间距由全装配体的采样点预算决定；
+  空间哈希（网格尺寸 = 接触半径）找出不同零件间距离在接触半径内的采样点
+- 只计法线相对、且采样点投影落在对方采样点所在三角形内的点对（贴合面、轴与孔）；
+  只共用棱边的相邻零件（侧面、共面的相邻面）不算接触
+- 接触面积 ≈ 接触采样点数 × 每个采样点代表的面积（取采样更密的一侧）
+- 包含：一个零件的包围盒完全在另一个零件的包围盒内（轴孔、壳体内零件）
+- 受阻方向：接触采样点的外法线与坐标轴方向一致的方向，零件沿该方向移动会顶到对方
+  （供 disassembly_planner 推算拆卸/装配顺序）
+
+所有长度为毫米（与 part_descriptors 一致）。
+"""
+
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+
+# BVH叶节点最多的包围盒数
+LEAF_SIZE = 4
+
+# 全装配体的表面采样点预算（决定采样间距），每个零件至少 MIN_SAMPLES 个
+SAMPLE_BUDGET = 200_000
+MIN_SAMPLES = 16
+
+# 视为接触的表面间隙（相对于装配体包围盒对角线）；实际接触半径 = 间隙 + 采样间距
+CONTACT_GAP_RATIO = 1e-3
+
+# 接触至少需要的采样点数（采样更密的一侧），单个采样点多半是棱边附近的噪声
+MIN_CONTACT_SAMPLES = 2
+
+# 接触的两个采样点法线夹角余弦上限（面对面的表面法线相反；排除只共用棱边的相邻零件侧面）
+FACING_COSINE = -0.5
+
+# 六个坐标轴方向（受阻方向的标签与单位向量）
+DIRECTIONS = ("+x", "-x", "+y", "-y", "+z", "-z")
+DIRECTION_VECTORS = np.array([
+    (1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)
+], dtype=np.float64)
+
+# 接触采样点外法线与方向夹角余弦大于该值时，该方向受阻
+BLOCKING_COSINE = 0.5
+
+# 空间哈希的13个“前向”相邻网格（与自身网格一起覆盖全部27个相邻网格的无序点对）
+_FORWARD_OFFSETS = np.array([
+    (dx, dy, dz)
+    for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+    if (dx, dy, dz) > (0, 0, 0)
+], dtype=np.int64)
+
+
+def opposite_direction(direction: str) -> str:
+    """坐标轴方向的反方向（"+x" ↔ "-x"）"""
+    return ("-" if direction[0] == "+" else "+") + direction[1:]
+
+
+def _expand_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """把若干区间 [start, start + count) 展开成一个下标数组"""
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + np.arange(total) - offsets
+
+
+class AABBTree:
+    """轴对齐包围盒的BVH（按最长轴中位数自顶向下划分）"""
+
+    def __init__(self, lower: np.ndarray, upper: np.ndarray, leaf_size: int = LEAF_SIZE):
+        """
+        Args:
+            lower: (n, 3) 包围盒最小角
+            upper: (n, 3) 包围盒最大角
+            leaf_size: 叶节点最多的包围盒数
+        """
+        self.lower = np.asarray(lower, dtype=np.float64).reshape(-1, 3)
+        self.upper = np.asarray(upper, dtype=np.float64).reshape(-1, 3)
+        count = len(self.lower)
+        self.order = np.arange(count)
+
+        # 二叉树节点数不超过 2n-1；节点i覆盖 order[start[i]:end[i]]，叶节点 left = -1
+        capacity = max(2 * count - 1, 1)
+        self.node_lower = np.zeros((capacity, 3))
+        self.node_upper = np.zeros((capacity, 3))
+        self.left = np.full(capacity, -1, dtype=np.int64)
+        self.right = np.full(capacity, -1, dtype=np.int64)
+        self.start = np.zeros(capacity, dtype=np.int64)
+        self.end = np.zeros(capacity, dtype=np.int64)
+        self.end[0] = count
+
+        centers = (self.lower + self.upper) / 2
+        used = 1
+        stack = [0] if count else []
+        while stack:
+            node = stack.pop()
+            first, last = self.start[node], self.end[node]
+            index = self.order[first:last]
+            self.node_lower[node] = self.lower[index].min(axis=0)
+            self.node_upper[node] = self.upper[index].max(axis=0)
+            if last - first <= leaf_size:
+                continue
+
+            axis = int(np.argmax(np.ptp(centers[index], axis=0)))
+            middle = first + (last - first) // 2
+            self.order[first:last] = index[np.argpartition(centers[index, axis], middle - first)]
+            self.left[node], self.right[node] = used, used + 1
+            self.start[used], self.end[used] = first, middle
+            self.start[used + 1], self.end[used + 1] = middle, last
+            stack.extend((used, used + 1))
+            used += 2
+
+        for name in ("node_lower", "node_upper", "left", "right", "start", "end"):
+            setattr(self, name, getattr(self, name)[:used])
+
+    def query(self, lower: np.ndarray, upper: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量查询与一组包围盒相交的树中包围盒（所有查询同时逐层遍历）
+
+        Returns:
+            (查询序号, 树中包围盒序号)，一一对应的两个数组
+        """
+        lower = np.asarray(lower, dtype=np.float64).reshape(-1, 3)
+        upper = np.asarray(upper, dtype=np.float64).reshape(-1, 3)
+        if not len(self.order) or not len(lower):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        queries = np.arange(len(lower))
+        nodes = np.zeros(len(lower), dtype=np.int64)
+        found_queries, found_boxes = [], []
+        while len(queries):
+            hit = (
+                (self.node_lower[nodes] <= upper[queries]).all(axis=1)
+                & (lower[queries] <= self.node_upper[nodes]).all(axis=1)
+            )
+            queries, nodes = queries[hit], nodes[hit]
+
+            leaf = self.left[nodes] < 0
+            leaf_queries, leaf_nodes = queries[leaf], nodes[leaf]
+            counts = self.end[leaf_nodes] - self.start[leaf_nodes]
+            box_queries = np.repeat(leaf_queries, counts)
+            boxes = self.order[_expand_ranges(self.start[leaf_nodes], counts)]
+            overlap = (
+                (self.lower[boxes] <= upper[box_queries]).all(axis=1)
+                & (lower[box_queries] <= self.upper[boxes]).all(axis=1)
+            )
+            found_queries.append(box_queries[overlap])
+            found_boxes.append(boxes[overlap])
+
+            inner_queries, inner_nodes = queries[~leaf], nodes[~leaf]
+            queries = np.concatenate([inner_queries, inner_queries])
+            nodes = np.concatenate([self.left[inner_nodes], self.right[inner_nodes]])
+
+        return np.concatenate(found_queries), np.concatenate(found_boxes)
+
+    def overlapping_pairs(self) -> np.ndarray:
+        """树中互相重叠的包围盒对 (k, 2)，每对 i < j 只出现一次"""
+        first, second = self.query(self.lower, self.upper)
+        keep = first < second
+        return np.column_stack([first[keep], second[keep]])
+
+
+def _sample_surfaces(
+    geometries: List[Tuple[np.ndarray, np.ndarray]],
+    counts: np.ndarray,
+    rng: np.random.Generator
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    按面积在每个几何体表面分层采样约 counts[g] 个点（局部坐标）：
+    每个三角形取 floor(期望数) 个点，余数按概率再取一个，面积估计的方差远小于独立随机采样
+
+    Returns:
+        (采样点 (N, 3), 采样点所在三角形的顶点 (N, 3, 3), 每个几何体的实际采样点数)
+    """
+    vertex_counts = np.array([len(v) for v, _ in geometries])
+    face_counts = np.array([len(f) for _, f in geometries])
+    vertex_offsets = np.concatenate([[0], np.cumsum(vertex_counts)[:-1]])
+    face_offsets = np.concatenate([[0], np.cumsum(face_counts)[:-1]])
+
+    vertices = np.concatenate([np.asarray(v, dtype=np.float64).reshape(-1, 3) for v, _ in geometries])
+    faces = np.concatenate([
+        np.asarray(f, dtype=np.int64).reshape(-1, 3) + offset
+        for (_, f), offset in zip(geometries, vertex_offsets)
+    ])
+    a, b, c = vertices[faces[:, 0]], vertices[faces[:, 1]], vertices[faces[:, 2]]
+    face_area = np.linalg.norm(np.cross(b - a, c - a), axis=1) / 2
+    face_owner = np.repeat(np.arange(len(geometries)), face_counts)
+    geometry_area = np.bincount(face_owner, weights=face_area, minlength=len(geometries))
+
+    expected = face_area * (counts / np.maximum(geometry_area, 1e-300))[face_owner]
+    per_face = np.floor(expected).astype(np.int64)
+    per_face += rng.random(len(expected)) < expected - per_face
+    face = np.repeat(np.arange(len(faces)), per_face)
+
+    r1, r2 = rng.random(len(face)), rng.random(len(face))
+    flip = r1 + r2 > 1
+    r1[flip], r2[flip] = 1 - r1[flip], 1 - r2[flip]
+    points = a[face] + r1[:, None] * (b[face] - a[face]) + r2[:, None] * (c[face] - a[face])
+    actual = np.bincount(face_owner, weights=per_face, minlength=len(geometries)).astype(np.int64)
+    return points, np.stack([a[face], b[face], c[face]], axis=1), actual
+
+
+def _close_point_pairs(points: np.ndarray, radius: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    距离不超过radius的点对（空间哈希，网格尺寸 = radius，每对只出现一次）
+
+    Returns:
+        (第一个点下标, 第二个点下标)
+    """
+    cells = np.floor((points - points.min(axis=0)) / radius).astype(np.int64) + 1  # 留出-1邻格
+    dims = cells.max(axis=0) + 2
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    firsts, seconds = [], []
+    for offset in np.vstack([np.zeros((1, 3), dtype=np.int64), _FORWARD_OFFSETS]):
+        neighbor = ((cells[:, 0] + offset[0]) * dims[1] + cells[:, 1] + offset[1]) * dims[2] + cells[:, 2] + offset[2]
+        low = np.searchsorted(sorted_keys, neighbor, side="left")
+        counts = np.searchsorted(sorted_keys, neighbor, side="right") - low
+        first = np.repeat(np.arange(len(points)), counts)
+        second = order[_expand_ranges(low, counts)]
+        keep = first < second if not offset.any() else np.ones(len(first), dtype=bool)
+        first, second = first[keep], second[keep]
+        close = ((points[first] - points[second]) ** 2).sum(axis=1) <= radius * radius
+        firsts.append(first[close])
+        seconds.append(second[close])
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+
+def _inside_triangles(points: np.ndarray, triangles: np.ndarray, margin: np.ndarray) -> np.ndarray:
+    """点在三角形平面上的投影是否落在三角形内（各边向外放宽margin）"""
+    normal = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    normal /= np.maximum(np.linalg.norm(normal, axis=1), 1e-300)[:, None]
+    inside = np.ones(len(points), dtype=bool)
+    for k in range(3):
+        start, edge = triangles[:, k], triangles[:, (k + 1) % 3] - triangles[:, k]
+        inward = np.cross(normal, edge)
+        inward /= np.maximum(np.linalg.norm(inward, axis=1), 1e-300)[:, None]
+        inside &= np.einsum("ij,ij->i", inward, points - start) >= -margin
+    return inside
+
+
+def _contact_areas(
+    points: np.ndarray,
+    normals: np.ndarray,
+    triangles: np.ndarray,
+    owner: np.ndarray,
+    radius: float,
+    gap: float,
+    sample_area: np.ndarray
+) -> Dict[Tuple[int, int], Tuple[float, List[str]]]:
+    """
+    精筛：每个 (零件, 对方零件) 的接触面积估计
+    = 与对方某个采样点距离在radius内、法线相对、投影落在对方三角形内的本零件采样点数 × 每点面积
+    以及本零件的受阻方向（外法线指向该方向的接触采样点不少于 MIN_CONTACT_SAMPLES 个）
+
+    三角形比采样间距大时投影必须严格落在三角形内（共面的相邻面不算接触）；
+    三角形比采样间距小时（细分很密的曲面）相邻三角形多半没有采样点，放宽到采样间距
+
+    Returns:
+        {(零件序号, 对方零件序号): (面积, 受阻方向)}；接触采样点少于 MIN_CONTACT_SAMPLES 的不计
+    """
+    if not len(points):
+        return {}
+    first, second = _close_point_pairs(points, radius)
+    keep = (owner[first] != owner[second]) & (
+        np.einsum("ij,ij->i", normals[first], normals[second]) <= FACING_COSINE
+    )
+    first, second = first[keep], second[keep]
+
+    spacing = radius - gap
+    triangle_area = np.linalg.norm(
+        np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]), axis=1
+    ) / 2
+    margin = np.where(triangle_area < spacing ** 2, spacing, 0.0)
+
+    # (采样点, 对方零件)：两个方向分别检查投影
+    sample = np.concatenate([first, second])
+    partner = np.concatenate([second, first])
+    hit = _inside_triangles(points[sample], triangles[partner], margin[partner])
+    parts = len(sample_area)
+    touching = np.unique(sample[hit] * parts + owner[partner[hit]])
+    if not len(touching):
+        return {}
+
+    # 按 (零件, 对方零件) 计数，同时按方向统计外法线
+    sides, side_index, side_counts = np.unique(
+        owner[touching // parts] * parts + touching % parts, return_inverse=True, return_counts=True
+    )
+    facing = normals[touching // parts] @ DIRECTION_VECTORS.T > BLOCKING_COSINE
+    direction_counts = np.zeros((len(sides), len(DIRECTIONS)), dtype=np.int64)
+    np.add.at(direction_counts, side_index.reshape(-1), facing)
+    blocked = direction_counts >= MIN_CONTACT_SAMPLES
+    return {
+        (side // parts, side % parts): (
+            count * float(sample_area[side // parts]),
+            [direction for direction, flag in zip(DIRECTIONS, blocked[i]) if flag]
+        )
+        for i, (side, count) in enumerate(zip(sides.tolist(), side_counts.tolist()))
+        if count >= MIN_CONTACT_SAMPLES
+    }
+
+
+def build_contact_graph(
+    geometries: Dict[Hashable, Tuple[np.ndarray, np.ndarray]],
+    nodes: List[Tuple[str, Hashable, np.ndarray]],
+    length_scale: float = 1.0,
+    gap: Optional[float] = None,
+    sample_budget: int = SAMPLE_BUDGET,
+    seed: int = 0
+) -> Dict:
+    """
+    计算零件之间的接触/包含关系
+
+    Args:
+        geometries: {几何体键: (顶点 (n, 3), 三角形 (m, 3))}，局部坐标
+        nodes: [(节点名, 几何体键, 世界变换 4x4), ...]（见 part_descriptors.glb_geometry_nodes）
+        length_scale: 模型长度单位 → 毫米的换算系数
+        gap: 视为接触的表面间隙（毫米），默认 CONTACT_GAP_RATIO × 装配体对角线
+        sample_budget: 全装配体的表面采样点数
+        seed: 采样随机种子（相同输入得到相同结果）
+
+    Returns:
+        {
+            "unit": "mm",
+            "sample_spacing_mm": 采样间距,
+            "contact_radius_mm": 接触半径,
+            "bounds_mm": {节点名: [[最小角], [最大角]]},
+            "edges": [{
+                "a": 节点名, "b": 节点名, "contact_area_mm2": 接触面积, "inside": 被包含的节点名或None,
+                "blocked_directions": a 沿这些方向移动会顶到 b（b 的受阻方向为其反方向）
+            }]
+        }
+    """
+    nodes = [node for node in nodes if node[1] in geometries and len(geometries[node[1]][1])]
+    graph = {"unit": "mm", "sample_spacing_mm": 0.0, "contact_radius_mm": 0.0, "bounds_mm": {}, "edges": []}
+    if not nodes:
+        return graph
+
+    keys = list(dict.fromkeys(key for _, key, _ in nodes))
+    key_index = {key: i for i, key in enumerate(keys)}
+    local = [(np.asarray(geometries[key][0], dtype=np.float64), np.asarray(geometries[key][1])) for key in keys]
+    geometry = np.array([key_index[key] for _, key, _ in nodes])
+    names = [name for name, _, _ in nodes]
+
+    transforms = np.array([transform for _, _, transform in nodes], dtype=np.float64)
+    transforms[:, :3, :] *= length_scale
+    rotation, translation = transforms[:, :3, :3], transforms[:, :3, 3]
+
+    # 世界包围盒：局部包围盒8个角变换后的范围
+    local_lower = np.array([v.min(axis=0) for v, _ in local])[geometry]
+    local_upper = np.array([v.max(axis=0) for v, _ in local])[geometry]
+    pattern = (np.arange(8)[:, None] >> np.arange(3)) & 1
+    corners = local_lower[:, None, :] + pattern[None] * (local_upper - local_lower)[:, None, :]
+    corners = np.einsum("nij,nkj->nki", rotation, corners) + translation[:, None, :]
+    lower, upper = corners.min(axis=1), corners.max(axis=1)
+    graph["bounds_mm"] = {
+        name: [low, high] for name, low, high in zip(names, lower.tolist(), upper.tolist())
+    }
+
+    # 采样间距：总表面积 / 采样点预算
+    local_area = np.array([
+        np.linalg.norm(np.cross(v[f[:, 1]] - v[f[:, 0]], v[f[:, 2]] - v[f[:, 0]]), axis=1).sum() / 2
+        for v, f in local
+    ])
+    # 法线朝内的网格（有向体积为负）采样法线取反
+    orientation = np.array([
+        -1.0 if np.einsum("ij,ij->", v[f[:, 0]], np.cross(v[f[:, 1]], v[f[:, 2]])) < 0 else 1.0
+        for v, f in local
+    ])
+    area = local_area[geometry] * np.abs(np.linalg.det(rotation)) ** (2 / 3)
+    if area.sum() <= 0:
+        return graph
+    diagonal = float(np.linalg.norm(upper.max(axis=0) - lower.min(axis=0)))
+    gap = CONTACT_GAP_RATIO * diagonal if gap is None else gap
+    spacing = float(np.sqrt(area.sum() / sample_budget))
+    radius = gap + spacing
+    graph["sample_spacing_mm"], graph["contact_radius_mm"] = spacing, radius
+
+    # 粗筛：包围盒各扩大半个接触半径后重叠的零件对
+    tree = AABBTree(lower - radius / 2, upper + radius / 2)
+    candidates = tree.overlapping_pairs()
+    if not len(candidates):
+        return graph
+
+    # 采样：每个几何体按其实例中最多的采样数采一次，所有实例共用（只采样至少有一个候选相邻零件的零件）
+    counts = np.maximum(np.ceil(area / spacing ** 2).astype(np.int64), MIN_SAMPLES)
+    counts[(area <= 0) | ~np.isin(np.arange(len(nodes)), candidates)] = 0
+    geometry_counts = np.zeros(len(keys), dtype=np.int64)
+    np.maximum.at(geometry_counts, geometry, counts)
+    samples, sample_triangles, geometry_counts = _sample_surfaces(
+        local, geometry_counts, np.random.default_rng(seed)
+    )
+    counts = np.where(counts > 0, geometry_counts[geometry], 0)
+
+    owner = np.repeat(np.arange(len(nodes)), counts)
+    sample_start = np.concatenate([[0], np.cumsum(geometry_counts)[:-1]])
+    picked = _expand_ranges(sample_start[geometry], counts)
+    points = np.einsum("nij,nj->ni", rotation[owner], samples[picked]) + translation[owner]
+    triangles = np.einsum("nij,nkj->nki", rotation[owner], sample_triangles[picked]) + translation[owner][:, None]
+    # 外法线：局部三角形法线按逆转置变换（镜像节点绕序相反，但逆转置后的方向仍朝外）
+    local_triangles = sample_triangles[picked]
+    normals = np.cross(local_triangles[:, 1] - local_triangles[:, 0], local_triangles[:, 2] - local_triangles[:, 0])
+    normals = np.einsum("nji,nj->ni", np.linalg.inv(rotation)[owner], normals) * orientation[geometry[owner], None]
+    normals /= np.maximum(np.linalg.norm(normals, axis=1), 1e-300)[:, None]
+
+    sample_area = area / np.maximum(counts, 1)
+    side_area = _contact_areas(points, normals, triangles, owner, radius, gap, sample_area)
+
+    for a, b in candidates.tolist():
+        # 采样更密的一侧估计更准
+        finer, coarser = (a, b) if sample_area[a] <= sample_area[b] else (b, a)
+        contact, _ = side_area.get((finer, coarser), side_area.get((coarser, finer), (0.0, [])))
+        contact = float(min(contact, area[a], area[b]))
+
+        # a 的受阻方向：a 侧的外法线方向，加上 b 侧外法线的反方向
+        blocked = set(side_area.get((a, b), (0.0, []))[1])
+        blocked.update(opposite_direction(direction) for direction in side_area.get((b, a), (0.0, []))[1])
+
+        inside = None
+        if (lower[a] >= lower[b]).all() and (upper[a] <= upper[b]).all():
+            inside = names[a]
+        elif (lower[b] >= lower[a]).all() and (upper[b] <= upper[a]).all():
+            inside = names[b]
+
+        if contact > 0 or inside:
+            graph["edges"].append({
+                "a": names[a],
+                "b": names[b],
+                "contact_area_mm2": contact,
+                "inside": inside,
+                "blocked_directions": [direction for direction in DIRECTIONS if direction in blocked]
+            })
+    return graph
+
+
+def adjacency(graph: Dict, min_area: float = 0.0) -> Dict[str, List[str]]:
+    """
+    接触图的邻接表
+
+    Args:
+        graph: build_contact_graph 的结果
+        min_area: 只保留接触面积大于该值（mm²）的边；包含关系总是保留
+
+    Returns:
+        {节点名: [相邻节点名, ...]}（所有节点都在结果中）
+    """
+    result: Dict[str, List[str]] = {name: [] for name in graph.get("bounds_mm", {})}
+    for edge in graph.get("edges", []):
+        if edge["contact_area_mm2"] > min_area or edge.get("inside"):
+            result.setdefault(edge["a"], []).append(edge["b"])
+            result.setdefault(edge["b"], []).append(edge["a"])
+    return result
+
+
+def contact_groups(graph: Dict, min_area: float = 0.0) -> Dict[str, str]:
+    """
+    按接触关系的连通分量分组（场景没有装配层级时，互相接触的零件近似一个组件）
+
+    Returns:
+        {节点名: 组名}，组名取分量中第一个节点名
+    """
+    parent = {name: name for name in graph.get("bounds_mm", {})}
+
+    def root(name: str) -> str:
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    for edge in graph.get("edges", []):
+        if edge["contact_area_mm2"] > min_area or edge.get("inside"):
+            a, b = root(edge["a"]), root(edge["b"])
+            if a != b:
+                parent[b] = a
+    return {name: root(name) for name in parent}
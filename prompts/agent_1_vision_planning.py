@@ -124,22 +124,13 @@ def build_simple_assembly_planning_prompt(bom_data):
     Returns:
         (system_prompt, user_query) 元组
     """
-    import json
+    from utils.prompt_encoder import encode_table
     
-    # 简化BOM数据
-    simplified_bom = []
-    for item in bom_data[:20]:  # 只取前20个
-        simplified_bom.append({
-            "code": item.get("code", ""),
-            "name": item.get("name", ""),
-            "qty": item.get("qty", 0),
-            "weight": item.get("weight", 0)
-        })
-    
-    bom_json = json.dumps(simplified_bom, ensure_ascii=False, indent=2)
+    # 简化BOM数据（紧凑表格，完整BOM也只占少量token，不再只取前20个）
+    bom_table = encode_table(bom_data, columns=["code", "name", "quantity", "weight"])
     
     system_prompt = ASSEMBLY_PLANNING_SYSTEM_PROMPT
-    user_query = ASSEMBLY_PLANNING_USER_QUERY.format(bom_data=bom_json)
+    user_query = ASSEMBLY_PLANNING_USER_QUERY.format(bom_data=bom_table)
     
     return system_prompt, user_query
 
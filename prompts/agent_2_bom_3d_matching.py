@@ -349,17 +349,15 @@ def build_ai_matching_prompt(
     Returns:
         (system_prompt, user_query) 元组
     """
-    # 格式化未匹配的零件（简化格式，只保留关键信息）
+    from utils.prompt_encoder import encode_table
+
+    # 格式化未匹配的零件（紧凑表格，只保留关键信息；输出要原样引用几何名称，不用别名）
     # ✅ 传递所有未匹配的零件，Gemini 2.5 Flash支持100万token输入
-    parts_text = ""
-    for i, part in enumerate(unmatched_parts, 1):  # 传所有零件！
-        parts_text += f"{i}. {part.get('mesh_id')} | {part.get('geometry_name')}\n"
+    parts_text = encode_table(unmatched_parts, columns=["mesh_id", "geometry_name"], aliases=False)
 
-    # 格式化未匹配的BOM（简化格式）
+    # 格式化未匹配的BOM（紧凑表格）
     # ✅ 传递所有未匹配的BOM
-    bom_text = ""
-    for i, bom in enumerate(unmatched_bom, 1):  # 传所有BOM！
-        bom_text += f"{i}. {bom.get('code')} | {bom.get('name')} | {bom.get('product_code', '')}\n"
+    bom_text = encode_table(unmatched_bom, columns=["code", "name", "product_code"])
 
     system_prompt = AI_MATCHING_SYSTEM_PROMPT
     user_query = AI_MATCHING_USER_QUERY.format(
@@ -70,7 +70,7 @@ COMPONENT_ASSEMBLY_USER_QUERY = """请为以下组件生成装配步骤：
 ## 装配规划建议
 
 {assembly_hints}
-
+{geometry_sequence}
 ## 要求
 
 1. **⚠️ 必须覆盖所有BOM零件**：装配步骤必须包含上述零件清单中的所有零件
@@ -90,6 +90,19 @@ COMPONENT_ASSEMBLY_USER_QUERY = """请为以下组件生成装配步骤：
 现在开始生成装配步骤！
 """
 
+# 几何推算的候选装配顺序（由3D模型的接触关系和无碰撞装入方向计算，见 processors/disassembly_planner.py）
+GEOMETRY_SEQUENCE_SECTION = """
+## 几何推算的装配顺序（候选）
+
+以下顺序由3D模型计算：每一步的零件在前面步骤的零件装好后，都能沿给出的方向无碰撞装入
+（方向是模型坐标轴，+z/-z 等）。请以它为骨架核对图纸：
+- 图纸没有相反依据时按这个顺序组织步骤，同一步里的零件可以合并或拆开
+- 确需调整时在对应步骤的operation中说明原因
+- 标注"需核对"的零件没有直线装入路径，请根据图纸确认装入方式
+
+{sequence}
+"""
+
 
 def build_component_assembly_prompt(component_plan, parts_list):
     """
@@ -102,17 +115,23 @@ def build_component_assembly_prompt(component_plan, parts_list):
     Returns:
         (system_prompt, user_query) 元组
     """
-    import json
+    from utils.prompt_encoder import encode_table
     
-    # 格式化零件清单
-    parts_text = ""
-    for i, part in enumerate(parts_list, 1):
-        parts_text += f"{i}. {part.get('code', '')} - {part.get('name', '')} (数量: {part.get('qty', 0)})\n"
+    # 格式化零件清单（紧凑表格）
+    parts_text = encode_table(parts_list, columns=["code", "name", "quantity"])
     
     # 格式化装配提示
     hints = component_plan.get('assembly_steps', [])
     hints_text = "\n".join([f"- {hint}" for hint in hints])
     
+    # 几何推算的候选顺序（步骤4附加，没有3D模型时为空）
+    geometry_sequence = ""
+    if component_plan.get('candidate_sequence'):
+        from processors.disassembly_planner import format_candidate_sequence
+        geometry_sequence = GEOMETRY_SEQUENCE_SECTION.format(
+            sequence=format_candidate_sequence(component_plan['candidate_sequence'])
+        )
+
     system_prompt = COMPONENT_ASSEMBLY_SYSTEM_PROMPT
     user_query = COMPONENT_ASSEMBLY_USER_QUERY.format(
         component_code=component_plan.get('component_code', ''),
@@ -120,7 +139,8 @@ def build_component_assembly_prompt(component_plan, parts_list):
         base_part_name=component_plan.get('base_part_name', ''),
         base_part_code=component_plan.get('base_part_code', ''),
         parts_list=parts_text,
-        assembly_hints=hints_text
+        assembly_hints=hints_text,
+        geometry_sequence=geometry_sequence
     )
     
     return system_prompt, user_query
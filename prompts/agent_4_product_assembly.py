@@ -111,16 +111,14 @@ def build_product_assembly_prompt(product_plan, components_list, product_bom=Non
     Returns:
         (system_prompt, user_query) 元组
     """
-    # 格式化组件清单
-    components_text = ""
-    for i, comp in enumerate(components_list, 1):
-        components_text += f"{i}. {comp.get('component_code', '')} - {comp.get('component_name', '')} (已预装配)\n"
+    from utils.prompt_encoder import encode_table
+
+    # 格式化组件清单（紧凑表格）
+    components_text = encode_table(components_list, columns=["component_code", "component_name"])
 
     # ✅ 格式化产品级BOM清单
-    product_bom_text = ""
     if product_bom:
-        for i, item in enumerate(product_bom, 1):
-            product_bom_text += f"{i}. {item.get('code', '')} - {item.get('name', '')} ({item.get('product_code', '')})\n"
+        product_bom_text = encode_table(product_bom, columns=["code", "name", "product_code"])
     else:
         product_bom_text = "（无产品级零件）"
 
@@ -6,30 +6,24 @@ Agent 5: 焊接工艺智能体提示词
 # 焊接工艺专家系统提示词
 WELDING_SYSTEM_PROMPT = """你是焊接工艺专家王师傅，拥有30年焊接经验。
 
-你的任务：为每个装配步骤添加焊接要点（如果该步骤涉及焊接）。
+你的任务：为涉及焊接的装配步骤补充焊接要点（只输出补丁）。
 
 ## 核心原则
 
 1. **识别焊接步骤**：判断哪些装配步骤需要焊接
-2. **嵌入焊接要点**：为需要焊接的步骤添加welding字段
+2. **补充焊接要点**：为需要焊接的步骤输出welding补丁
 3. **工人友好**：使用通俗语言，避免专业术语
 4. **安全第一**：强调焊接安全和质量要求
 
 ## 输出格式
 
-严格按照以下JSON格式输出（返回增强后的装配步骤）：
+只输出需要焊接的步骤的补丁（步骤号 → 新增的welding字段），不要重复步骤原有的内容：
 
 ```json
 {
-  "enhanced_steps": [
+  "step_patches": [
     {
-      "step_number": 1,
-      "title": "步骤标题",
-      "parts_used": [...],
-      "tools_required": [...],
-      "operation": "操作说明",
-      "quality_check": "质量检查",
-      "estimated_time_minutes": 10,
+      "step_number": 3,
       "welding": {
         "required": true,
         "welding_type": "角焊",
@@ -45,9 +39,9 @@ WELDING_SYSTEM_PROMPT = """你是焊接工艺专家王师傅，拥有30年焊接
 ```
 
 **⚠️ 重要**：
-- 如果步骤不需要焊接，不要添加welding字段
-- 如果步骤需要焊接，welding.required必须为true
-- 保持原有步骤的所有字段不变，只添加welding字段
+- 不需要焊接的步骤不要出现在step_patches中；没有步骤需要焊接时输出 {"step_patches": []}
+- step_number必须是输入中的步骤号，welding.required必须为true
+- 不要输出title、operation等原有字段，补丁会自动合并到原步骤
 
 ## 重要提醒
 
@@ -67,17 +61,17 @@ WELDING_USER_QUERY = """请为以下装配步骤添加焊接要点（如果涉
 ## 要求
 
 1. **识别焊接步骤**：判断哪些步骤需要焊接（通常是零件固定、连接的步骤）
-2. **添加焊接要点**：为需要焊接的步骤添加welding字段
-3. **保持原有字段**：不要修改或删除原有的字段（step_number、title、parts_used等）
+2. **添加焊接要点**：为需要焊接的步骤输出welding补丁
+3. **只输出补丁**：不要重复步骤原有的字段（title、parts_used、operation等）
 4. **使用通俗语言**：工人能看懂的语言
 5. **包含安全提示**：每个焊接点都要有安全注意事项
 
 ## 自检清单
 
-- [ ] 所有需要焊接的步骤都添加了welding字段
+- [ ] 所有需要焊接的步骤都有welding补丁
 - [ ] welding字段包含完整信息（type、method、size、position、quality、safety）
-- [ ] 原有步骤的所有字段都保持不变
-- [ ] 不需要焊接的步骤没有添加welding字段
+- [ ] 补丁只包含step_number和welding，没有重复原有字段
+- [ ] 不需要焊接的步骤没有出现在step_patches中
 
 现在开始为装配步骤添加焊接要点！
 """
@@ -93,10 +87,11 @@ def build_welding_prompt(assembly_steps: list) -> tuple:
     Returns:
         (system_prompt, user_query) 元组
     """
-    import json
+    from utils.prompt_encoder import encode_table
+    from utils.step_patches import steps_for_prompt
 
-    # ✅ 将装配步骤转换为JSON字符串
-    steps_json = json.dumps(assembly_steps, ensure_ascii=False, indent=2)
+    # ✅ 将装配步骤编码为紧凑表格（步骤号与补丁编号一致）
+    steps_json = encode_table(steps_for_prompt(assembly_steps))
 
     system_prompt = WELDING_SYSTEM_PROMPT
     user_query = WELDING_USER_QUERY.format(
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+流水线步骤检查点
+每个步骤完成后在输出目录记录输入指纹，重启时指纹一致的步骤直接从磁盘加载
+
+指纹 = SHA-256(输入文件内容, 上游产物内容, 提示词/Agent模块源码, 模型名, 其它参数)
+清单保存在 <output_dir>/checkpoints.json：
+{
+    "step1": {"fingerprint": "...", "artifacts": ["step1_file_hierarchy.json", ...], "completed_at": ...},
+    ...
+}
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import importlib
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+from utils.file_hash import hash_file
+from utils.logger import print_info, print_warning
+
+
+# 检查点清单文件名
+CHECKPOINT_MANIFEST = "checkpoints.json"
+
+
+def hash_module_source(module_name: str) -> str:
+    """计算模块源码的SHA-256（模块不存在时对模块名取哈希，保证指纹稳定）"""
+    try:
+        module = sys.modules.get(module_name) or importlib.import_module(module_name)
+        source_file = getattr(module, "__file__", None)
+    except ImportError:
+        source_file = None
+
+    if source_file and os.path.exists(source_file):
+        return hash_file(source_file)
+    return hashlib.sha256(f"missing-module:{module_name}".encode("utf-8")).hexdigest()
+
+
+class StepCheckpoint:
+    """基于输入指纹的步骤检查点（续跑模式）"""
+
+    def __init__(
+        self,
+        output_dir: Union[str, Path],
+        resume: bool = False,
+        from_step: Optional[int] = None
+    ):
+        """
+        初始化检查点
+
+        Args:
+            output_dir: 流水线输出目录（步骤产物与清单所在目录）
+            resume: 是否启用续跑（指纹一致的步骤从磁盘加载）
+            from_step: 强制从第N步开始重新计算；更早的步骤只要产物存在即加载（隐含resume）
+        """
+        self.output_dir = Path(output_dir)
+        self.from_step = from_step
+        self.resume = resume or from_step is not None
+        self.manifest_path = self.output_dir / CHECKPOINT_MANIFEST
+
+        self._lock = threading.Lock()
+        self._manifest = self._load_manifest()
+
+    def _load_manifest(self) -> Dict:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    # ========== 指纹 ==========
+
+    def fingerprint(
+        self,
+        files: Iterable[Union[str, Path]] = (),
+        artifacts: Iterable[str] = (),
+        modules: Iterable[str] = (),
+        models: Iterable[str] = (),
+        extra: Optional[Dict] = None
+    ) -> str:
+        """
+        计算步骤输入指纹
+
+        Args:
+            files: 原始输入文件（PDF/STEP等），按内容取哈希
+            artifacts: 上游步骤产物（相对output_dir的文件名），按内容取哈希
+            modules: 影响输出的模块名（提示词模块、Agent模块），按源码取哈希
+            models: 使用的模型名
+            extra: 其它影响输出的参数（如DPI）
+
+        Returns:
+            十六进制SHA-256字符串
+        """
+        payload = {
+            "files": sorted(
+                (Path(p).name, hash_file(p)) for p in files if os.path.exists(p)
+            ),
+            "artifacts": [
+                (name, hash_file(self.output_dir / name) if (self.output_dir / name).exists() else None)
+                for name in artifacts
+            ],
+            "modules": [(name, hash_module_source(name)) for name in modules],
+            "models": list(models),
+            "extra": extra or {}
+        }
+        encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    # ========== 检查与记录 ==========
+
+    def is_fresh(self, step: int, fingerprint: str, artifacts: List[str]) -> bool:
+        """
+        判断步骤能否从磁盘加载
+
+        Args:
+            step: 步骤编号
+            fingerprint: 本次运行计算出的输入指纹
+            artifacts: 该步骤的产物文件名（相对output_dir）
+
+        Returns:
+            True表示跳过计算、直接加载产物
+        """
+        if not self.resume:
+            return False
+        if self.from_step is not None and step >= self.from_step:
+            return False
+        if not all((self.output_dir / name).exists() for name in artifacts):
+            return False
+
+        entry = self._manifest.get(f"step{step}")
+        if entry and entry.get("fingerprint") == fingerprint:
+            print_info(f"♻️  步骤{step}输入未变化，从检查点加载", indent=1)
+            return True
+
+        # --from-step 之前的步骤按用户要求强制复用
+        if self.from_step is not None:
+            print_warning(f"步骤{step}输入指纹已变化，按 --from-step {self.from_step} 仍从检查点加载", indent=1)
+            return True
+        return False
+
+    def record(self, step: int, fingerprint: str, artifacts: List[str]):
+        """步骤完成后记录指纹"""
+        with self._lock:
+            self._manifest[f"step{step}"] = {
+                "fingerprint": fingerprint,
+                "artifacts": list(artifacts),
+                "completed_at": time.time()
+            }
+            self._save_manifest()
+
+    def load_json(self, name: str):
+        """读取步骤产物"""
+        with open(self.output_dir / name, "r", encoding="utf-8") as f:
+            return json.load(f)
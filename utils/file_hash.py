@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+文件内容哈希
+按 (路径, 修改时间, 大小) 记忆SHA-256，同一文件在进程内只读取一次
+"""
+
+import os
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, Union
+
+
+_file_hash_memo: Dict[tuple, str] = {}
+_file_hash_lock = threading.Lock()
+
+
+def hash_file(path: Union[str, Path]) -> str:
+    """
+    计算文件内容的SHA-256
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        十六进制SHA-256字符串
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _file_hash_lock:
+        digest = _file_hash_memo.get(memo_key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        with _file_hash_lock:
+            _file_hash_memo[memo_key] = digest
+    return digest
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+STEP→GLB转换缓存
+同一STEP文件（内容相同）在相同转换参数下只做一次曲面细分，之后直接复用GLB和零件信息
+
+缓存键 = SHA-256(STEP内容SHA-256, 缩放因子, 细分/转换参数, 转换器版本)
+存储布局：<CACHE_CONFIG["directory"]>/glb_conversions/<key[:2]>/<key>.glb
+         同名 .json 旁注文件保存 step_to_glb 的结果（parts_info、parts_count 等），
+         附属文件（如LOD）存为 <key>.<标签>
+- 命中时GLB（及附属文件 <输出文件名>.<标签>）复制到调用方指定的输出路径
+- 缓存总字节数超过 CACHE_CONFIG["glb_max_size"] 后按最近访问时间淘汰（LRU）
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from config import CACHE_CONFIG
+from utils.file_hash import hash_file
+
+
+# 转换缓存子目录
+GLB_CACHE_SUBDIR = "glb_conversions"
+
+# 淘汰后保留的容量比例
+EVICTION_TARGET_RATIO = 0.9
+
+# 零件名取自文件内容的格式（其它格式的缓存键包含文件名）
+STEP_SUFFIXES = {".step", ".stp"}
+
+# 旁注中记录附属文件标签的字段（不返回给调用方）
+EXTRA_FILES_FIELD = "_extra_files"
+
+
+class GlbConversionCache:
+    """基于内容哈希的GLB转换磁盘缓存（GLB + parts_info旁注）"""
+
+    def __init__(
+        self,
+        directory: Optional[Union[str, Path]] = None,
+        max_size: Optional[int] = None,
+        enabled: Optional[bool] = None
+    ):
+        """
+        初始化转换缓存
+
+        Args:
+            directory: 缓存根目录，默认使用 CACHE_CONFIG["directory"]
+            max_size: 缓存总字节数上限，默认使用 CACHE_CONFIG["glb_max_size"]
+            enabled: 是否启用，默认使用 CACHE_CONFIG["enable"]
+        """
+        base_dir = Path(directory or CACHE_CONFIG["directory"])
+        self.directory = base_dir / GLB_CACHE_SUBDIR
+        self.max_size = int(max_size if max_size is not None else CACHE_CONFIG["glb_max_size"])
+        self.enabled = CACHE_CONFIG["enable"] if enabled is None else enabled
+
+        # 统计计数器
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._total_size = None  # 首次写入时扫描目录得到
+
+    # ========== 对外接口 ==========
+
+    @staticmethod
+    def make_key(step_path: Union[str, Path], scale_factor: float, settings: Dict) -> str:
+        """
+        计算缓存键
+
+        Args:
+            step_path: STEP文件路径
+            scale_factor: 缩放因子
+            settings: 影响输出的转换参数（细分精度、转换方法、转换器版本等）
+
+        Returns:
+            十六进制SHA-256字符串
+        """
+        step_path = Path(step_path)
+        payload = {
+            "step": hash_file(step_path),
+            # 加载器按扩展名选择；STL等单网格格式的零件名取自文件名
+            "format": step_path.suffix.lower(),
+            "name": None if step_path.suffix.lower() in STEP_SUFFIXES else step_path.name,
+            "scale_factor": scale_factor,
+            "settings": settings
+        }
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(
+        self,
+        step_path: Union[str, Path],
+        output_path: Union[str, Path],
+        scale_factor: float,
+        settings: Dict
+    ) -> Optional[Dict]:
+        """
+        查找缓存，命中时把GLB放到输出路径
+
+        Args:
+            step_path: STEP文件路径
+            output_path: 输出GLB路径
+            scale_factor: 缩放因子
+            settings: 转换参数
+
+        Returns:
+            step_to_glb 的结果字典（output_path 已替换为调用方路径）；未命中返回None
+        """
+        if not self.enabled:
+            return None
+
+        glb_path, sidecar_path = self._paths(self.make_key(step_path, scale_factor, settings))
+        output_path = Path(output_path)
+        try:
+            with open(sidecar_path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            self._materialize(glb_path, output_path)
+            for tag in result.pop(EXTRA_FILES_FIELD, []):
+                self._materialize(self._extra_path(glb_path, tag), self._extra_path(output_path, tag))
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        self._touch(glb_path)
+        with self._lock:
+            self.hits += 1
+
+        result["output_path"] = str(output_path)
+        result["cached"] = True
+        return result
+
+    def put(
+        self,
+        step_path: Union[str, Path],
+        scale_factor: float,
+        settings: Dict,
+        glb_path: Union[str, Path],
+        result: Dict,
+        extra_files: Optional[Dict[str, Union[str, Path]]] = None
+    ):
+        """
+        写入转换结果
+
+        Args:
+            step_path: STEP文件路径
+            scale_factor: 缩放因子
+            settings: 转换参数
+            glb_path: 已生成的GLB文件
+            result: step_to_glb 的结果字典（可JSON序列化的部分会写入旁注）
+            extra_files: 附属文件 {标签: 路径}，命中时放到 <输出文件名>.<标签>
+        """
+        if not self.enabled or not result.get("success"):
+            return
+
+        cached_glb, sidecar_path = self._paths(self.make_key(step_path, scale_factor, settings))
+        cached_glb.parent.mkdir(parents=True, exist_ok=True)
+
+        # 旁注最后写入：旁注存在即表示GLB和附属文件都已就绪
+        extra_files = extra_files or {}
+        self._atomic_copy(Path(glb_path), cached_glb)
+        for tag, path in extra_files.items():
+            self._atomic_copy(Path(path), self._extra_path(cached_glb, tag))
+
+        sidecar = {k: v for k, v in result.items() if k not in ("output_path", "cached")}
+        sidecar[EXTRA_FILES_FIELD] = sorted(extra_files)
+        self._atomic_write(sidecar_path, json.dumps(sidecar, ensure_ascii=False, default=str).encode("utf-8"))
+
+        size = sum(path.stat().st_size for path in self._entry_files(sidecar_path))
+        with self._lock:
+            self.stores += 1
+            if self._total_size is None:
+                self._total_size = self._scan_size()
+            else:
+                self._total_size += size
+            if self._total_size > self.max_size:
+                self._evict()
+
+    def stats(self) -> Dict:
+        """返回命中统计"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "size_bytes": self._total_size
+            }
+
+    # ========== 文件操作 ==========
+
+    def _paths(self, key: str):
+        entry_dir = self.directory / key[:2]
+        return entry_dir / f"{key}.glb", entry_dir / f"{key}.json"
+
+    @staticmethod
+    def _extra_path(glb_path: Path, tag: str) -> Path:
+        """附属文件路径：<GLB文件名去掉.glb>.<标签>"""
+        return glb_path.with_name(f"{glb_path.stem}.{tag}")
+
+    @staticmethod
+    def _entry_files(sidecar_path: Path) -> List[Path]:
+        """一个缓存条目的全部文件（GLB、旁注、附属文件）"""
+        return [
+            path for path in sidecar_path.parent.glob(f"{sidecar_path.stem}.*")
+            if not path.name.endswith(".tmp")
+        ]
+
+    @staticmethod
+    def _atomic_write(path: Path, data: bytes):
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _atomic_copy(source: Path, target: Path):
+        tmp_path = target.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, target)
+
+    @staticmethod
+    def _touch(path: Path):
+        """更新访问时间（LRU依据）"""
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _materialize(cached_path: Path, target: Path):
+        """把缓存GLB复制到输出路径（不用硬链接：下游可能原地改写输出GLB）"""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(cached_path, target)
+
+    # ========== 淘汰 ==========
+
+    def _iter_entries(self):
+        """以旁注为准遍历缓存条目：(GLB路径, 最近访问时间, 条目总字节数)"""
+        if not self.directory.exists():
+            return
+        for sidecar in self.directory.glob("*/*.json"):
+            path = sidecar.with_suffix(".glb")
+            try:
+                size = sum(file.stat().st_size for file in self._entry_files(sidecar))
+                yield path, path.stat().st_mtime, size
+            except OSError:
+                continue
+
+    def _scan_size(self) -> int:
+        return sum(size for _, _, size in self._iter_entries())
+
+    def _evict(self):
+        """按最近访问时间删除最旧的条目（GLB、旁注、附属文件），直到低于目标容量（调用方持锁）"""
+        entries = sorted(self._iter_entries(), key=lambda item: item[1])
+        target = self.max_size * EVICTION_TARGET_RATIO
+        total = sum(size for _, _, size in entries)
+
+        for path, _, size in entries:
+            if total <= target:
+                break
+            sidecar = path.with_suffix(".json")
+            try:
+                # 先删旁注，其他进程不会再命中不完整的条目
+                sidecar.unlink(missing_ok=True)
+                for file in self._entry_files(sidecar):
+                    file.unlink(missing_ok=True)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+        self._total_size = total
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_glb_cache() -> GlbConversionCache:
+    """获取全局共享的GLB转换缓存实例"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = GlbConversionCache()
+    return _default_cache
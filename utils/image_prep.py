@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+视觉模型图片预处理
+所有视觉调用（Gemini Agent、Qwen-VL、GeminiVisionModel）共用的图片编码层
+
+- 渲染：PDF页面直接按灰度渲染（工程图是黑白线稿，RGB只会让体积翻三倍）
+- 编码：按图片内容选择最小且清晰的格式
+    * 纯黑白（几乎没有灰阶）          → 1位PNG
+    * 线稿（含抗锯齿、平面着色视图）  → 16级灰度调色板PNG（4位）
+    * 连续色调（照片/渲染图）         → JPEG与16级PNG中较小者
+    * 彩色图片                        → JPEG
+- 预算：单次请求的所有图片共享像素和字节预算（config.IMAGE_CONFIG），超出时按统一比例缩小
+- 复用：编码结果按 (文件内容哈希, 目标尺寸) 记忆，同一页发给Agent 1、3、5只编码一次
+"""
+
+import io
+import base64
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageStat
+
+from config import IMAGE_CONFIG
+from utils.file_hash import hash_file
+
+
+# 超出预算时依次尝试的缩放比例（离散化以便不同请求命中同一编码结果）
+SCALE_LADDER = (1.0, 0.85, 0.7, 0.6, 0.5, 0.42, 0.35, 0.3, 0.25)
+
+# 灰阶像素（非黑非白）占比阈值
+BILEVEL_MAX_MIDTONE = 0.005
+LINE_ART_MAX_MIDTONE = 0.25
+
+# 判定为彩色图片的平均饱和度阈值（0-255）
+COLOR_MIN_SATURATION = 24
+
+# 16级灰度调色板
+GRAY16_PALETTE = [level * 17 for level in range(16) for _ in range(3)]
+
+
+def render_page_pixmap(page, dpi: float, colorspace: Optional[str] = None):
+    """
+    按DPI渲染PDF页面
+
+    Args:
+        page: fitz页面对象
+        dpi: 渲染DPI
+        colorspace: "gray" 或 "rgb"，默认使用 IMAGE_CONFIG["render_colorspace"]
+
+    Returns:
+        fitz.Pixmap（无alpha通道）
+    """
+    colorspace = colorspace or IMAGE_CONFIG["render_colorspace"]
+    zoom = dpi / 72
+    return page.get_pixmap(
+        matrix=fitz.Matrix(zoom, zoom),
+        colorspace=fitz.csGRAY if colorspace == "gray" else fitz.csRGB,
+        alpha=False
+    )
+
+
+class ImagePreparer:
+    """视觉请求图片编码器（按内容选择格式 + 请求级预算 + 编码结果记忆）"""
+
+    def __init__(
+        self,
+        max_pixels: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        min_long_edge: Optional[int] = None,
+        jpeg_quality: Optional[int] = None,
+        memo_entries: Optional[int] = None
+    ):
+        """
+        初始化图片编码器
+
+        Args:
+            max_pixels: 单次请求总像素上限，默认 IMAGE_CONFIG["max_pixels_per_request"]
+            max_bytes: 单次请求编码后总字节上限，默认 IMAGE_CONFIG["max_bytes_per_request"]
+            min_long_edge: 缩放后长边的最小像素数，默认 IMAGE_CONFIG["min_long_edge"]
+            jpeg_quality: JPEG质量，默认 IMAGE_CONFIG["jpeg_quality"]
+            memo_entries: 编码结果记忆条目数，默认 IMAGE_CONFIG["memo_entries"]
+        """
+        self.max_pixels = max_pixels or IMAGE_CONFIG["max_pixels_per_request"]
+        self.max_bytes = max_bytes or IMAGE_CONFIG["max_bytes_per_request"]
+        self.min_long_edge = min_long_edge or IMAGE_CONFIG["min_long_edge"]
+        self.jpeg_quality = jpeg_quality or IMAGE_CONFIG["jpeg_quality"]
+        self.memo_entries = memo_entries or IMAGE_CONFIG["memo_entries"]
+
+        self._memo: "OrderedDict[tuple, str]" = OrderedDict()
+        self._kind_memo: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+        # 统计（原始文件字节 vs 实际上传字节）
+        self.source_bytes = 0
+        self.encoded_bytes = 0
+
+    @property
+    def signature(self) -> Dict:
+        """影响编码结果的参数（写入LLM响应缓存键）"""
+        return {
+            "max_pixels": self.max_pixels,
+            "max_bytes": self.max_bytes,
+            "min_long_edge": self.min_long_edge,
+            "jpeg_quality": self.jpeg_quality
+        }
+
+    # ========== 对外接口 ==========
+
+    def prepare(
+        self,
+        images: List[str],
+        max_pixels: Optional[int] = None,
+        max_bytes: Optional[int] = None
+    ) -> List[str]:
+        """
+        将一次请求的所有图片编码为data URL，整体满足像素和字节预算
+
+        Args:
+            images: 图片路径或URL列表（http/data URL原样返回）
+            max_pixels: 覆盖默认的请求总像素上限
+            max_bytes: 覆盖默认的请求总字节上限
+
+        Returns:
+            与images一一对应的URL列表
+        """
+        max_pixels = max_pixels or self.max_pixels
+        max_bytes = max_bytes or self.max_bytes
+
+        local = [img for img in images if not self._is_url(img)]
+        sizes = {}
+        for path in local:
+            with Image.open(path) as img:
+                sizes[path] = img.size
+
+        total_pixels = sum(w * h for w, h in sizes.values())
+        encoded: Dict[str, str] = {}
+        previous_targets = None
+
+        for scale in SCALE_LADDER:
+            targets = {path: self._target_size(size, scale) for path, size in sizes.items()}
+            if targets == previous_targets:
+                break  # 所有图片都已到达最小尺寸，继续缩小没有意义
+            previous_targets = targets
+
+            if total_pixels * scale * scale > max_pixels and scale != SCALE_LADDER[-1]:
+                continue
+
+            encoded = {path: self._encode(path, targets[path]) for path in local}
+            if sum(len(url) for url in encoded.values()) <= max_bytes:
+                break
+
+        # 像素预算要求的缩放超过了最小尺寸限制：按最小尺寸编码
+        if local and not encoded:
+            encoded = {path: self._encode(path, previous_targets[path]) for path in local}
+
+        with self._lock:
+            self.source_bytes += sum(Path(path).stat().st_size for path in local)
+            self.encoded_bytes += sum(len(url) for url in encoded.values())
+
+        return [img if self._is_url(img) else encoded[img] for img in images]
+
+    def encode_file(self, image_path: str) -> str:
+        """编码单张图片（使用单次请求预算）"""
+        return self.prepare([image_path])[0]
+
+    def stats(self) -> Dict:
+        """返回累计上传字节统计"""
+        with self._lock:
+            return {
+                "source_bytes": self.source_bytes,
+                "encoded_bytes": self.encoded_bytes,
+                "ratio": self.source_bytes / self.encoded_bytes if self.encoded_bytes else 0.0,
+                "memo_entries": len(self._memo)
+            }
+
+    # ========== 内部实现 ==========
+
+    @staticmethod
+    def _is_url(image: str) -> bool:
+        return image.startswith("http") or image.startswith("data:")
+
+    def _target_size(self, size: Tuple[int, int], scale: float) -> Tuple[int, int]:
+        """按比例缩放，但长边不低于min_long_edge，且不放大"""
+        width, height = size
+        long_edge = max(width, height)
+        floor_scale = min(1.0, self.min_long_edge / long_edge) if long_edge else 1.0
+        effective = max(scale, floor_scale)
+        return max(1, round(width * effective)), max(1, round(height * effective))
+
+    def _encode(self, path: str, target: Tuple[int, int]) -> str:
+        """编码单张图片到目标尺寸（按内容哈希记忆）"""
+        digest = hash_file(path)
+        memo_key = (digest, target, self.jpeg_quality)
+
+        with self._lock:
+            url = self._memo.get(memo_key)
+            if url is not None:
+                self._memo.move_to_end(memo_key)
+                return url
+
+        with Image.open(path) as img:
+            img.load()
+            kind = self._kind_memo.get(digest)
+            if kind is None:
+                kind = self._classify(img)
+                self._kind_memo[digest] = kind
+
+            resized = target != img.size
+            if kind == "color":
+                work = img.convert("RGB")
+            else:
+                work = img.convert("L")
+            if resized:
+                work = work.resize(target, Image.LANCZOS)
+
+            if kind == "bilevel" and not resized:
+                # 原尺寸纯黑白：1位PNG
+                data, mime = self._save(work.convert("1", dither=Image.Dither.NONE), "PNG"), "image/png"
+            elif kind in ("bilevel", "line_art"):
+                # 抗锯齿边缘和平面着色：16级灰度调色板保证线条、文字和面的层次清晰
+                data, mime = self._save(self._to_gray16(work), "PNG"), "image/png"
+            elif kind == "shaded":
+                candidates = [
+                    (self._save(self._to_gray16(work), "PNG"), "image/png"),
+                    (self._save(work, "JPEG", quality=self.jpeg_quality), "image/jpeg")
+                ]
+                data, mime = min(candidates, key=lambda item: len(item[0]))
+            else:
+                data, mime = self._save(work, "JPEG", quality=self.jpeg_quality), "image/jpeg"
+
+        url = f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+        with self._lock:
+            self._memo[memo_key] = url
+            while len(self._memo) > self.memo_entries:
+                self._memo.popitem(last=False)
+        return url
+
+    @staticmethod
+    def _classify(img: Image.Image) -> str:
+        """判断图片类型：bilevel / line_art / shaded / color"""
+        if img.mode not in ("1", "L", "LA", "P"):
+            thumb = img.convert("RGB")
+            thumb.thumbnail((256, 256))
+            saturation = ImageStat.Stat(thumb.convert("HSV").getchannel("S")).mean[0]
+            if saturation >= COLOR_MIN_SATURATION:
+                return "color"
+
+        histogram = img.convert("L").histogram()
+        total = sum(histogram) or 1
+        midtone_ratio = sum(histogram[64:192]) / total
+
+        if midtone_ratio <= BILEVEL_MAX_MIDTONE:
+            return "bilevel"
+        if midtone_ratio <= LINE_ART_MAX_MIDTONE:
+            return "line_art"
+        return "shaded"
+
+    @staticmethod
+    def _to_gray16(gray: Image.Image) -> Image.Image:
+        """8位灰度 → 16级灰度调色板（PNG写出为4位）"""
+        indexed = gray.point(lambda value: value // 17).convert("P")
+        indexed.putpalette(GRAY16_PALETTE)
+        return indexed
+
+    @staticmethod
+    def _save(img: Image.Image, fmt: str, **kwargs) -> bytes:
+        buffer = io.BytesIO()
+        if fmt == "PNG":
+            img.save(buffer, fmt, optimize=True)
+        else:
+            img.save(buffer, fmt, optimize=True, **kwargs)
+        return buffer.getvalue()
+
+
+_default_preparer = None
+_default_preparer_lock = threading.Lock()
+
+
+def get_image_preparer() -> ImagePreparer:
+    """获取全局共享的图片编码器（各Agent共享编码结果）"""
+    global _default_preparer
+    if _default_preparer is None:
+        with _default_preparer_lock:
+            if _default_preparer is None:
+                _default_preparer = ImagePreparer()
+    return _default_preparer
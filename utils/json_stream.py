@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+容错的增量JSON解析
+所有模型输出（Gemini Agent、Qwen-VL、DeepSeek、AI匹配）共用，替代各处的 find('{') / rfind('}') 截取
+
+- 增量：流式响应逐块 feed，每个字符只扫描一次，流结束时已知JSON是否完整
+- 截取：跳过JSON之前的说明文字和代码块标记，根值闭合后忽略其后的内容（总结、结尾的```）
+- 修复：
+    * 数组/对象末尾多余的逗号
+    * 字符串中未转义的换行、制表符等控制字符
+    * 字符串中未转义的引号（后面不是 , : } ] 的引号按字面引号处理）
+    * 输出被截断：回退到最后一个完整的值，补齐未闭合的字符串、数组和对象
+      （数组中未闭合的对象/数组元素整个丢弃，不保留只有一半字段的元素）
+- 续写：截断时由 merge_continuation 把"从截断处继续"请求的输出接到已有输出后面
+  （去掉代码块标记和重复的重叠部分），见 utils/llm_clients.PooledLLMClient.acall_json
+"""
+
+import json
+from typing import Any, List, Optional, Tuple
+
+
+# 判断续写与已有输出重叠时的最小/最大重叠长度（过短的重叠可能是巧合）
+MIN_CONTINUATION_OVERLAP = 16
+MAX_CONTINUATION_OVERLAP = 2000
+
+# 续写从头重新输出JSON的判定长度（开头这么多字符与已有输出相同）
+RESTART_PREFIX_LENGTH = 32
+
+# 字符串中的引号后面出现这些字符时视为字符串结束
+STRING_TERMINATORS = ",:}]"
+
+CLOSERS = {"{": "}", "[": "]"}
+
+ESCAPED_CONTROL_CHARS = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+
+
+class StreamingJSONParser:
+    """
+    增量JSON解析器
+
+    用法：
+        parser = StreamingJSONParser()
+        for chunk in stream:
+            parser.feed(chunk)
+        if parser.truncated:
+            ...  # 请求续写后继续 feed
+        result = parser.result()
+    """
+
+    def __init__(self, roots: str = "{["):
+        """
+        Args:
+            roots: 可作为根值开头的字符（"{" 只接受对象，"{[" 对象或数组）
+        """
+        self.roots = roots
+        self.text = ""  # 已输入的原始文本
+
+        self._output: List[str] = []  # 修复后的JSON（根值之外的空白不保留）
+        self._stack: List[str] = []  # 未闭合的 { / [
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._escape = False
+        self._quote_pending = False  # 字符串中遇到引号，等下一个非空白字符决定是否结束字符串
+        self._pending_space = ""  # 待定引号之后的空白
+        self._expect_key = False  # 对象中下一个字符串是键
+        self._string_is_key = False
+        # 最后一个完整值之后的位置：(输出长度, 当时未闭合的容器)
+        self._safe_point: Tuple[int, Tuple[str, ...]] = (0, ())
+        # 最外层未闭合的数组元素容器在 _stack 中的位置；元素闭合前其中的位置都不是安全点
+        self._element_depth: Optional[int] = None
+
+    @property
+    def started(self) -> bool:
+        """是否已读到根值的开头"""
+        return self._started
+
+    @property
+    def done(self) -> bool:
+        """根值是否已闭合"""
+        return self._done
+
+    @property
+    def truncated(self) -> bool:
+        """根值已开始但未闭合（输出被截断）"""
+        return self._started and not self._done
+
+    def feed(self, text: str) -> "StreamingJSONParser":
+        """
+        输入一段文本（流式响应的一块）
+
+        Args:
+            text: 文本片段
+
+        Returns:
+            self
+        """
+        self.text += text
+        for char in text:
+            if self._done:
+                break
+            if not self._started:
+                if char in self.roots:
+                    self._started = True
+                    self._open(char)
+                continue
+            if self._in_string:
+                self._string_char(char)
+            else:
+                self._value_char(char)
+        return self
+
+    def result(self) -> Any:
+        """
+        解析结果（截断时补齐后解析）
+
+        Returns:
+            解析得到的对象/数组
+
+        Raises:
+            ValueError: 没有找到JSON
+            json.JSONDecodeError: 修复后仍无法解析
+        """
+        if not self._started:
+            raise ValueError("未找到有效的JSON数据")
+        return json.loads(self.repaired())
+
+    def repaired(self) -> str:
+        """修复后的JSON文本"""
+        if self._done:
+            return "".join(self._output)
+        if self._in_string and self._quote_pending:
+            # 截断在引号之后：视为字符串已结束
+            self._close_string()
+            if not self._string_is_key:
+                self._mark_safe()
+        length, stack = self._safe_point
+        return "".join(self._output[:length]) + "".join(CLOSERS[opener] for opener in reversed(stack))
+
+    def _open(self, opener: str):
+        if self._element_depth is None and self._stack and self._stack[-1] == "[":
+            # 数组元素：截断时回退到元素之前（上一个安全点），不保留不完整的元素
+            self._element_depth = len(self._stack)
+        self._output.append(opener)
+        self._stack.append(opener)
+        self._expect_key = opener == "{"
+        self._mark_safe()
+
+    def _mark_safe(self):
+        if self._element_depth is None:
+            self._safe_point = (len(self._output), tuple(self._stack))
+
+    def _value_char(self, char: str):
+        """字符串之外的字符"""
+        if char in " \t\r\n":
+            return
+        if char in CLOSERS:
+            self._open(char)
+        elif char in "}]":
+            if not self._stack:
+                return
+            # 去掉末尾多余的逗号
+            if self._output and self._output[-1] == ",":
+                self._output.pop()
+            self._output.append(CLOSERS[self._stack.pop()])
+            if self._element_depth is not None and len(self._stack) <= self._element_depth:
+                self._element_depth = None
+            if not self._stack:
+                self._done = True
+                return
+            self._expect_key = False
+            self._mark_safe()
+        elif char == ",":
+            if self._output and self._output[-1] not in "{[,":
+                self._mark_safe()
+                self._output.append(char)
+            self._expect_key = self._stack[-1] == "{"
+        elif char == ":":
+            self._output.append(char)
+            self._expect_key = False
+        elif char == '"':
+            self._output.append(char)
+            self._in_string = True
+            self._string_is_key = self._expect_key and self._stack[-1] == "{"
+        else:
+            self._output.append(char)
+
+    def _string_char(self, char: str):
+        """字符串中的字符"""
+        if self._quote_pending:
+            if char in " \t\r\n":
+                self._pending_space += char
+                return
+            if char in STRING_TERMINATORS:
+                self._close_string()
+                if not self._string_is_key:
+                    self._mark_safe()
+                self._value_char(char)
+                return
+            # 引号后面还有内容：是字符串中未转义的引号
+            self._output.append('\\"')
+            self._output.extend(ESCAPED_CONTROL_CHARS.get(space, space) for space in self._pending_space)
+            self._quote_pending = False
+            self._pending_space = ""
+
+        if self._escape:
+            self._output.append(char)
+            self._escape = False
+        elif char == "\\":
+            self._output.append(char)
+            self._escape = True
+        elif char == '"':
+            self._quote_pending = True
+        elif char < " ":
+            self._output.append(ESCAPED_CONTROL_CHARS.get(char, f"\\u{ord(char):04x}"))
+        else:
+            self._output.append(char)
+
+    def _close_string(self):
+        self._output.append('"')
+        self._in_string = False
+        self._quote_pending = False
+        self._pending_space = ""
+
+
+def parse_json_text(text: str, roots: str = "{[") -> Any:
+    """
+    从完整的模型输出中解析JSON（容错）
+
+    Args:
+        text: 模型输出
+        roots: 可作为根值开头的字符（"{" 只接受对象，"{[" 对象或数组）
+
+    Returns:
+        解析得到的对象/数组
+
+    Raises:
+        ValueError: 没有找到JSON或无法修复（json.JSONDecodeError 是其子类）
+    """
+    return _feed_text(text, roots).result()
+
+
+def _feed_text(text: str, roots: str) -> StreamingJSONParser:
+    """把完整的模型输出交给解析器"""
+    text = text or ""
+    # 有```json代码块时从代码块开始，避免说明文字中的括号被当作JSON开头
+    fence = text.find("```json")
+    if fence >= 0:
+        text = text[fence + len("```json"):]
+    return StreamingJSONParser(roots).feed(text)
+
+
+def strip_code_fence(text: str) -> str:
+    """去掉续写开头的代码块标记"""
+    stripped = text.lstrip()
+    if stripped.startswith("```"):
+        newline = stripped.find("\n")
+        return stripped[newline + 1:] if newline >= 0 else ""
+    return text
+
+
+def merge_continuation(previous: str, continuation: str) -> Tuple[str, bool]:
+    """
+    把续写请求的输出接到已有输出后面
+
+    Args:
+        previous: 已有（被截断的）输出
+        continuation: 续写请求的输出
+
+    Returns:
+        (续写中新增的文本, 是否从头重新输出)；重新输出时新增文本即完整输出
+    """
+    continuation = strip_code_fence(continuation)
+
+    # 模型没有续写而是从头重新输出了整个JSON
+    head = continuation.lstrip()[:RESTART_PREFIX_LENGTH]
+    body = strip_code_fence(previous).lstrip()
+    if len(head) == RESTART_PREFIX_LENGTH and body.startswith(head):
+        return continuation, True
+
+    # 去掉与已有输出末尾重复的部分
+    limit = min(len(previous), len(continuation), MAX_CONTINUATION_OVERLAP)
+    for overlap in range(limit, MIN_CONTINUATION_OVERLAP - 1, -1):
+        if previous.endswith(continuation[:overlap]):
+            return continuation[overlap:], False
+    return continuation, False
+
+
+def try_parse_json(text: str, roots: str = "{[") -> Tuple[Optional[Any], Optional[str]]:
+    """
+    parse_json_text 的不抛异常版本
+
+    Returns:
+        (解析结果, 错误信息)，解析失败时结果为None
+    """
+    try:
+        return parse_json_text(text, roots), None
+    except ValueError as e:
+        return None, str(e)
+
+
+def parse_complete_json(text: str, roots: str = "{[") -> Tuple[Optional[Any], Optional[str]]:
+    """
+    try_parse_json 的严格版本：JSON必须完整闭合，截断后补齐的结果视为失败
+    （判断模型输出能否写入/使用响应缓存）
+
+    Returns:
+        (解析结果, 错误信息)，解析失败或输出被截断时结果为None
+    """
+    parser = _feed_text(text, roots)
+    if parser.truncated:
+        return None, "JSON不完整（输出被截断）"
+    try:
+        return parser.result(), None
+    except ValueError as e:
+        return None, str(e)
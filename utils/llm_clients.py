@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+"""
+共享LLM客户端池
+按服务商（OpenRouter / DashScope / DeepSeek）复用 AsyncOpenAI 客户端及其HTTP连接
+（keep-alive，安装了h2时走HTTP/2），各Agent和模型封装不再各自创建客户端
+
+- 异步调用（acall / acall_gemini / aprocess）：使用调用方事件循环上的客户端
+  （HTTP客户端的连接绑定创建它的事件循环，每个事件循环一组客户端）
+- 同步调用（原有API）：把协程提交到客户端池的后台事件循环执行并等待结果，
+  所有线程的同步调用共用后台事件循环上的同一组连接，不再每个调用阻塞占用一个连接池
+- 所有请求经过限流器（utils/rate_governor.py）：限速、自适应并发、重试都在那里，
+  客户端自身不再重试（max_retries=0）
+- 要求JSON输出的调用用 acall_json / call_json：边接收边增量解析（utils/json_stream.py），
+  输出被截断时发"从截断处继续"的续写请求（默认不重新附带图片），而不是整个重试
+连接数上限等见 config.PERFORMANCE_CONFIG 中的 llm_* 配置，服务商地址见 config.API_CONFIG
+"""
+
+import asyncio
+import contextvars
+import importlib
+import importlib.util
+import threading
+import weakref
+from typing import Any, Callable, Coroutine, Dict, Iterator, List, Optional, Tuple
+
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from config import API_CONFIG, PERFORMANCE_CONFIG
+from utils.json_stream import StreamingJSONParser, merge_continuation
+from utils.prompt_encoder import estimate_prompt_tokens
+from utils.rate_governor import get_rate_governor
+
+
+# 续写请求的用户消息
+CONTINUATION_PROMPT = (
+    "上面的输出因长度限制被截断。请从截断处紧接着继续输出剩余内容："
+    "不要重复已输出的部分，不要从头重新输出，不要添加代码块标记或任何说明。"
+)
+
+
+def _http_library():
+    """
+    openai 使用的HTTP库（openai 1.x 为 httpx，新版本为 httpx2）
+
+    http_client 必须是该库的 AsyncClient，连接池限额也须用同一个库的 Limits
+    """
+    base = DefaultAsyncHttpxClient.__mro__[1]
+    return importlib.import_module(base.__module__.split(".")[0])
+
+
+class LLMClientPool:
+    """按 (服务商, API Key) 共享的 AsyncOpenAI 客户端池"""
+
+    def __init__(
+        self,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        http2: Optional[bool] = None
+    ):
+        """
+        初始化客户端池
+
+        Args:
+            max_connections: 每个客户端的最大连接数，默认使用 PERFORMANCE_CONFIG["llm_max_connections"]
+            max_keepalive_connections: 每个客户端保持的空闲连接数，默认使用 PERFORMANCE_CONFIG["llm_max_keepalive_connections"]
+            keepalive_expiry: 空闲连接保持时间（秒），默认使用 PERFORMANCE_CONFIG["llm_keepalive_expiry"]
+            http2: 是否启用HTTP/2（需要h2包，未安装时退回HTTP/1.1），默认使用 PERFORMANCE_CONFIG["llm_http2"]
+        """
+        self.limits = _http_library().Limits(
+            max_connections=max_connections or PERFORMANCE_CONFIG["llm_max_connections"],
+            max_keepalive_connections=max_keepalive_connections or PERFORMANCE_CONFIG["llm_max_keepalive_connections"],
+            keepalive_expiry=keepalive_expiry or PERFORMANCE_CONFIG["llm_keepalive_expiry"]
+        )
+        http2 = PERFORMANCE_CONFIG["llm_http2"] if http2 is None else http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            print("⚠️  未安装h2，LLM客户端使用HTTP/1.1（pip install h2 启用HTTP/2）")
+            http2 = False
+        self.http2 = http2
+
+        # 事件循环 → {(服务商, API Key): 客户端}（事件循环结束后随之释放）
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], AsyncOpenAI]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+        # 同步调用使用的后台事件循环（首次同步调用时启动）
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def client(self, provider: str, api_key: Optional[str] = None) -> AsyncOpenAI:
+        """
+        获取当前事件循环上的客户端（须在协程中调用）
+
+        Args:
+            provider: 服务商（API_CONFIG中的名称：openrouter / dashscope / deepseek）
+            api_key: API Key，默认使用 API_CONFIG 中的配置
+
+        Returns:
+            该服务商的 AsyncOpenAI 客户端
+        """
+        settings = API_CONFIG[provider]
+        api_key = api_key or settings["api_key"]
+        if not api_key:
+            raise ValueError(f"缺少{provider}的API Key")
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._clients.setdefault(loop, {})
+            key = (provider, api_key)
+            if key not in clients:
+                clients[key] = AsyncOpenAI(
+                    api_key=api_key,
+                    base_url=settings["base_url"],
+                    max_retries=0,  # 重试由限流器统一处理
+                    http_client=DefaultAsyncHttpxClient(limits=self.limits, http2=self.http2)
+                )
+            return clients[key]
+
+    def run(self, coroutine: Coroutine) -> Any:
+        """
+        同步等待协程结果（在客户端池的后台事件循环上执行，带上调用方的上下文变量，如限流器的当前任务）
+
+        Args:
+            coroutine: 要执行的协程
+
+        Returns:
+            协程的返回值（异常原样抛出）
+        """
+        loop = self._background_loop()
+        if threading.current_thread() is self._thread:
+            coroutine.close()
+            raise RuntimeError("不能在LLM后台事件循环中同步等待，请改用异步接口（acall / aprocess）")
+
+        context = contextvars.copy_context()
+
+        async def in_caller_context():
+            for variable, value in context.items():
+                variable.set(value)
+            return await coroutine
+
+        return asyncio.run_coroutine_threadsafe(in_caller_context(), loop).result()
+
+    def iterate(self, coroutine: Coroutine) -> Iterator:
+        """
+        同步迭代异步流（流式响应：协程返回 AsyncStream，逐块在后台事件循环上读取）
+
+        Args:
+            coroutine: 返回异步可迭代对象的协程
+
+        Yields:
+            流中的每一块
+        """
+        stream = self.run(coroutine)
+        iterator = stream.__aiter__()
+        finished = object()
+
+        async def next_chunk():
+            try:
+                return await iterator.__anext__()
+            except StopAsyncIteration:
+                return finished
+
+        try:
+            while True:
+                chunk = self.run(next_chunk())
+                if chunk is finished:
+                    return
+                yield chunk
+        finally:
+            # 调用方提前停止迭代时释放连接
+            if hasattr(stream, "close"):
+                self.run(stream.close())
+
+    async def aclose(self):
+        """关闭当前事件循环上的所有客户端"""
+        with self._lock:
+            clients = self._clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.close()
+
+    def close(self):
+        """关闭后台事件循环及其客户端"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        """后台事件循环（守护线程，进程退出时随之结束）"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="llm-client-pool", daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+
+class PooledLLMClient:
+    """
+    使用共享客户端池的模型封装基类
+
+    子类设置 provider（API_CONFIG中的服务商名称），实例设置 api_key
+    """
+
+    provider: str = ""
+    api_key: Optional[str] = None
+
+    async def acall(self, **request) -> Any:
+        """
+        异步调用 chat.completions.create（经过限流器：限速、自适应并发、重试；发送前输出提示词token预估）
+
+        Args:
+            **request: chat.completions.create 的参数（model、messages等）
+
+        Returns:
+            ChatCompletion
+        """
+        client = get_client_pool().client(self.provider, self.api_key)
+        if PERFORMANCE_CONFIG["llm_report_prompt_tokens"]:
+            prompt = estimate_prompt_tokens(request.get("messages", []))
+            label = getattr(self, "agent_name", type(self).__name__)
+            print(
+                f"🧮 [{label}] 提示词约 {prompt['total']} tokens"
+                f"（文本 {prompt['text_tokens']}，图片 {prompt['images']} 张）"
+            )
+        return await get_rate_governor().execute(
+            self.provider, request, lambda: client.chat.completions.create(**request)
+        )
+
+    def call(self, **request) -> Any:
+        """同步调用 chat.completions.create（acall 的同步封装；stream=True 时返回同步迭代器）"""
+        if request.get("stream"):
+            return get_client_pool().iterate(self.acall(**request))
+        return run_sync(self.acall(**request))
+
+    async def acall_json(
+        self,
+        roots: str = "{[",
+        on_text: Optional[Callable[[str], None]] = None,
+        on_reasoning: Optional[Callable[[str], None]] = None,
+        max_continuations: Optional[int] = None,
+        **request
+    ) -> Dict[str, Any]:
+        """
+        调用模型并容错解析JSON输出（流式请求边接收边解析）
+
+        输出在JSON闭合之前结束（截断）时，把已有输出作为assistant消息发续写请求，
+        续写结果接在已有输出后面继续解析；续写次数用完仍未闭合时补齐后解析，结果按失败返回
+
+        Args:
+            roots: 可作为JSON根值开头的字符（"{" 只接受对象，"{[" 对象或数组）
+            on_text: 每收到一段文本时的回调（显示进度）
+            on_reasoning: 每收到一段思考过程（delta.reasoning_content）时的回调
+            max_continuations: 最多续写次数，默认使用 PERFORMANCE_CONFIG["llm_max_continuations"]
+            **request: chat.completions.create 的参数（model、messages、stream等）
+
+        Returns:
+            {
+                "success": bool,  # 是否解析出完整的JSON（续写用完仍被截断时为False）
+                "result": 解析结果（截断时为补齐后的部分结果，无法解析时为None）,
+                "raw_response": str,  # 完整输出（含续写）
+                "complete": bool,  # JSON是否完整闭合（否则为截断后补齐的结果）
+                "continuations": int,  # 续写请求次数
+                "error": str  # 失败原因（仅失败时）
+            }
+        """
+        if max_continuations is None:
+            max_continuations = PERFORMANCE_CONFIG["llm_max_continuations"]
+
+        parser = StreamingJSONParser(roots)
+        finish_reason = await self._acollect(request, parser.feed, on_text, on_reasoning)
+        continuations = 0
+        while parser.truncated and continuations < max_continuations:
+            continuations += 1
+            print(f"✂️ 输出在JSON闭合前结束（finish_reason={finish_reason}），请求从截断处继续（第{continuations}次）")
+            pieces: List[str] = []
+            follow_up = dict(request, messages=_continuation_messages(request["messages"], parser.text))
+            finish_reason = await self._acollect(follow_up, pieces.append, on_text, on_reasoning)
+            addition, restarted = merge_continuation(parser.text, "".join(pieces))
+            if restarted:
+                parser = StreamingJSONParser(roots)
+            parser.feed(addition)
+
+        response = {
+            "success": True,
+            "result": None,
+            "raw_response": parser.text,
+            "complete": parser.done,
+            "continuations": continuations
+        }
+        try:
+            response["result"] = parser.result()
+        except ValueError as e:
+            response.update(success=False, error=str(e))
+        else:
+            if parser.truncated:
+                print(f"⚠️ 续写{continuations}次后JSON仍未闭合，结果为截断补齐的部分内容")
+                response.update(success=False, error=f"输出被截断（续写{continuations}次后JSON仍未闭合）")
+        return response
+
+    def call_json(self, **kwargs) -> Dict[str, Any]:
+        """acall_json 的同步封装"""
+        return run_sync(self.acall_json(**kwargs))
+
+    async def _acollect(
+        self,
+        request: Dict[str, Any],
+        sink: Callable[[str], Any],
+        on_text: Optional[Callable[[str], None]] = None,
+        on_reasoning: Optional[Callable[[str], None]] = None
+    ) -> Optional[str]:
+        """
+        执行请求并把输出文本交给 sink（流式请求逐块交付）
+
+        Returns:
+            finish_reason（"length" 表示达到输出长度上限）
+        """
+        if not request.get("stream"):
+            choice = (await self.acall(**request)).choices[0]
+            text = choice.message.content or ""
+            sink(text)
+            if on_text:
+                on_text(text)
+            return choice.finish_reason
+
+        stream = await self.acall(**request)
+        finish_reason = None
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                finish_reason = choice.finish_reason or finish_reason
+                reasoning = getattr(choice.delta, "reasoning_content", None)
+                if reasoning and on_reasoning:
+                    on_reasoning(reasoning)
+                if choice.delta.content:
+                    sink(choice.delta.content)
+                    if on_text:
+                        on_text(choice.delta.content)
+        finally:
+            await stream.close()
+        return finish_reason
+
+
+def _continuation_messages(messages: List[Dict], partial: str) -> List[Dict]:
+    """
+    续写请求的消息：原对话 + 已有输出（assistant）+ 续写要求
+
+    默认去掉原消息中的图片（已有输出已包含对图纸的分析，不再重复上传），
+    见 PERFORMANCE_CONFIG["llm_continuation_images"]
+    """
+    keep_images = PERFORMANCE_CONFIG["llm_continuation_images"]
+    follow_up = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list) and not keep_images:
+            content = [part for part in content if part.get("type") == "text"]
+            message = dict(message, content=content)
+        follow_up.append(message)
+    follow_up.append({"role": "assistant", "content": partial})
+    follow_up.append({"role": "user", "content": CONTINUATION_PROMPT})
+    return follow_up
+
+
+# 全局共享的客户端池（惰性创建）
+_default_pool: Optional[LLMClientPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_client_pool() -> LLMClientPool:
+    """获取全局共享的客户端池"""
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = LLMClientPool()
+    return _default_pool
+
+
+def run_sync(coroutine: Coroutine) -> Any:
+    """在共享客户端池的后台事件循环上同步执行协程（原有同步API的封装）"""
+    return get_client_pool().run(coroutine)
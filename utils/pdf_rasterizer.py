@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+PDF并行栅格化
+把页面分发到进程池渲染，结果以内存中的编码字节返回，是否落盘由调用方决定
+
+- 每个工作进程对同一PDF只打开一次 fitz.Document（进程内按路径缓存）
+- 每页完成即回调进度，调用方可转发给 ProgressReporter
+- 页数较少或只有一个工作进程时在当前进程内串行渲染，避免进程池启动开销
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import fitz  # PyMuPDF
+
+from config import IMAGE_CONFIG, PERFORMANCE_CONFIG
+from utils.image_prep import render_page_pixmap
+
+
+# 少于该页数时不启动进程池
+PARALLEL_MIN_PAGES = 4
+
+# 进度回调：(已完成页数, 总页数, 页码)
+ProgressCallback = Callable[[int, int, int], None]
+
+# 工作进程内已打开的文档（进程级，按路径缓存）
+_worker_docs: Dict[str, "fitz.Document"] = {}
+
+
+def _worker_document(pdf_path: str) -> "fitz.Document":
+    doc = _worker_docs.get(pdf_path)
+    if doc is None:
+        doc = fitz.open(pdf_path)
+        _worker_docs[pdf_path] = doc
+    return doc
+
+
+def _render_page(pdf_path: str, page_index: int, dpi: float, colorspace: str, fmt: str) -> Tuple[int, bytes]:
+    """进程池任务：渲染单页并编码为字节"""
+    pix = render_page_pixmap(_worker_document(pdf_path)[page_index], dpi, colorspace)
+    return page_index, pix.tobytes(fmt)
+
+
+def iter_rasterize_pdf(
+    pdf_path: str,
+    dpi: float,
+    colorspace: Optional[str] = None,
+    page_indices: Optional[Sequence[int]] = None,
+    max_workers: Optional[int] = None,
+    fmt: str = "png",
+    progress_callback: Optional[ProgressCallback] = None
+) -> Iterator[Tuple[int, bytes]]:
+    """
+    逐页产出渲染结果（按完成顺序）
+
+    Args:
+        pdf_path: PDF文件路径
+        dpi: 渲染DPI
+        colorspace: "gray" 或 "rgb"，默认 IMAGE_CONFIG["render_colorspace"]
+        page_indices: 要渲染的页码（从0开始），默认全部页面
+        max_workers: 工作进程数，默认 PERFORMANCE_CONFIG["render_workers"]
+        fmt: 编码格式（fitz.Pixmap.tobytes 支持的格式，如 "png"）
+        progress_callback: 每页完成后调用 (已完成页数, 总页数, 页码)
+
+    Yields:
+        (页码, 编码后的图片字节)
+    """
+    pdf_path = str(pdf_path)
+    colorspace = colorspace or IMAGE_CONFIG["render_colorspace"]
+    if page_indices is None:
+        with fitz.open(pdf_path) as doc:
+            page_indices = range(len(doc))
+    page_indices = list(page_indices)
+
+    total = len(page_indices)
+    workers = min(max_workers or PERFORMANCE_CONFIG["render_workers"], total)
+
+    if workers <= 1 or total < PARALLEL_MIN_PAGES:
+        with fitz.open(pdf_path) as doc:
+            for done, page_index in enumerate(page_indices, 1):
+                data = render_page_pixmap(doc[page_index], dpi, colorspace).tobytes(fmt)
+                if progress_callback:
+                    progress_callback(done, total, page_index)
+                yield page_index, data
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_render_page, pdf_path, page_index, dpi, colorspace, fmt)
+            for page_index in page_indices
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            page_index, data = future.result()
+            if progress_callback:
+                progress_callback(done, total, page_index)
+            yield page_index, data
+
+
+def rasterize_pdf(
+    pdf_path: str,
+    dpi: float,
+    colorspace: Optional[str] = None,
+    page_indices: Optional[Sequence[int]] = None,
+    max_workers: Optional[int] = None,
+    fmt: str = "png",
+    progress_callback: Optional[ProgressCallback] = None
+) -> List[bytes]:
+    """
+    并行渲染PDF页面，返回按页码顺序排列的编码字节（不写磁盘）
+
+    Args:
+        同 iter_rasterize_pdf
+
+    Returns:
+        与page_indices顺序一致的图片字节列表
+    """
+    results = dict(iter_rasterize_pdf(
+        pdf_path, dpi, colorspace, page_indices, max_workers, fmt, progress_callback
+    ))
+    order = page_indices if page_indices is not None else sorted(results)
+    return [results[page_index] for page_index in order]
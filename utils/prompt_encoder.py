@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+提示词数据编码
+BOM表、零件清单、装配步骤等列表数据写入提示词时的紧凑格式，以及提示词token数预估
+
+- 表格：首行列名，每条记录一行，以 | 分隔（不再逐条重复字段名、引号和缩进）
+- 空值：None、空字符串、空列表/对象的单元格留空，整列为空的列不输出
+- 嵌套值：标量列表用顿号连接，对象/对象列表用紧凑JSON（去掉空字段）
+- 别名：多次出现的长字符串（零件名称、规格等）换成 &1、&2…，在表格前给出对照
+- 预估：按中文字符约1 token、其他字符约0.3 token、每张图片约1000 token估算，
+  请求发送前输出（见 utils/llm_clients.py），限流器的token预估也使用同一算法（见 utils/rate_governor.py）
+"""
+
+import json
+import math
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+
+# 预估token：中文（含全角标点）每字、其他每字符、每张图片
+TOKENS_PER_CJK_CHAR = 1.0
+TOKENS_PER_OTHER_CHAR = 0.3
+TOKENS_PER_IMAGE = 1000
+
+CJK_PATTERN = re.compile("[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")  # 中日韩文字、全角标点
+
+# 换成别名的字符串最短长度
+MIN_ALIAS_LENGTH = 6
+ALIAS_PREFIX = "&"
+
+TABLE_NOTE = "（表格：首行为列名，每行一条记录，以|分隔，空单元格表示无此项）"
+ALIAS_NOTE = "（别名：表格中的{prefix}n代表以下内容；输出中引用时写原文，不要写别名）"
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or (isinstance(value, (list, dict)) and not value)
+
+
+def _drop_empty(value: Any) -> Any:
+    """递归去掉对象中的空字段"""
+    if isinstance(value, dict):
+        return {key: _drop_empty(item) for key, item in value.items() if not _is_empty(item)}
+    if isinstance(value, list):
+        return [_drop_empty(item) for item in value if not _is_empty(item)]
+    return value
+
+
+def encode_value(value: Any) -> str:
+    """
+    单元格内容
+
+    Args:
+        value: 字段值
+
+    Returns:
+        单行文本（不含 |）；空值为空字符串
+    """
+    if _is_empty(value):
+        return ""
+    if isinstance(value, bool):
+        text = "true" if value else "false"
+    elif isinstance(value, float):
+        text = f"{value:.4f}".rstrip("0").rstrip(".") if math.isfinite(value) else str(value)
+    elif isinstance(value, (int, str)):
+        text = str(value).strip()
+    elif isinstance(value, list) and all(not isinstance(item, (list, dict)) for item in value):
+        text = "、".join(encode_value(item) for item in value if not _is_empty(item))
+    else:
+        text = json.dumps(_drop_empty(value), ensure_ascii=False, separators=(",", ":"))
+    # 单元格内不能有换行和分隔符
+    return re.sub(r"\s*[\r\n]+\s*", " ", text).replace("|", "｜")
+
+
+def _aliases(cells: Iterable[str]) -> Dict[str, str]:
+    """为重复出现、换成别名后能缩短总长度的字符串分配别名（节省多的优先）"""
+    counts: Dict[str, int] = {}
+    for cell in cells:
+        if len(cell) >= MIN_ALIAS_LENGTH:
+            counts[cell] = counts.get(cell, 0) + 1
+
+    def saving(text: str) -> int:
+        alias_length = len(ALIAS_PREFIX) + 2
+        # 每处替换节省的字符 - 对照行的开销
+        return (len(text) - alias_length) * counts[text] - (len(text) + alias_length + 1)
+
+    candidates = sorted((text for text in counts if counts[text] > 1 and saving(text) > 0), key=saving, reverse=True)
+    return {text: f"{ALIAS_PREFIX}{index}" for index, text in enumerate(candidates, 1)}
+
+
+def encode_table(
+    rows: List[Dict],
+    columns: Optional[List[str]] = None,
+    aliases: bool = True,
+    note: bool = True
+) -> str:
+    """
+    把字典列表编码成紧凑表格
+
+    Args:
+        rows: 记录列表
+        columns: 输出的列（按顺序），默认为所有记录中出现过的字段
+        aliases: 是否把重复的长字符串换成别名
+        note: 是否在表格前加一行格式说明
+
+    Returns:
+        表格文本；没有记录时为"（无）"
+    """
+    if not rows:
+        return "（无）"
+    if columns is None:
+        columns = list(dict.fromkeys(key for row in rows for key in row))
+
+    cells = [[encode_value(row.get(column)) for column in columns] for row in rows]
+    # 去掉整列为空的列
+    keep = [index for index in range(len(columns)) if any(row[index] for row in cells)]
+    columns = [columns[index] for index in keep]
+    cells = [[row[index] for index in keep] for row in cells]
+
+    lines = []
+    if note:
+        lines.append(TABLE_NOTE)
+    alias_map = _aliases(cell for row in cells for cell in row) if aliases else {}
+    if alias_map:
+        lines.append(ALIAS_NOTE.format(prefix=ALIAS_PREFIX))
+        lines.extend(f"{alias}={text}" for text, alias in alias_map.items())
+        lines.append("")
+    lines.append("|".join(columns))
+    lines.extend("|".join(alias_map.get(cell, cell) for cell in row) for row in cells)
+    return "\n".join(lines)
+
+
+def estimate_text_tokens(text: str) -> int:
+    """预估一段文本的token数"""
+    if not text:
+        return 0
+    cjk = len(CJK_PATTERN.findall(text))
+    return math.ceil(cjk * TOKENS_PER_CJK_CHAR + (len(text) - cjk) * TOKENS_PER_OTHER_CHAR)
+
+
+def estimate_prompt_tokens(messages: List[Dict]) -> Dict[str, int]:
+    """
+    预估一次请求提示词的token数
+
+    Args:
+        messages: chat.completions.create 的 messages
+
+    Returns:
+        {"text_tokens": 文本token数, "images": 图片数, "total": 合计token数}
+    """
+    text_tokens, images = 0, 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            text_tokens += estimate_text_tokens(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                text_tokens += estimate_text_tokens(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                images += 1
+    return {"text_tokens": text_tokens, "images": images, "total": text_tokens + images * TOKENS_PER_IMAGE}
@@ -0,0 +1,466 @@
+# -*- coding: utf-8 -*-
+"""
+LLM调用限流与自适应并发
+所有模型客户端（utils/llm_clients.py 的 PooledLLMClient.acall）的请求都经过这里，
+并行链路和多个任务同时运行时不超过各服务商的限额
+
+- 速率：按服务商、按模型的令牌桶（每分钟请求数、每分钟token数）；
+  token按请求内容预估先扣，响应返回后按实际用量多退少补
+- 并发：每个服务商的并发上限按AIMD调整——请求成功且延迟正常时加性增加，
+  429/5xx 或延迟明显变长时乘性减小（同一拥塞窗口内只减一次）；流式请求在流读完或关闭后才归还名额
+- 重试：429/408/409/5xx 和连接错误按 Retry-After（有则优先，并暂停该服务商的所有请求）
+  或带抖动的指数退避重试
+- 公平：等待并发名额的请求按任务轮转放行，大产品的几十个请求不会饿死小任务
+  （任务由 job_scope 设置，未设置时归入 "default"）
+- 指标：metrics() 返回各服务商的并发上限、在途/排队数（按任务）、限流与重试计数及最近的限流事件
+
+配置见 config.RATE_LIMIT_CONFIG。
+"""
+
+import asyncio
+import contextvars
+import email.utils
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import openai
+
+from config import RATE_LIMIT_CONFIG
+from utils.prompt_encoder import estimate_prompt_tokens
+
+
+# 当前任务（公平调度与指标的分组键）
+current_job: contextvars.ContextVar = contextvars.ContextVar("llm_job", default="default")
+
+# 重试的HTTP状态码（另加所有5xx）
+RETRY_STATUS_CODES = (408, 409, 429)
+
+# 预估token时未设置max_tokens的请求按此输出量计（提示词部分见 utils/prompt_encoder.py）
+DEFAULT_OUTPUT_TOKENS = 2000
+
+# 延迟指数滑动平均的权重
+LATENCY_SMOOTHING = 0.2
+
+# 延迟基线每个请求向当前延迟靠拢的比例（基线约为最近 1/0.05 个请求中的最好值）
+LATENCY_BASELINE_DRIFT = 0.05
+
+# 按输出token归一化延迟时的最少token数（很短的输出主要是固定开销）
+MIN_LATENCY_TOKENS = 50
+
+# 保留的最近限流事件数
+THROTTLE_EVENT_HISTORY = 100
+
+
+@contextmanager
+def job_scope(job_id: str):
+    """在该作用域内发出的LLM请求归属于任务 job_id（线程池提交时需用 contextvars.copy_context 传递）"""
+    token = current_job.set(job_id)
+    try:
+        yield
+    finally:
+        current_job.reset(token)
+
+
+class TokenBucket:
+    """每分钟限额的令牌桶（预约式：先扣后等，允许欠额，按欠额计算等待时间）"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        """
+        扣除 amount 个令牌
+
+        Returns:
+            需要等待的秒数（令牌不足时）
+        """
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        self.level -= amount
+        return max(0.0, -self.level / self.rate)
+
+    def refund(self, amount: float):
+        """退回（amount为负时补扣）预估与实际用量的差额"""
+        self.level = min(self.capacity, self.level + amount)
+
+
+class SlotStream:
+    """流式响应的包装：流读完、出错或关闭时归还占用的并发名额（只归还一次），其余属性转给原来的流"""
+
+    def __init__(self, stream: Any, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        finally:
+            self._release_once()
+
+    async def close(self):
+        try:
+            await self._stream.close()
+        finally:
+            self._release_once()
+
+    async def __aenter__(self) -> "SlotStream":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
+
+    def _release_once(self):
+        if not self._released:
+            self._released = True
+            self._release()
+
+
+class _ProviderState:
+    """一个服务商的并发名额、等待队列和统计"""
+
+    def __init__(self, name: str, settings: Dict, min_concurrency: float):
+        self.name = name
+        self.min_concurrency = float(min_concurrency)
+        self.max_concurrency = float(settings["max_concurrency"])
+        self.limit = float(settings.get("initial_concurrency", self.max_concurrency))
+        self.in_flight = 0
+        # 任务 → 等待中的 (事件循环, future)，按任务轮转放行
+        self.waiters: "OrderedDict[str, Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]]" = OrderedDict()
+        self.in_flight_by_job: Dict[str, int] = {}
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.latency = None
+        # 延迟统计：类别 → (平滑后的延迟, 基线)；有输出token数时按每token计（"per_token"），否则按每请求计（"request"）
+        self.latency_stats: Dict[str, Tuple[float, float]] = {}
+        self.counters = {"requests": 0, "throttled": 0, "server_errors": 0, "retries": 0, "failures": 0}
+
+
+class RateGovernor:
+    """LLM请求的限流、自适应并发、重试与公平调度（各事件循环、线程共享一个实例）"""
+
+    def __init__(self, config: Optional[Dict] = None):
+        """
+        Args:
+            config: 限流配置，默认使用 RATE_LIMIT_CONFIG
+        """
+        self.config = config or RATE_LIMIT_CONFIG
+        self._lock = threading.Lock()
+        self._providers: Dict[str, _ProviderState] = {}
+        self._buckets: Dict[Tuple[str, str, str], TokenBucket] = {}
+        self._events: Deque[Dict] = deque(maxlen=THROTTLE_EVENT_HISTORY)
+
+    async def execute(self, provider: str, request: Dict, send: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        在限流和重试下发送一个请求
+
+        Args:
+            provider: 服务商（RATE_LIMIT_CONFIG["providers"]中的名称）
+            request: chat.completions.create 的参数（用于预估token和按模型限流）
+            send: 发送请求的协程工厂（每次重试调用一次）
+
+        Returns:
+            send 的结果；流式请求（stream=True）返回的流读完或关闭前一直占用并发名额
+        """
+        job = current_job.get()
+        model = request.get("model", "")
+        state = self._state(provider)
+        estimate = estimate_tokens(request)
+
+        attempt = 0
+        while True:
+            await self._acquire(state, job)
+            held = False
+            try:
+                await self._wait_for_rate(state, model, estimate)
+                started = time.monotonic()
+                try:
+                    response = await send()
+                except Exception as error:
+                    delay = self._on_error(state, model, job, error, attempt)
+                    if delay is None:
+                        raise
+                else:
+                    self._on_success(state, model, response, estimate, time.monotonic() - started)
+                    if request.get("stream"):
+                        # 响应体还没有读取：名额交给流，读完或关闭时归还
+                        held = True
+                        return SlotStream(response, lambda: self._release(state, job))
+                    return response
+            finally:
+                if not held:
+                    self._release(state, job)
+
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def metrics(self) -> Dict:
+        """
+        各服务商的限流指标快照
+
+        Returns:
+            {
+                "providers": {服务商: {"concurrency_limit", "in_flight", "queued", "in_flight_by_job",
+                                      "queued_by_job", "paused_for_s", "latency_s", "requests",
+                                      "throttled", "server_errors", "retries", "failures"}},
+                "throttle_events": [{"time", "provider", "model", "job", "status", "delay_s", "attempt"}, ...]
+            }
+        """
+        now = time.monotonic()
+        with self._lock:
+            providers = {
+                name: {
+                    "concurrency_limit": int(state.limit),
+                    "in_flight": state.in_flight,
+                    "queued": sum(len(queue) for queue in state.waiters.values()),
+                    "in_flight_by_job": dict(state.in_flight_by_job),
+                    "queued_by_job": {job: len(queue) for job, queue in state.waiters.items()},
+                    "paused_for_s": round(max(0.0, state.paused_until - now), 3),
+                    "latency_s": None if state.latency is None else round(state.latency, 3),
+                    **state.counters
+                }
+                for name, state in self._providers.items()
+            }
+            events = list(self._events)
+        return {"providers": providers, "throttle_events": events}
+
+    def _state(self, provider: str) -> _ProviderState:
+        with self._lock:
+            if provider not in self._providers:
+                self._providers[provider] = _ProviderState(
+                    provider, self._settings(provider), self.config["min_concurrency"]
+                )
+            return self._providers[provider]
+
+    def _settings(self, provider: str, model: Optional[str] = None) -> Dict:
+        settings = self.config["providers"].get(provider, self.config["providers"]["default"])
+        if model is not None:
+            return settings.get("models", {}).get(model, {})
+        return settings
+
+    # ---------- 并发名额（按任务轮转） ----------
+
+    async def _acquire(self, state: _ProviderState, job: str):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if state.in_flight < int(state.limit) and not state.waiters:
+                self._grant(state, job)
+                return
+            future = loop.create_future()
+            state.waiters.setdefault(job, deque()).append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # 名额已放行但调用方被取消：归还名额
+            if future.done() and not future.cancelled():
+                self._release(state, job)
+            raise
+
+    def _grant(self, state: _ProviderState, job: str):
+        state.in_flight += 1
+        state.in_flight_by_job[job] = state.in_flight_by_job.get(job, 0) + 1
+
+    def _release(self, state: _ProviderState, job: str):
+        with self._lock:
+            state.in_flight -= 1
+            state.in_flight_by_job[job] -= 1
+            if not state.in_flight_by_job[job]:
+                del state.in_flight_by_job[job]
+            self._dispatch(state)
+
+    def _dispatch(self, state: _ProviderState):
+        """有空闲名额时按任务轮转唤醒等待者（调用方持有锁）"""
+        while state.in_flight < int(state.limit) and state.waiters:
+            job, queue = next(iter(state.waiters.items()))
+            loop, future = queue.popleft()
+            if queue:
+                state.waiters.move_to_end(job)
+            else:
+                del state.waiters[job]
+            if future.done():
+                continue
+            self._grant(state, job)
+            loop.call_soon_threadsafe(self._wake, state, job, future)
+
+    def _wake(self, state: _ProviderState, job: str, future: asyncio.Future):
+        if future.done():
+            # 等待者在放行前已取消
+            self._release(state, job)
+        else:
+            future.set_result(None)
+
+    # ---------- 速率 ----------
+
+    async def _wait_for_rate(self, state: _ProviderState, model: str, estimate: int):
+        with self._lock:
+            wait = max(0.0, state.paused_until - time.monotonic())
+            for bucket, amount in self._buckets_for(state.name, model, estimate):
+                wait = max(wait, bucket.reserve(amount))
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _buckets_for(self, provider: str, model: str, tokens: int):
+        """(令牌桶, 扣除量)：服务商级和模型级的请求数、token数限额（调用方持有锁）"""
+        for scope, settings in (("*", self._settings(provider)), (model, self._settings(provider, model))):
+            for kind, amount in (("requests_per_minute", 1), ("tokens_per_minute", tokens)):
+                if settings.get(kind):
+                    key = (provider, scope, kind)
+                    if key not in self._buckets:
+                        self._buckets[key] = TokenBucket(settings[kind])
+                    yield self._buckets[key], amount
+
+    # ---------- 结果反馈 ----------
+
+    def _on_success(self, state: _ProviderState, model: str, response: Any, estimate: int, latency: float):
+        usage = getattr(response, "usage", None)
+        actual = getattr(usage, "total_tokens", None)
+        with self._lock:
+            state.counters["requests"] += 1
+            if actual is not None:
+                for scope in ("*", model):
+                    bucket = self._buckets.get((state.name, scope, "tokens_per_minute"))
+                    if bucket is not None:
+                        bucket.refund(estimate - actual)
+
+            state.latency = latency if state.latency is None else (
+                (1 - LATENCY_SMOOTHING) * state.latency + LATENCY_SMOOTHING * latency
+            )
+            if self._latency_congested(state, response, latency):
+                # 延迟明显变长：服务商在排队，减小并发
+                self._decrease(state, self.config["latency_decrease"])
+            else:
+                state.limit = min(state.max_concurrency, state.limit + 1 / max(state.limit, 1.0))
+                self._dispatch(state)
+
+    def _latency_congested(self, state: _ProviderState, response: Any, latency: float) -> bool:
+        """
+        更新延迟统计并判断是否拥塞（调用方持有锁）
+
+        延迟按输出token数归一化，长短不同的生成可以相互比较；基线取近期的最好值而不是历史最小值：
+        低于基线时立即下调，否则每个请求向当前延迟靠拢一点，偶尔一次特别快的请求不会永久压低并发上限
+
+        Returns:
+            平滑后的延迟是否超过基线的 latency_slowdown 倍
+        """
+        tokens = getattr(getattr(response, "usage", None), "completion_tokens", None)
+        if tokens:
+            kind, sample = "per_token", latency / max(tokens, MIN_LATENCY_TOKENS)
+        else:
+            kind, sample = "request", latency
+        smoothed, baseline = state.latency_stats.get(kind, (sample, sample))
+        smoothed = (1 - LATENCY_SMOOTHING) * smoothed + LATENCY_SMOOTHING * sample
+        baseline = min(smoothed, baseline + LATENCY_BASELINE_DRIFT * (smoothed - baseline))
+        state.latency_stats[kind] = (smoothed, baseline)
+        return smoothed > self.config["latency_slowdown"] * baseline
+
+    def _on_error(self, state: _ProviderState, model: str, job: str, error: Exception, attempt: int) -> Optional[float]:
+        """
+        记录失败并决定是否重试
+
+        Returns:
+            重试前等待的秒数；不重试时返回None
+        """
+        status = getattr(error, "status_code", None)
+        retryable = isinstance(error, openai.APIConnectionError) or (
+            status is not None and (status in RETRY_STATUS_CODES or status >= 500)
+        )
+        with self._lock:
+            if not retryable or attempt >= self.config["max_retries"]:
+                state.counters["failures"] += 1
+                return None
+
+            retry_after = _retry_after(error)
+            backoff = random.uniform(0, min(self.config["backoff_max"], self.config["backoff_base"] * 2 ** attempt))
+            delay = backoff if retry_after is None else retry_after + random.uniform(0, self.config["backoff_base"])
+
+            if status == 429:
+                state.counters["throttled"] += 1
+                if retry_after is not None:
+                    # 服务商明确要求等待：该服务商的所有请求一起暂停
+                    state.paused_until = max(state.paused_until, time.monotonic() + retry_after)
+            elif status is not None and status >= 500:
+                state.counters["server_errors"] += 1
+            if status == 429 or (status is not None and status >= 500):
+                self._decrease(state, self.config["error_decrease"])
+            state.counters["retries"] += 1
+
+            self._events.append({
+                "time": time.time(),
+                "provider": state.name,
+                "model": model,
+                "job": job,
+                "status": status or type(error).__name__,
+                "delay_s": round(delay, 3),
+                "attempt": attempt + 1
+            })
+        print(f"⏳ [{state.name}] {status or type(error).__name__}，{delay:.1f}s后重试（第{attempt + 1}次）")
+        return delay
+
+    def _decrease(self, state: _ProviderState, factor: float):
+        """乘性减小并发上限；一个拥塞窗口（约一个请求的延迟）内只减一次（调用方持有锁）"""
+        now = time.monotonic()
+        if now - state.last_decrease < (state.latency or 1.0):
+            return
+        state.last_decrease = now
+        state.limit = max(state.min_concurrency, state.limit * factor)
+
+
+def estimate_tokens(request: Dict) -> int:
+    """按提示词预估（文本、图片）和输出上限预估一次请求的token数"""
+    output = request.get("max_tokens") or DEFAULT_OUTPUT_TOKENS
+    return estimate_prompt_tokens(request.get("messages", []))["total"] + output
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """响应头 Retry-After（秒数或HTTP日期）/ retry-after-ms 要求的等待秒数"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    milliseconds = headers.get("retry-after-ms")
+    if milliseconds:
+        try:
+            return max(0.0, float(milliseconds) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# 全局共享的限流器（惰性创建）
+_default_governor: Optional[RateGovernor] = None
+_default_governor_lock = threading.Lock()
+
+
+def get_rate_governor() -> RateGovernor:
+    """获取全局共享的限流器"""
+    global _default_governor
+    if _default_governor is None:
+        with _default_governor_lock:
+            if _default_governor is None:
+                _default_governor = RateGovernor()
+    return _default_governor
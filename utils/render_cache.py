@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+"""
+PDF页面渲染缓存
+整个系统共用的页面栅格化服务，每个页面在每个DPI下只渲染一次
+
+缓存键 = (PDF内容SHA-256, 页码, DPI, 色彩空间)
+存储布局：<CACHE_CONFIG["directory"]>/page_renders/<hash[:2]>/<hash>/p0001_200_gray.png
+- 同一页面已缓存更高DPI时，低DPI版本直接由高DPI图片缩小得到，不再渲染PDF
+- 缺失页面交给 utils.pdf_rasterizer 在进程池中并行渲染，逐页回调进度
+- 需要固定输出目录的调用方（如HTML引用的图片）通过硬链接/复制从缓存取得文件
+- 缓存总字节数超过 CACHE_CONFIG["page_render_max_size"] 后按最近访问时间淘汰（LRU）
+"""
+
+import io
+import os
+import json
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from config import CACHE_CONFIG, IMAGE_CONFIG
+from utils.file_hash import hash_file
+from utils.pdf_rasterizer import ProgressCallback, iter_rasterize_pdf
+
+
+# 渲染缓存子目录
+RENDER_CACHE_SUBDIR = "page_renders"
+
+# 每个PDF的元数据文件（页数）
+META_FILE = "meta.json"
+
+# 淘汰后保留的容量比例
+EVICTION_TARGET_RATIO = 0.9
+
+
+class PageRenderCache:
+    """基于内容哈希的PDF页面渲染磁盘缓存"""
+
+    def __init__(
+        self,
+        directory: Optional[Union[str, Path]] = None,
+        max_size: Optional[int] = None,
+        enabled: Optional[bool] = None
+    ):
+        """
+        初始化渲染缓存
+
+        Args:
+            directory: 缓存根目录，默认使用 CACHE_CONFIG["directory"]
+            max_size: 缓存总字节数上限，默认使用 CACHE_CONFIG["page_render_max_size"]
+            enabled: 是否启用，默认使用 CACHE_CONFIG["enable"]
+        """
+        base_dir = Path(directory or CACHE_CONFIG["directory"])
+        self.directory = base_dir / RENDER_CACHE_SUBDIR
+        self.max_size = int(max_size if max_size is not None else CACHE_CONFIG["page_render_max_size"])
+        self.enabled = CACHE_CONFIG["enable"] if enabled is None else enabled
+
+        # 统计计数器
+        self.hits = 0
+        self.derived = 0
+        self.renders = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._total_size = None  # 首次写入时扫描目录得到
+
+    # ========== 对外接口 ==========
+
+    def render_pdf(
+        self,
+        pdf_path: Union[str, Path],
+        dpi: float,
+        output_dir: Optional[Union[str, Path]] = None,
+        colorspace: Optional[str] = None,
+        filename_pattern: str = "page_{:03d}.png",
+        max_pages: Optional[int] = None,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> List[str]:
+        """
+        获取PDF所有页面的渲染图片
+
+        Args:
+            pdf_path: PDF文件路径
+            dpi: 渲染DPI
+            output_dir: 输出目录；为None时直接返回缓存中的文件路径（只读使用）
+            colorspace: "gray" 或 "rgb"，默认 IMAGE_CONFIG["render_colorspace"]
+            filename_pattern: 输出文件名模板（参数为从1开始的页码）
+            max_pages: 最多渲染的页数
+            progress_callback: 每页就绪后调用 (已完成页数, 总页数, 页码)
+
+        Returns:
+            图片路径列表（按页码顺序）
+        """
+        colorspace = colorspace or IMAGE_CONFIG["render_colorspace"]
+
+        if not self.enabled:
+            return self._render_uncached(
+                pdf_path, dpi, output_dir, colorspace, filename_pattern, max_pages, progress_callback
+            )
+
+        digest = hash_file(pdf_path)
+        page_count = self._page_count(pdf_path, digest)
+        if max_pages is not None:
+            page_count = min(page_count, max_pages)
+
+        cached_paths = self._ensure_pages(
+            pdf_path, digest, range(page_count), dpi, colorspace, progress_callback
+        )
+
+        if output_dir is None:
+            return [str(p) for p in cached_paths]
+
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        results = []
+        for page_index, cached_path in enumerate(cached_paths):
+            target = output_dir / filename_pattern.format(page_index + 1)
+            self._materialize(cached_path, target)
+            results.append(str(target))
+        return results
+
+    def get_page(
+        self,
+        pdf_path: Union[str, Path],
+        page_index: int,
+        dpi: float,
+        colorspace: Optional[str] = None
+    ) -> str:
+        """
+        获取单个页面的渲染图片（缓存中的路径，只读使用）
+
+        Args:
+            pdf_path: PDF文件路径
+            page_index: 页码（从0开始）
+            dpi: 渲染DPI
+            colorspace: "gray" 或 "rgb"
+
+        Returns:
+            图片路径
+        """
+        colorspace = colorspace or IMAGE_CONFIG["render_colorspace"]
+        if not self.enabled:
+            raise RuntimeError("页面渲染缓存未启用")
+        digest = hash_file(pdf_path)
+        return str(self._ensure_pages(pdf_path, digest, [page_index], dpi, colorspace)[0])
+
+    def stats(self) -> Dict:
+        """返回命中统计"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "derived": self.derived,
+                "renders": self.renders,
+                "evictions": self.evictions,
+                "size_bytes": self._total_size
+            }
+
+    # ========== 缓存查找与渲染 ==========
+
+    def _pdf_dir(self, digest: str) -> Path:
+        return self.directory / digest[:2] / digest
+
+    @staticmethod
+    def _entry_name(page_index: int, dpi: float, colorspace: str) -> str:
+        return f"p{page_index + 1:04d}_{dpi:g}_{colorspace}.png"
+
+    def _page_count(self, pdf_path, digest: str) -> int:
+        meta_path = self._pdf_dir(digest) / META_FILE
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)["page_count"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        with fitz.open(pdf_path) as doc:
+            page_count = len(doc)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        self._atomic_write(meta_path, json.dumps({"page_count": page_count}).encode("utf-8"))
+        return page_count
+
+    def _ensure_pages(
+        self,
+        pdf_path,
+        digest: str,
+        page_indices,
+        dpi: float,
+        colorspace: str,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> List[Path]:
+        """确保页面在缓存中：命中 → 由更高DPI缩小 → 并行渲染PDF"""
+        pdf_dir = self._pdf_dir(digest)
+        pdf_dir.mkdir(parents=True, exist_ok=True)
+
+        page_indices = list(page_indices)
+        total = len(page_indices)
+        done = 0
+
+        def page_ready(page_index: int):
+            nonlocal done
+            done += 1
+            if progress_callback:
+                progress_callback(done, total, page_index)
+
+        paths = []
+        to_render = {}
+        for page_index in page_indices:
+            path = pdf_dir / self._entry_name(page_index, dpi, colorspace)
+            paths.append(path)
+
+            if path.exists():
+                self._touch(path)
+                with self._lock:
+                    self.hits += 1
+                page_ready(page_index)
+                continue
+
+            source = self._find_higher_dpi(pdf_dir, page_index, dpi, colorspace)
+            if source is not None:
+                try:
+                    self._derive(source[0], source[1], dpi, path)
+                    with self._lock:
+                        self.derived += 1
+                    page_ready(page_index)
+                    continue
+                except OSError:
+                    pass  # 源图片刚被淘汰，回退到渲染
+
+            to_render[page_index] = path
+
+        if to_render:
+            for page_index, data in iter_rasterize_pdf(
+                str(pdf_path), dpi, colorspace, page_indices=list(to_render)
+            ):
+                self._store(to_render[page_index], data)
+                with self._lock:
+                    self.renders += 1
+                page_ready(page_index)
+
+        return paths
+
+    def _find_higher_dpi(
+        self, pdf_dir: Path, page_index: int, dpi: float, colorspace: str
+    ) -> Optional[Tuple[Path, float]]:
+        """查找同一页面最接近的更高DPI缓存"""
+        best = None
+        for candidate in pdf_dir.glob(f"p{page_index + 1:04d}_*_{colorspace}.png"):
+            try:
+                candidate_dpi = float(candidate.stem.split("_")[1])
+            except (IndexError, ValueError):
+                continue
+            if candidate_dpi > dpi and (best is None or candidate_dpi < best[1]):
+                best = (candidate, candidate_dpi)
+        return best
+
+    def _derive(self, source: Path, source_dpi: float, dpi: float, target: Path):
+        """由更高DPI图片缩小得到目标DPI图片"""
+        with Image.open(source) as img:
+            ratio = dpi / source_dpi
+            size = (max(1, round(img.width * ratio)), max(1, round(img.height * ratio)))
+            resized = img.resize(size, Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        resized.save(buffer, "PNG")
+        self._store(target, buffer.getvalue())
+        self._touch(source)
+
+    def _render_uncached(
+        self, pdf_path, dpi, output_dir, colorspace, filename_pattern, max_pages, progress_callback
+    ) -> List[str]:
+        """缓存禁用时直接渲染到输出目录"""
+        output_dir = Path(output_dir or tempfile.mkdtemp())
+        output_dir.mkdir(parents=True, exist_ok=True)
+        with fitz.open(pdf_path) as doc:
+            page_count = len(doc) if max_pages is None else min(len(doc), max_pages)
+
+        results = [str(output_dir / filename_pattern.format(i + 1)) for i in range(page_count)]
+        for page_index, data in iter_rasterize_pdf(
+            str(pdf_path), dpi, colorspace, page_indices=range(page_count),
+            progress_callback=progress_callback
+        ):
+            with open(results[page_index], "wb") as f:
+                f.write(data)
+        return results
+
+    # ========== 文件操作 ==========
+
+    @staticmethod
+    def _atomic_write(path: Path, data: bytes):
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _touch(path: Path):
+        """更新访问时间（LRU依据）"""
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _materialize(cached_path: Path, target: Path):
+        """把缓存文件放到输出目录（优先硬链接，跨文件系统时复制）"""
+        if target.exists():
+            target.unlink()
+        try:
+            os.link(cached_path, target)
+        except OSError:
+            shutil.copy2(cached_path, target)
+
+    def _store(self, path: Path, data: bytes):
+        """写入缓存条目，必要时触发淘汰"""
+        self._atomic_write(path, data)
+        with self._lock:
+            if self._total_size is None:
+                self._total_size = self._scan_size()
+            else:
+                self._total_size += len(data)
+            if self._total_size > self.max_size:
+                self._evict()
+
+    # ========== 淘汰 ==========
+
+    def _iter_entries(self):
+        if not self.directory.exists():
+            return
+        for path in self.directory.glob("*/*/*.png"):
+            try:
+                yield path, path.stat()
+            except OSError:
+                continue
+
+    def _scan_size(self) -> int:
+        return sum(stat.st_size for _, stat in self._iter_entries())
+
+    def _evict(self):
+        """按最近访问时间删除最旧的页面图片，直到低于目标容量（调用方持锁）"""
+        entries = sorted(self._iter_entries(), key=lambda item: item[1].st_mtime)
+        target = self.max_size * EVICTION_TARGET_RATIO
+        total = sum(stat.st_size for _, stat in entries)
+
+        for path, stat in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= stat.st_size
+            self.evictions += 1
+
+        self._total_size = total
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_render_cache() -> PageRenderCache:
+    """获取全局共享的页面渲染缓存实例"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = PageRenderCache()
+    return _default_cache
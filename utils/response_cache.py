@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+LLM响应缓存
+以内容哈希为键的磁盘缓存，重复运行相同图纸时跳过已完成的模型调用
+
+缓存键 = SHA-256(模型名, 温度, 系统提示词, 用户查询, 每张图片内容的SHA-256, 附加参数)
+淘汰策略由 config.CACHE_CONFIG 控制：
+- directory: 缓存根目录（响应存放在 llm_responses 子目录）
+- max_size: 缓存总字节数上限，超出后按最近访问时间淘汰（LRU）
+- ttl: 条目有效期（秒），过期条目视为未命中并删除
+"""
+
+import os
+import json
+import hashlib
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from config import CACHE_CONFIG
+from utils.file_hash import hash_file
+from utils.json_stream import parse_complete_json
+
+
+# 响应缓存子目录
+RESPONSE_CACHE_SUBDIR = "llm_responses"
+
+# 淘汰后保留的容量比例（避免每次写入都触发淘汰）
+EVICTION_TARGET_RATIO = 0.9
+
+
+class ResponseCache:
+    """基于内容哈希的LLM响应磁盘缓存（LRU + TTL）"""
+
+    def __init__(
+        self,
+        directory: Optional[Union[str, Path]] = None,
+        max_size: Optional[int] = None,
+        ttl: Optional[float] = None,
+        enabled: Optional[bool] = None
+    ):
+        """
+        初始化响应缓存
+
+        Args:
+            directory: 缓存根目录，默认使用 CACHE_CONFIG["directory"]
+            max_size: 缓存总字节数上限，默认使用 CACHE_CONFIG["max_size"]
+            ttl: 条目有效期（秒），默认使用 CACHE_CONFIG["ttl"]
+            enabled: 是否启用，默认使用 CACHE_CONFIG["enable"]
+        """
+        base_dir = Path(directory or CACHE_CONFIG["directory"])
+        self.directory = base_dir / RESPONSE_CACHE_SUBDIR
+        self.max_size = int(max_size if max_size is not None else CACHE_CONFIG["max_size"])
+        self.ttl = float(ttl if ttl is not None else CACHE_CONFIG["ttl"])
+        self.enabled = CACHE_CONFIG["enable"] if enabled is None else enabled
+
+        # 统计计数器
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._total_size = None  # 首次写入时扫描目录得到
+
+    # ========== 缓存键 ==========
+
+    def hash_image(self, image: str) -> str:
+        """
+        计算图片内容的SHA-256（URL直接对字符串取哈希）
+
+        本地文件按 (路径, 修改时间, 大小) 记忆结果，同一文件只读取一次
+        """
+        if image.startswith("http") or image.startswith("data:"):
+            return hashlib.sha256(image.encode("utf-8")).hexdigest()
+
+        return hash_file(image)
+
+    def make_key(
+        self,
+        model: str,
+        temperature: Optional[float],
+        system_prompt: str,
+        user_query: str,
+        images: Optional[List[str]] = None,
+        extra: Optional[Dict] = None
+    ) -> str:
+        """
+        构建缓存键
+
+        Args:
+            model: 模型名称
+            temperature: 温度
+            system_prompt: 系统提示词
+            user_query: 用户查询
+            images: 图片路径或URL列表
+            extra: 其它影响输出的请求参数（如max_tokens、enable_thinking）
+
+        Returns:
+            十六进制SHA-256字符串
+        """
+        payload = {
+            "model": model,
+            "temperature": temperature,
+            "system_prompt": system_prompt,
+            "user_query": user_query,
+            "images": [self.hash_image(img) for img in (images or [])],
+            "extra": extra or {}
+        }
+        encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    # ========== 读写 ==========
+
+    def _entry_path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        读取缓存条目
+
+        Returns:
+            缓存的响应字典；未命中、过期或损坏时返回None
+        """
+        if not self.enabled:
+            return None
+
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if self.ttl > 0 and time.time() - entry.get("created_at", 0) > self.ttl:
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # 更新访问时间（LRU依据）
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+        return entry.get("value")
+
+    def get_json(self, key: str, roots: str = "{[") -> Optional[Dict]:
+        """
+        读取缓存的JSON输出（条目的 raw_response 为模型输出）
+
+        只写入完整可解析的输出；旧版本写入的截断或无法解析的输出视为未命中并删除，由调用方重新请求
+
+        Args:
+            key: 缓存键
+            roots: 可作为JSON根值开头的字符（同 utils.json_stream.parse_json_text）
+
+        Returns:
+            缓存的响应字典；未命中或输出不完整时返回None
+        """
+        value = self.get(key)
+        if value is None:
+            return None
+        result, _ = parse_complete_json(value.get("raw_response", ""), roots)
+        if result is None:
+            self._remove(self._entry_path(key))
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return value
+
+    def set(self, key: str, value: Dict):
+        """
+        写入缓存条目（原子写入），必要时触发淘汰
+
+        Args:
+            key: 缓存键
+            value: 可JSON序列化的响应字典
+        """
+        if not self.enabled:
+            return
+
+        path = self._entry_path(key)
+        entry = {"key": key, "created_at": time.time(), "value": value}
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            old_size = path.stat().st_size if path.exists() else 0
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[ResponseCache] 写入缓存失败: {e}")
+            return
+
+        with self._lock:
+            self.stores += 1
+            if self._total_size is None:
+                self._total_size = self._scan_size()
+            else:
+                self._total_size += len(data) - old_size
+            if self._total_size > self.max_size:
+                self._evict()
+
+    # ========== 淘汰 ==========
+
+    def _iter_entries(self):
+        if not self.directory.exists():
+            return
+        for path in self.directory.glob("*/*.json"):
+            try:
+                yield path, path.stat()
+            except OSError:
+                continue
+
+    def _scan_size(self) -> int:
+        return sum(stat.st_size for _, stat in self._iter_entries())
+
+    def _remove(self, path: Path) -> int:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+            return size
+        except OSError:
+            return 0
+
+    def _evict(self):
+        """按最近访问时间删除最旧条目，直到低于目标容量（调用方持锁）"""
+        entries = sorted(self._iter_entries(), key=lambda item: item[1].st_mtime)
+        target = self.max_size * EVICTION_TARGET_RATIO
+        total = sum(stat.st_size for _, stat in entries)
+
+        for path, _ in entries:
+            if total <= target:
+                break
+            total -= self._remove(path)
+            self.evictions += 1
+
+        self._total_size = total
+
+    # ========== 统计 ==========
+
+    def stats(self) -> Dict:
+        """返回命中统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size_bytes": self._total_size
+            }
+
+    def clear(self):
+        """清空缓存目录"""
+        with self._lock:
+            for path, _ in list(self._iter_entries()):
+                self._remove(path)
+            self._total_size = 0
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """获取全局共享的响应缓存实例"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = ResponseCache()
+    return _default_cache
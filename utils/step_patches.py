@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+装配步骤补丁
+焊接（Agent 5）和安全（Agent 6）只为部分步骤补充一个字段，模型只输出补丁，
+不再把全部步骤原样重新生成一遍（输出token约为输入的两倍，且Agent 6会再重复Agent 5的输出）
+
+补丁格式（模型输出）：
+    {"step_patches": [{"step_number": 3, "welding": {...}}, ...]}
+
+合并在本地进行并逐条校验：
+- step_number 必须对应输入中的步骤（步骤号缺失或重复时按位置编号，提示词中的步骤号随之改写）
+- 只合并该Agent负责的字段，原有字段不会被覆盖或删除
+- 字段内容按 validate 函数校验/规整，不合格的补丁丢弃并记录原因
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def step_keys(assembly_steps: List[Dict]) -> List[Any]:
+    """
+    补丁中用来指代步骤的编号
+
+    Returns:
+        与步骤一一对应的编号：步骤号齐全且不重复时用 step_number，否则用从1开始的位置
+    """
+    numbers = [step.get("step_number") for step in assembly_steps]
+    if None not in numbers and len(set(map(str, numbers))) == len(numbers):
+        return numbers
+    return list(range(1, len(assembly_steps) + 1))
+
+
+def steps_for_prompt(assembly_steps: List[Dict]) -> List[Dict]:
+    """
+    写入提示词的步骤（step_number 与补丁编号一致）
+
+    Returns:
+        步骤列表；编号与原步骤号一致时原样返回
+    """
+    keys = step_keys(assembly_steps)
+    return [
+        step if step.get("step_number") == key else {**step, "step_number": key}
+        for step, key in zip(assembly_steps, keys)
+    ]
+
+
+def validate_welding(value: Any) -> Optional[Dict]:
+    """焊接字段：对象且 required 为 true（不需要焊接的步骤不应有补丁）"""
+    if isinstance(value, dict) and value.get("required") is True:
+        return value
+    return None
+
+
+def validate_safety_warnings(value: Any) -> Optional[List[str]]:
+    """安全警告字段：非空字符串数组（单个字符串按一条警告处理）"""
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        return None
+    warnings = [warning.strip() for warning in value if isinstance(warning, str) and warning.strip()]
+    return warnings or None
+
+
+def extract_patches(parsed: Any, field: str) -> Optional[List[Dict]]:
+    """
+    从模型输出中取出补丁列表
+
+    兼容模型仍按旧格式返回完整的 enhanced_steps：只取其中带该字段的步骤
+
+    Returns:
+        补丁列表；输出中既没有 step_patches 也没有 enhanced_steps 时为None
+    """
+    if not isinstance(parsed, dict):
+        return None
+    if isinstance(parsed.get("step_patches"), list):
+        return parsed["step_patches"]
+    if isinstance(parsed.get("enhanced_steps"), list):
+        return [
+            {"step_number": step.get("step_number"), field: step[field]}
+            for step in parsed["enhanced_steps"] if isinstance(step, dict) and field in step
+        ]
+    return None
+
+
+def apply_step_patches(
+    assembly_steps: List[Dict],
+    patches: List[Dict],
+    field: str,
+    validate: Callable[[Any], Any]
+) -> Tuple[List[Dict], Dict]:
+    """
+    把补丁合并到装配步骤（不修改传入的步骤）
+
+    Args:
+        assembly_steps: 原装配步骤
+        patches: 补丁列表 [{"step_number": 编号, field: 值}, ...]
+        field: 本次补充的字段名（"welding" / "safety_warnings"）
+        validate: 字段校验函数，返回规整后的值，不合格时返回None
+
+    Returns:
+        (合并后的步骤, {"applied": 合并的补丁数, "skipped": [丢弃原因, ...]})
+    """
+    position = {str(key): index for index, key in enumerate(step_keys(assembly_steps))}
+    merged = [dict(step) for step in assembly_steps]
+    report = {"applied": 0, "skipped": []}
+
+    for patch in patches:
+        if not isinstance(patch, dict):
+            report["skipped"].append(f"补丁不是对象: {json.dumps(patch, ensure_ascii=False)[:80]}")
+            continue
+        index = position.get(str(patch.get("step_number")))
+        if index is None:
+            report["skipped"].append(f"步骤{patch.get('step_number')}不存在")
+            continue
+        value = validate(patch.get(field))
+        if value is None:
+            report["skipped"].append(f"步骤{patch.get('step_number')}的{field}不合格")
+            continue
+        # 同一步骤有多条补丁时后者覆盖前者
+        merged[index][field] = value
+        report["applied"] += 1
+
+    return merged, report
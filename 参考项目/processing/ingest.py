@@ -6,16 +6,21 @@ import json
 import os
 import shutil
 import subprocess
+import sys
 import textwrap
 from dataclasses import dataclass, asdict
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional
 
-try:
-    from pypdf import PdfReader  # type: ignore
-except ImportError:  # pragma: no cover
-    PdfReader = None
+import fitz  # PyMuPDF
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from core.bom_parser import BomRow, iter_bom_rows_from_text, iter_page_bom_rows, page_lines  # noqa: E402
+from utils.file_hash import hash_file  # noqa: E402
 
 
 @dataclass
@@ -79,30 +84,30 @@ def iter_files(root: Path, suffixes: Iterable[str]) -> Iterable[Path]:
 
 
 def handle_pdf(path: Path, output_dir: Path) -> Optional[Dict[str, Any]]:
-    if PdfReader is None:
-        print("pypdf is not installed; skipping PDF extraction.")
-        return None
-
     try:
-        reader = PdfReader(path)
+        doc = fitz.open(path)
     except Exception as exc:  # pragma: no cover - depends on file integrity
         print(f"Failed to load PDF {path}: {exc}")
         return None
 
     text_chunks = []
-    for page in reader.pages:
-        page_text = page.extract_text() or ""
-        if page_text:
-            text_chunks.append(page_text)
+    bom_items: List[Dict[str, Any]] = []
+    digest = hash_file(path)
+    with doc:
+        page_count = len(doc)
+        for page in doc:
+            lines = page_lines(page)
+            if lines:
+                text_chunks.append("\n".join(lines))
+            bom_items.extend(_to_entry(row) for row in iter_page_bom_rows(page, digest, path.name, lines=lines))
 
     text = "\n".join(text_chunks)
     preview = textwrap.shorten(text.replace("\n", " "), width=600, placeholder="…")
-    bom_items = extract_bom_items(text)
     items = build_frontend_items(bom_items, source=str(path))
 
     report = PdfExtraction(
         path=str(path),
-        page_count=len(reader.pages),
+        page_count=page_count,
         preview=preview,
         bom_items=bom_items,
         items=items,
@@ -118,43 +123,20 @@ def handle_pdf(path: Path, output_dir: Path) -> Optional[Dict[str, Any]]:
 
 
 def extract_bom_items(raw_text: str) -> List[Dict[str, Any]]:
-    items: List[Dict[str, Any]] = []
-    for raw_line in raw_text.splitlines():
-        line = raw_line.strip()
-        if not line:
-            continue
-        tokens = line.split()
-        if len(tokens) < 4 or not tokens[0].isdigit():
-            continue
-
-        code = tokens[1]
-        if not _looks_like_code(code):
-            continue
-
-        index = int(tokens[0])
-        qty_info = _find_last_int(tokens)
-        weight_info = _find_last_float(tokens)
-
-        desc_end = len(tokens)
-        if qty_info:
-            desc_end = min(desc_end, qty_info[1])
-        elif weight_info:
-            desc_end = min(desc_end, weight_info[1])
-
-        name_tokens = tokens[2:desc_end]
-        if not name_tokens:
-            name_tokens = tokens[1:desc_end]
-
-        item = {
-            "index": index,
-            "code": code,
-            "name": " ".join(name_tokens),
-            "quantity": qty_info[0] if qty_info else None,
-            "weight": weight_info[0] if weight_info else None,
-            "raw": line,
-        }
-        items.append(item)
-    return items
+    return [_to_entry(row) for row in iter_bom_rows_from_text(raw_text)]
+
+
+def _to_entry(row: BomRow) -> Dict[str, Any]:
+    return {
+        "index": row.seq,
+        "code": row.code,
+        "name": " ".join(filter(None, (row.product_code, row.name))),
+        "quantity": row.quantity,
+        "weight": row.weight,
+        "raw": row.raw,
+        "page": row.page,
+        "line": row.line,
+    }
 
 
 def build_frontend_items(entries: List[Dict[str, Any]], source: str) -> List[Dict[str, Any]]:
@@ -173,34 +155,6 @@ def build_frontend_items(entries: List[Dict[str, Any]], source: str) -> List[Dic
     return payload
 
 
-def _looks_like_code(token: str) -> bool:
-    if any(ch.isalpha() for ch in token):
-        return True
-    return any(ch in "-_.*/" for ch in token)
-
-
-def _find_last_int(tokens: List[str]) -> Optional[Tuple[int, int]]:
-    for idx in range(len(tokens) - 1, -1, -1):
-        token = tokens[idx]
-        if token.isdigit():
-            try:
-                return int(token), idx
-            except ValueError:
-                continue
-    return None
-
-
-def _find_last_float(tokens: List[str]) -> Optional[Tuple[float, int]]:
-    for idx in range(len(tokens) - 1, -1, -1):
-        token = tokens[idx]
-        try:
-            if any(ch.isdigit() for ch in token):
-                return float(token), idx
-        except ValueError:
-            continue
-    return None
-
-
 def handle_dwg(path: Path, output_dir: Path, placeholder_glb: Path) -> Dict[str, Any]:
     converter = os.environ.get("ODA_CONVERTER")
     generated: List[str] = []
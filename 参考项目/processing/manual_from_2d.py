@@ -9,14 +9,19 @@ from __future__ import annotations
 
 import argparse
 import json
+import sys
 import textwrap
 from dataclasses import asdict, dataclass
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Optional
 
-import fitz  # PyMuPDF
-from pypdf import PdfReader
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from core.bom_parser import iter_bom_rows  # noqa: E402
+from utils.render_cache import get_render_cache  # noqa: E402
 
 
 @dataclass
@@ -27,6 +32,8 @@ class BomItem:
     quantity: Optional[int]
     weight: Optional[float]
     raw: str
+    page: int = 0
+    line: int = 0
 
 
 @dataclass
@@ -137,87 +144,31 @@ def iter_pdfs(root: Path) -> Iterable[Path]:
 
 
 def render_pdf_to_images(pdf_path: Path, manual_dir: Path, dpi: int) -> List[Path]:
-    images_dir = manual_dir / "images"
-    images_dir.mkdir(parents=True, exist_ok=True)
-    doc = fitz.open(pdf_path)
-    zoom = dpi / 72.0
-    matrix = fitz.Matrix(zoom, zoom)
-    rendered: List[Path] = []
-    for page_index, page in enumerate(doc, start=1):
-        pix = page.get_pixmap(matrix=matrix, alpha=False)
-        output_path = images_dir / f"page-{page_index:02d}.png"
-        pix.save(output_path)
-        rendered.append(output_path)
-    return rendered
+    # Pages come from the shared render cache; HTML needs stable files, so they are linked into images/.
+    rendered = get_render_cache().render_pdf(
+        pdf_path,
+        dpi,
+        output_dir=manual_dir / "images",
+        colorspace="rgb",
+        filename_pattern="page-{:02d}.png",
+    )
+    return [Path(p) for p in rendered]
 
 
 def parse_bom(pdf_path: Path) -> List[BomItem]:
-    reader = PdfReader(pdf_path)
-    text = "\n".join(filter(None, (page.extract_text() or "" for page in reader.pages)))
-    items = extract_bom_items(text)
-    return [BomItem(**item) for item in items]
-
-
-def extract_bom_items(raw_text: str) -> List[Dict[str, Any]]:
-    items: List[Dict[str, Any]] = []
-    for raw_line in raw_text.splitlines():
-        line = raw_line.strip()
-        if not line:
-            continue
-        tokens = line.split()
-        if len(tokens) < 4 or not tokens[0].isdigit():
-            continue
-        index = int(tokens[0])
-        code = tokens[1]
-        if not _looks_like_code(code):
-            continue
-        qty_info = _find_last_int(tokens)
-        weight_info = _find_last_float(tokens)
-        desc_end = len(tokens)
-        if qty_info:
-            desc_end = min(desc_end, qty_info[1])
-        elif weight_info:
-            desc_end = min(desc_end, weight_info[1])
-        name_tokens = tokens[2:desc_end]
-        if not name_tokens:
-            name_tokens = tokens[1:desc_end]
-        items.append({
-            "index": index,
-            "code": code,
-            "name": " ".join(name_tokens),
-            "quantity": qty_info[0] if qty_info else None,
-            "weight": weight_info[0] if weight_info else None,
-            "raw": line,
-        })
-    return items
-
-
-def _looks_like_code(token: str) -> bool:
-    if any(ch.isalpha() for ch in token):
-        return True
-    return any(ch in "-_.*/" for ch in token)
-
-
-def _find_last_int(tokens: List[str]) -> Optional[tuple[int, int]]:
-    for idx in range(len(tokens) - 1, -1, -1):
-        token = tokens[idx]
-        if token.isdigit():
-            try:
-                return int(token), idx
-            except ValueError:
-                continue
-    return None
-
-
-def _find_last_float(tokens: List[str]) -> Optional[tuple[float, int]]:
-    for idx in range(len(tokens) - 1, -1, -1):
-        token = tokens[idx]
-        try:
-            if any(ch.isdigit() for ch in token):
-                return float(token), idx
-        except ValueError:
-            continue
-    return None
+    return [
+        BomItem(
+            index=row.seq,
+            code=row.code,
+            name=" ".join(filter(None, (row.product_code, row.name))),
+            quantity=row.quantity,
+            weight=row.weight,
+            raw=row.raw,
+            page=row.page,
+            line=row.line,
+        )
+        for row in iter_bom_rows(pdf_path)
+    ]
 
 
 def render_html(context: ManualContext) -> str: